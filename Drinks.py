@@ -4,6 +4,7 @@ import pandas as pd
 import plotly.express as px
 import os
 import calendar
+import uuid
 from datetime import datetime, date
 
 from reportlab.lib.pagesizes import A4
@@ -11,16 +12,35 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 
+from barcode_scan import ScanQueue, build_barcode_index, decoder_error, tally_scans
+from delivery_ingest import ingest_delivery
+from price_impact import TIER_COLUMNS, TIER_KEY, apply_tier_changes, changed_tiers, normalize_tiers, simulate, summarize
+from search_index import search
+from snapshots import label_column, memory_report
+
 # Import Supabase DB functions
 from db_supabase import (
-    view_items, add_or_update_item, delete_item, delete_all_inventory, get_total_qty,
-    view_customers, validate_if_customer_exist, save_customer, update_customer, delete_customer, delete_all_customers,get_customer,
-    view_pricing, get_price_list, add_price, update_price, delete_price, validate_special_price_exist, upload_tiered_pricing_to_db, 
+    view_items, add_or_update_item, add_or_update_items_batch, delete_item, get_total_qty,
+    view_item_barcodes, save_item_barcode,
+    view_customers, validate_if_customer_exist, save_customer, update_customer, delete_customer, get_customer,
+    view_pricing, get_price_list, set_special_price, delete_price,
     get_pricing_tiers, save_pricing_tier, delete_pricing_tier, get_items_for_pricing, get_special_price,
     get_base_price, get_customer_adjusted_price, get_po_sequence,
-    view_sales, view_sales_by_customer, record_sale, get_sales_by_customer,
-    view_audit_log, create_price_history_entry
+    view_sales, view_sales_by_customer, record_sale, get_sales_by_customer, annotate_sales_with_prices,
+    view_audit_log, flush_audit_log, archive_old_audit_entries,
+    local_sync_status, dismiss_sync_conflict, sync_mirror, table_versions, CHANGE_FEED_INTERVAL,
+    coalescing_stats, db_request_metrics, inventory_as_of, take_inventory_checkpoint, view_inventory_checkpoints,
+    maybe_take_inventory_checkpoint, low_stock_items, reorder_suggestions, view_stock_thresholds,
+    set_stock_threshold, delete_stock_threshold, demand_forecast, item_demand_series,
+    stock_by_category_chart, profit_trend_chart, fridge_summary, view_items_in_fridge,
+    start_purge, purge_status, view_purge_jobs, submit_pricing_upload, submit_item_import, submit_soa_report,
+    submit_po_report, submit_csv_export, view_jobs, job_status, cancel_job, job_result
 )
+from audit_archive import HOT_DAYS as AUDIT_HOT_DAYS
+import rerun_profiler
+
+# Opt-in (DIANES_PROFILE): time this rerun's sections and db_supabase calls
+rerun_profiler.begin()
 
 # ---------------- SESSION STATE INIT ----------------
 if 'logged_in' not in st.session_state:
@@ -39,27 +59,66 @@ if "quantity" not in st.session_state:
 if "fridge_no" not in st.session_state:
     st.session_state.fridge_no = ""
 
-# ---------------- FUNCTIONS ----------------
-def upload_tiered_pricing(uploaded_file):
-    if uploaded_file is None:
-        st.error("No file uploaded.")
-        return
+# Tables each page displays; the page reruns by itself when one of them changes
+PAGE_TABLES = {
+    "Home": ["items", "sales", "stock_thresholds"],
+    "View Inventory": ["items"],
+    "Manage Stock": ["items"],
+    "Barcode Scan-In": ["items", "item_barcodes"],
+    "View Pricing Tiers": ["pricing_tiers"],
+    "Manage Customers": ["customers"],
+    "View Sale for a Customer": ["customers", "sales"],
+    "Record Sale": ["items", "customers", "sales"],
+    "View Special Pricing": ["customers", "customer_price_list", "pricing_tiers"],
+    "Profit/Loss Report": ["sales"],
+}
 
+# ---------------- FUNCTIONS ----------------
+@st.fragment(run_every=CHANGE_FEED_INTERVAL)
+def watch_page_tables(tables):
+    """Rerun the page when data it shows has changed in another session."""
+    versions = table_versions(tables)
+    if st.session_state.get("page_versions") is None:
+        st.session_state.page_versions = versions
+    elif versions != st.session_state.page_versions:
+        st.rerun(scope="app")
+
+def search_picker(label, df, kind, label_name, key, placeholder=None, limit=20):
+    """
+    Type-ahead picker: a search box over the rows of df (see search_index)
+    and a selectbox of only the top `limit` matches. Returns the chosen row's
+    label, built like snapshots.LABELS[label_name], or `placeholder`.
+    """
+    options = []
+    if not df.empty:
+        query = st.text_input(f"Search: {label}", key=f"{key}_query", placeholder="Type a name, category, id, phone...")
+        matches = search(df, kind, query, limit)
+        if matches.empty:
+            st.caption("No matches.")
+            matches = search(df, kind, "", limit)
+        options = label_column(matches, label_name).tolist()
+    if placeholder is not None:
+        options = [placeholder] + options
+    return st.selectbox(label, options, key=key)
+
+def read_pricing_file(uploaded_file) -> pd.DataFrame:
     # Determine file type and read accordingly
     file_ext = os.path.splitext(uploaded_file.name)[1].lower()
     if file_ext == '.csv':
-        df = pd.read_csv(uploaded_file)
+        return pd.read_csv(uploaded_file)
     elif file_ext in ['.xlsx', '.xls']:
-        df = pd.read_excel(uploaded_file, engine='openpyxl' if file_ext == '.xlsx' else 'xlrd')
+        return pd.read_excel(uploaded_file, engine='openpyxl' if file_ext == '.xlsx' else 'xlrd')
     else:
         raise ValueError("Unsupported file format. Please upload a CSV or Excel file.")
 
-    skipped_rows = upload_tiered_pricing_to_db(df)
+def upload_tiered_pricing(uploaded_file):
+    if uploaded_file is None:
+        st.error("No file uploaded.")
+        return
 
-    if skipped_rows:
-        st.warning(f"Skipped rows with invalid item_id(s): {skipped_rows}")
-    else:
-        st.success("Pricing Tiers updated or inserted successfully!")
+    if st.button("Upload Pricing"):
+        df = read_pricing_file(uploaded_file)
+        st.session_state.job_pricing_upload = submit_pricing_upload(df, st.session_state.username)
 
 # ----------------- Manage Pricing Tiers -----------------
 def manage_pricing_tiers():
@@ -70,10 +129,7 @@ def manage_pricing_tiers():
         st.warning("No items found.")
         return
 
-    item_label = st.selectbox(
-        "Select Item",
-        items_df.apply(lambda row: f"{row['item_id']} - {row['item_name']}", axis=1)
-    )
+    item_label = search_picker("Select Item", items_df, "items", "item", key="tier_item")
     item_id = int(item_label.split(" - ")[0])
     item_name = item_label.split(" - ")[1]
 
@@ -135,11 +191,10 @@ def manage_special_customer_pricing():
         customers_df = view_customers()
         items_df = view_items()
 
-        customer_options = ["Select customer"] + [f"{row['id']} - {row['name']}" for _, row in customers_df.iterrows()]
-        item_options = ["Select item"] + [f"{row['item_id']} - {row['item_name']}" for _, row in items_df.iterrows()]
-
-        selected_customer = st.selectbox("Customer", customer_options, index=0)
-        selected_item = st.selectbox("Item", item_options, index=0)
+        selected_customer = search_picker(
+            "Customer", customers_df, "customers", "customer", key="special_price_customer", placeholder="Select customer"
+        )
+        selected_item = search_picker("Item", items_df, "items", "item", key="special_price_item", placeholder="Select item")
         custom_price = st.number_input("Custom Price", min_value=0.0, format="%.2f")
 
         if st.button("Save Special Price"):
@@ -150,14 +205,9 @@ def manage_special_customer_pricing():
             if selected_item != "Select item":
                 item_id = int(selected_item.split(" - ")[0])
 
-            if validate_special_price_exist(customer_id, item_id):
-                update_price(customer_id, item_id, custom_price)
-                st.success(f"Updated existing special pricing for customer {customer_id}.")
-                st.rerun()
-            else:
-                add_price(customer_id, item_id, custom_price)
-                st.success(f"Added new special pricing for customer {customer_id}.")
-                st.rerun()
+            set_special_price(customer_id, item_id, custom_price)
+            st.success(f"Saved special pricing for customer {customer_id}.")
+            st.rerun()
 
     # Delete section
     with st.expander("🗑️ Delete Special Customer Pricing", expanded=False):
@@ -176,7 +226,81 @@ def manage_special_customer_pricing():
                     st.success("Price deleted.")
                     st.rerun()
 
+# ---------------- Background Jobs ----------------
+@st.fragment(run_every=1)
+def show_job_progress(job_id):
+    """Live progress of a queued or running job; the page reruns once it stops."""
+    job = job_status(job_id)
+    if job.get("status") in ("queued", "running"):
+        st.progress(job["progress"] or 0.0, text=f"{job['title']}: {job['message'] or job['status'].title()}")
+        if st.button("Cancel", key=f"cancel_{job_id}"):
+            cancel_job(job_id)
+    else:
+        st.rerun(scope="app")
+
+def job_panel(key):
+    """Progress, outcome and download of the job whose id is in st.session_state[key]."""
+    job_id = st.session_state.get(key)
+    if not job_id:
+        return
+    job = job_status(job_id)
+    status = job.get("status")
+    if status in ("queued", "running"):
+        show_job_progress(job_id)
+    elif status == "done":
+        st.success(job["message"] or f"{job['title']} finished.")
+        result = job_result(job_id)
+        if result:
+            load, name, mime = result
+            st.download_button(f"Download {name}", data=load, file_name=name, mime=mime, key=f"download_{job_id}")
+    elif status == "failed":
+        error = (job["error"] or "unknown error").splitlines()[0]
+        st.error(f"{job['title']} failed: {error}")
+    elif status == "cancelled":
+        st.warning(f"{job['title']} was cancelled.")
+
 # ---------------- Pagination Utility ----------------
+@st.fragment(run_every=1)
+def show_purge_progress(table, job_id):
+    """Live progress of a bulk purge job; the page reruns once it stops."""
+    job = purge_status(job_id)
+    if not job:
+        # The job row is gone (e.g. purge_jobs was cleared); stop following it
+        st.session_state.pop(f"purge_job_{table}", None)
+        st.rerun(scope="app")
+    total = max(job.get("total_rows") or 0, job.get("deleted_rows") or 0, 1)
+    st.progress((job.get("deleted_rows") or 0) / total, text=f"Deleted {job.get('deleted_rows') or 0:,} of ~{total:,} rows")
+    if job.get("status") != "running":
+        st.session_state.pop(f"purge_job_{table}", None)
+        st.rerun(scope="app")
+
+def purge_page(table, what):
+    """Confirm and start a chunked background purge of `table`, then follow its progress."""
+    st.warning(f"This action will delete ALL {what} permanently.")
+    job_key = f"purge_job_{table}"
+    if job_key in st.session_state:
+        show_purge_progress(table, st.session_state[job_key])
+    else:
+        confirm = st.text_input("Type 'DELETE' to confirm")
+        archive = st.checkbox("Archive rows to Parquet before deleting")
+        if st.button(f"Delete All {what.title()}"):
+            if confirm == "DELETE":
+                st.session_state[job_key] = start_purge(table, st.session_state.username, archive)
+                st.rerun()
+            else:
+                st.error(f"Confirmation text does not match. {what.capitalize()} not deleted.")
+
+    jobs = view_purge_jobs(table)
+    if not jobs.empty:
+        st.subheader("Recent Purges")
+        st.dataframe(jobs[["id", "status", "username", "archive", "deleted_rows", "total_rows", "started_at", "finished_at", "error"]],
+                     hide_index=True, width='stretch')
+        unfinished = jobs[jobs["status"] != "done"]
+        if job_key not in st.session_state and not unfinished.empty:
+            if st.button(f"Resume purge #{unfinished['id'].iloc[0]}"):
+                st.session_state[job_key] = start_purge(table, st.session_state.username)
+                st.rerun()
+
 def paginate_dataframe(df, page_size=20):
     total_rows = len(df)
     if total_rows == 0:
@@ -219,6 +343,68 @@ elif st.session_state.logged_in:
     st.sidebar.header("Settings")
     stock_threshold = st.sidebar.number_input("Set Stock Alert Threshold", min_value=0, value=5)
 
+    # Local-first mode: writes go to the local mirror and sync in the background
+    sync_status = local_sync_status()
+    if sync_status["enabled"]:
+        if sync_status["last_error"]:
+            st.sidebar.warning(f"Offline: {sync_status['pending']} change(s) waiting to sync")
+        elif sync_status["pending"]:
+            st.sidebar.info(f"Syncing {sync_status['pending']} change(s)...")
+        else:
+            st.sidebar.success("All changes synced")
+            if st.sidebar.button("Full Resync from Server"):
+                sync_mirror(full=True)
+                st.rerun()
+        conflicts = sync_status["conflicts"]
+        if not conflicts.empty:
+            with st.sidebar.expander(f"⚠️ {len(conflicts)} Sync Conflict(s)"):
+                st.dataframe(conflicts[["seq", "op", "error", "created_at"]], width='stretch')
+                seq = st.selectbox("Conflict", conflicts["seq"])
+                if st.button("Dismiss Conflict"):
+                    dismiss_sync_conflict(int(seq))
+                    st.rerun()
+
+    with st.sidebar.expander("Background Jobs"):
+        my_jobs = view_jobs(st.session_state.username, limit=5)
+        if my_jobs.empty:
+            st.caption("No jobs yet.")
+        for job in my_jobs.itertuples(index=False):
+            st.caption(f"{job.title}: {job.status}" + (f" ({job.progress:.0%})" if job.status == "running" else ""))
+            result = job_result(job.id) if job.status == "done" else None
+            if result:
+                load, name, mime = result
+                # Read only when clicked, not on every rerun of every page
+                st.download_button(name, data=load, file_name=name, mime=mime, key=f"sidebar_download_{job.id}")
+
+    if rerun_profiler.ENABLED:
+        with st.sidebar.expander("Slowest Reruns"):
+            slow_df = rerun_profiler.slowest_reruns()
+            profile_menu = st.selectbox("Page", ["All pages"] + sorted(slow_df["menu"].unique()), key="profile_menu")
+            if profile_menu != "All pages":
+                slow_df = slow_df[slow_df["menu"] == profile_menu]
+            st.dataframe(slow_df, hide_index=True, width='stretch')
+            if not slow_df.empty:
+                rerun_id = st.selectbox("Rerun", slow_df["id"], key="profile_rerun")
+                detail = rerun_profiler.rerun_detail(int(rerun_id))
+                if detail is not None:
+                    sections_df, calls_df, profile_text = detail
+                    st.dataframe(sections_df, hide_index=True, width='stretch')
+                    st.dataframe(calls_df.sort_values("ms", ascending=False), hide_index=True, width='stretch')
+                    if profile_text:
+                        st.code(profile_text, language=None)
+            if st.button("Clear Profiles"):
+                rerun_profiler.reset()
+
+    with st.sidebar.expander("DB Latency"):
+        st.dataframe(db_request_metrics(), hide_index=True, width='stretch')
+
+    with st.sidebar.expander("Cache Stats"):
+        read_stats = coalescing_stats()
+        st.metric("DB reads saved by coalescing", int(read_stats["coalesced"].sum()))
+        st.dataframe(read_stats, hide_index=True, width='stretch')
+        st.caption("Memory held by this server process")
+        st.dataframe(memory_report(), hide_index=True, width='stretch')
+
     with st.sidebar:
         main_menu = option_menu(
             "Main Menu",
@@ -233,9 +419,11 @@ elif st.session_state.logged_in:
             menu = option_menu("Inventory", [
                 "View Inventory",
                 "Manage Stock",
+                "Barcode Scan-In",
+                "Delivery Receipt Import",
                 "File Upload (Items)",
                 "Delete All Inventory"
-            ], icons=["plus-circle", "list", "pencil", "upload", "trash"])
+            ], icons=["plus-circle", "list", "upc-scan", "receipt", "upload", "trash"])
         elif main_menu == "Pricing":
             menu = option_menu("Pricing", [
                 "View Pricing Tiers",
@@ -257,44 +445,96 @@ elif st.session_state.logged_in:
                 "Profit/Loss Report",
                 "View Audit Log",
                 "Generate Purchase Order",
-                "Price Change Impact Report"
-            ], icons=["graph-up", "book", "file-earmark-text", "bar-chart"])
+                "Price Change Impact Report",
+                "Stock As Of",
+                "Demand Forecast"
+            ], icons=["graph-up", "book", "file-earmark-text", "bar-chart", "clock-history", "graph-up-arrow"])
 
     st.session_state.menu = menu
     st.write(f"Selected: {main_menu} → {menu}")
+    rerun_profiler.lap("sidebar")
+
+    # Set again once the page has rendered, so the watcher compares against what is shown
+    st.session_state.page_versions = None
+    if menu in PAGE_TABLES and table_versions(PAGE_TABLES[menu]):
+        watch_page_tables(PAGE_TABLES[menu])
 
     # ---------------- HOME ----------------
     if menu == "Home":
         st.title("Dashboard")
         items_df = view_items()
         sales_df = view_sales()
+
+        low_df = low_stock_items(stock_threshold)
+        if low_df.empty:
+            st.success("No items at or below their stock alert threshold.")
+        else:
+            st.warning(f"⚠️ {len(low_df)} item(s) at or below their stock alert threshold: "
+                       + ", ".join(low_df["item_name"].head(10)) + (" ..." if len(low_df) > 10 else ""))
+            st.subheader("Reorder List")
+            reorder_df = reorder_suggestions(stock_threshold)
+            st.dataframe(reorder_df, hide_index=True, width='stretch')
+            st.download_button("Download Reorder List CSV", data=reorder_df.to_csv(index=False),
+                               file_name="reorder_list.csv", mime="text/csv")
+        rerun_profiler.lap("Home: stock alerts")
+
+        with st.expander("Per-Item Alert Thresholds", expanded=False):
+            st.caption("Items listed here alert at their own threshold instead of the sidebar one.")
+            thresholds_df = view_stock_thresholds()
+            if not thresholds_df.empty:
+                st.dataframe(thresholds_df[["item_name", "threshold"]], hide_index=True)
+            item_names = sorted(items_df["item_name"].dropna().unique()) if not items_df.empty else []
+            if item_names:
+                threshold_item = st.selectbox("Item", item_names, key="threshold_item")
+                item_threshold = st.number_input("Alert Threshold", min_value=0, value=int(stock_threshold), key="item_threshold")
+                col1, col2 = st.columns(2)
+                if col1.button("Save Threshold"):
+                    set_stock_threshold(threshold_item, item_threshold)
+                    st.rerun()
+                if col2.button("Use Global Threshold"):
+                    delete_stock_threshold(threshold_item)
+                    st.rerun()
+        rerun_profiler.lap("Home: thresholds")
         if not items_df.empty:
             st.subheader("Inventory Summary")
             st.metric("Total Items", len(items_df))
-            fig = px.bar(items_df, x='category', y='quantity', color='category', title="Stock by Category")
+            fig = px.bar(stock_by_category_chart(), x='category', y='quantity', color='category', title="Stock by Category")
             st.plotly_chart(fig)
         if not sales_df.empty:
             st.subheader("Sales Summary")
-            fig2 = px.line(sales_df, x='date', y='profit', title="Profit Trend Over Time")
+            period = st.radio("Group profit by", ["Day", "Week", "Month"], horizontal=True, key="profit_period")
+            fig2 = px.line(profit_trend_chart(period), x='date', y='profit', title="Profit Trend Over Time")
             st.plotly_chart(fig2)
 
     # ---------------- INVENTORY ----------------
     elif menu == "View Inventory":
         st.title("Inventory Data")
-        data = view_items()
-        if data.empty:
+        # The fridge list and counts come from a server-side summary, not every item row
+        fridges_df = fridge_summary()
+        if fridges_df.empty:
             st.warning("No items found.")
         else:
             view_mode = st.radio("Select View Mode", ["Per-Fridge View", "Aggregated View"], index=0)
             if view_mode == "Per-Fridge View":
-                fridge_options = sorted(data["fridge_no"].unique())
-                selected_fridge = st.selectbox("Filter by Fridge No", ["All"] + fridge_options)
-                if selected_fridge != "All":
-                    data = data[data["fridge_no"] == selected_fridge]
-                data = data.sort_values(by="fridge_no")
+                st.subheader("Fridge Occupancy")
+                st.dataframe(fridges_df, hide_index=True, width='stretch')
+                # The option is the fridge itself, so the selection survives its counts changing
+                fridge_labels = {
+                    r.fridge_no: f"Fridge {r.fridge_no} ({r.item_rows} items, {r.total_units:,.0f} units)"
+                    for r in fridges_df.itertuples()
+                }
+                selected_fridge = st.selectbox(
+                    "Filter by Fridge No", [None] + list(fridge_labels),
+                    format_func=lambda fridge_no: "All" if fridge_no is None else fridge_labels[fridge_no],
+                )
+                if selected_fridge is not None:
+                    data = view_items_in_fridge(selected_fridge)
+                else:
+                    data = view_items().sort_values(by="fridge_no")
                 paged_df, _ = paginate_dataframe(data, page_size=100)
                 st.dataframe(paged_df)
             else:
+                data = view_items()
                 aggregated_df = data.groupby(["item_name", "category"], as_index=False).agg({"quantity": "sum"}).rename(columns={"quantity": "total_stock"})
                 st.dataframe(aggregated_df)
 
@@ -317,13 +557,8 @@ elif st.session_state.logged_in:
             existing_categories = sorted(items_df['category'].dropna().unique()) if not items_df.empty else []
             category_options = ["Add New"] + existing_categories
 
-            # Build item options with "<item_id> - <item_name>"
-            if not items_df.empty:
-                item_options = ["Add New"] + [f"{row['item_id']} - {row['item_name']}" for _, row in items_df.iterrows()]
-            else:
-                item_options = ["Add New"]
-
-            selected_item = st.selectbox("Select Item", item_options)
+            # Options are "<item_id> - <item_name>"
+            selected_item = search_picker("Select Item", items_df, "items", "item", key="stock_item", placeholder="Add New")
 
             current_stock = None
             if selected_item != "Add New":
@@ -364,9 +599,13 @@ elif st.session_state.logged_in:
             if st.button("Save"):
                 if item_id and category_name:
                     qty_value = float(quantity)
-                    add_or_update_item(item_id, item_name.strip().upper(), category_name.strip().upper(), qty_value, fridge_no, st.session_state.username)
-                    st.success(f"Item '{item_name}' in category '{category_name}' updated successfully!")
-                    st.rerun()
+                    try:
+                        add_or_update_item(item_id, item_name.strip().upper(), category_name.strip().upper(), qty_value, fridge_no, st.session_state.username)
+                    except ValueError as e:
+                        st.error(str(e))
+                    else:
+                        st.success(f"Item '{item_name}' in category '{category_name}' updated successfully!")
+                        st.rerun()
                 else:
                     st.error("Please provide valid item and category names.")
 
@@ -375,14 +614,138 @@ elif st.session_state.logged_in:
             if items_df.empty:
                 st.warning("No items to delete.")
             else:
-                items_df['label'] = items_df.apply(lambda row: f"{row['item_id']} - {row['category']} - {row['item_name']}", axis=1)
-                selected_label = st.selectbox("Select Item to Delete", items_df['label'])
+                selected_label = search_picker("Select Item to Delete", items_df, "items", "item_category", key="delete_item")
                 item_id = int(selected_label.split(" - ")[0])
                 if st.button("Delete"):
                     delete_item(item_id, st.session_state.username)
                     st.success(f"Item with ID {item_id} deleted successfully!")
                     st.rerun()
 
+    elif menu == "Barcode Scan-In":
+        st.title("Barcode Scan-In")
+
+        if "scan_queue" not in st.session_state:
+            st.session_state.scan_queue = ScanQueue()
+            st.session_state.scan_batch = []
+            st.session_state.scan_seen_images = set()
+        if "barcode_index" not in st.session_state or st.button("Reload Barcodes"):
+            st.session_state.barcode_index = build_barcode_index(view_item_barcodes(), view_items())
+        scan_queue = st.session_state.scan_queue
+        barcode_index = st.session_state.barcode_index
+
+        def queue_typed_barcode():
+            scan_queue.submit_code(st.session_state.typed_barcode)
+            st.session_state.typed_barcode = ""
+
+        # USB/Bluetooth scanners type the code and press Enter
+        st.text_input("Scan or type barcode", key="typed_barcode", on_change=queue_typed_barcode)
+
+        if decoder_error():
+            st.warning(f"Photo decoding is unavailable on this server ({decoder_error()}); scanners and typed barcodes still work.")
+            snapshot, uploads = None, []
+        else:
+            snapshot = st.camera_input("Camera Snapshot")
+            uploads = st.file_uploader("Or upload barcode photos", type=["png", "jpg", "jpeg"], accept_multiple_files=True)
+        for image in ([snapshot] if snapshot else []) + (uploads or []):
+            if image.file_id not in st.session_state.scan_seen_images:
+                st.session_state.scan_seen_images.add(image.file_id)
+                scan_queue.submit_image(image.getvalue(), source=image.name)
+
+        st.session_state.scan_batch.extend(scan_queue.drain())
+        if scan_queue.pending_images():
+            st.info(f"Decoding {scan_queue.pending_images()} image(s)...")
+            if st.button("Refresh Scans"):
+                st.rerun()
+
+        batch_df, unknown = tally_scans(st.session_state.scan_batch, barcode_index)
+        st.metric("Scans Queued", len(st.session_state.scan_batch))
+
+        if not batch_df.empty:
+            st.subheader("Stock-In Batch")
+            st.dataframe(batch_df, width='stretch')
+            target_fridge = st.text_input("Put into Fridge No (blank = item's own fridge)", value="")
+            col1, col2 = st.columns(2)
+            if col1.button(f"Apply {len(st.session_state.scan_batch)} Scans"):
+                entries = [
+                    {"item_id": row.item_id, "quantity": row.quantity, "fridge_no": target_fridge or None}
+                    for row in batch_df.itertuples(index=False)
+                ]
+                try:
+                    result = add_or_update_items_batch(entries, st.session_state.username)
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.session_state.scan_batch = []
+                    st.success(f"Stock-in applied: {result['updated']} row(s) updated, {result['inserted']} row(s) added.")
+                    st.rerun()
+            if col2.button("Clear Scans"):
+                st.session_state.scan_batch = []
+                st.rerun()
+
+        if unknown:
+            with st.expander(f"⚠️ {len(unknown)} Unknown Barcode(s)", expanded=True):
+                items_df = view_items()
+                barcode = st.selectbox("Barcode", unknown)
+                item_label = search_picker("Link to Item", items_df, "items", "item_fridge", key="barcode_item")
+                units_per_scan = st.number_input("Units per Scan", min_value=1, value=1)
+                if st.button("Link Barcode"):
+                    save_item_barcode(barcode, int(item_label.split(" - ")[0]), units_per_scan)
+                    st.session_state.barcode_index = build_barcode_index(view_item_barcodes(), view_items())
+                    st.success(f"Barcode {barcode} linked.")
+                    st.rerun()
+
+    elif menu == "Delivery Receipt Import":
+        st.title("Delivery Receipt Import")
+        if decoder_error():
+            st.error(f"Barcode decoding is unavailable on this server: {decoder_error()}")
+            uploads = None
+        else:
+            uploads = st.file_uploader(
+                "Upload delivery manifests (PDF or photos)",
+                type=["pdf", "png", "jpg", "jpeg"],
+                accept_multiple_files=True
+            )
+        if uploads and st.button("Decode Barcodes"):
+            barcode_index = build_barcode_index(view_item_barcodes(), view_items())
+            with st.spinner("Decoding manifests..."):
+                st.session_state.delivery_result = ingest_delivery(
+                    [(f.name, f.getvalue()) for f in uploads], barcode_index
+                )
+
+        result = st.session_state.get("delivery_result")
+        if result:
+            stats = result["stats"]
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Images / Pages", stats["images"])
+            col2.metric("Barcodes Found", stats["barcodes"])
+            col3.metric("Images per Second", stats["images_per_sec"])
+
+            with st.expander("Per-page results", expanded=False):
+                st.dataframe(result["pages"], width='stretch')
+            if result["unknown"]:
+                st.warning(f"Unknown barcodes (link them on the Barcode Scan-In page): {result['unknown']}")
+
+            batch_df = result["batch"]
+            if batch_df.empty:
+                st.info("No known barcodes found.")
+            else:
+                st.subheader("Review Stock-In Batch")
+                review_df = batch_df.assign(include=True)
+                edited_df = st.data_editor(
+                    review_df,
+                    disabled=["item_id", "item_name", "category", "fridge_no", "scans"],
+                    width='stretch'
+                )
+                if st.button("Apply Stock-In"):
+                    entries = [
+                        {"item_id": row.item_id, "quantity": row.quantity}
+                        for row in edited_df[edited_df["include"]].itertuples(index=False)
+                        if pd.notna(row.quantity) and row.quantity > 0
+                    ]
+                    applied = add_or_update_items_batch(entries, st.session_state.username)
+                    del st.session_state["delivery_result"]
+                    st.success(f"Stock-in applied: {applied['updated']} row(s) updated, {applied['inserted']} row(s) added.")
+
     elif menu == "File Upload (Items)":
         st.title("File Upload (Items)")
         uploaded_file = st.file_uploader("Upload CSV or Excel file", type=["csv", "xlsx", "xls"])
@@ -394,22 +757,15 @@ elif st.session_state.logged_in:
                 df = pd.read_excel(uploaded_file)
             required_cols = ["item_name", "category", "quantity", "fridge_no"]
             if all(col in df.columns for col in required_cols):
-                for _, row in df.iterrows():
-                    add_or_update_item(None, row["item_name"].strip().upper(), row["category"].strip().upper(), row["quantity"], row["fridge_no"], st.session_state.username)
-                st.success("Items updated or inserted successfully!")
+                if st.button("Upload Items"):
+                    st.session_state.job_item_import = submit_item_import(df[required_cols], st.session_state.username)
             else:
                 st.error(f"Missing required columns: {required_cols}")
+        job_panel("job_item_import")
 
     elif menu == "Delete All Inventory":
         st.title("Delete All Inventory")
-        st.warning("This action will delete ALL inventory items permanently.")
-        confirm = st.text_input("Type 'DELETE' to confirm")
-        if st.button("Delete All Inventory"):
-            if confirm == "DELETE":
-                delete_all_inventory()
-                st.success("All inventory items have been deleted.")
-            else:
-                st.error("Confirmation text does not match. Inventory not deleted.")
+        purge_page("items", "inventory items")
 
     # ---------------- PRICING ----------------
     elif menu == "View Pricing Tiers":
@@ -427,6 +783,7 @@ elif st.session_state.logged_in:
         uploaded_file = st.file_uploader("Upload Pricing CSV or Excel file", type=["csv", "xlsx", "xls"])
         if uploaded_file:
             upload_tiered_pricing(uploaded_file)
+        job_panel("job_pricing_upload")
 
     elif menu == "Manage Pricing Tiers":
         manage_pricing_tiers()
@@ -446,12 +803,9 @@ elif st.session_state.logged_in:
             st.dataframe(customers_df[['id','name','phone','email','address']], width='stretch')
 
         with st.expander("➕ Add / Update Customers", expanded=False):
-            if not customers_df.empty:
-                customer_options = ["Add New"] + [f"{row['id']} - {row['name']}" for _, row in customers_df.iterrows()]
-            else:
-                customer_options = ["Add New"]
-
-            selected_customer = st.selectbox("Select Customer", customer_options)
+            selected_customer = search_picker(
+                "Select Customer", customers_df, "customers", "customer", key="edit_customer", placeholder="Add New"
+            )
             if selected_customer != "Add New":
                 selected_customer_id = int(selected_customer.split(" - ")[0])
                 selected_customer_name = selected_customer.split(" - ")[1]
@@ -489,8 +843,7 @@ elif st.session_state.logged_in:
             if customers_df.empty:
                 st.warning("No customers to delete.")
             else:
-                customers_df['label'] = customers_df.apply(lambda row: f"{row['id']} - {row['name']}", axis=1)
-                selected_label = st.selectbox("Select Customer to Delete", customers_df['label'])
+                selected_label = search_picker("Select Customer to Delete", customers_df, "customers", "customer", key="delete_customer")
                 customer_id = int(selected_label.split(" - ")[0])
                 if st.button("Delete Customer"):
                     delete_customer(customer_id)
@@ -504,10 +857,7 @@ elif st.session_state.logged_in:
         if customers_df.empty:
             st.warning("No customers found.")
         else:
-            customer_label = st.selectbox(
-                "Select Customer",
-                customers_df.apply(lambda row: f"{row['id']} - {row['name']}", axis=1)
-            )
+            customer_label = search_picker("Select Customer", customers_df, "customers", "customer", key="sales_customer")
             customer_id = int(customer_label.split(" - ")[0])
             sales_df = view_sales_by_customer(customer_id)
 
@@ -519,11 +869,14 @@ elif st.session_state.logged_in:
             if sales_df.empty:
                 st.warning("No sales records found for this customer.")
             else:
+                # What the price list said on the day of each sale, next to what was charged
+                sales_df = annotate_sales_with_prices(sales_df)
                 paged_sales, total_pages = paginate_dataframe(sales_df, page_size=20)
                 st.write(f"Showing {len(paged_sales)} rows (Page size: 20)")
                 styled_sales = paged_sales.style.format({
                     "total_sale": "{:,.2f}",
                     "selling_price": "{:,.2f}",
+                    "price_as_of": "{:,.2f}",
                     "cost": "{:,.2f}",
                     "profit": "{:,.2f}"
                 })
@@ -542,17 +895,15 @@ elif st.session_state.logged_in:
         elif customers_df.empty:
             st.warning("No customers available. Please add a customer first.")
         else:
-            items_df["display"] = items_df.apply(lambda row: f"{row['item_id']} - {row['item_name']}", axis=1)
-            item_display = st.selectbox("Select Item", ["Select item"] + items_df["display"].tolist())
+            item_display = search_picker("Select Item", items_df, "items", "item", key="sale_item", placeholder="Select item")
 
             selected_item_id, selected_item_name = None, None
             if item_display != "Select item":
                 selected_item_id = int(item_display.split(" - ")[0])
                 selected_item_name = item_display.split(" - ")[1]
 
-            customer_label = st.selectbox(
-                "Select Customer",
-                ["Select customer"] + customers_df.apply(lambda row: f"{row['id']} - {row['name']}", axis=1).tolist()
+            customer_label = search_picker(
+                "Select Customer", customers_df, "customers", "customer", key="sale_customer", placeholder="Select customer"
             )
             if customer_label == "Select customer":
                 st.warning("Please select a valid customer.")
@@ -589,8 +940,18 @@ elif st.session_state.logged_in:
                     st.success(f"Chosen Price per Unit: PHP {chosen_unit_price:,.2f}")
                     st.success(f"Calculated Total Sale: PHP {total_sale:,.2f}")
 
+                # One idempotency key per sale: a click retried after a failure (or
+                # interrupted by a rerun) reuses it, a recorded sale retires it
+                sale_inputs = (selected_item_id, quantity, customer_id, chosen_unit_price)
+                if st.session_state.get("sale_inputs") != sale_inputs or "sale_key" not in st.session_state:
+                    st.session_state.sale_inputs = sale_inputs
+                    st.session_state.sale_key = str(uuid.uuid4())
+
                 if st.button("Record Sale"):
-                    msg = record_sale(selected_item_id, quantity, st.session_state.username, customer_id, chosen_unit_price)
+                    msg = record_sale(selected_item_id, quantity, st.session_state.username, customer_id, chosen_unit_price,
+                                      idempotency_key=st.session_state.sale_key)
+                    if msg.startswith(("Sale recorded", "Sale already recorded")):
+                        st.session_state.sale_key = str(uuid.uuid4())
                     st.subheader("Sales Records")
                     sales_df = view_sales_by_customer(customer_id)
                     if not sales_df.empty:
@@ -611,16 +972,12 @@ elif st.session_state.logged_in:
                             
     elif menu == "Customer Statement of Account":
         st.title("Customer Statement of Account")
-        from fpdf.enums import XPos, YPos
         customers_df = view_customers()
 
         if customers_df.empty:
             st.warning("No customers found.")
         else:
-            customer_label = st.selectbox(
-                "Select Customer",
-                customers_df.apply(lambda row: f"{row['id']} - {row['name']}", axis=1)
-            )
+            customer_label = search_picker("Select Customer", customers_df, "customers", "customer", key="soa_customer")
             customer_id = int(customer_label.split(" - ")[0])
             customer_name = customer_label.split(" - ")[1]
 
@@ -658,65 +1015,14 @@ elif st.session_state.logged_in:
                 st.download_button("Download Sales CSV", data=csv_sales, file_name="sales_customer.csv", mime="text/csv")
 
                 if st.button("Generate SOA"):
-                    from fpdf import FPDF
-
-                    filename = f"SOA_{customer_id}_{start_date}_{end_date}.pdf"
-                    pdf = FPDF()
-                    pdf.add_page()
-
-                    # --- Logo ---
-                    pdf.image("Icon.jpeg", x=10, y=8, w=30)
-
-                    # --- Company Name & Address ---
-                    pdf.set_font("Helvetica", 'B', 14)
-                    pdf.cell(0, 10, "Diane's Wholesale Beverages", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-
-                    pdf.set_font("Helvetica", size=10)
-                    pdf.multi_cell(0, 5, "45 Data St. Brgy Don Manuel QC\nPhone: +63 917 8081409\nEmail: ong_diane@yahoo.com", align="C")
-                    pdf.ln(10)
-
-                    pdf.set_font("Helvetica", size=12)
-                    pdf.cell(200, 10, text=f"Statement of Account", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-                    pdf.cell(200, 10, text=f"Customer: {customer_name} (ID: {customer_id})", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-                    pdf.cell(200, 10, text=f"Period: {start_date} to {end_date}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-                    pdf.ln(10)
-
-                    # Table header
-                    pdf.set_font("Helvetica", 'B', 10)
-                    pdf.cell(20, 10, "Date", 1, align="C")
-                    pdf.cell(60, 10, "Item", 1, align="L")
-                    pdf.cell(20, 10, "Qty", 1, align="C")
-                    pdf.cell(40, 10, "Total Sale", 1, align="R")
-                    pdf.cell(40, 10, "Profit", 1, align="R")
-                    pdf.ln()
-
-                    # Table rows
-                    pdf.set_font("Helvetica", size=10)
-                    for _, row in sales_customer.iterrows():
-                        pdf.cell(20, 10, str(row.get("date", "")), 1, align="C")
-                        pdf.cell(60, 10, str(row.get("item_name", "")), 1, align="L")
-                        pdf.cell(20, 10, str(row.get("quantity", "")), 1, align="C")
-                        pdf.cell(40, 10, f"{row.get('total_sale', 0):,.2f}", 1, align="R")
-                        pdf.cell(40, 10, f"{row.get('profit', 0):,.2f}", 1, align="R")
-                        pdf.ln()
-
-                    # ✅ Save PDF properly
-                    pdf.output(filename)
-
-                    # ✅ Get bytes without deprecated dest
-                    pdf_bytes = bytes(pdf.output())
-                    st.download_button("Download SOA PDF", data=pdf_bytes, file_name=filename, mime="application/pdf")
+                    st.session_state.job_soa = submit_soa_report(
+                        customer_id, customer_name, start_date, end_date, st.session_state.username
+                    )
+                job_panel("job_soa")
                 
     elif menu == "Delete All Customers":
         st.title("Delete All Customers")
-        st.warning("This action will delete ALL customers permanently.")
-        confirm = st.text_input("Type 'DELETE' to confirm")
-        if st.button("Delete All Customers"):
-            if confirm == "DELETE":
-                delete_all_customers()
-                st.success("All customers have been deleted.")
-            else:
-                st.error("Confirmation text does not match. Customers not deleted.")
+        purge_page("customers", "customers")
 
 
     elif menu == "View Special Pricing":
@@ -725,8 +1031,9 @@ elif st.session_state.logged_in:
         # --- Select Customer ---
         customers_df = view_customers()
 
-        customers_df["display"] = customers_df.apply(lambda row: f"{row['id']} - {row['name']}", axis=1)
-        customer_display = st.selectbox("Select Customer", ["Select customer"] + customers_df["display"].tolist())
+        customer_display = search_picker(
+            "Select Customer", customers_df, "customers", "customer", key="special_customer", placeholder="Select customer"
+        )
 
         selected_customer_id, selected_customer_name = None, None
         if customer_display != "Select customer":
@@ -736,8 +1043,9 @@ elif st.session_state.logged_in:
         # --- Select Item ---
         items_df = get_items_for_pricing()
 
-        items_df["display"] = items_df.apply(lambda row: f"{row['item_id']} - {row['label']}", axis=1)
-        item_display = st.selectbox("Select Item", ["Select item"] + items_df["display"].tolist())
+        item_display = search_picker(
+            "Select Item", items_df, "pricing_items", "pricing_item", key="special_item", placeholder="Select item"
+        )
 
         selected_item_id, selected_item_name = None, None
         if item_display != "Select item":
@@ -779,15 +1087,30 @@ elif st.session_state.logged_in:
     # ---------------- REPORTS ----------------
     elif menu == "View Audit Log":
         st.title("Audit Log")
-        data = view_audit_log()
+        today = date.today()
+        start_date = st.date_input("Start Date", value=today.replace(day=1))
+        end_date = st.date_input("End Date", value=today)
+        # Ranges older than the archive boundary are read from the monthly archive files
+        data = view_audit_log(start_date.isoformat(), f"{end_date.isoformat()}T23:59:59.999999")
         if data.empty:
             st.warning("No audit log entries found.")
         else:
             paged_df, total_pages = paginate_dataframe(data, page_size=100)
             st.write(f"Showing {len(paged_df)} rows (Page size: 100)")
             st.dataframe(paged_df)
-            csv_audit = data.to_csv(index=False)    
-            st.download_button("Download Audit Log CSV", data=csv_audit, file_name="audit_log.csv", mime="text/csv")
+            if st.button("Export Audit Log CSV"):
+                start_iso, end_iso = start_date.isoformat(), f"{end_date.isoformat()}T23:59:59.999999"
+                st.session_state.job_audit_export = submit_csv_export(
+                    f"Audit log {start_date} to {end_date}", lambda: view_audit_log(start_iso, end_iso),
+                    "audit_log.csv", st.session_state.username,
+                )
+            job_panel("job_audit_export")
+
+        with st.expander("🗄️ Archive Old Entries", expanded=False):
+            older_than_days = st.number_input("Archive entries older than (days)", min_value=30, value=AUDIT_HOT_DAYS)
+            if st.button("Archive Now"):
+                archived = archive_old_audit_entries(older_than_days)
+                st.success(f"Archived {archived} audit entries.")
 
     elif menu == "Profit/Loss Report":
         st.title("Profit/Loss Report")
@@ -797,22 +1120,151 @@ elif st.session_state.logged_in:
         else:
             profit_loss_df = sales_df.groupby('date', as_index=False).agg({'profit': 'sum'})
             st.dataframe(profit_loss_df)
-            fig = px.line(profit_loss_df, x='date', y='profit', title="Profit/Loss Over Time")
+            # The table lists every day; the chart gets a downsampled series
+            fig = px.line(profit_trend_chart("Day"), x='date', y='profit', title="Profit/Loss Over Time")
             st.plotly_chart(fig)
             csv_profit_loss = profit_loss_df.to_csv(index=False)    
             st.download_button("Download Profit/Loss CSV", data=csv_profit_loss, file_name="profit_loss_report.csv", mime="text/csv")
 
+    elif menu == "Price Change Impact Report":
+        st.title("Price Change Impact Report")
+        st.caption("Re-prices past sales against the current and the proposed pricing tiers.")
+
+        current_tiers = view_pricing()
+        if current_tiers.empty:
+            current_tiers = pd.DataFrame(columns=TIER_COLUMNS)
+        current_tiers = normalize_tiers(current_tiers)
+
+        source = st.radio("Proposed tiers", ["Edit current tiers", "Upload file"], horizontal=True)
+        if source == "Edit current tiers":
+            edited = st.data_editor(current_tiers, num_rows="dynamic", width='stretch', key="impact_tiers")
+            new_tiers = normalize_tiers(edited)
+            removed = current_tiers.merge(new_tiers[TIER_KEY], on=TIER_KEY, how="left", indicator=True)
+            if (removed["_merge"] == "left_only").any():
+                st.caption("Deleted tiers are simulated here but not removed by Apply; use Manage Pricing Tiers for that.")
+        else:
+            uploaded_file = st.file_uploader("Upload Pricing CSV or Excel file", type=["csv", "xlsx", "xls"], key="impact_upload")
+            if uploaded_file is None:
+                st.info("Upload a file in the same format as File Upload (Pricing).")
+                new_tiers = current_tiers
+            else:
+                new_tiers = apply_tier_changes(current_tiers, read_pricing_file(uploaded_file))
+
+        changes = changed_tiers(current_tiers, new_tiers)
+        st.subheader(f"Changed Tiers ({len(changes)})")
+        st.dataframe(changes, hide_index=True, width='stretch')
+
+        col1, col2 = st.columns(2)
+        start_date = col1.date_input("From", value=date.today().replace(year=date.today().year - 1), key="impact_start")
+        end_date = col2.date_input("To", value=date.today(), key="impact_end")
+
+        sales_df = view_sales()
+        if not sales_df.empty:
+            sales_df = sales_df[(sales_df["date"] >= start_date.isoformat()) & (sales_df["date"] <= end_date.isoformat())]
+        if sales_df.empty:
+            st.warning("No sales in the selected period.")
+        else:
+            lines = simulate(sales_df, current_tiers, new_tiers, get_price_list())
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Revenue at Current Tiers", f"{lines['old_revenue'].sum():,.2f}")
+            col2.metric("Revenue at Proposed Tiers", f"{lines['new_revenue'].sum():,.2f}",
+                        delta=f"{lines['revenue_delta'].sum():,.2f}")
+            col3.metric("Margin Change", f"{lines['margin_delta'].sum():,.2f}")
+
+            by_item = summarize(lines, "item_id")
+            items_df = view_items()
+            if not items_df.empty:
+                names = items_df.drop_duplicates("item_id").set_index("item_id")["item_name"]
+                by_item.insert(1, "item_name", by_item["item_id"].map(names))
+            st.subheader("Impact by Item")
+            st.dataframe(by_item, hide_index=True, width='stretch')
+            top = by_item[by_item["revenue_delta"] != 0].head(15)
+            if not top.empty:
+                fig = px.bar(top, x=top.get("item_name", top["item_id"]).astype(str), y="revenue_delta",
+                             labels={"x": "Item", "revenue_delta": "Revenue Change"}, title="Largest Revenue Changes")
+                st.plotly_chart(fig)
+
+            by_customer = summarize(lines, "customer_id")
+            customers_df = view_customers()
+            if not customers_df.empty:
+                names = customers_df.set_index("id")["name"]
+                by_customer.insert(1, "customer_name", by_customer["customer_id"].map(names))
+            st.subheader("Impact by Customer")
+            st.dataframe(by_customer, hide_index=True, width='stretch')
+
+            st.download_button("Download Line Detail CSV", data=lines.to_csv(index=False),
+                               file_name="price_change_impact.csv", mime="text/csv")
+
+        if not changes.empty and st.button("Apply Proposed Tier Changes"):
+            upload_df = changes.rename(columns={"new_price": "price_per_unit"})[TIER_COLUMNS]
+            # Written like a pricing file upload, as a job; tier changes are
+            # versioned in price_versions as they are written
+            st.session_state.job_price_impact = submit_pricing_upload(upload_df, st.session_state.username)
+        job_panel("job_price_impact")
+
+    elif menu == "Stock As Of":
+        st.title("Stock As Of")
+        st.caption("Stock per item and fridge at a past time, rebuilt from the nearest inventory checkpoint and the audit log.")
+        col1, col2, col3 = st.columns(3)
+        as_of_date = col1.date_input("Date", value=date.today())
+        as_of_time = col2.time_input("Time", value=datetime.max.time().replace(microsecond=0))
+        fridge = col3.text_input("Fridge No. (blank for all)")
+        try:
+            stock_df = inventory_as_of(datetime.combine(as_of_date, as_of_time), fridge.strip() or None)
+        except ValueError as e:
+            stock_df = None
+            st.warning(str(e))
+        if stock_df is not None:
+            if stock_df.empty:
+                st.info("No stock at that time.")
+            else:
+                st.metric("Total Units", f"{stock_df['quantity'].sum():,.0f}")
+                by_fridge = stock_df.groupby("fridge_no", as_index=False)["quantity"].sum()
+                st.dataframe(by_fridge, hide_index=True)
+                st.dataframe(stock_df, hide_index=True, width='stretch')
+                st.download_button(
+                    "Download Stock CSV", data=stock_df.to_csv(index=False),
+                    file_name=f"stock_as_of_{as_of_date.isoformat()}.csv", mime="text/csv"
+                )
+
+        with st.expander("Inventory Checkpoints", expanded=False):
+            st.caption("Checkpoints are also taken automatically once a day.")
+            if st.button("Take Checkpoint Now"):
+                checkpoint_id = take_inventory_checkpoint()
+                if checkpoint_id is None:
+                    st.warning("Local changes are still syncing; try again once they are sent.")
+                else:
+                    st.success(f"Checkpoint {checkpoint_id} taken.")
+            st.dataframe(view_inventory_checkpoints(), hide_index=True)
+
+    elif menu == "Demand Forecast":
+        st.title("Demand Forecast")
+        st.caption("Daily demand per item forecast from recent sales (weekly pattern and trend), against current stock.")
+        horizon = st.slider("Forecast horizon (days)", min_value=7, max_value=90, value=28, step=7)
+        forecast_df = demand_forecast(horizon)
+        if forecast_df.empty:
+            st.warning("No sales or stock to forecast from.")
+        else:
+            running_out = forecast_df["days_left"].notna()
+            col1, col2 = st.columns(2)
+            col1.metric("Items forecast", len(forecast_df))
+            col2.metric(f"Running out within {horizon} days", int(running_out.sum()))
+            st.dataframe(forecast_df, hide_index=True, width='stretch')
+            st.download_button("Download Forecast CSV", data=forecast_df.to_csv(index=False),
+                               file_name="demand_forecast.csv", mime="text/csv")
+
+            forecast_item = st.selectbox("Item", forecast_df["item_name"], key="forecast_item")
+            series_df = item_demand_series(forecast_item, horizon)
+            fig = px.line(series_df, x="date", y="units", color="series", title=f"Daily demand: {forecast_item}")
+            st.plotly_chart(fig)
+
     elif menu == "Generate Purchase Order":
         st.title("Generate Purchase Order (PO)")
-        from fpdf.enums import XPos, YPos
         customers_df = view_customers()
         if customers_df.empty:
             st.warning("No customers found.")
         else:
-            customer_label = st.selectbox(
-                "Select Customer",
-                customers_df.apply(lambda row: f"{row['id']} - {row['name']}", axis=1)
-            )
+            customer_label = search_picker("Select Customer", customers_df, "customers", "customer", key="po_customer")
             customer_id = int(customer_label.split(" - ")[0])
             sales_df = view_sales_by_customer(customer_id)
             if sales_df.empty:
@@ -829,97 +1281,18 @@ elif st.session_state.logged_in:
                 pickup_date_sql = pickup_date.strftime("%Y-%m-%d")
 
                 if st.button("Generate PO"):
-                    from fpdf import FPDF
-
-                    # --- Generate PO Number ---
-                    seq = get_po_sequence(order_date_sql)
-                    po_number = f"PO-{order_date_sql.replace('-', '')}-{seq:03d}"
-
-                    # --- Vendor Info ---
-                    vendor = {
-                        "name": "Diane's Wholesale Beverages",
-                        "address": "45 Data St. Brgy Don Manuel QC",
-                        "phone": "+63 917 808 1409",
-                        "email": "ong_diane@yahoo.com"
-                    }
-
-                    # --- Buyer Info ---
-                    customer = get_customer(customer_id)
-                    buyer = {
-                        "name": customer.get("name", ""),
-                        "address": customer.get("address", ""),
-                        "phone": customer.get("phone", ""),
-                        "email": customer.get("email", "")
-                    }
-                    safe_name = buyer["name"].replace(" ", "_").replace("/", "_")
-                    filename = f"PO_{order_date_sql.replace('-', '')}_{safe_name}.pdf"
-
-                    # --- Build PDF ---
-                    pdf = FPDF()
-                    pdf.add_page()
-                    pdf.image("Icon.jpeg", x=10, y=8, w=30)
-
-                    pdf.set_font("Helvetica", 'B', 14)
-                    pdf.cell(0, 10, vendor["name"], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-                    pdf.set_font("Helvetica", size=10)
-                    pdf.multi_cell(0, 5, f"{vendor['address']}\nPhone: {vendor['phone']}\nEmail: {vendor['email']}", align="C")
-                    pdf.ln(10)
-
-                    pdf.set_font("Helvetica", 'B', 12)
-                    pdf.cell(0, 10, "Purchase Order", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
-                    pdf.set_font("Helvetica", size=10)
-                    pdf.cell(0, 10, f"PO Number: {po_number}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                    pdf.cell(0, 10, f"Order Date: {order_date_sql}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                    #pdf.cell(0, 10, f"Pickup Date: {pickup_date_sql}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                    pdf.ln(10)
-
-                    # Table header
-                    pdf.set_font("Helvetica", 'B', 10)
-                    pdf.cell(20, 10, "No.", 1, align="C")
-                    pdf.cell(80, 10, "Description", 1, align="L")
-                    pdf.cell(30, 10, "Qty", 1, align="C")
-                    pdf.cell(30, 10, "Unit Price", 1, align="R")
-                    pdf.cell(30, 10, "Total", 1, align="R")
-                    pdf.ln()
-
-                    # Table rows
-                    pdf.set_font("Helvetica", size=10)
-                    subtotal = 0
-                    for idx, row in sales_df[sales_df['date'] == order_date].iterrows():
-                        total = row["quantity"] * row["selling_price"]
-                        subtotal += total
-                        pdf.cell(20, 10, str(idx+1), 1, align="C")
-                        pdf.cell(80, 10, str(row.get("item_name", "")), 1, align="L")
-                        pdf.cell(30, 10, str(row.get("quantity", "")), 1, align="C")
-                        pdf.cell(30, 10, f"{row.get('selling_price', 0):,.2f}", 1, align="R")
-                        pdf.cell(30, 10, f"{total:,.2f}", 1, align="R")
-                        pdf.ln()
-
-                    pdf.ln(5)
-                    pdf.cell(0, 10, f"Subtotal: PHP {subtotal:,.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
-                    pdf.cell(0, 10, "GST: PHP 0.00 (No GST)", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
-                    pdf.cell(0, 10, f"Total Amount: PHP {subtotal:,.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
-                    pdf.ln(10)
-
-                    pdf.cell(0, 10, f"Pickup Date: {pickup_date_sql}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-                    pdf.ln(20)
-                    pdf.cell(0, 10, "Authorized By: ____________________", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
-
-                    #pdf_bytes = bytes(pdf.output(dest="S"))
-
-                    #pdf_bytes = pdf.output(dest="bytes")
-                    #pdf_bytes = bytes(pdf_bytes)   # Convert bytearray → bytes
-                    #st.download_button(
-                    #    "Download PO PDF",
-                    #    data=pdf_bytes,
-                    #    file_name=filename,
-                    #    mime="application/pdf"
-                    #)
-
-                    pdf_bytes = bytes(pdf.output())  # no dest argument
-                    st.download_button(
-                        "Download PO PDF",
-                        data=pdf_bytes,
-                        file_name=filename,
-                        mime="application/pdf"
-                    )
\ No newline at end of file
+                    st.session_state.job_po = submit_po_report(
+                        customer_id, order_date, pickup_date_sql, st.session_state.username
+                    )
+                job_panel("job_po")
+
+# ---------------- END OF RUN ----------------
+rerun_profiler.lap("page")
+# Hand any audit entries from this run to the background writer
+flush_audit_log()
+if st.session_state.get("logged_in"):
+    maybe_take_inventory_checkpoint()
+if st.session_state.get("logged_in") and st.session_state.menu in PAGE_TABLES:
+    st.session_state.page_versions = table_versions(PAGE_TABLES[st.session_state.menu])
+rerun_profiler.lap("end of run")
+rerun_profiler.end(st.session_state.get("menu", "Landing"))
@@ -0,0 +1,181 @@
+import io
+import json
+import os
+import time
+import weakref
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+# Old audit rows move out of Supabase into one compressed Parquet file per month
+# in shared storage (see StorageArchive):
+#   audit_log_2024-01.parquet
+# plus archive_state.json, which records the boundary below which rows are read
+# from the archive instead of the live table.
+#
+# The archive must be visible to every host and survive redeploys, so it lives
+# in a Supabase Storage bucket (migrations/supabase/014_audit_archive_bucket.sql).
+# DIANES_AUDIT_ARCHIVE_DIR keeps it in a local directory instead, for a single
+# host with a persistent disk.
+ARCHIVE_BUCKET = os.environ.get("DIANES_AUDIT_ARCHIVE_BUCKET", "audit-archive")
+ARCHIVE_DIR = os.environ.get("DIANES_AUDIT_ARCHIVE_DIR", "")
+# Rows younger than this stay in the live audit_log table
+HOT_DAYS = int(os.environ.get("DIANES_AUDIT_HOT_DAYS", "90"))
+# Every audit read needs the boundary; each process keeps the one it read for
+# this many seconds instead of downloading archive_state.json every time.
+# Other hosts therefore see a move up to this late, and rows below a new
+# boundary may only leave the live table once it has stood this long (see
+# settled_before()).
+BOUNDARY_TTL = float(os.environ.get("DIANES_AUDIT_BOUNDARY_TTL", "300"))
+
+_STATE_FILE = "archive_state.json"
+_boundaries = weakref.WeakKeyDictionary()  # store -> (boundary, time.monotonic() when read)
+
+
+# ---------------- STORES ----------------
+class StorageArchive:
+    """Archive files in a Supabase Storage bucket (`storage` is client.storage)."""
+
+    def __init__(self, storage, bucket: str = ARCHIVE_BUCKET):
+        self._bucket = storage.from_(bucket)
+
+    def read(self, name: str):
+        """The file's bytes, or None if it does not exist."""
+        from storage3.utils import StorageException
+        try:
+            return self._bucket.download(name)
+        except StorageException as e:
+            if "not found" in str(e).lower() or "404" in str(e):
+                return None
+            raise
+
+    def write(self, name: str, data: bytes):
+        self._bucket.upload(name, data, {"content-type": "application/octet-stream", "upsert": "true"})
+
+    def names(self) -> list:
+        return [f["name"] for f in self._bucket.list("", {"limit": 10000})]
+
+
+class LocalArchive:
+    """Archive files in a local directory (single host only)."""
+
+    def __init__(self, directory: str):
+        self._directory = directory
+
+    def read(self, name: str):
+        path = os.path.join(self._directory, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write(self, name: str, data: bytes):
+        os.makedirs(self._directory, exist_ok=True)
+        path = os.path.join(self._directory, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def names(self) -> list:
+        return sorted(os.listdir(self._directory)) if os.path.isdir(self._directory) else []
+
+
+# ---------------- BOUNDARY ----------------
+def archive_cutoff(older_than_days: int = None, today: date = None) -> str:
+    """
+    First day of the month that contains (today - older_than_days).
+    Only whole months are archived, so each monthly file is written once.
+    """
+    today = today or date.today()
+    boundary = today - timedelta(days=HOT_DAYS if older_than_days is None else older_than_days)
+    return boundary.replace(day=1).isoformat()
+
+def _read_state(store) -> dict:
+    data = store.read(_STATE_FILE)
+    return json.loads(data) if data else {}
+
+def archived_before(store) -> str:
+    """
+    Timestamp before which rows are read from the archive instead of Supabase
+    ("" if nothing archived), as read at most BOUNDARY_TTL seconds ago.
+    """
+    cached = _boundaries.get(store)
+    if cached is not None and time.monotonic() - cached[1] < BOUNDARY_TTL:
+        return cached[0]
+    boundary = _read_state(store).get("archived_before", "")
+    _boundaries[store] = (boundary, time.monotonic())
+    return boundary
+
+def mark_archived_before(store, cutoff: str):
+    """Move the boundary. Only call once every row before `cutoff` is in the archive."""
+    state = _read_state(store)
+    boundary = max(cutoff, state.get("archived_before", ""))
+    moves = state.get("moves", [])
+    if boundary != state.get("archived_before"):
+        moves = (moves + [[boundary, time.time()]])[-10:]
+    state = {"archived_before": boundary, "updated": datetime.now().isoformat(), "moves": moves}
+    store.write(_STATE_FILE, json.dumps(state).encode("utf-8"))
+    _boundaries[store] = (boundary, time.monotonic())
+
+def settled_before(store, now: float = None) -> str:
+    """
+    The boundary as it stood BOUNDARY_TTL seconds ago. Every process reads rows
+    below it from the archive by now, so they may be deleted from Supabase.
+    """
+    state = _read_state(store)
+    cutoff = (time.time() if now is None else now) - BOUNDARY_TTL
+    moves = state.get("moves", [])
+    if all(moved_at <= cutoff for _, moved_at in moves):
+        return state.get("archived_before", "")
+    # Every recorded move is recent, and what stood before them is not known
+    return max((boundary for boundary, moved_at in moves if moved_at <= cutoff), default="")
+
+
+# ---------------- MONTH FILES ----------------
+def _month_name(month: str) -> str:
+    return f"audit_log_{month}.parquet"
+
+def write_month_partitions(store, df: pd.DataFrame) -> list:
+    """
+    Add audit rows to their monthly Parquet files (merging with anything
+    already archived for that month, so writing the same rows twice is
+    harmless). Returns the months written.
+    """
+    if df.empty:
+        return []
+    df = df.assign(timestamp=df["timestamp"].astype(str))
+    months = []
+    for month, part in df.groupby(df["timestamp"].str[:7]):
+        existing = store.read(_month_name(month))
+        if existing is not None:
+            part = pd.concat([pd.read_parquet(io.BytesIO(existing)), part], ignore_index=True)
+        part = part.drop_duplicates(subset="id", keep="last").sort_values("timestamp")
+        out = io.BytesIO()
+        part.to_parquet(out, index=False, compression="zstd")
+        store.write(_month_name(month), out.getvalue())
+        months.append(month)
+    return months
+
+def read_archive(store, start: str = None, end: str = None) -> pd.DataFrame:
+    """Read archived rows with start <= timestamp <= end, touching only the months in range."""
+    frames = []
+    for name in sorted(store.names()):
+        if not (name.startswith("audit_log_") and name.endswith(".parquet")):
+            continue
+        month = name[len("audit_log_"):-len(".parquet")]
+        if start and month < start[:7]:
+            continue
+        if end and month > end[:7]:
+            continue
+        data = store.read(name)
+        if data is not None:
+            frames.append(pd.read_parquet(io.BytesIO(data)))
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    if start:
+        df = df[df["timestamp"] >= start]
+    if end:
+        df = df[df["timestamp"] <= end]
+    return df
@@ -0,0 +1,201 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from file_locks import try_lock
+
+
+class AuditWriter:
+    """
+    Write-behind buffer for audit_log rows.
+
+    log() appends the entry to a local spool file and returns; a background
+    thread fsyncs the spool every `sync_interval` seconds (one disk sync for
+    every entry logged in that window) and sends buffered entries to `sink`
+    in batches when the buffer reaches `max_batch`, every `flush_interval`
+    seconds, or when request_flush() is called at the end of a page run.
+
+    Each writer spools to its own file in `spool_dir` and holds an exclusive
+    lock on a matching .lock file while it lives (see file_locks.py). Spools
+    whose lock can be taken belong to a writer that is gone and are picked up
+    by the next writer that starts. Every entry carries a client_id so a
+    batch re-sent after a crash is not stored twice.
+
+    Nothing is opened and no thread runs until the writer is first used, so
+    creating one at import time is free.
+    """
+
+    def __init__(self, sink, spool_dir, max_batch=50, flush_interval=2.0, sync_interval=0.2):
+        self._sink = sink
+        self._spool_dir = spool_dir
+        name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._spool_path = os.path.join(spool_dir, f"{name}.jsonl")
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._buffer = []
+        self._unsynced = False
+        self._name = name
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    # ---------------- PUBLIC ----------------
+    def log(self, entry: dict):
+        self.log_many([entry])
+
+    def log_many(self, entries):
+        now = datetime.now().isoformat()
+        rows = [
+            {"client_id": str(uuid.uuid4()), "timestamp": now, **entry}
+            for entry in entries
+        ]
+        self._start()
+        with self._lock:
+            self._append_spool(rows)
+            self._buffer.extend(rows)
+            full = len(self._buffer) >= self._max_batch
+        if full:
+            self._wake.set()
+
+    def request_flush(self):
+        """Ask the background thread to flush now without waiting for it."""
+        self._start()
+        self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Send everything buffered so far. Raises if the sink fails."""
+        self._start()
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._buffer[:self._max_batch]
+                if not batch:
+                    return
+                self._sink(batch)
+                with self._lock:
+                    del self._buffer[:len(batch)]
+                    self._rewrite_spool()
+
+    # ---------------- INTERNAL ----------------
+    def _start(self):
+        """On first use: take the lock, open the spool, adopt orphaned spools, start the thread."""
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            os.makedirs(self._spool_dir, exist_ok=True)
+            self._owner_lock = open(os.path.join(self._spool_dir, f"{self._name}.lock"), "w")
+            if not try_lock(self._owner_lock):
+                raise RuntimeError(f"Audit spool {self._name} is locked by another writer")
+            self._spool = open(self._spool_path, "a", encoding="utf-8")
+            self._recover_orphaned_spools()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self._flush_at_exit)
+            self._started = True
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            # Still spooled; the next process to start sends it
+            pass
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            woken = self._wake.wait(timeout=self._sync_interval)
+            self._wake.clear()
+            self._sync()
+            if not woken and time.monotonic() - last_flush < self._flush_interval:
+                continue
+            last_flush = time.monotonic()
+            try:
+                self.flush()
+            except Exception:
+                # Sink unreachable; entries stay spooled and are retried next tick
+                pass
+
+    def _append_spool(self, rows):
+        # Written through to the OS (so a crash of this process loses nothing);
+        # the disk sync is batched in _sync()
+        for row in rows:
+            self._spool.write(json.dumps(row, default=str) + "\n")
+        self._spool.flush()
+        self._unsynced = True
+
+    def _sync(self):
+        with self._lock:
+            if self._unsynced:
+                os.fsync(self._spool.fileno())
+                self._unsynced = False
+
+    def _rewrite_spool(self):
+        tmp_path = self._spool_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in self._buffer:
+                f.write(json.dumps(row, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._spool_path)
+        self._spool.close()
+        self._spool = open(self._spool_path, "a", encoding="utf-8")
+        self._unsynced = False
+
+    def _recover_orphaned_spools(self):
+        recovered = []
+        for name in sorted(os.listdir(self._spool_dir)):
+            if not name.endswith(".jsonl"):
+                continue
+            path = os.path.join(self._spool_dir, name)
+            if path == self._spool_path:
+                continue
+            owner = _take_lock(path[:-len(".jsonl")] + ".lock")
+            if owner is False:
+                continue  # its writer is still running
+            with open(path, encoding="utf-8") as f:
+                # A torn last line from a crash mid-write is dropped
+                for line in f:
+                    try:
+                        self._buffer.append(json.loads(line))
+                    except ValueError:
+                        pass
+            recovered.append((path, owner))
+        if self._buffer:
+            self._rewrite_spool()
+            self._wake.set()
+        # Only drop the old files once their entries are safely in our own spool
+        for path, owner in recovered:
+            os.remove(path)
+            if owner is not None:
+                # Closed first: Windows cannot remove a file that is still open
+                owner.close()
+                os.remove(owner.name)
+
+
+def _take_lock(path):
+    """
+    The open, exclusively locked lock file at `path`; None if there is none
+    (spools from before lock files, or whose lock file is already gone);
+    False if another live writer holds it.
+    """
+    try:
+        f = open(path, "r+")
+    except FileNotFoundError:
+        return None
+    if not try_lock(f):
+        f.close()
+        return False
+    return f
@@ -0,0 +1,163 @@
+import functools
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# ---------------- DECODING ----------------
+# cv2 and pyzbar are imported on first use. pyzbar needs the native zbar
+# library (libzbar0, see packages.txt); a host without it loses image
+# decoding, not the whole app.
+@functools.cache
+def decoder_error():
+    """Why images cannot be decoded on this host, or None if they can."""
+    try:
+        import cv2  # noqa: F401
+        from pyzbar import pyzbar  # noqa: F401
+    except ImportError as e:
+        return str(e)
+    return None
+
+def decode_image(image) -> list:
+    """Return the barcode strings found in a grayscale or BGR image array."""
+    import cv2
+    from pyzbar import pyzbar
+
+    if image is None:
+        return []
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    results = pyzbar.decode(image)
+    if not results:
+        # Phone snapshots are often dim or uneven; retry on a binarized copy
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        results = pyzbar.decode(binary)
+    return [r.data.decode("utf-8", errors="replace") for r in results]
+
+def decode_image_bytes(data: bytes) -> list:
+    """Decode an encoded image (JPEG/PNG from camera_input or an upload)."""
+    import cv2
+
+    image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    return decode_image(image)
+
+
+# ---------------- BARCODE INDEX ----------------
+def build_barcode_index(barcodes_df: pd.DataFrame, items_df: pd.DataFrame) -> dict:
+    """
+    Build the in-memory barcode → item lookup from the item_barcodes and items tables.
+    Barcodes pointing at deleted items are left out.
+    """
+    if barcodes_df.empty or items_df.empty:
+        return {}
+    merged = barcodes_df.merge(
+        items_df[["item_id", "item_name", "category", "fridge_no"]], on="item_id", how="inner"
+    )
+    return {
+        row.barcode: {
+            "item_id": int(row.item_id),
+            "item_name": row.item_name,
+            "category": row.category,
+            "fridge_no": row.fridge_no,
+            "units_per_scan": int(row.units_per_scan),
+        }
+        for row in merged.itertuples(index=False)
+    }
+
+
+def tally_scans(scans: list, index: dict):
+    """
+    Group queued scans into one stock-in line per item.
+    Returns (batch DataFrame, list of unknown barcodes).
+    """
+    lines = {}
+    unknown = []
+    for scan in scans:
+        item = index.get(scan["barcode"])
+        if item is None:
+            unknown.append(scan["barcode"])
+            continue
+        line = lines.setdefault(item["item_id"], {
+            "item_id": item["item_id"],
+            "item_name": item["item_name"],
+            "category": item["category"],
+            "fridge_no": item["fridge_no"],
+            "scans": 0,
+            "quantity": 0,
+        })
+        line["scans"] += 1
+        line["quantity"] += item["units_per_scan"]
+
+    columns = ["item_id", "item_name", "category", "fridge_no", "scans", "quantity"]
+    return pd.DataFrame(list(lines.values()), columns=columns), sorted(set(unknown))
+
+
+# ---------------- SCAN QUEUE ----------------
+# One decoder thread serves every session's ScanQueue, started on first use,
+# so sessions that come and go do not leave threads behind.
+_images = queue.Queue()  # (ScanQueue, image bytes, source)
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_decode_forever, name="barcode-decoder", daemon=True)
+            _worker.start()
+
+def _decode_forever():
+    while True:
+        scan_queue, data, source = _images.get()
+        try:
+            codes = decode_image_bytes(data)
+        except Exception:
+            codes = []
+        for code in codes:
+            scan_queue.submit_code(code, source)
+        scan_queue._image_done()
+
+
+class ScanQueue:
+    """
+    Queues a session's images for the shared decoder thread so the page never
+    waits on pyzbar. Barcodes come out of drain() in the order they were decoded.
+    Codes typed by a keyboard-wedge scanner skip decoding and are queued directly.
+    """
+
+    def __init__(self):
+        self._scans = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit_image(self, data: bytes, source: str = "upload"):
+        with self._lock:
+            self._pending += 1
+        _start_worker()
+        _images.put((self, data, source))
+
+    def submit_code(self, barcode: str, source: str = "scanner"):
+        barcode = barcode.strip()
+        if barcode:
+            self._scans.put({"barcode": barcode, "source": source, "scanned_at": time.time()})
+
+    def pending_images(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def drain(self) -> list:
+        scans = []
+        while True:
+            try:
+                scans.append(self._scans.get_nowait())
+            except queue.Empty:
+                return scans
+
+    def _image_done(self):
+        with self._lock:
+            self._pending -= 1
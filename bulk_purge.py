@@ -0,0 +1,71 @@
+import io
+import os
+
+import pandas as pd
+
+from audit_archive import LocalArchive, StorageArchive
+
+# Rows removed by an archiving purge are kept as Parquet files, one per chunk:
+#   customers_job12_000000000001.parquet
+# in a Supabase Storage bucket (migrations/supabase/021_purge_archive_bucket.sql),
+# so every host sees them and they survive redeploys; a store is a
+# StorageArchive or LocalArchive from audit_archive.py.
+# DIANES_PURGE_ARCHIVE_DIR keeps them in a local directory instead.
+ARCHIVE_BUCKET = os.environ.get("DIANES_PURGE_ARCHIVE_BUCKET", "purge-archive")
+ARCHIVE_DIR = os.environ.get("DIANES_PURGE_ARCHIVE_DIR", "")
+CHUNK_SIZE = int(os.environ.get("DIANES_PURGE_CHUNK_SIZE", "500"))
+
+
+def delete_chunks(client, table: str, pk: str, after=None, chunk_size: int = CHUNK_SIZE,
+                  columns: str = None, before_delete=None):
+    """
+    Delete every row of `table` with pk > `after` in pk order, one id range
+    of at most `chunk_size` rows per request, so no single request has to
+    touch the whole table. Yields (first, last, deleted) per chunk. Stop
+    iterating to pause; call again with after=last to resume.
+
+    before_delete(rows, first, last), if given, sees each chunk's rows (only
+    the pk unless `columns` is given) before they are deleted.
+    """
+    while True:
+        query = client.table(table).select(columns or pk)
+        if after is not None:
+            query = query.gt(pk, after)
+        rows = query.order(pk).limit(chunk_size).execute().data
+        if not rows:
+            return
+        first, last = rows[0][pk], rows[-1][pk]
+        if before_delete is not None:
+            before_delete(rows, first, last)
+        deleted = client.table(table).delete().gte(pk, first).lte(pk, last).execute().data
+        yield first, last, len(deleted)
+        after = last
+
+def archive_store(storage):
+    """The configured store for purge archives (`storage` is client.storage)."""
+    return LocalArchive(ARCHIVE_DIR) if ARCHIVE_DIR else StorageArchive(storage, ARCHIVE_BUCKET)
+
+def _chunk_name(table: str, job_id, first) -> str:
+    return f"{table}_job{job_id}_{int(first):012d}.parquet"
+
+def archive_chunk(store, table: str, job_id, first, rows) -> str:
+    """Write one chunk of rows about to be purged. Re-running a chunk overwrites its file."""
+    name = _chunk_name(table, job_id, first)
+    out = io.BytesIO()
+    pd.DataFrame(rows).to_parquet(out, index=False, compression="zstd")
+    store.write(name, out.getvalue())
+    return name
+
+def read_archive(store, table: str, job_id) -> pd.DataFrame:
+    """All rows archived by one purge job."""
+    prefix = f"{table}_job{job_id}_"
+    frames = []
+    for name in sorted(store.names()):
+        if not (name.startswith(prefix) and name.endswith(".parquet")):
+            continue
+        data = store.read(name)
+        if data is not None:
+            frames.append(pd.read_parquet(io.BytesIO(data)))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
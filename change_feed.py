@@ -0,0 +1,322 @@
+import asyncio
+import sqlite3
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+import snapshots
+
+# op is INSERT, UPDATE or DELETE. row is the new row when the feed carries it,
+# or None when only the key is known (the row is then read back by key).
+ChangeEvent = namedtuple("ChangeEvent", ["table", "op", "pk", "row"])
+
+
+# ---------------- TABLE CACHE ----------------
+class TableCache:
+    """
+    Process-wide copies of whole tables, shared by every session and kept
+    current row by row from change events instead of by reloading the table.
+
+    load_table(table) -> list of rows, used once per table.
+    load_rows(table, pks) -> list of rows, for events that only carry a key.
+    primary_key(table) -> name of the key column.
+    on_load(table, rows) is called after a table is first loaded, so a feed
+    can start tracking it from that point.
+    """
+
+    def __init__(self, load_table, load_rows, primary_key, on_load=None):
+        self._load_table = load_table
+        self._load_rows = load_rows
+        self._primary_key = primary_key
+        self._on_load = on_load
+        self._lock = threading.RLock()
+        self._rows = {}      # table -> {pk: row}
+        self._frames = {}    # table -> (version, DataFrame)
+        self._versions = {}  # table -> int, bumped only when rows really change
+
+    def version(self, table) -> int:
+        return self._versions.get(table, 0)
+
+    def versions(self, tables) -> dict:
+        return {t: self.version(t) for t in tables}
+
+    def get(self, table) -> pd.DataFrame:
+        """The table as a shared read-only snapshot (see snapshots.share)."""
+        with self._lock:
+            if table not in self._rows:
+                self._load(table)
+            version = self._versions[table]
+            cached = self._frames.get(table)
+            if cached is None or cached[0] != version:
+                frame = pd.DataFrame(list(self._rows[table].values()))
+                cached = (version, snapshots.publish("table_cache", table, version, frame))
+                self._frames[table] = cached
+            return snapshots.share(cached[1])
+
+    def invalidate(self, table):
+        """Drop a table so the next read reloads it in full."""
+        with self._lock:
+            if self._rows.pop(table, None) is not None:
+                self._frames.pop(table, None)
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def apply(self, events) -> set:
+        """Merge change events into the cached tables. Returns the tables that changed."""
+        changed = set()
+        with self._lock:
+            keyed_only = {}
+            for event in events:
+                rows = self._rows.get(event.table)
+                if rows is None:
+                    continue  # not cached in this process; nothing to update
+                if event.op == "DELETE":
+                    if rows.pop(event.pk, None) is not None:
+                        changed.add(event.table)
+                elif event.row is None:
+                    keyed_only.setdefault(event.table, set()).add(event.pk)
+                elif rows.get(event.pk) != event.row:
+                    rows[event.pk] = event.row
+                    changed.add(event.table)
+
+            for table, pks in keyed_only.items():
+                pk_col = self._primary_key(table)
+                found = {r[pk_col]: r for r in self._load_rows(table, sorted(pks, key=str))}
+                rows = self._rows[table]
+                for pk in pks:
+                    row = found.get(pk)
+                    if row is None:
+                        if rows.pop(pk, None) is not None:
+                            changed.add(table)
+                    elif rows.get(pk) != row:
+                        rows[pk] = row
+                        changed.add(table)
+
+            for table in changed:
+                self._versions[table] = self._versions.get(table, 0) + 1
+        return changed
+
+    def _load(self, table):
+        pk_col = self._primary_key(table)
+        rows = self._load_table(table)
+        self._rows[table] = {r[pk_col]: r for r in rows}
+        self._versions[table] = self._versions.get(table, 0) + 1
+        if self._on_load:
+            self._on_load(table, rows)
+
+
+# ---------------- FEEDS ----------------
+class PollingChangeFeed:
+    """
+    Polls the server for rows changed since each tracked table's watermark
+    (updated_at plus deleted_rows tombstones) and hands the events to
+    `on_events`. poke() makes the feed's thread poll soon, e.g. right after a
+    write, so the writer sees its own change without waiting for the timer.
+
+    fetch_changes(table, watermark, deleted_watermark) must return
+    (rows, deleted_ids, watermark, deleted_watermark).
+    latest_tombstone(table) returns the newest deleted_at for a table, or None.
+    """
+
+    def __init__(self, fetch_changes, latest_tombstone, primary_key, on_events, interval=3.0):
+        self._fetch_changes = fetch_changes
+        self._latest_tombstone = latest_tombstone
+        self._primary_key = primary_key
+        self._on_events = on_events
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._poke_lock = threading.Lock()
+        self._watermarks = {}  # table -> (watermark, deleted_watermark)
+        self._wake = threading.Event()
+        self._poked = set()    # tables to poll when woken early; None for all
+
+    def track(self, table, rows):
+        """Start following a table from the state it was just loaded in."""
+        stamps = [r["updated_at"] for r in rows if r.get("updated_at")]
+        with self._lock:
+            self._watermarks[table] = (max(stamps) if stamps else None, self._latest_tombstone(table))
+
+    def poll_once(self, tables=None) -> list:
+        events = []
+        with self._lock:
+            for table in tables or list(self._watermarks):
+                if table not in self._watermarks:
+                    continue
+                rows, deleted_ids, watermark, deleted_watermark = self._fetch_changes(table, *self._watermarks[table])
+                pk_col = self._primary_key(table)
+                # Deletes first: a key deleted and then reused (a barcode, a
+                # threshold's item_name) comes back among `rows`, which must win
+                table_events = [ChangeEvent(table, "DELETE", _coerce_key(pk), None) for pk in deleted_ids]
+                table_events += [ChangeEvent(table, "UPDATE", r[pk_col], r) for r in rows]
+                if table_events:
+                    self._on_events(table_events)
+                # Advance only once the events are delivered
+                self._watermarks[table] = (watermark, deleted_watermark)
+                events += table_events
+        return events
+
+    def poke(self, tables=None):
+        """Poll `tables` (default every tracked table) on the feed's thread soon."""
+        with self._poke_lock:
+            if tables is None or self._poked is None:
+                self._poked = None
+            else:
+                self._poked.update(tables)
+        self._wake.set()
+
+    def start(self):
+        threading.Thread(target=self._run, name="change-feed-poll", daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            poked = self._wake.wait(timeout=self._interval)
+            self._wake.clear()
+            with self._poke_lock:
+                tables, self._poked = self._poked, set()
+            try:
+                self.poll_once(sorted(tables) if poked and tables else None)
+            except Exception:
+                # Server unreachable; the watermarks are unchanged so nothing is missed
+                pass
+
+
+class RealtimeChangeFeed(PollingChangeFeed):
+    """
+    Supabase realtime (postgres_changes) push feed. Events arrive as soon as
+    they are committed; the inherited polling runs on a long interval as a
+    safety net for anything missed while the socket was reconnecting.
+    Needs the tables in the supabase_realtime publication (migration 005).
+    """
+
+    def __init__(self, url, key, tables, fetch_changes, latest_tombstone, primary_key, on_events, interval=60.0):
+        super().__init__(fetch_changes, latest_tombstone, primary_key, on_events, interval)
+        self._url = url
+        self._key = key
+        self._tables = list(tables)
+
+    def start(self):
+        threading.Thread(target=lambda: asyncio.run(self._listen()), name="change-feed-realtime", daemon=True).start()
+        return super().start()
+
+    async def _listen(self):
+        from supabase import acreate_client
+
+        client = await acreate_client(self._url, self._key)
+        channel = client.channel("dianes-inventory-changes")
+        for table in self._tables:
+            channel.on_postgres_changes("*", schema="public", table=table, callback=self._on_payload)
+        await channel.subscribe()
+        await asyncio.Event().wait()
+
+    def _on_payload(self, payload):
+        data = payload.get("data", payload)
+        table, op = data.get("table"), data.get("type")
+        pk_col = self._primary_key(table)
+        if op == "DELETE":
+            pk = (data.get("old_record") or {}).get(pk_col)
+            event = ChangeEvent(table, "DELETE", pk, None)
+        else:
+            record = data.get("record") or {}
+            event = ChangeEvent(table, op, record.get(pk_col), record)
+        if event.pk is not None:
+            self._on_events([event])
+
+
+class SQLiteTriggerChangeFeed:
+    """
+    Change feed for a SQLite database (the local mirror, or a local test
+    backend). Triggers append each insert/update/delete to a change_log
+    table, and the feed reads the log past the last sequence it has seen.
+    Events carry only the key; the cache reads the current row back.
+    Works across processes sharing the same database file.
+    """
+
+    def __init__(self, path, tables, primary_key, on_events, interval=1.0):
+        self._path = path
+        self._primary_key = primary_key
+        self._on_events = on_events
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wake = threading.Event()
+        conn = self._conn()
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS change_log (
+                   seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                   table_name TEXT NOT NULL,
+                   op TEXT NOT NULL,
+                   row_id TEXT NOT NULL,
+                   changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+               )"""
+        )
+        for table in tables:
+            self.install_triggers(conn, table, primary_key(table))
+        self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+
+    @staticmethod
+    def install_triggers(conn, table, pk_col):
+        for op, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            conn.execute(
+                f"""CREATE TRIGGER IF NOT EXISTS "{table}_change_log_{op.lower()}"
+                    AFTER {op} ON "{table}"
+                    BEGIN
+                        INSERT INTO change_log (table_name, op, row_id) VALUES ('{table}', '{op}', {ref}."{pk_col}");
+                    END"""
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def poll_once(self, tables=None) -> list:
+        # The log is cheap to read, so `tables` is ignored and everything new is
+        # delivered (filtering would drop events once _last_seq moves past them).
+        with self._lock:
+            rows = self._conn().execute(
+                "SELECT seq, table_name, op, row_id FROM change_log WHERE seq > ? ORDER BY seq", (self._last_seq,)
+            ).fetchall()
+            if rows:
+                self._last_seq = rows[-1][0]
+        # Collapse to the last operation per row; the cache re-reads rows that still exist
+        latest = {}
+        for _, table, op, row_id in rows:
+            latest[(table, _coerce_key(row_id))] = op
+        events = [ChangeEvent(table, op, pk, None) for (table, pk), op in latest.items()]
+        if events:
+            self._on_events(events)
+        return events
+
+    def prune(self, keep_seconds=3600):
+        self._conn().execute(
+            "DELETE FROM change_log WHERE changed_at < strftime('%Y-%m-%dT%H:%M:%f', 'now', ?)", (f"-{int(keep_seconds)} seconds",)
+        )
+
+    def poke(self, tables=None):
+        """Read the log on the feed's thread soon (it always reads every table)."""
+        self._wake.set()
+
+    def start(self):
+        threading.Thread(target=self._run, name="change-feed-sqlite", daemon=True).start()
+        return self
+
+    def _run(self):
+        ticks = 0
+        while True:
+            self._wake.wait(timeout=self._interval)
+            self._wake.clear()
+            try:
+                self.poll_once()
+                ticks += 1
+                if ticks % 600 == 0:
+                    self.prune()
+            except Exception:
+                pass
+
+
+def _coerce_key(value):
+    """Keys come back as text from tombstones and change_log; ids are integers."""
+    return int(value) if str(value).lstrip("-").isdigit() else value
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Longest series a chart is sent; longer ones are downsampled with LTTB
+MAX_POINTS = 500
+
+PERIODS = {"Day": "D", "Week": "W-MON", "Month": "MS"}
+
+_lock = threading.Lock()
+_payloads = {}  # (chart, params) -> (data version, DataFrame)
+
+
+def cached(chart: str, params: tuple, version, build) -> pd.DataFrame:
+    """
+    The chart frame for (chart, params), rebuilt by build() only when the
+    data version changes. One frame per chart and parameters is kept.
+    """
+    key = (chart, params)
+    with _lock:
+        hit = _payloads.get(key)
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    df = build()
+    with _lock:
+        _payloads[key] = (version, df)
+    return df
+
+def data_version(df: pd.DataFrame, columns) -> tuple:
+    """
+    A fingerprint of the charted columns, for frames no change feed or shared
+    snapshot versions. The charts are aggregates, so row order does not matter
+    and the row hashes are simply summed.
+    """
+    columns = [c for c in columns if c in df.columns]
+    if df.empty or not columns:
+        return len(df), 0
+    hashes = pd.util.hash_pandas_object(df[columns], index=False, categorize=True).to_numpy()
+    return len(df), int(hashes.sum(dtype=np.uint64))
+
+def stock_by_category(items: pd.DataFrame) -> pd.DataFrame:
+    """Units in stock per category, one bar each instead of one segment per fridge row."""
+    if items.empty:
+        return pd.DataFrame(columns=["category", "quantity"])
+    quantity = pd.to_numeric(items["quantity"], errors="coerce").fillna(0.0)
+    return quantity.groupby(items["category"].fillna("")).sum().rename_axis("category").reset_index()
+
+def profit_by_period(sales: pd.DataFrame, period: str = "Day", max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """
+    Total profit per day, week or month (see PERIODS), downsampled to at most
+    `max_points` points.
+    """
+    if sales.empty:
+        return pd.DataFrame(columns=["date", "profit"])
+    day = pd.to_datetime(sales["date"].astype(str).str[:10], format="%Y-%m-%d", errors="coerce")
+    profit = pd.to_numeric(sales["profit"], errors="coerce").fillna(0.0)
+    totals = profit.groupby(day).sum()
+    if totals.empty:
+        return pd.DataFrame(columns=["date", "profit"])
+    # Every period in range, so gaps show as zero rather than being bridged
+    totals = totals.resample(PERIODS[period], label="left", closed="left").sum()
+    out = totals.rename_axis("date").rename("profit").reset_index()
+    return downsample(out, "date", "profit", max_points)
+
+def downsample(df: pd.DataFrame, x: str, y: str, max_points: int = MAX_POINTS) -> pd.DataFrame:
+    """The rows of a sorted series kept by lttb(), or df itself when it is short enough."""
+    if len(df) <= max_points:
+        return df.reset_index(drop=True)
+    xs = df[x].to_numpy()
+    xs = xs.astype("datetime64[ns]").astype(np.int64).astype(float) if np.issubdtype(xs.dtype, np.datetime64) else xs.astype(float)
+    return df.iloc[lttb(xs, df[y].to_numpy(dtype=float), max_points)].reset_index(drop=True)
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: positions of `n_out` points that keep the
+    visual shape of the series (peaks and dips survive, flat runs thin out).
+    The first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(area.argmax())
+        keep[i + 1] = previous
+    return keep
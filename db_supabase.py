@@ -1,122 +1,491 @@
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 import pandas as pd
 import streamlit as st
 import os
-from datetime import datetime
+import functools
+import inspect
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+
+import audit_archive
+import bulk_purge
+import chart_data
+import forecasting
+import inventory_history
+import price_versions
+import rerun_profiler
+import reports
+import snapshots
+from audit_writer import AuditWriter
+from change_feed import TableCache, PollingChangeFeed, RealtimeChangeFeed, SQLiteTriggerChangeFeed
+from jobs import JobRunner
+from local_store import LocalStore, SyncConflict, SyncWorker, MIRROR_SCHEMA
+from resilient_client import RequestPolicy, ResilientClient, is_transient
+from shared_cache import SharedTableStore
+from stock_alerts import StockAlerts, reorder_list
 
 # Initialize Supabase client
 SUPABASE_URL = st.secrets["supabase"]["url"]
 SUPABASE_KEY = st.secrets["supabase"]["service_role_key"]  # server-side only
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# Every Supabase request runs with a timeout; reads and repeatable writes are
+# retried with backoff, and with DIANES_DB_HEDGE=1 a read slower than its
+# table's p95 is sent again (see resilient_client.RequestPolicy).
+DB_READ_TIMEOUT = float(os.environ.get("DIANES_DB_READ_TIMEOUT", "10"))
+DB_WRITE_TIMEOUT = float(os.environ.get("DIANES_DB_WRITE_TIMEOUT", "15"))
+DB_RETRIES = int(os.environ.get("DIANES_DB_RETRIES", "3"))
+DB_HEDGE = os.environ.get("DIANES_DB_HEDGE", "0") == "1"
+request_policy = RequestPolicy(DB_READ_TIMEOUT, DB_WRITE_TIMEOUT, retries=DB_RETRIES, hedge=DB_HEDGE)
+supabase: Client = ResilientClient(
+    # The HTTP timeout ends requests the policy has already given up waiting for
+    create_client(SUPABASE_URL, SUPABASE_KEY,
+                  options=ClientOptions(postgrest_client_timeout=max(DB_READ_TIMEOUT, DB_WRITE_TIMEOUT) * 2)),
+    request_policy,
+)
+
+# Audit rows are buffered and written behind the user-facing call.
+# client_id is unique (migrations/supabase/002_audit_log_client_id.sql), so a
+# batch re-sent after a crash is ignored instead of duplicated.
+AUDIT_SPOOL_DIR = os.environ.get(
+    "DIANES_AUDIT_SPOOL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "audit_spool")
+)
+audit_writer = AuditWriter(
+    lambda rows: supabase.table("audit_log").upsert(rows, on_conflict="client_id", ignore_duplicates=True).execute(),
+    AUDIT_SPOOL_DIR,
+)
+
+# Audit rows older than the hot window are archived to shared storage (see
+# audit_archive.py and archive_old_audit_entries())
+audit_archive_store = (
+    audit_archive.LocalArchive(audit_archive.ARCHIVE_DIR) if audit_archive.ARCHIVE_DIR
+    else audit_archive.StorageArchive(supabase.storage)
+)
+# Rows saved by archiving bulk purges (see bulk_purge.py and start_purge())
+purge_archive_store = bulk_purge.archive_store(supabase.storage)
+
+# Local-first mode: reads come from a SQLite mirror and writes are applied there
+# first, then replayed on Supabase in order by a background worker, so the
+# counter keeps working at local-disk speed when the connection is bad or down.
+LOCAL_FIRST = os.environ.get("DIANES_LOCAL_FIRST", "0") == "1"
+LOCAL_DB_PATH = os.environ.get(
+    "DIANES_LOCAL_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "local_mirror.db")
+)
+SYNC_INTERVAL = float(os.environ.get("DIANES_SYNC_INTERVAL", "5"))
+SYNC_BATCH_SIZE = int(os.environ.get("DIANES_SYNC_BATCH_SIZE", "50"))
+
+# Delta sync: whole-table reads (view_items, view_customers, ...) come from the
+# local mirror, refreshed by fetching only rows changed since the last sync.
+# Always on in local-first mode.
+DELTA_SYNC = LOCAL_FIRST or os.environ.get("DIANES_DELTA_SYNC", "0") == "1"
+SYNC_OVERLAP_SECONDS = 5
+# Must not exceed the retention passed to purge_tombstones() on the server
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get("DIANES_TOMBSTONE_RETENTION_DAYS", "30"))
+
+local_store = LocalStore(LOCAL_DB_PATH) if DELTA_SYNC else None
+
+# Change feed: one process-wide copy of each table, shared by every session and
+# patched row by row from change events instead of being reloaded.
+#   realtime - Supabase realtime push (needs migrations/supabase/005_realtime_publication.sql)
+#   poll     - poll updated_at / deleted_rows for changes every CHANGE_FEED_INTERVAL seconds
+# In local-first mode the feed follows the local mirror through SQLite triggers.
+CHANGE_FEED = os.environ.get("DIANES_CHANGE_FEED", "")
+CHANGE_FEED_INTERVAL = float(os.environ.get("DIANES_CHANGE_FEED_INTERVAL", "3"))
+
+# Shared cache: whole-table snapshots kept in DIANES_SHARED_CACHE_DIR and
+# shared by every worker process on the host, so each table is fetched once per
+# host rather than once per process. Not used in local-first mode, where the
+# mirror is already a per-host copy.
+SHARED_CACHE_DIR = os.environ.get("DIANES_SHARED_CACHE_DIR", "")
+SHARED_CACHE_MAX_AGE = float(os.environ.get("DIANES_SHARED_CACHE_MAX_AGE", "300"))
+shared_store = SharedTableStore(SHARED_CACHE_DIR, SHARED_CACHE_MAX_AGE) if SHARED_CACHE_DIR and not LOCAL_FIRST else None
+
+# Stock alerts: the reorder list covers REORDER_COVER_DAYS of sales at the rate
+# of the last REORDER_LOOKBACK_DAYS. Without a change feed, writes from other
+# processes reach the alerts through a full reload every STOCK_ALERT_REFRESH seconds.
+REORDER_LOOKBACK_DAYS = int(os.environ.get("DIANES_REORDER_LOOKBACK_DAYS", "28"))
+REORDER_COVER_DAYS = int(os.environ.get("DIANES_REORDER_COVER_DAYS", "14"))
+STOCK_ALERT_REFRESH = float(os.environ.get("DIANES_STOCK_ALERT_REFRESH", "60"))
+
+# Primary keys of tables whose key is not "id" (used when there is no local mirror)
+_PRIMARY_KEYS = {"items": "item_id", "item_barcodes": "barcode", "stock_thresholds": "item_name"}
+
+_call_ctx = threading.local()
+_QUEUED_WRITES = {}
+# Results that mean a write was refused rather than applied
+_REJECTED_RESULTS = {"Item not found.", "Not enough stock."}
+
+def _db():
+    """Client for the current call: the local mirror in local-first mode, Supabase otherwise."""
+    client = getattr(_call_ctx, "client", None)
+    if client is not None:
+        return client
+    return local_store.client if LOCAL_FIRST else supabase
+
+def _view_table(table):
+    """
+    Whole-table read. Served from the in-process table cache when a change feed
+    is running, else from the host-wide shared cache, else from the
+    delta-synced mirror, whichever are enabled.
+    """
+    if getattr(_call_ctx, "client", None) is None:
+        if table_cache is not None:
+            return table_cache.get(table)
+        if shared_store is not None:
+            return snapshots.share(shared_store.get(table, _load_table))
+        if local_store is not None:
+            return pd.DataFrame(_load_table(table))
+    return pd.DataFrame(_db().table(table).select("*").execute().data)
+
+def _load_cached_table(table) -> list:
+    if shared_store is not None:
+        df = shared_store.get(table, _load_table)
+        return df.astype(object).where(df.notna(), None).to_dict(orient="records")
+    return _load_table(table)
+
+def _load_table(table) -> list:
+    if local_store is not None:
+        if not LOCAL_FIRST:
+            # Local-first mode is kept in sync by the background worker instead
+            sync_table(table)
+        return local_store.client.table(table).select("*").execute().data
+    return _fetch_pages(lambda: supabase.table(table).select("*").order(primary_key(table)))
+
+def _load_rows(table, pks) -> list:
+    client = local_store.client if LOCAL_FIRST else supabase
+    return client.table(table).select("*").in_(primary_key(table), pks).execute().data
+
+def _tables_changed(tables):
+    _bump_write_epochs(tables)
+    if shared_store is not None:
+        shared_store.invalidate(tables)
+    if change_feed is not None:
+        # Polled on the feed's thread, so the write does not wait on the server
+        change_feed.poke(tables)
+
+def _bump_write_epochs(tables):
+    with _flight_lock:
+        for table in tables:
+            _write_epochs[table] = _write_epochs.get(table, 0) + 1
+
+def table_versions(tables) -> dict:
+    """
+    Current version of each cached table. A version only moves when rows in
+    that table actually change, so pages can compare versions to decide
+    whether to rerun. Empty when no change feed is running.
+    """
+    return table_cache.versions(tables) if table_cache is not None else {}
+
+@contextmanager
+def _use_client(client, replaying=False, write_key=None):
+    previous = (
+        getattr(_call_ctx, "client", None), getattr(_call_ctx, "replaying", False),
+        getattr(_call_ctx, "write_key", None),
+    )
+    _call_ctx.client, _call_ctx.replaying, _call_ctx.write_key = client, replaying, write_key
+    try:
+        yield
+    finally:
+        _call_ctx.client, _call_ctx.replaying, _call_ctx.write_key = previous
+
+def _replay_key():
+    """Client key of the queued write being replayed, for server functions that apply a key once."""
+    return _call_ctx.write_key if getattr(_call_ctx, "replaying", False) else None
+
+def _log_audit(*entries):
+    # A replayed write was already audited when it was made locally
+    if not getattr(_call_ctx, "replaying", False):
+        audit_writer.log_many(entries)
+        _bump_write_epochs(["audit_log"])
+
+def _stock_written(rows=(), deleted=()):
+    """Hand the item rows a write left (and the ids it deleted) to the stock alerts."""
+    # A replayed write was already applied to the alerts when it was made locally
+    if not getattr(_call_ctx, "replaying", False):
+        stock_alerts.update_rows(rows)
+        stock_alerts.remove_rows(deleted)
+
+def _upserted(res) -> list:
+    """(row, whether it was inserted) for each row an upsert function returned."""
+    return [(row, bool(row.pop("inserted"))) for row in map(dict, res.data)]
+
+def _rejected(result) -> bool:
+    return isinstance(result, str) and result in _REJECTED_RESULTS
+
+def _queued_write(*tables):
+    """
+    Decorator for writes to `tables`. In local-first mode, apply the write to the
+    local mirror and queue the call for replay on Supabase (in one local
+    transaction); otherwise call through. Either way the change feed is poked
+    for `tables` afterwards so this process sees its own write promptly.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_call_ctx, "client", None) is not None:
+                return fn(*args, **kwargs)
+            if not LOCAL_FIRST:
+                result = fn(*args, **kwargs)
+                _tables_changed(tables)
+                return result
+            call_args = dict(inspect.signature(fn).bind(*args, **kwargs).arguments)
+            if "valid_from" in inspect.signature(fn).parameters and call_args.get("valid_from") is None:
+                # Queued with the call, so the replay versions prices from the edit
+                call_args["valid_from"] = datetime.now(timezone.utc).isoformat()
+                args, kwargs = (), call_args
+            client_key = str(uuid.uuid4())
+            with local_store.client.transaction():
+                base = _conflict_base(fn.__name__, call_args)
+                # Captured before the write, which may delete them
+                local_rows = _local_rows(call_args)
+                with _use_client(local_store.client, write_key=client_key):
+                    result = fn(*args, **kwargs)
+                if not _rejected(result):
+                    local_store.enqueue(fn.__name__, call_args, base, client_key, local_rows)
+            _tables_changed(tables)
+            sync_worker.poke()
+            return result
+
+        _QUEUED_WRITES[fn.__name__] = fn
+        return wrapper
+    return decorate
+
+
+# ---------------- READ COALESCING ----------------
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+_flights = {}
+_flight_lock = threading.Lock()
+_flight_stats = {}  # function name -> {"calls", "executed", "coalesced"}
+_write_epochs = {}  # table -> writes this process has made to it
+
+def _single_flight(*tables):
+    """
+    Decorator for reads of `tables`. Identical reads made at the same moment
+    (same function, same arguments) share one request: the first caller runs
+    it and the others wait for its result (or its exception). DataFrames are
+    shared copy-on-write. The key carries each table's write epoch, so a read
+    made after a write returns never joins a request sent before it.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_call_ctx, "client", None) is not None:
+                return fn(*args, **kwargs)
+            epochs = tuple(_write_epochs.get(t, 0) for t in tables)
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())), epochs)
+            try:
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            with _flight_lock:
+                stats = _flight_stats.setdefault(fn.__name__, {"calls": 0, "executed": 0, "coalesced": 0})
+                stats["calls"] += 1
+                flight = _flights.get(key)
+                leader = flight is None
+                if leader:
+                    flight = _flights[key] = _Flight()
+                    stats["executed"] += 1
+                else:
+                    flight.waiters += 1
+                    stats["coalesced"] += 1
+            if leader:
+                try:
+                    flight.result = fn(*args, **kwargs)
+                except Exception as e:
+                    flight.error = e
+                finally:
+                    with _flight_lock:
+                        del _flights[key]
+                    flight.done.set()
+            else:
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            result = flight.result
+            return snapshots.share(result) if isinstance(result, pd.DataFrame) and flight.waiters else result
+
+        return wrapper
+    return decorate
+
+def coalescing_stats() -> pd.DataFrame:
+    """Per read function: calls made, requests actually sent, and calls saved by coalescing."""
+    with _flight_lock:
+        rows = [{"function": name, **stats} for name, stats in sorted(_flight_stats.items())]
+    return pd.DataFrame(rows, columns=["function", "calls", "executed", "coalesced"])
+
+def db_request_metrics() -> pd.DataFrame:
+    """Latency percentiles, retries, timeouts and hedges of Supabase requests made by this process."""
+    return request_policy.metrics()
 
 
 # ---------------- ITEMS ----------------
+@_single_flight("items")
 def view_items():
-    res = supabase.table("items").select("*").execute()
-    return pd.DataFrame(res.data)
+    return _view_table("items")
 
-def add_or_update_item(item_id, item_name, category, quantity, fridge_no, user):
-    # Normalize fridge_no to int if possible
+def _fridge_number(fridge_no):
+    """
+    fridge_no as the whole number items.fridge_no holds (bigint on the
+    server), or None when blank. Anything else raises ValueError here rather
+    than a cast error from the server halfway through a stock-in.
+    """
+    if fridge_no is None or (not isinstance(fridge_no, str) and pd.isna(fridge_no)):
+        return None
+    text = str(fridge_no).strip()
+    if not text:
+        return None
     try:
-        fridge_no = int(fridge_no)
-    except:
-        pass
+        number = float(text)
+    except ValueError:
+        number = None
+    if number is None or not number.is_integer():
+        raise ValueError(f"Fridge No. must be a whole number, not {fridge_no!r}")
+    return int(number)
 
-    action = None
-
-    if item_id and item_id != "Add New":
-        # Case 1: Existing item selected
-        existing = supabase.table("items").select("*").eq("item_id", item_id).execute()
-        if existing.data:
-            current_record = existing.data[0]
-            current_qty = current_record["quantity"]
-            current_fridge = current_record["fridge_no"]
-
-            if str(current_fridge) == str(fridge_no):
-                # Same fridge → add to existing quantity
-                new_qty = current_qty + quantity
-                supabase.table("items").update({
-                    "quantity": new_qty
-                }).eq("item_id", item_id).execute()
-                action = "Update"
-            else:
-                # Different fridge → create new item row
-                supabase.table("items").insert({
-                    "item_name": item_name,
-                    "category": category,
-                    "quantity": quantity,
-                    "fridge_no": fridge_no
-                }).execute()
-                action = "Add (New Fridge)"
-        else:
-            # No record found → insert new
-            supabase.table("items").insert({
-                "item_name": item_name,
-                "category": category,
-                "quantity": quantity,
-                "fridge_no": fridge_no
-            }).execute()
-            action = "Add"
-    else:
-        # Case 2: New item/category entered
-        # ✅ Check if same item/category/fridge already exists
-        existing = (
-            supabase.table("items")
-            .select("*")
-            .eq("item_name", item_name)
-            .eq("category", category)
-            .eq("fridge_no", fridge_no)
-            .execute()
-        )
+@_queued_write("items")
+def add_or_update_item(item_id, item_name, category, quantity, fridge_no, user):
+    """
+    Stock in `quantity` units: onto the selected item's row in `fridge_no`,
+    or onto the item_name/category/fridge_no row for a new entry. One
+    statement on the server adds to the row if it is there and inserts it if
+    not (stock_in() in migrations/supabase/013_upsert_keys.sql), so concurrent
+    stock-ins neither lose units nor create duplicate rows. Raises ValueError
+    if fridge_no is not a whole number (blank means no fridge).
+    """
+    fridge_no = _fridge_number(fridge_no)
 
-        if existing.data:
-            # Update quantity instead of inserting duplicate
-            current_record = existing.data[0]
-            new_qty = current_record["quantity"] + quantity
-            supabase.table("items").update({
-                "quantity": new_qty
-            }).eq("item_id", current_record["item_id"]).execute()
-            action = "Update Existing (Duplicate Prevented)"
-        else:
-            # Insert new record
-            supabase.table("items").insert({
-                "item_name": item_name,
-                "category": category,
-                "quantity": quantity,
-                "fridge_no": fridge_no
-            }).execute()
-            action = "Add"
+    selected = item_id if item_id and item_id != "Add New" else None
+    res = _db().rpc("stock_in", {
+        "p_item_id": selected,
+        "p_item_name": item_name,
+        "p_category": category,
+        "p_fridge_no": fridge_no,
+        "p_quantity": quantity,
+        "p_client_key": _replay_key()
+    }).execute()
+    written = _upserted(res)
+    if not written:
+        return  # a replayed stock-in the server had already applied
+    row, inserted = written[0]
+    stamped_at = _audit_stamp(row.pop("stamped_at"))
+    if selected:
+        action = "Add (New Fridge)" if inserted else "Update"
+    else:
+        action = "Add" if inserted else "Update Existing (Duplicate Prevented)"
 
     # Audit log entry
-    supabase.table("audit_log").insert({
-        "item_name": item_name,
-        "category": category,
+    _log_audit({
+        "item_name": row["item_name"],
+        "category": row["category"],
         "action": action,
         "quantity": quantity,
+        "fridge_no": row["fridge_no"],
+        "qty_delta": quantity,
         "unit_cost": 0.0,
         "selling_price": 0.0,
         "username": user,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": stamped_at
+    })
+    _stock_written([row])
+
+@_queued_write("items")
+def add_or_update_items_batch(entries, user):
+    """
+    Apply many stock-ins at once (e.g. a scanned delivery).
+    Each entry is a dict with item_id and quantity, plus an optional fridge_no.
+    Entries for the same item/fridge are summed first, and the batch is one
+    call on the server (stock_in_batch() in migrations/supabase/016) that adds
+    each total to its row as it is then, the same way add_or_update_item()
+    does for one entry.
+    Returns a dict with the number of rows updated and inserted. Raises
+    ValueError, before anything is written, if a fridge_no is not a whole
+    number.
+    """
+    totals = {}
+    for entry in entries:
+        key = (int(entry["item_id"]), _fridge_number(entry.get("fridge_no")))
+        totals[key] = totals.get(key, 0) + entry["quantity"]
+    if not totals:
+        return {"updated": 0, "inserted": 0}
+
+    res = _db().rpc("stock_in_batch", {
+        "p_entries": [
+            {"item_id": item_id, "fridge_no": fridge_no, "quantity": quantity}
+            for (item_id, fridge_no), quantity in totals.items()
+        ],
+        "p_client_key": _replay_key()
     }).execute()
+    written = [(row, inserted, row.pop("item_ids")) for row, inserted in _upserted(res)]
+    stamps = {row["item_id"]: _audit_stamp(row.pop("stamped_at")) for row, _, _ in written}
+    _stock_written([row for row, _, _ in written])
 
+    audit_rows = []
+    for (item_id, fridge_no), quantity in totals.items():
+        for row, inserted, item_ids in written:
+            # An entry without a fridge lands on the item's own row
+            if fridge_no is None and row["item_id"] == item_id:
+                break
+            if fridge_no is not None and item_id in item_ids and str(row["fridge_no"]) == str(fridge_no):
+                break
+        else:
+            continue  # unknown item, skipped by the server
+        if row["item_id"] == item_id:
+            action = "Update"
+        else:
+            action = "Add (New Fridge)" if inserted else "Update Existing (Duplicate Prevented)"
+        audit_rows.append({
+            "item_name": row["item_name"],
+            "category": row["category"],
+            "action": action,
+            "quantity": quantity,
+            "fridge_no": row["fridge_no"],
+            "qty_delta": quantity,
+            "unit_cost": 0.0,
+            "selling_price": 0.0,
+            "username": user,
+            "timestamp": stamps[row["item_id"]]
+        })
+
+    if audit_rows:
+        _log_audit(*audit_rows)
+    inserted = sum(1 for _, was_inserted, _ in written if was_inserted)
+    return {"updated": len(written) - inserted, "inserted": inserted}
+
+@_queued_write("items", "item_barcodes")
 def delete_item(item_id, user):
-    item = supabase.table("items").select("*").eq("item_id", item_id).execute()
-    if item.data:
-        supabase.table("audit_log").insert({
-            "item_name": item.data[0]["item_name"],
-            "category": item.data[0]["category"],
+    # Audited from the row as deleted, stamped once the delete is done (see
+    # take_inventory_checkpoint())
+    res = _db().table("items").delete().eq("item_id", item_id).execute()
+    if res.data:
+        _log_audit({
+            "item_name": res.data[0]["item_name"],
+            "category": res.data[0]["category"],
             "action": "Delete",
-            "quantity": item.data[0]["quantity"],
+            "quantity": res.data[0]["quantity"],
+            "fridge_no": res.data[0]["fridge_no"],
+            "qty_delta": -res.data[0]["quantity"],
             "unit_cost": 0.0,
             "selling_price": 0.0,
             "username": user,
             "timestamp": datetime.now().isoformat()
-        }).execute()
-    supabase.table("items").delete().eq("item_id", item_id).execute()
+        })
+    _stock_written(deleted=[item_id])
 
+@_queued_write("items", "item_barcodes")
 def delete_all_inventory():
-    supabase.table("items").delete().gte("item_id", 0).execute()
-    supabase.table("audit_log").insert({
+    """Delete every item row in id ranges (see start_purge() for the background version)."""
+    for _ in bulk_purge.delete_chunks(_db(), "items", "item_id"):
+        pass
+    if not getattr(_call_ctx, "replaying", False):
+        stock_alerts.invalidate()
+    _log_audit({
         "item_name": "ALL ITEMS",
         "category": "ALL CATEGORIES",
         "action": "Delete All Inventory",
@@ -124,30 +493,151 @@ def delete_all_inventory():
         "unit_cost": 0.00,
         "selling_price": 0.00,
         "username": "System"
-    }).execute()   
+    })   
 
+@_single_flight("items")
 def get_total_qty(item_name):
-    res = supabase.table("items").select("quantity").eq("item_name", item_name).execute()
+    res = _db().table("items").select("quantity").eq("item_name", item_name).execute()
     if not res.data:
         return 0
     return sum([row["quantity"] for row in res.data])
 
+# ---------------- FRIDGES ----------------
+FRIDGE_SUMMARY_COLUMNS = ["fridge_no", "item_rows", "stocked_rows", "empty_rows", "categories", "total_units"]
+
+# Same aggregate as fridge_summary() in migrations/supabase/009_fridge_queries.sql
+_FRIDGE_SUMMARY_SQL = """
+    SELECT CAST(fridge_no AS TEXT), COUNT(*),
+           SUM(quantity > 0), SUM(COALESCE(quantity, 0) <= 0),
+           COUNT(DISTINCT category), COALESCE(SUM(quantity), 0)
+    FROM items GROUP BY fridge_no
+"""
+
+@_single_flight("items")
+def fridge_summary() -> pd.DataFrame:
+    """
+    One row per fridge: item rows, rows in stock, empty rows, categories and
+    total units. Aggregated where the rows live (the process table cache, the
+    local mirror or Supabase) rather than from a full items fetch.
+    """
+    if table_cache is not None:
+        items = view_items()
+        if items.empty:
+            return pd.DataFrame(columns=FRIDGE_SUMMARY_COLUMNS)
+        quantity = pd.to_numeric(items["quantity"], errors="coerce")
+        summary = items.assign(quantity=quantity, stocked=quantity > 0, empty=~(quantity.fillna(0) > 0)).groupby(
+            items["fridge_no"].astype(str), dropna=False
+        ).agg(
+            item_rows=("quantity", "size"),
+            stocked_rows=("stocked", "sum"),
+            empty_rows=("empty", "sum"),
+            categories=("category", "nunique"),
+            total_units=("quantity", "sum"),
+        ).rename_axis("fridge_no").reset_index()
+    elif local_store is not None:
+        if not LOCAL_FIRST:
+            sync_table("items")
+        rows = local_store.client.conn.execute(_FRIDGE_SUMMARY_SQL).fetchall()
+        summary = pd.DataFrame([tuple(r) for r in rows], columns=FRIDGE_SUMMARY_COLUMNS)
+    else:
+        summary = pd.DataFrame(supabase.rpc("fridge_summary").execute().data, columns=FRIDGE_SUMMARY_COLUMNS)
+    return _sort_fridges(summary)[FRIDGE_SUMMARY_COLUMNS]
+
+def _sort_fridges(df):
+    # Fridge numbers are text in the summary; 2 sorts before 10
+    number = pd.to_numeric(df["fridge_no"], errors="coerce")
+    return df.assign(_n=number).sort_values(["_n", "fridge_no"], na_position="last").drop(columns="_n").reset_index(drop=True)
+
+@_single_flight("items")
+def view_items_in_fridge(fridge_no) -> pd.DataFrame:
+    """Item rows in one fridge (indexed on fridge_no on the server and in the mirror)."""
+    if table_cache is not None:
+        items = view_items()
+        if items.empty:
+            return items
+        return items[items["fridge_no"].astype(str) == str(fridge_no)].sort_values("item_id").reset_index(drop=True)
+    try:
+        fridge_no = int(fridge_no)
+    except (TypeError, ValueError):
+        pass
+    return pd.DataFrame(
+        _db().table("items").select("*").eq("fridge_no", fridge_no).order("item_id").execute().data
+    )
+
+# ---------------- BARCODES ----------------
+@_single_flight("item_barcodes")
+def view_item_barcodes():
+    """Barcode → item mapping (see migrations/supabase/001_item_barcodes.sql)."""
+    return _view_table("item_barcodes")
+
+@_queued_write("item_barcodes")
+def save_item_barcode(barcode: str, item_id: int, units_per_scan: int = 1):
+    """Link a barcode to an item row. Re-saving a barcode moves it to the new item."""
+    _db().table("item_barcodes").upsert({
+        "barcode": barcode.strip(),
+        "item_id": int(item_id),
+        "units_per_scan": int(units_per_scan)
+    }).execute()
+
+@_queued_write("item_barcodes")
+def delete_item_barcode(barcode: str):
+    _db().table("item_barcodes").delete().eq("barcode", barcode).execute()
+
+# ---------------- STOCK ALERTS ----------------
+@_single_flight("stock_thresholds")
+def view_stock_thresholds():
+    """Per-item alert thresholds (see migrations/supabase/008_stock_thresholds.sql)."""
+    return _view_table("stock_thresholds")
+
+@_queued_write("stock_thresholds")
+def set_stock_threshold(item_name: str, threshold: float):
+    """Alert on item_name at its own threshold instead of the global one."""
+    _db().table("stock_thresholds").upsert(
+        {"item_name": item_name, "threshold": float(threshold)}, on_conflict="item_name"
+    ).execute()
+    if not getattr(_call_ctx, "replaying", False):
+        stock_alerts.set_thresholds({item_name: float(threshold)})
+
+@_queued_write("stock_thresholds")
+def delete_stock_threshold(item_name: str):
+    _db().table("stock_thresholds").delete().eq("item_name", item_name).execute()
+    if not getattr(_call_ctx, "replaying", False):
+        stock_alerts.set_thresholds({item_name: None})
+
+def low_stock_items(threshold) -> pd.DataFrame:
+    """Items (summed over fridges) at or below their own threshold, else `threshold`."""
+    return stock_alerts.low_stock(threshold)
+
+def reorder_suggestions(threshold, lookback_days=REORDER_LOOKBACK_DAYS, cover_days=REORDER_COVER_DAYS) -> pd.DataFrame:
+    """Low-stock items with a suggested order quantity from their recent sales rate."""
+    low = low_stock_items(threshold)
+    if low.empty:
+        return reorder_list(low, pd.DataFrame())
+    since = (date.today() - timedelta(days=lookback_days)).isoformat()
+    sales = pd.DataFrame(_fetch_pages(lambda: (
+        _db().table("sales").select("id,item_name,quantity,date")
+        .gte("date", since).in_("item_name", low["item_name"].tolist()).order("id")
+    )))
+    return reorder_list(low, sales, lookback_days, cover_days)
+
 # ---------------- CUSTOMERS ----------------
+@_single_flight("customers")
 def view_customers():
-    res = supabase.table("customers").select("*").execute()
-    return pd.DataFrame(res.data)
+    return _view_table("customers")
 
+@_single_flight("customers")
 def get_customer(customer_id: int) -> dict:
     """Fetch customer details by ID."""
-    result = supabase.table("customers").select("*").eq("id", customer_id).execute()
+    result = _db().table("customers").select("*").eq("id", customer_id).execute()
     if result.data:
         return result.data[0]
     return {}
 
 def validate_if_customer_exist(name):
-    res = supabase.table("customers").select("id").eq("name", name.upper()).execute()
+    res = _db().table("customers").select("id").eq("name", name.upper()).execute()
     return bool(res.data)
 
+@_queued_write("customers")
 def save_customer(customer_id, name, phone, email, address, group_id=None):
     """Insert or update a customer record."""
     data = {
@@ -159,28 +649,32 @@ def save_customer(customer_id, name, phone, email, address, group_id=None):
     }
 
     if customer_id:  # Update existing
-        supabase.table("customers").update(data).eq("id", customer_id).execute()
+        _db().table("customers").update(data).eq("id", customer_id).execute()
         return "updated"
-    else:  # Insert new
-        supabase.table("customers").insert(data).execute()
+    else:  # Insert new, once per queued write (insert_once() in migrations/supabase/017)
+        _db().rpc("insert_once", {"p_table": "customers", "p_row": data, "p_client_key": _replay_key()}).execute()
         return "inserted"
 
+@_queued_write("customers")
 def update_customer(name, phone, email, address):
-    supabase.table("customers").update({
+    _db().table("customers").update({
         "phone": phone,
         "email": email.upper(),
         "address": address.upper()
     }).eq("name", name.upper()).execute()
 
+@_queued_write("customers")
 def delete_customer(customer_id):
-    supabase.table("customers").delete().eq("id", customer_id).execute()
+    _db().table("customers").delete().eq("id", customer_id).execute()
 
+@_queued_write("customers")
 def delete_all_customers():
-    # Explicitly delete all rows by using a condition that matches everything
-    supabase.table("customers").delete().gte("id", 0).execute()
+    """Delete every customer in id ranges (see start_purge() for the background version)."""
+    for _ in bulk_purge.delete_chunks(_db(), "customers", "id"):
+        pass
 
     # Log the action
-    supabase.table("audit_log").insert({
+    _log_audit({
         "item_name": "ALL CUSTOMERS",
         "category": "N/A",
         "action": "Delete All Customers",
@@ -188,22 +682,24 @@ def delete_all_customers():
         "unit_cost": 0.00,
         "selling_price": 0.00,
         "username": "System"
-    }).execute()
+    })
 
 # ---------------- PRICING ----------------
+@_single_flight("pricing_tiers")
 def view_pricing():
-    res = supabase.table("pricing_tiers").select("*").execute()
-    return pd.DataFrame(res.data)
+    return _view_table("pricing_tiers")
 
+@_single_flight("pricing_tiers")
 def get_items_for_pricing() -> pd.DataFrame:
     """Fetch items grouped by item_id for pricing tiers."""
-    res = supabase.table("pricing_tiers").select("item_id, label").execute()
+    res = _db().table("pricing_tiers").select("item_id, label").execute()
     return pd.DataFrame(res.data)
 
 #def get_price_list():
 #    res = supabase.rpc("get_price_list").execute()  # optional: create SQL function in Supabase
 #    return pd.DataFrame(res.data)
 
+@_single_flight("customer_price_list", "customers", "items")
 def get_price_list() -> pd.DataFrame:
     """
     Fetch the special customer price list with customer and item names.
@@ -215,7 +711,7 @@ def get_price_list() -> pd.DataFrame:
     JOIN items i ON cpl.item_id = i.item_id;
     """
     res = (
-        supabase.table("customer_price_list")
+        _db().table("customer_price_list")
         .select("id, custom_price, customer_id, item_id, customers(name), items(item_name)")
         .execute()
     )
@@ -229,31 +725,43 @@ def get_price_list() -> pd.DataFrame:
 
     return df
 
-def add_price(customer_id, item_id, custom_price):
-    supabase.table("customer_price_list").insert({
+def _upsert_special_price(customer_id, item_id, custom_price, valid_from=None):
+    # One upsert on the (customer_id, item_id) key (migrations/supabase/012)
+    res = _db().table("customer_price_list").upsert({
         "customer_id": customer_id,
         "item_id": item_id,
         "custom_price": custom_price
-    }).execute()
+    }, on_conflict="customer_id,item_id").execute()
+    _record_price_versions("special", res.data, valid_from=valid_from)
+
+@_queued_write("customer_price_list", "price_versions")
+def set_special_price(customer_id: int, item_id: int, custom_price: float, valid_from: str = None):
+    """Add a customer's special price for an item, or update the one they have."""
+    _upsert_special_price(customer_id, item_id, custom_price, valid_from)
+
+@_queued_write("customer_price_list", "price_versions")
+def add_price(customer_id, item_id, custom_price, valid_from=None):
+    _upsert_special_price(customer_id, item_id, custom_price, valid_from)
 
 #def update_price(record_id, custom_price):
-#    supabase.table("customer_price_list").update({
+#    _db().table("customer_price_list").update({
 #        "custom_price": custom_price
 #    }).eq("id", record_id).execute()
 
-def update_price(customer_id: int, item_id: int, custom_price: float):
+@_queued_write("customer_price_list", "price_versions")
+def update_price(customer_id: int, item_id: int, custom_price: float, valid_from: str = None):
     """Update an existing special price record."""
-    supabase.table("customer_price_list").update({
-        "custom_price": custom_price
-    }).eq("customer_id", customer_id).eq("item_id", item_id).execute()
+    _upsert_special_price(customer_id, item_id, custom_price, valid_from)
 
-def delete_price(record_id):
-    supabase.table("customer_price_list").delete().eq("id", record_id).execute()
+@_queued_write("customer_price_list", "price_versions")
+def delete_price(record_id, valid_from=None):
+    res = _db().table("customer_price_list").delete().eq("id", record_id).execute()
+    _record_price_versions("special", res.data, deleted=True, valid_from=valid_from)
 
 def validate_special_price_exist(customer_id: int, item_id: int) -> bool:
     """Check if a special price record already exists for a customer-item pair."""
     res = (
-        supabase.table("customer_price_list")
+        _db().table("customer_price_list")
         .select("id")
         .eq("customer_id", customer_id)
         .eq("item_id", item_id)
@@ -261,9 +769,10 @@ def validate_special_price_exist(customer_id: int, item_id: int) -> bool:
     )
     return bool(res.data)
 
+@_single_flight("pricing_tiers")
 def get_base_price(item_id: int, quantity: int) -> float:
     res = (
-        supabase.table("pricing_tiers")
+        _db().table("pricing_tiers")
         .select("price_per_unit")
         .eq("item_id", item_id)
         .lte("min_qty", quantity)
@@ -276,6 +785,7 @@ def get_base_price(item_id: int, quantity: int) -> float:
         return float(res.data[0]["price_per_unit"])
     return 0.00
 
+@_single_flight("customer_price_list")
 def get_special_price(customer_id: int, item_id: int) -> pd.DataFrame:
     """
     Fetch special pricing for a given customer and item.
@@ -285,7 +795,7 @@ def get_special_price(customer_id: int, item_id: int) -> pd.DataFrame:
     WHERE customer_id = ? AND item_id = ?
     """
     res = (
-        supabase.table("customer_price_list")
+        _db().table("customer_price_list")
         .select("id, customer_id, item_id, custom_price")
         .eq("customer_id", customer_id)
         .eq("item_id", item_id)
@@ -293,10 +803,11 @@ def get_special_price(customer_id: int, item_id: int) -> pd.DataFrame:
     )
     return pd.DataFrame(res.data)
 
+@_single_flight("customer_price_list", "pricing_tiers")
 def get_customer_adjusted_price(customer_id: int, item_id: int, quantity: int) -> float:
     """Fetch special customer price if defined, otherwise fall back to base price."""
     res = (
-        supabase.table("customer_price_list")
+        _db().table("customer_price_list")
         .select("custom_price")
         .eq("customer_id", customer_id)
         .eq("item_id", item_id)
@@ -307,140 +818,107 @@ def get_customer_adjusted_price(customer_id: int, item_id: int, quantity: int) -
     return get_base_price(item_id, quantity)
 
 
-def upload_tiered_pricing_to_db(df: pd.DataFrame):
+@_queued_write("pricing_tiers", "price_versions")
+def upload_tiered_pricing_to_db(df: pd.DataFrame, valid_from: str = None):
     """
     Process a DataFrame of tiered pricing and update/insert into Supabase.
     Returns a list of skipped item_ids.
     """
     skipped_rows = []
+    changed_rows = []
+
+    # ✅ Check the items exist, all at once
+    item_ids = sorted({int(i) for i in df["item_id"]})
+    known = {r["item_id"] for r in _db().table("items").select("item_id").in_("item_id", item_ids).execute().data}
 
     for _, row in df.iterrows():
         item_id = int(row['item_id'])
-        min_qty = int(row['min_qty'])
-        max_qty = None if pd.isna(row['max_qty']) else int(row['max_qty'])
-        price_per_unit = float(row['price_per_unit'])
-        label = str(row['label']).strip().upper()
-
-        # ✅ Check if item exists in items table
-        item_check = supabase.table("items").select("item_id").eq("item_id", item_id).execute()
-        if not item_check.data:
+        if item_id not in known:
             skipped_rows.append(item_id)
             continue
+        tier, _ = _upsert_pricing_tier(
+            item_id,
+            int(row['min_qty']),
+            None if pd.isna(row['max_qty']) else int(row['max_qty']),
+            float(row['price_per_unit']),
+            str(row['label']).strip().upper()
+        )
+        changed_rows.append(tier)
 
-        # Check if pricing tier exists
-        if max_qty is None:
-            existing = (
-                supabase.table("pricing_tiers")
-                .select("id")
-                .eq("item_id", item_id)
-                .eq("min_qty", min_qty)
-                .is_("max_qty", None)
-                .eq("label", label)
-                .execute()
-            )
-        else:
-            existing = (
-                supabase.table("pricing_tiers")
-                .select("id")
-                .eq("item_id", item_id)
-                .eq("min_qty", min_qty)
-                .eq("max_qty", max_qty)
-                .eq("label", label)
-                .execute()
-            )
-
-        if existing.data:
-            tier_id = existing.data[0]["id"]
-            supabase.table("pricing_tiers").update({
-                "price_per_unit": price_per_unit
-            }).eq("id", tier_id).execute()
-        else:
-            supabase.table("pricing_tiers").insert({
-                "item_id": item_id,
-                "min_qty": min_qty,
-                "max_qty": max_qty,
-                "price_per_unit": price_per_unit,
-                "label": label
-            }).execute()
-
+    _record_price_versions("tier", changed_rows, valid_from=valid_from)
     return skipped_rows
 
 # ---------------- SALES ----------------
+@_single_flight("sales")
 def view_sales():
-    res = supabase.table("sales").select("*").execute()
-    return pd.DataFrame(res.data)
+    return _view_table("sales")
 
+@_single_flight("sales")
 def view_sales_by_customer(customer_id: int) -> pd.DataFrame:
     """Fetch sales records for a given customer."""
-    res = supabase.table("sales").select("*").eq("customer_id", customer_id).order("date", desc=True).execute()
+    res = _db().table("sales").select("*").eq("customer_id", customer_id).order("date", desc=True).execute()
     return pd.DataFrame(res.data)
 
-def record_sale(item_id: int, quantity: int, user: str, customer_id: int, chosen_unit_price: float):
-    """Deduct stock, record sale, and log audit entry."""
-    # Get item details
-    res = supabase.table("items").select("*").eq("item_id", item_id).execute()
-    if not res.data:
+@_queued_write("sales", "items")
+def record_sale(item_id: int, quantity: int, user: str, customer_id: int, chosen_unit_price: float,
+                idempotency_key: str = None):
+    """
+    Deduct stock, record sale, and log audit entry. The sale row carries
+    `idempotency_key` as its client_id, so submitting the same sale again
+    (a double click, a retried request, an outbox replay) records it once.
+    The key check, the deduction and the sale row are one call on the server
+    (sell_stock() in migrations/supabase/015_sell_stock.sql), which subtracts
+    from the stock rows as they are at that moment, so concurrent sales can
+    neither oversell nor overwrite each other's deductions.
+    """
+    # Without a key of its own, a queued sale uses its outbox entry's
+    client_id = idempotency_key or getattr(_call_ctx, "write_key", None) or str(uuid.uuid4())
+    result = _db().rpc("sell_stock", {
+        "p_client_id": client_id,
+        "p_item_id": item_id,
+        "p_quantity": quantity,
+        "p_customer_id": customer_id,
+        "p_selling_price": chosen_unit_price,
+        "p_date": datetime.now().date().isoformat()
+    }).execute().data
+    if result["status"] == "duplicate":
+        return "Sale already recorded."
+    if result["status"] == "not_found":
         return "Item not found."
-
-    item_name = res.data[0]["item_name"]
-    category = res.data[0]["category"]
-
-    # Get all fridge records for this item_name
-    res = supabase.table("items").select("*").eq("item_name", item_name).execute()
-    rows = res.data
-    total_quantity = sum(r["quantity"] for r in rows)
-    if total_quantity < quantity:
+    if result["status"] == "short":
         return "Not enough stock."
 
-    # Deduct stock across fridges
-    qty_to_deduct = quantity
-    deduction_log = []
-    for r in rows:
-        if qty_to_deduct <= 0:
-            break
-        available = r["quantity"]
-        deduct = min(available, qty_to_deduct)
-        new_qty = available - deduct
-        supabase.table("items").update({"quantity": new_qty}).eq("item_id", r["item_id"]).execute()
-        qty_to_deduct -= deduct
-        deduction_log.append(f"Fridge {r['fridge_no']}: deducted {deduct}, new qty={new_qty}")
-
-    # Insert into sales
-    total_sale = quantity * chosen_unit_price
-    supabase.table("sales").insert({
-        "item_id": item_id,
-        "item_name": item_name,
-        "quantity": quantity,
-        "selling_price": chosen_unit_price,
-        "total_sale": total_sale,
-        "cost": 0.0,
-        "profit": 0.0,
-        "date": datetime.now().date().isoformat(),
-        "customer_id": customer_id,
-        "overridden": 1 if chosen_unit_price else 0
-    }).execute()
+    deductions = [(d["row"], d["deduct"]) for d in result["deductions"]]
+    _stock_written([row for row, _ in deductions])
+    deduction_log = [
+        f"Fridge {row['fridge_no']}: deducted {deduct}, new qty={row['quantity']}" for row, deduct in deductions
+    ]
 
-    # Insert into audit log
-    supabase.table("audit_log").insert({
-        "item_name": item_name,
-        "category": category,
+    # Insert into audit log, one entry per fridge the stock came out of
+    now = _audit_stamp(result["stamped_at"])
+    _log_audit(*[{
+        "item_name": row["item_name"],
+        "category": row["category"],
         "action": "Sale",
-        "quantity": quantity,
+        "quantity": deduct,
+        "fridge_no": row["fridge_no"],
+        "qty_delta": -deduct,
         "unit_cost": 0.0,
         "selling_price": chosen_unit_price,
         "username": user,
-        "timestamp": datetime.now().isoformat()
-    }).execute()
+        "timestamp": now
+    } for row, deduct in deductions])
 
     return f"Sale recorded. Deduction details:\n" + "\n".join(deduction_log)
 
+@_single_flight("sales")
 def get_sales_by_customer(customer_id: int, start_date: str, end_date: str):
     """
     Fetch sales records for a given customer between start_date and end_date.
     Returns a DataFrame.
     """
     query = (
-        supabase.table("sales")
+        _db().table("sales")
         .select("*")
         .eq("customer_id", customer_id)
         .gte("date", str(start_date))
@@ -460,17 +938,552 @@ def get_po_sequence(order_date_sql: str) -> int:
         supabase.table("po_sequence").insert({"date": order_date_sql, "seq": seq}).execute()
     return seq
 
+# ---------------- CHART DATA ----------------
+def _chart_data(table, load, columns) -> tuple:
+    """
+    (frame, version) for a chart of `table`. The table version is read before
+    the data, so a change landing in between is charted under the old version
+    and rebuilt on the next run rather than missed. A shared snapshot carries
+    its own version; only frames read straight from the server are fingerprinted.
+    """
+    versions = table_versions([table])
+    df = load()
+    if versions:
+        return df, versions[table]
+    if "snapshot" in df.attrs:
+        return df, df.attrs["snapshot"]
+    return df, chart_data.data_version(df, columns)
+
+def stock_by_category_chart() -> pd.DataFrame:
+    """Units in stock per category, aggregated once per items version."""
+    items, version = _chart_data("items", view_items, ["category", "quantity"])
+    return chart_data.cached("stock_by_category", (), version, lambda: chart_data.stock_by_category(items))
+
+def profit_trend_chart(period: str = "Day", max_points: int = chart_data.MAX_POINTS) -> pd.DataFrame:
+    """Profit per day, week or month, downsampled for long ranges, rebuilt once per sales version."""
+    sales, version = _chart_data("sales", view_sales, ["date", "profit"])
+    return chart_data.cached(
+        "profit_trend", (period, max_points), version,
+        lambda: chart_data.profit_by_period(sales, period, max_points),
+    )
+
+# ---------------- DEMAND FORECAST ----------------
+FORECAST_HISTORY_DAYS = int(os.environ.get("DIANES_FORECAST_HISTORY_DAYS", "182"))
+
+def _recent_sales(days: int) -> pd.DataFrame:
+    """
+    Sales of the last `days` days, fetched once per sales version: the forecast
+    table and the item chart of a page run share one fetch.
+    """
+    since = (date.today() - timedelta(days=days)).isoformat()
+    return chart_data.cached("recent_sales", (since,), _sales_version(since), lambda: pd.DataFrame(_fetch_pages(lambda: (
+        _db().table("sales").select("id,item_name,quantity,date").gte("date", since).order("id")
+    )), columns=["id", "item_name", "quantity", "date"]))
+
+def _sales_version(since: str):
+    # Sales are only ever inserted or deleted, so without a change feed the
+    # count and newest id since `since` change whenever the rows do
+    versions = table_versions(["sales"])
+    if versions:
+        return versions["sales"]
+    res = _db().table("sales").select("id", count="exact").gte("date", since).order("id", desc=True).limit(1).execute()
+    return res.count, res.data[0]["id"] if res.data else None
+
+def demand_forecast(horizon: int = 28) -> pd.DataFrame:
+    """
+    Projected demand over the next `horizon` days and days of stock left for
+    every item, from the last FORECAST_HISTORY_DAYS of sales (see forecasting.py).
+    """
+    return forecasting.forecast_demand(_recent_sales(FORECAST_HISTORY_DAYS), view_items(), horizon, FORECAST_HISTORY_DAYS)
+
+def item_demand_series(item_name: str, horizon: int = 28) -> pd.DataFrame:
+    return forecasting.demand_series(_recent_sales(FORECAST_HISTORY_DAYS), item_name, horizon, FORECAST_HISTORY_DAYS)
+
 # ---------------- AUDIT LOG ----------------
+def flush_audit_log():
+    """Called at the end of each page run; the flush happens on the writer thread."""
+    audit_writer.request_flush()
+
+@_single_flight("audit_log")
 def view_audit_log(start_date=None, end_date=None):
-    if start_date and end_date:
-        res = supabase.table("audit_log").select("*").gte("timestamp", start_date).lte("timestamp", end_date).order("timestamp", desc=True).execute()
-    else:
-        res = supabase.table("audit_log").select("*").order("timestamp", desc=True).execute()
+    """
+    Audit entries between start_date and end_date, newest first.
+    With no dates only the hot window (last HOT_DAYS days) is read. Ranges that
+    reach back past the archive boundary also read the monthly archive files.
+    """
+    # Show this process's own recent actions; if Supabase is unreachable the
+    # entries stay spooled and the page shows what has been stored so far.
+    try:
+        audit_writer.flush()
+    except Exception:
+        pass
+    if not (start_date and end_date):
+        start_date = (datetime.now() - timedelta(days=audit_archive.HOT_DAYS)).isoformat()
+        end_date = None
+    start_date = str(start_date)
+    end_date = str(end_date) if end_date else None
+
+    # Rows before the archive boundary are read from the archive only, rows
+    # after it from the live table only, so a row being archived is never
+    # seen twice or missed
+    boundary = audit_archive.archived_before(audit_archive_store)
+    query = supabase.table("audit_log").select("*").gte("timestamp", max(start_date, boundary))
+    if end_date:
+        query = query.lte("timestamp", end_date)
+    df = pd.DataFrame(query.order("timestamp", desc=True).execute().data)
+
+    if boundary and start_date < boundary:
+        archived = audit_archive.read_archive(audit_archive_store, start_date, end_date)
+        if not archived.empty:
+            archived = archived[archived["timestamp"] < boundary]
+            df = (
+                pd.concat([df, archived], ignore_index=True)
+                .sort_values("timestamp", ascending=False)
+                .reset_index(drop=True)
+            )
+    return df
+
+def archive_old_audit_entries(older_than_days=None, page_size=1000):
+    """
+    Move audit rows from whole months older than `older_than_days` (default
+    audit_archive.HOT_DAYS) into monthly Parquet files in shared storage, then
+    delete them from Supabase. Every month is copied first; only then does
+    the archive boundary move (from then on readers take those rows from the
+    archive). Other processes may go on reading the old boundary for up to
+    audit_archive.BOUNDARY_TTL seconds, so the rows are deleted once the new
+    one has stood that long: in the background here, or by the next run if
+    this process stops first. Interrupted runs are safe to repeat.
+    Returns the number of rows archived.
+    """
+    cutoff = audit_archive.archive_cutoff(older_than_days)
+    # Copy, one month file at a time
+    copied = 0
+    month_start = None
+    while True:
+        query = supabase.table("audit_log").select("timestamp").lt("timestamp", cutoff)
+        if month_start:
+            query = query.gte("timestamp", month_start)
+        oldest = query.order("timestamp").limit(1).execute().data
+        if not oldest:
+            break
+        month_start = str(oldest[0]["timestamp"])[:7] + "-01"
+        month_end = min(_next_month(month_start), cutoff)
+        rows = _fetch_pages(lambda: (
+            supabase.table("audit_log").select("*")
+            .gte("timestamp", month_start).lt("timestamp", month_end).order("id")
+        ), page_size)
+        audit_archive.write_month_partitions(audit_archive_store, pd.DataFrame(rows))
+        copied += len(rows)
+        month_start = month_end
+    if month_start is not None:
+        audit_archive.mark_archived_before(audit_archive_store, cutoff)
+
+    # Rows below a boundary that has settled (including earlier runs' leftovers)
+    # go now, the rest once this run's boundary has settled too
+    _delete_archived_audit_rows(page_size)
+    if month_start is not None:
+        timer = threading.Timer(audit_archive.BOUNDARY_TTL, _delete_archived_audit_rows, args=(page_size,))
+        timer.daemon = True
+        timer.start()
+    return copied
+
+def _delete_archived_audit_rows(page_size=1000) -> int:
+    """Delete live audit rows below the settled archive boundary. Returns how many."""
+    settled = audit_archive.settled_before(audit_archive_store)
+    deleted = 0
+    while settled:
+        res = supabase.table("audit_log").select("id").lt("timestamp", settled).order("id").limit(page_size).execute()
+        if not res.data:
+            break
+        page_ids = [r["id"] for r in res.data]
+        supabase.table("audit_log").delete().in_("id", page_ids).execute()
+        deleted += len(page_ids)
+    return deleted
+
+def _next_month(month_start: str) -> str:
+    first = date.fromisoformat(month_start)
+    return (first.replace(day=28) + timedelta(days=4)).replace(day=1).isoformat()
+
+# ---------------- INVENTORY HISTORY ----------------
+# Stock at a past time is rebuilt from the nearest inventory checkpoint (a copy
+# of the items table, see migrations/supabase/007_inventory_checkpoints.sql)
+# plus the audit entries between the checkpoint and that time.
+INVENTORY_CHECKPOINT_HOURS = float(os.environ.get("DIANES_INVENTORY_CHECKPOINT_HOURS", "24"))
+
+_AUDIT_STOCK_COLUMNS = "timestamp,action,item_name,category,fridge_no,qty_delta"
+_checkpoint_lock = threading.Lock()
+_last_checkpoint_at = None  # taken_at of the newest checkpoint seen by this process
+
+def _audit_stamp(stamped_at: str) -> str:
+    """Audit timestamp (local time) of a stock write from the server time it returned."""
+    return datetime.fromisoformat(stamped_at).astimezone().replace(tzinfo=None).isoformat()
+
+def take_inventory_checkpoint():
+    """
+    Copy the current stock on Supabase into a new checkpoint, in one server
+    transaction (take_inventory_checkpoint() in migrations/supabase/019) that
+    stock writes wait on, so each write is either in the copy or audited
+    after it. In local-first mode it is skipped (returns None) while local
+    writes are still waiting to be replayed, since their audit entries are
+    already stored. Returns the checkpoint id.
+    """
+    global _last_checkpoint_at
+    if LOCAL_FIRST and local_store.pending_count():
+        return None
+    offset = datetime.now().astimezone().utcoffset()
+    checkpoint_id = supabase.rpc(
+        "take_inventory_checkpoint", {"p_utc_offset_seconds": int(offset.total_seconds())}
+    ).execute().data
+    _last_checkpoint_at = datetime.now().isoformat()
+    return checkpoint_id
+
+def maybe_take_inventory_checkpoint():
+    """
+    Take a checkpoint in the background when the newest one is older than
+    INVENTORY_CHECKPOINT_HOURS. Called at the end of each page run; cheap when
+    nothing is due.
+    """
+    global _last_checkpoint_at
+    due = datetime.now() - timedelta(hours=INVENTORY_CHECKPOINT_HOURS)
+    if _last_checkpoint_at is not None and _last_checkpoint_at > due.isoformat():
+        return
+    if not _checkpoint_lock.acquire(blocking=False):
+        return
+
+    def run():
+        global _last_checkpoint_at
+        try:
+            latest = _nearest_checkpoint(datetime.now().isoformat(), before=True)
+            _last_checkpoint_at = latest["taken_at"] if latest else None
+            if _last_checkpoint_at is None or _last_checkpoint_at <= due.isoformat():
+                take_inventory_checkpoint()
+        except Exception:
+            # Tried again on a later run
+            pass
+        finally:
+            _checkpoint_lock.release()
+
+    threading.Thread(target=run, name="inventory-checkpoint", daemon=True).start()
+
+def view_inventory_checkpoints() -> pd.DataFrame:
+    res = supabase.table("inventory_checkpoints").select("*").order("taken_at", desc=True).execute()
     return pd.DataFrame(res.data)
 
+def _nearest_checkpoint(when: str, before: bool):
+    query = supabase.table("inventory_checkpoints").select("*")
+    if before:
+        query = query.lte("taken_at", when).order("taken_at", desc=True)
+    else:
+        query = query.gt("taken_at", when).order("taken_at")
+    res = query.limit(1).execute()
+    return res.data[0] if res.data else None
+
+@functools.lru_cache(maxsize=8)
+def _checkpoint_stock(checkpoint_id) -> pd.DataFrame:
+    # Checkpoints never change, so month-end reports reuse the rows they read
+    rows = _fetch_pages(lambda: (
+        supabase.table("inventory_checkpoint_rows").select("*")
+        .eq("checkpoint_id", checkpoint_id).order("item_id")
+    ))
+    return inventory_history.stock_rows(pd.DataFrame(rows))
+
+def _audit_stock_entries(after: str, until: str) -> pd.DataFrame:
+    """
+    Audit rows with after < timestamp <= until: from the archive before its
+    boundary and from the live table after it (see view_audit_log()).
+    """
+    boundary = audit_archive.archived_before(audit_archive_store)
+    def live():
+        query = supabase.table("audit_log").select(_AUDIT_STOCK_COLUMNS)
+        query = query.gt("timestamp", after) if after >= boundary else query.gte("timestamp", boundary)
+        return query.lte("timestamp", until).order("timestamp")
+    rows = _fetch_pages(live)
+    df = pd.DataFrame(rows, columns=_AUDIT_STOCK_COLUMNS.split(","))
+    if boundary and after < boundary:
+        archived = audit_archive.read_archive(audit_archive_store, after, until)
+        if not archived.empty:
+            archived = archived[(archived["timestamp"] > after) & (archived["timestamp"] < boundary)]
+            df = pd.concat([df, archived.reindex(columns=df.columns)], ignore_index=True)
+    return df
+
+def inventory_as_of(when, fridge_no=None) -> pd.DataFrame:
+    """
+    Stock per item and fridge at `when` (a datetime, or a date meaning the end
+    of that day), in local time like the audit log timestamps. Starts from the
+    latest checkpoint at or before `when` and replays the audit entries since;
+    without one, starts from the earliest later checkpoint and undoes the
+    entries in between. Returns item_id, item_name, category, fridge_no,
+    quantity, optionally for one fridge only.
+    """
+    if isinstance(when, datetime):
+        when = when.isoformat()
+    elif isinstance(when, date):
+        when = f"{when.isoformat()}T23:59:59.999999"
+    when = str(when)
+    # Entries still in this process's write-behind buffer belong in the replay
+    try:
+        audit_writer.flush()
+    except Exception:
+        pass
+
+    checkpoint = _nearest_checkpoint(when, before=True)
+    if checkpoint is not None:
+        audit = _audit_stock_entries(checkpoint["taken_at"], when)
+        stock = inventory_history.replay(_checkpoint_stock(checkpoint["id"]), audit)
+    else:
+        checkpoint = _nearest_checkpoint(when, before=False)
+        if checkpoint is None:
+            raise ValueError("No inventory checkpoint has been taken yet")
+        audit = _audit_stock_entries(when, checkpoint["taken_at"])
+        stock = inventory_history.replay(_checkpoint_stock(checkpoint["id"]), audit, backward=True)
+
+    if fridge_no is not None:
+        stock = stock[stock["fridge_no"] == inventory_history.fridge_label(pd.Series([fridge_no]))[0]]
+    stock = inventory_history.fill_item_ids(stock, view_items())
+    return stock.reset_index(drop=True)
+
+# ---------------- BULK PURGES ----------------
+# Emptying a table runs as a background job that deletes in id ranges and
+# records its progress in purge_jobs (migrations/supabase/010_purge_jobs.sql),
+# so a page can show progress and a failed or abandoned job can be resumed.
+# Table -> summary audit entry (action, item_name, category)
+PURGE_TABLES = {
+    "items": ("Delete All Inventory", "ALL ITEMS", "ALL CATEGORIES"),
+    "customers": ("Delete All Customers", "ALL CUSTOMERS", "N/A"),
+}
+# A running job whose heartbeat is older than this was abandoned and may be resumed
+PURGE_STALE_SECONDS = 120
+
+_purge_lock = threading.Lock()
+_purge_threads = {}  # job id -> Thread running it in this process
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def start_purge(table: str, user: str, archive: bool = False) -> int:
+    """
+    Start deleting every row of `table` (one of PURGE_TABLES) in the
+    background, first saving each chunk to Parquet in purge_archive_store
+    when `archive` is set.
+    An unfinished job for the table is resumed from where it stopped instead
+    of starting a new one. Returns the job id.
+    """
+    if table not in PURGE_TABLES:
+        raise ValueError(f"Bulk purge is not supported for {table}")
+    job = _active_purge(table)
+    if job is None:
+        total = supabase.table(table).select(primary_key(table), count="exact").limit(1).execute().count
+        try:
+            job = supabase.table("purge_jobs").insert({
+                "table_name": table,
+                "status": "running",
+                "username": user,
+                "archive": bool(archive),
+                "total_rows": total or 0,
+                "deleted_rows": 0,
+                "heartbeat": _utc_now(),
+            }).execute().data[0]
+            job["heartbeat"] = None  # claimable by this process below
+        except Exception:
+            # Another process started a job for the table first; only one may be
+            # unfinished (purge_jobs_active_key, migrations/supabase/020), so resume it
+            job = _active_purge(table)
+            if job is None:
+                raise
+
+    with _purge_lock:
+        running = _purge_threads.get(job["id"])
+        if running is not None and running.is_alive():
+            return job["id"]
+        if not _claim_purge(job):
+            return job["id"]  # running in another process
+        thread = threading.Thread(target=_run_purge, args=(job,), name=f"purge-{table}", daemon=True)
+        _purge_threads[job["id"]] = thread
+        thread.start()
+    return job["id"]
+
+def _active_purge(table: str):
+    """The table's unfinished (running or failed) purge job, or None."""
+    res = (
+        supabase.table("purge_jobs").select("*")
+        .eq("table_name", table).in_("status", ["running", "failed"])
+        .order("id", desc=True).limit(1).execute()
+    )
+    return res.data[0] if res.data else None
+
+def _claim_purge(job) -> bool:
+    """Take over a job unless another process is still working on it."""
+    if job["heartbeat"] is not None and job["status"] == "running":
+        age = datetime.now(timezone.utc) - _parse_timestamp(job["heartbeat"])
+        if age < timedelta(seconds=PURGE_STALE_SECONDS):
+            return False
+    query = supabase.table("purge_jobs").update({"status": "running", "error": None, "heartbeat": _utc_now()}).eq("id", job["id"])
+    if job["heartbeat"] is not None:
+        # Only one process wins the update when several resume the same job
+        query = query.eq("heartbeat", job["heartbeat"])
+    return bool(query.execute().data)
+
+def _run_purge(job):
+    table, job_id = job["table_name"], job["id"]
+    deleted_rows = job["deleted_rows"] or 0
+
+    def archive(rows, first, last):
+        bulk_purge.archive_chunk(purge_archive_store, table, job_id, first, rows)
+
+    try:
+        for _, last, deleted in bulk_purge.delete_chunks(
+            supabase, table, primary_key(table), after=job["last_id"],
+            columns="*" if job["archive"] else None, before_delete=archive if job["archive"] else None,
+        ):
+            # Progress is saved after each chunk; a chunk deleted just before a crash is
+            # not re-deleted on resume, only missing from deleted_rows
+            deleted_rows += deleted
+            supabase.table("purge_jobs").update({
+                "last_id": last, "deleted_rows": deleted_rows, "heartbeat": _utc_now(),
+            }).eq("id", job_id).execute()
+
+        action, item_name, category = PURGE_TABLES[table]
+        _log_audit({
+            "item_name": item_name,
+            "category": category,
+            "action": action,
+            "quantity": deleted_rows,
+            "unit_cost": 0.00,
+            "selling_price": 0.00,
+            "username": job["username"] or "System"
+        })
+        supabase.table("purge_jobs").update({
+            "status": "done", "heartbeat": _utc_now(), "finished_at": _utc_now(),
+        }).eq("id", job_id).execute()
+    except Exception as e:
+        try:
+            supabase.table("purge_jobs").update({"status": "failed", "error": str(e)}).eq("id", job_id).execute()
+        except Exception:
+            pass  # Still "running" with an old heartbeat, so resumable once stale
+    finally:
+        _purged(table)
+        with _purge_lock:
+            _purge_threads.pop(job_id, None)
+
+def _purged(table):
+    if table == "items":
+        stock_alerts.invalidate()
+    if LOCAL_FIRST:
+        sync_worker.poke()
+    elif local_store is not None:
+        sync_table(table)
+    _tables_changed([table])
+
+def purge_status(job_id: int) -> dict:
+    res = supabase.table("purge_jobs").select("*").eq("id", job_id).execute()
+    return res.data[0] if res.data else {}
+
+def view_purge_jobs(table: str = None) -> pd.DataFrame:
+    query = supabase.table("purge_jobs").select("*")
+    if table:
+        query = query.eq("table_name", table)
+    return pd.DataFrame(query.order("id", desc=True).limit(20).execute().data)
+
+# ---------------- BACKGROUND JOBS ----------------
+# Imports, report generation and exports run on the job runner (jobs.py) so
+# the page that starts one returns at once; any page can follow its progress,
+# cancel it and download what it produced.
+JOBS_DIR = os.environ.get("DIANES_JOBS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs"))
+JOB_WORKERS = int(os.environ.get("DIANES_JOB_WORKERS", "2"))
+# Rows per progress step of an import
+IMPORT_CHUNK_SIZE = int(os.environ.get("DIANES_IMPORT_CHUNK_SIZE", "100"))
+
+job_runner = JobRunner(os.path.join(JOBS_DIR, "jobs.db"), os.path.join(JOBS_DIR, "results"), JOB_WORKERS)
+job_runner.prune()
+
+def _chunks(df: pd.DataFrame, size: int = IMPORT_CHUNK_SIZE):
+    for start in range(0, len(df), size):
+        yield start, df.iloc[start:start + size]
+
+def _import_pricing(ctx, df: pd.DataFrame) -> str:
+    skipped = []
+    for start, chunk in _chunks(df):
+        ctx.progress(start / len(df), f"{start:,} of {len(df):,} rows")
+        skipped += upload_tiered_pricing_to_db(chunk)
+    if skipped:
+        return f"Pricing tiers updated. Skipped rows with invalid item_id(s): {skipped}"
+    return "Pricing Tiers updated or inserted successfully!"
+
+def submit_pricing_upload(df: pd.DataFrame, user: str) -> str:
+    """Upload a tiered pricing file (see upload_tiered_pricing_to_db) as a job. Returns the job id."""
+    return job_runner.submit("pricing_upload", f"Pricing upload ({len(df):,} rows)", _import_pricing, df, owner=user)
+
+def _import_items(ctx, df: pd.DataFrame, user: str) -> str:
+    for start, chunk in _chunks(df):
+        ctx.progress(start / len(df), f"{start:,} of {len(df):,} rows")
+        for row in chunk.itertuples(index=False):
+            add_or_update_item(None, row.item_name.strip().upper(), row.category.strip().upper(),
+                               row.quantity, row.fridge_no, user)
+    return f"{len(df):,} item(s) updated or inserted successfully!"
+
+def submit_item_import(df: pd.DataFrame, user: str) -> str:
+    """Add or update every row of an items file as a job. Returns the job id."""
+    return job_runner.submit("item_import", f"Items upload ({len(df):,} rows)", _import_items, df, user, owner=user)
+
+def _soa_report(ctx, customer_id, customer_name, start_date, end_date) -> str:
+    ctx.progress(0.1, "Reading sales")
+    sales_customer = get_sales_by_customer(customer_id, start_date, end_date)
+    if not sales_customer.empty and "date" in sales_customer.columns:
+        sales_customer = sales_customer[["date"] + [c for c in sales_customer.columns if c != "date"]]
+    ctx.progress(0.5, "Building PDF")
+    ctx.save_result(reports.soa_pdf(customer_id, customer_name, start_date, end_date, sales_customer),
+                    f"SOA_{customer_id}_{start_date}_{end_date}.pdf", "application/pdf")
+    return f"Statement of Account ready ({len(sales_customer):,} sale(s))"
+
+def submit_soa_report(customer_id: int, customer_name: str, start_date, end_date, user: str) -> str:
+    return job_runner.submit("soa", f"SOA for {customer_name}", _soa_report,
+                             customer_id, customer_name, start_date, end_date, owner=user)
+
+def _po_report(ctx, customer_id, order_date, pickup_date_sql) -> str:
+    order_date_sql = order_date.strftime("%Y-%m-%d") if isinstance(order_date, date) else str(order_date)
+    ctx.progress(0.1, "Reading sales")
+    sales_df = view_sales_by_customer(customer_id)
+    order_lines = sales_df[sales_df["date"] == order_date] if not sales_df.empty else sales_df
+    seq = get_po_sequence(order_date_sql)
+    po_number = f"PO-{order_date_sql.replace('-', '')}-{seq:03d}"
+    safe_name = get_customer(customer_id).get("name", "").replace(" ", "_").replace("/", "_")
+    ctx.progress(0.5, "Building PDF")
+    ctx.save_result(reports.po_pdf(po_number, order_date_sql, pickup_date_sql, order_lines),
+                    f"PO_{order_date_sql.replace('-', '')}_{safe_name}.pdf", "application/pdf")
+    return f"{po_number} ready"
+
+def submit_po_report(customer_id: int, order_date, pickup_date_sql: str, user: str) -> str:
+    return job_runner.submit("po", f"Purchase order for customer {customer_id} ({order_date})", _po_report,
+                             customer_id, order_date, pickup_date_sql, owner=user)
+
+def _csv_export(ctx, fetch, file_name) -> str:
+    ctx.progress(0.1, "Reading")
+    df = fetch()
+    ctx.progress(0.6, f"Writing {len(df):,} rows")
+    ctx.save_result(df.to_csv(index=False), file_name, "text/csv")
+    return f"{len(df):,} row(s) exported"
+
+def submit_csv_export(title: str, fetch, file_name: str, user: str) -> str:
+    """Export fetch()'s DataFrame as CSV in a job. Returns the job id."""
+    return job_runner.submit("csv_export", title, _csv_export, fetch, file_name, owner=user)
+
+def view_jobs(user: str = None, limit: int = 10) -> pd.DataFrame:
+    return job_runner.jobs(user, limit)
+
+def job_status(job_id: str) -> dict:
+    return job_runner.status(job_id)
+
+def cancel_job(job_id: str):
+    job_runner.cancel(job_id)
+
+def job_result(job_id: str):
+    """(load, file name, mime type) of a finished job's output, or None; load() reads its bytes."""
+    return job_runner.result(job_id)
+
 # ---------------- PRICE HISTORY ----------------
+@_queued_write("price_history")
 def create_price_history_entry(item_id, old_qty, new_qty, old_uc, old_sp, new_uc, new_sp, user):
-    supabase.table("price_history").insert({
+    _db().rpc("insert_once", {"p_table": "price_history", "p_row": {
         "item_id": item_id,
         "old_quantity": old_qty,
         "new_price_quantity": new_qty,
@@ -480,60 +1493,458 @@ def create_price_history_entry(item_id, old_qty, new_qty, old_uc, old_sp, new_uc
         "new_selling_price": new_sp,
         "changed_by": user,
         "timestamp": datetime.now().isoformat()
-    }).execute()
+    }, "p_client_key": _replay_key()}).execute()
 
 
 
 #----------------- PRICING TIERS ----------------
+@_single_flight("pricing_tiers")
 def get_pricing_tiers(item_id: int):
     """Fetch pricing tiers for a given item_id, ordered by min_qty."""
-    res = supabase.table("pricing_tiers").select("*").eq("item_id", item_id).order("min_qty").execute()
+    res = _db().table("pricing_tiers").select("*").eq("item_id", item_id).order("min_qty").execute()
     return pd.DataFrame(res.data)
 
-def save_pricing_tier(item_id: int, min_qty: int, max_qty: int, price_per_unit: float, label: str):
+def _upsert_pricing_tier(item_id, min_qty, max_qty, price_per_unit, label) -> tuple:
+    # One statement on the (item_id, min_qty, max_qty) key; max_qty 0 means unlimited
+    res = _db().rpc("upsert_pricing_tier", {
+        "p_item_id": item_id,
+        "p_min_qty": min_qty,
+        "p_max_qty": max_qty or None,
+        "p_price_per_unit": price_per_unit,
+        "p_label": label
+    }).execute()
+    return _upserted(res)[0]
+
+@_queued_write("pricing_tiers", "price_versions")
+def save_pricing_tier(item_id: int, min_qty: int, max_qty: int, price_per_unit: float, label: str,
+                      valid_from: str = None):
     """Insert or update a pricing tier."""
-    if max_qty == 0:
-        existing = (
-            supabase.table("pricing_tiers")
-            .select("*")
-            .eq("item_id", item_id)
-            .eq("min_qty", min_qty)
-            .is_("max_qty", None)
-            .execute()
-        )
+    row, inserted = _upsert_pricing_tier(item_id, min_qty, max_qty, price_per_unit, label.strip().upper())
+    _record_price_versions("tier", [row], valid_from=valid_from)
+    return "inserted" if inserted else "updated"
+
+@_queued_write("pricing_tiers", "price_versions")
+def delete_pricing_tier(tier_id: int, valid_from: str = None):
+    """Delete a pricing tier by ID."""
+    res = _db().table("pricing_tiers").delete().eq("id", tier_id).execute()
+    _record_price_versions("tier", res.data, deleted=True, valid_from=valid_from)
+    return True
+# ---------------- PRICE VERSIONS ----------------
+# Every pricing tier and special price is versioned in price_versions with a
+# validity interval [valid_from, valid_to); the open version has valid_to null.
+# Writes that version prices take valid_from, which _queued_write fills in with
+# the time of the edit so a replay made later still dates the version from it.
+_PRICE_VERSION_FIELDS = {
+    "tier": {"item_id": "item_id", "min_qty": "min_qty", "max_qty": "max_qty", "label": "label",
+             "price_per_unit": "price_per_unit"},
+    "special": {"item_id": "item_id", "customer_id": "customer_id", "price_per_unit": "custom_price"},
+}
+
+def _record_price_versions(kind: str, rows: list, deleted: bool = False, valid_from: str = None):
+    """
+    Close the open version of each changed tier or special price and, unless it
+    was deleted, open a new one from the row as written, valid from
+    `valid_from` (default now). Rows whose price fields did not change keep
+    their open version. One server call (migrations/supabase/018).
+    """
+    if not rows:
+        return
+    fields = _PRICE_VERSION_FIELDS[kind]
+    _db().rpc("record_price_versions", {
+        "p_kind": kind,
+        "p_rows": [{"source_id": r["id"], **{column: r.get(source) for column, source in fields.items()}} for r in rows],
+        "p_deleted": deleted,
+        "p_valid_from": valid_from,
+    }).execute()
+
+def _as_of_timestamp(when) -> str:
+    """
+    UTC ISO timestamp for an as-of lookup (UTC so it also compares correctly as
+    text in the SQLite mirror). A date means the end of that day, so changes
+    made during it count; naive times are local.
+    """
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when) if "T" in when or " " in when else date.fromisoformat(when)
+    if not isinstance(when, datetime):
+        when = datetime.combine(when, datetime.max.time())
+    return (when if when.tzinfo else when.astimezone()).astimezone(timezone.utc).isoformat()
+
+@_single_flight("price_versions")
+def view_price_versions(item_ids=None, start=None, end=None) -> pd.DataFrame:
+    """Price versions (for item_ids, if given) that were valid at any time between start and end."""
+    query = lambda: _price_version_query(item_ids, start, end).order("id")
+    return pd.DataFrame(_fetch_pages(query), columns=_PRICE_VERSION_COLUMNS)
+
+_PRICE_VERSION_COLUMNS = [
+    "id", "kind", "source_id", "item_id", "customer_id", "min_qty", "max_qty", "label",
+    "price_per_unit", "valid_from", "valid_to",
+]
+
+def _price_version_query(item_ids, start, end):
+    query = _db().table("price_versions").select(", ".join(_PRICE_VERSION_COLUMNS))
+    if item_ids is not None:
+        query = query.in_("item_id", [int(i) for i in item_ids])
+    if end is not None:
+        query = query.lte("valid_from", _as_of_timestamp(end))
+    if start is not None:
+        query = query.or_(f"valid_to.is.null,valid_to.gt.{_as_of_timestamp(start)}")
+    return query
+
+@_single_flight("price_versions", "pricing_tiers")
+def price_as_of(item_id: int, quantity, when, customer_id: int = None) -> float:
+    """
+    The unit price `customer_id` would have been charged for `quantity` of
+    `item_id` at `when` (a date or datetime): their special price if one was
+    in effect, else the matching tier price, as get_customer_adjusted_price()
+    decides today. 0.0 if no price was in effect. Served by the
+    (item_id, kind, valid_from) index on price_versions.
+    """
+    ts = _as_of_timestamp(when)
+    valid = lambda q: q.lte("valid_from", ts).or_(f"valid_to.is.null,valid_to.gt.{ts}")
+    if customer_id is not None:
+        special = valid(
+            _db().table("price_versions").select("price_per_unit")
+            .eq("item_id", item_id).eq("kind", "special").eq("customer_id", customer_id)
+        ).order("valid_from", desc=True).limit(1).execute().data
+        if special:
+            return float(special[0]["price_per_unit"])
+    tier = valid(
+        _db().table("price_versions").select("price_per_unit")
+        .eq("item_id", item_id).eq("kind", "tier").lte("min_qty", quantity)
+        .or_(f"max_qty.is.null,max_qty.eq.0,max_qty.gte.{quantity}")
+    ).order("min_qty", desc=True).limit(1).execute().data
+    return float(tier[0]["price_per_unit"]) if tier else 0.0
+
+def annotate_sales_with_prices(sales_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bulk price_as_of(): adds price_as_of (NaN where no price was in effect)
+    and price_source ("special", "tier" or None) to every sales line, from one
+    read of the price versions that overlap the sales' dates.
+    """
+    if sales_df.empty:
+        return sales_df.assign(price_as_of=pd.Series(dtype=float), price_source=pd.Series(dtype=object))
+    versions = view_price_versions(
+        sales_df["item_id"].dropna().unique().tolist(), sales_df["date"].min(), sales_df["date"].max()
+    )
+    when = pd.to_datetime(sales_df["date"].map(_as_of_timestamp), utc=True)
+    return price_versions.annotate(sales_df, when, versions)
+
+
+# ---------------- LOCAL-FIRST SYNC ----------------
+# Writes that overwrite fields (rather than add to a quantity) keep a copy of the
+# row as the local mirror saw it. If the server row no longer matches that copy
+# when the write is replayed, someone else changed it and the write is held back
+# as a conflict instead of silently overwriting their change.
+_CONFLICT_CHECKS = {
+    "save_customer": ("customers", ["name", "phone", "email", "address", "group_id"]),
+    "update_customer": ("customers", ["phone", "email", "address"]),
+    "update_price": ("customer_price_list", ["custom_price"]),
+    "set_special_price": ("customer_price_list", ["custom_price"]),
+}
+
+def _conflict_key(op, args):
+    if op == "save_customer":
+        return {"id": int(args["customer_id"])} if args.get("customer_id") else None
+    if op == "update_customer":
+        return {"name": args["name"].upper()}
+    if op in ("update_price", "set_special_price"):
+        return {"customer_id": int(args["customer_id"]), "item_id": int(args["item_id"])}
+    return None
+
+def _conflict_base(op, args):
+    key = _conflict_key(op, args) if op in _CONFLICT_CHECKS else None
+    return local_store.row(_CONFLICT_CHECKS[op][0], **key) if key else None
+
+def _same(a, b) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    try:
+        return float(a) == float(b)
+    except (TypeError, ValueError):
+        return str(a) == str(b)
+
+def _check_conflict(op, args, base):
+    if base is None:
+        return
+    table, fields = _CONFLICT_CHECKS[op]
+    query = supabase.table(table).select("*")
+    for column, value in _conflict_key(op, args).items():
+        query = query.eq(column, value)
+    res = query.execute()
+    if not res.data:
+        raise SyncConflict(f"{table} record was deleted on the server")
+    changed = [f for f in fields if not _same(res.data[0].get(f), base.get(f))]
+    if changed:
+        raise SyncConflict(f"{table} record changed on the server since it was edited here: {', '.join(changed)}")
+
+# How a row created offline (negative id) is found on the server, by the id
+# argument that refers to it: (table, primary key, natural key)
+_LOCAL_ID_KEYS = {
+    "item_id": ("items", "item_id", ["item_name", "category", "fridge_no"]),
+    "customer_id": ("customers", "id", ["name"]),
+    "record_id": ("customer_price_list", "id", ["customer_id", "item_id"]),
+    "tier_id": ("pricing_tiers", "id", ["item_id", "min_qty", "max_qty"]),
+}
+
+def _is_local_id(value) -> bool:
+    return str(value).lstrip("-").isdigit() and int(value) < 0
+
+def _local_rows(value, key=None, rows=None) -> dict:
+    """
+    Mirror rows behind the ids created offline in a queued call's arguments,
+    by "key:id", so they can still be found on the server when the call is
+    replayed after the mirror row is gone (e.g. a tier added, then deleted).
+    """
+    rows = {} if rows is None else rows
+    if key in _LOCAL_ID_KEYS and _is_local_id(value):
+        if f"{key}:{int(value)}" not in rows:
+            table, pk, natural_key = _LOCAL_ID_KEYS[key]
+            row = rows[f"{key}:{int(value)}"] = local_store.row(table, **{pk: int(value)})
+            if row:
+                for column in natural_key:
+                    _local_rows(row[column], column, rows)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            _local_rows(v, k, rows)
+    elif isinstance(value, list):
+        for v in value:
+            _local_rows(v, None, rows)
+    elif isinstance(value, pd.DataFrame) and "item_id" in value.columns:
+        for v in value["item_id"]:
+            _local_rows(v, "item_id", rows)
+    return rows
+
+def _server_id(key, local_id, local_rows):
+    """Map a row created offline (negative id) to the id Supabase gave it, by natural key."""
+    table, pk, natural_key = _LOCAL_ID_KEYS[key]
+    row = local_rows.get(f"{key}:{int(local_id)}") or local_store.row(table, **{pk: int(local_id)})
+    res = None
+    if row:
+        query = supabase.table(table).select(pk)
+        for column in natural_key:
+            value = _resolve_local_ids(row[column], column, local_rows)
+            query = query.is_(column, None) if value is None else query.eq(column, value)
+        res = query.execute()
+    if not res or not res.data:
+        raise SyncConflict(f"{key} {local_id} was created offline but not found on the server")
+    return res.data[0][pk]
+
+def _resolve_local_ids(value, key=None, local_rows=None):
+    local_rows = local_rows or {}
+    if key in _LOCAL_ID_KEYS and _is_local_id(value):
+        return _server_id(key, value, local_rows)
+    if isinstance(value, dict):
+        return {k: _resolve_local_ids(v, k, local_rows) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_local_ids(v, None, local_rows) for v in value]
+    if isinstance(value, pd.DataFrame) and "item_id" in value.columns:
+        return value.assign(item_id=[_resolve_local_ids(v, "item_id", local_rows) for v in value["item_id"]])
+    return value
+
+def _parse_timestamp(value: str) -> datetime:
+    ts = datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.astimezone()
+
+def _fetch_pages(query_fn, page_size=1000) -> list:
+    """Read every row of a query in pages (PostgREST caps a single response)."""
+    rows, start = [], 0
+    while True:
+        page = query_fn().range(start, start + page_size - 1).execute().data
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+def primary_key(table: str) -> str:
+    return local_store.client.primary_key(table) if local_store else _PRIMARY_KEYS.get(table, "id")
+
+def latest_tombstone(table: str):
+    """Newest deleted_at recorded for a table, or None."""
+    res = (
+        supabase.table("deleted_rows")
+        .select("deleted_at")
+        .eq("table_name", table)
+        .order("deleted_at", desc=True)
+        .limit(1)
+        .execute()
+    )
+    return res.data[0]["deleted_at"] if res.data else None
+
+def fetch_changes(table: str, watermark, deleted_watermark):
+    """
+    Rows of `table` changed since `watermark` and ids deleted since
+    `deleted_watermark`. Returns (rows, deleted_ids, watermark, deleted_watermark)
+    with the watermarks advanced past what was returned.
+    """
+    # Both reads start a few seconds behind their watermark so rows committed
+    # late with an earlier timestamp are not skipped; applying them twice is harmless.
+    overlap = lambda ts: (_parse_timestamp(ts) - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+
+    tombstones = supabase.table("deleted_rows").select("row_id, deleted_at").eq("table_name", table)
+    if deleted_watermark:
+        tombstones = tombstones.gte("deleted_at", overlap(deleted_watermark))
+    deleted = tombstones.order("deleted_at").execute().data
+    deleted_ids = [d["row_id"] for d in deleted]
+    if deleted:
+        deleted_watermark = max(deleted[-1]["deleted_at"], deleted_watermark or "")
+
+    query = lambda: supabase.table(table).select("*")
+    if watermark:
+        query = lambda: supabase.table(table).select("*").gte("updated_at", overlap(watermark))
+    rows = _fetch_pages(lambda: query().order("updated_at").order(primary_key(table)))
+    stamps = [r["updated_at"] for r in rows if r.get("updated_at")]
+    if stamps:
+        watermark = max(stamps + ([watermark] if watermark else []))
+    return rows, deleted_ids, watermark, deleted_watermark
+
+def sync_table(table: str, full: bool = False) -> dict:
+    """
+    Bring one mirrored table up to date with the server.
+
+    Normally only rows whose updated_at is past the table's watermark, and
+    tombstones in deleted_rows past the delete watermark, are fetched and
+    merged, so the cost follows the number of changes rather than the table
+    size. A full copy is pulled instead when the table has never been synced,
+    when the watermark is older than the server's tombstone retention, or when
+    full=True. Returns {"mode", "changed", "deleted", "applied"}.
+    """
+    state = local_store.sync_state(table)
+    if state and state["watermark"] and not full:
+        age = datetime.now().astimezone() - _parse_timestamp(state["watermark"])
+        full = age > timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    else:
+        full = True
+    pk = primary_key(table)
+
+    if full:
+        # Tombstone watermark first: a delete after this point is picked up next sync
+        deleted_ids, deleted_watermark = [], latest_tombstone(table)
+        rows = _fetch_pages(lambda: supabase.table(table).select("*").order(pk))
+        watermarks = [r["updated_at"] for r in rows if r.get("updated_at")]
+        watermark = max(watermarks) if watermarks else None
     else:
-        existing = (
-            supabase.table("pricing_tiers")
-            .select("*")
-            .eq("item_id", item_id)
-            .eq("min_qty", min_qty)
-            .eq("max_qty", max_qty)
-            .execute()
+        rows, deleted_ids, watermark, deleted_watermark = fetch_changes(
+            table, state["watermark"], state["deleted_watermark"]
         )
+    applied = local_store.merge_if_idle(table, rows, deleted_ids, watermark, deleted_watermark, full=full)
+    return {"mode": "full" if full else "delta", "changed": len(rows), "deleted": len(deleted_ids), "applied": applied}
 
-    if existing.data:
-        if max_qty == 0:
-            supabase.table("pricing_tiers").update({
-                "price_per_unit": price_per_unit,
-                "label": label.strip().upper()
-            }).eq("item_id", item_id).eq("min_qty", min_qty).is_("max_qty", None).execute()
+def sync_mirror(full: bool = False) -> dict:
+    """Delta-sync every mirrored table. Returns sync_table() results by table."""
+    return {table: sync_table(table, full=full) for table in MIRROR_SCHEMA}
+
+_sync_lock = threading.Lock()
+
+def _applied_keys(keys) -> set:
+    """Client keys of queued writes the server has applied (migrations/supabase/017)."""
+    res = supabase.table("applied_writes").select("client_key").in_("client_key", list(keys)).execute()
+    return {r["client_key"] for r in res.data}
+
+def sync_local_changes(batch_size=SYNC_BATCH_SIZE) -> int:
+    """
+    Replay queued local writes on Supabase, oldest first, `batch_size` at a time.
+    A network/server error stops the run so later writes never overtake earlier
+    ones; conflicts, and writes the server refuses for any other reason, are
+    set aside for review and the run continues. Every write carries a client
+    key the server records when it applies it, so a write replayed again
+    after a crash or a lost response is not applied twice. Once the queue is
+    empty the mirror is delta-synced from the server.
+    Returns the number of queued writes processed.
+    """
+    processed = 0
+    with _sync_lock:
+        try:
+            while True:
+                ops = local_store.pending(batch_size)
+                if not ops:
+                    break
+                applied = _applied_keys(op["client_key"] for op in ops)
+                for op in ops:
+                    try:
+                        if op["client_key"] not in applied:
+                            with _use_client(supabase, replaying=True, write_key=op["client_key"]):
+                                args = _resolve_local_ids(op["args"], local_rows=op["local_rows"])
+                                _check_conflict(op["op"], args, op["base"])
+                                result = _QUEUED_WRITES[op["op"]](**args)
+                            if _rejected(result):
+                                raise SyncConflict(f"Rejected by the server: {result}")
+                            supabase.table("applied_writes").upsert(
+                                {"client_key": op["client_key"], "op": op["op"]},
+                                on_conflict="client_key", ignore_duplicates=True,
+                            ).execute()
+                        local_store.mark_synced(op["seq"])
+                    except SyncConflict as e:
+                        local_store.mark_conflict(op["seq"], str(e))
+                    except Exception as e:
+                        if is_transient(e):
+                            raise
+                        # Refused by the server (a constraint, a missing row, bad data):
+                        # retrying cannot help, and it must not hold up the writes after it
+                        local_store.mark_conflict(op["seq"], f"{type(e).__name__}: {e}")
+                    processed += 1
+            local_store.prune_synced()
+            sync_mirror()
+            local_store.last_sync, local_store.last_error = datetime.now(), None
+        except Exception as e:
+            local_store.last_error = str(e)
+            raise
+    return processed
+
+def local_sync_status() -> dict:
+    if not LOCAL_FIRST:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "pending": local_store.pending_count(),
+        "conflicts": local_store.conflicts(),
+        "last_sync": local_store.last_sync,
+        "last_error": local_store.last_error,
+    }
+
+def dismiss_sync_conflict(seq: int):
+    local_store.dismiss_conflict(seq)
+
+sync_worker = SyncWorker(sync_local_changes, SYNC_INTERVAL) if LOCAL_FIRST else None
+if sync_worker:
+    sync_worker.poke()
+
+
+# ---------------- CHANGE FEED ----------------
+def _start_change_feed():
+    def on_events(events):
+        changed = cache.apply(events)
+        stock_alerts.apply(events, _load_rows)
+        if shared_store is not None and changed:
+            # Processes that load these tables later must not start from the old snapshot
+            shared_store.invalidate(changed)
+
+    if LOCAL_FIRST:
+        cache = TableCache(_load_table, _load_rows, primary_key)
+        feed = SQLiteTriggerChangeFeed(LOCAL_DB_PATH, list(MIRROR_SCHEMA), primary_key, on_events)
+    elif CHANGE_FEED in ("poll", "realtime"):
+        if CHANGE_FEED == "realtime":
+            feed = RealtimeChangeFeed(
+                SUPABASE_URL, SUPABASE_KEY, list(MIRROR_SCHEMA), fetch_changes, latest_tombstone,
+                primary_key, on_events,
+            )
         else:
-            supabase.table("pricing_tiers").update({
-                "price_per_unit": price_per_unit,
-                "label": label.strip().upper()
-            }).eq("item_id", item_id).eq("min_qty", min_qty).eq("max_qty", max_qty).execute()
-        return "updated"
+            feed = PollingChangeFeed(
+                fetch_changes, latest_tombstone, primary_key, on_events, interval=CHANGE_FEED_INTERVAL,
+            )
+        cache = TableCache(_load_cached_table, _load_rows, primary_key, on_load=feed.track)
     else:
-        supabase.table("pricing_tiers").insert({
-            "item_id": item_id,
-            "min_qty": min_qty,
-            "max_qty": None if max_qty == 0 else max_qty,
-            "price_per_unit": price_per_unit,
-            "label": label.strip().upper()
-        }).execute()
-        return "inserted"
+        return None, None
+    return cache, feed.start()
 
-def delete_pricing_tier(tier_id: int):
-    """Delete a pricing tier by ID."""
-    supabase.table("pricing_tiers").delete().eq("id", tier_id).execute()
-    return True
\ No newline at end of file
+# Kept current by the change feed when one runs, else reloaded periodically
+stock_alerts = StockAlerts(
+    view_items, view_stock_thresholds,
+    max_age=None if LOCAL_FIRST or CHANGE_FEED in ("poll", "realtime") else STOCK_ALERT_REFRESH,
+)
+table_cache, change_feed = _start_change_feed()
+
+# ---------------- PROFILING ----------------
+# With DIANES_PROFILE set, every public function here is timed within the
+# rerun that calls it (see rerun_profiler); Drinks.py imports the wrappers
+if rerun_profiler.ENABLED:
+    rerun_profiler.instrument(globals(), __name__)
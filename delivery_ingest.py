@@ -0,0 +1,147 @@
+"""
+Delivery receipt ingestion: rasterize manifest PDFs, decode their barcodes on a
+process pool and turn the codes into a reviewable stock-in batch.
+
+Dry-run benchmark over a folder of sample images/PDFs (no database access):
+    python delivery_ingest.py samples/ --workers 4 --repeat 3
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import fitz  # pymupdf
+import numpy as np
+import pandas as pd
+
+from barcode_scan import decode_image, tally_scans
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff"}
+PDF_ZOOM = 2.0  # ~144 dpi, enough for 1D barcodes on a phone-scanned manifest
+
+
+# ---------------- RASTERIZING ----------------
+def _load_source(source):
+    """source is either a file path or the raw bytes of an uploaded file."""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return f.read()
+    return source
+
+def _open_pdf(source):
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+def _page_count(source) -> int:
+    with _open_pdf(source) as doc:
+        return doc.page_count
+
+def rasterize_pdf_page(source, page_no: int, zoom: float = PDF_ZOOM):
+    """Render one page of a PDF (a path or the file's bytes) to a grayscale image array."""
+    with _open_pdf(source) as doc:
+        pix = doc[page_no].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY)
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width)
+
+
+# ---------------- DECODING ----------------
+def _decode_task(task):
+    """Process-pool worker: (label, source, page_no) → (label, codes)."""
+    label, source, page_no = task
+    if page_no is None:
+        image = cv2.imdecode(np.frombuffer(_load_source(source), dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    else:
+        image = rasterize_pdf_page(source, page_no)
+    return label, decode_image(image)
+
+def build_tasks(files, spool_dir: str):
+    """
+    Expand (name, source) pairs into one decode task per image or PDF page.
+    PDF tasks carry a path, never the document's bytes: uploaded PDFs are
+    written once to `spool_dir` and each page's worker opens the file there.
+    Unsupported file types are skipped.
+    """
+    tasks = []
+    for number, (name, source) in enumerate(files):
+        ext = os.path.splitext(name)[1].lower()
+        if ext == ".pdf":
+            if not isinstance(source, str):
+                path = os.path.join(spool_dir, f"{number}.pdf")
+                with open(path, "wb") as f:
+                    f.write(source)
+                source = path
+            for page_no in range(_page_count(source)):
+                tasks.append((f"{name} p{page_no + 1}", source, page_no))
+        elif ext in IMAGE_EXTENSIONS:
+            tasks.append((name, source, None))
+    return tasks
+
+def decode_files(files, max_workers=None):
+    """
+    Decode all barcodes in the given files across a process pool.
+    Returns (list of (label, codes), stats dict with images and images_per_sec).
+    """
+    start = time.perf_counter()
+    spool_dir = tempfile.mkdtemp(prefix="dianes_delivery_")
+    try:
+        tasks = build_tasks(files, spool_dir)
+        results = []
+        if tasks:
+            workers = max_workers or os.cpu_count() or 1
+            chunksize = max(1, len(tasks) // (workers * 4))
+            # Spawned, not forked: the app process already runs threads (audit
+            # writer, job runner, sync and decoder threads), and forking a
+            # threaded process can deadlock the child on a lock held mid-fork
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results = list(pool.map(_decode_task, tasks, chunksize=chunksize))
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    elapsed = time.perf_counter() - start
+    stats = {
+        "images": len(tasks),
+        "barcodes": sum(len(codes) for _, codes in results),
+        "seconds": round(elapsed, 3),
+        "images_per_sec": round(len(tasks) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+    return results, stats
+
+
+# ---------------- STOCK-IN BATCH ----------------
+def ingest_delivery(files, barcode_index: dict, max_workers=None):
+    """
+    Decode a delivery's manifests and aggregate the codes into a stock-in batch.
+    Nothing is written; the caller reviews the batch and applies it with
+    add_or_update_items_batch().
+    """
+    decoded, stats = decode_files(files, max_workers=max_workers)
+    scans = [{"barcode": code, "source": label} for label, codes in decoded for code in codes]
+    batch_df, unknown = tally_scans(scans, barcode_index)
+    pages_df = pd.DataFrame(
+        [{"source": label, "barcodes": len(codes)} for label, codes in decoded],
+        columns=["source", "barcodes"],
+    )
+    return {"batch": batch_df, "unknown": unknown, "pages": pages_df, "stats": stats}
+
+def benchmark(directory: str, max_workers=None, repeat: int = 1) -> list:
+    """Dry run: decode every image/PDF in a directory and report throughput per run."""
+    files = [
+        (name, os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if os.path.isfile(os.path.join(directory, name))
+    ]
+    return [decode_files(files, max_workers=max_workers)[1] for _ in range(repeat)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark barcode decoding over sample delivery images.")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+    for run, stats in enumerate(benchmark(args.directory, args.workers, args.repeat), start=1):
+        print(f"run {run}: {stats['images']} images, {stats['barcodes']} barcodes, "
+              f"{stats['seconds']}s, {stats['images_per_sec']} images/sec")
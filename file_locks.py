@@ -0,0 +1,27 @@
+import os
+
+# Exclusive, non-blocking locks on open files that the OS drops when the
+# process holding them dies, whatever pid the next process gets: flock on
+# POSIX, msvcrt.locking on Windows. Used to tell files of a live process
+# (audit spools, job runners) from those a crashed one left behind.
+if os.name == "nt":
+    import msvcrt
+
+    def try_lock(f) -> bool:
+        """Lock the open file `f`. False if another process holds it."""
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            return False
+        return True
+else:
+    import fcntl
+
+    def try_lock(f) -> bool:
+        """Lock the open file `f`. False if another process holds it."""
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
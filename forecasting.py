@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+# Seasonal period of the daily series (day of week)
+SEASON = 7
+# Level smoothing factors tried per item; each item keeps the one with the
+# smallest one-step-ahead error over its history
+ALPHAS = np.array([0.05, 0.1, 0.2, 0.3, 0.5])
+GAMMA = 0.1   # seasonal smoothing
+BETA = 0.02   # trend smoothing
+PHI = 0.9     # trend damping, so a recent run does not extrapolate forever
+
+FORECAST_COLUMNS = [
+    "item_name", "stock", "units_per_day", "forecast_7d", "forecast_horizon", "days_left", "stockout_date",
+]
+
+
+def demand_matrix(sales: pd.DataFrame, start, end):
+    """
+    Units sold per day and item as a dense (days x items) float matrix, with
+    zero for days without sales. Items are keyed by item_name, the way
+    record_sale() draws stock. Returns (dates, item_names, matrix).
+    """
+    dates = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+    if sales.empty:
+        return dates, pd.Index([], dtype=object), np.zeros((len(dates), 0))
+    day = pd.to_datetime(sales["date"].astype(str).str[:10], format="%Y-%m-%d", errors="coerce")
+    quantity = pd.to_numeric(sales["quantity"], errors="coerce")
+    keep = day.between(dates[0], dates[-1]) & quantity.notna() & sales["item_name"].notna()
+    codes, names = pd.factorize(sales.loc[keep, "item_name"], sort=True)
+    rows = ((day[keep] - dates[0]).dt.days).to_numpy()
+    flat = np.bincount(rows * len(names) + codes, weights=quantity[keep].to_numpy(dtype=float),
+                       minlength=len(dates) * len(names))
+    return dates, pd.Index(names), flat.reshape(len(dates), len(names))
+
+def fit_forecast(history: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    Damped-trend additive Holt-Winters (weekly season) for every column of
+    `history` (days x items) at once, returning a (horizon x items) forecast.
+
+    The recursion steps over days; each step updates all items, and all the
+    candidate alphas, as one array operation. Series shorter than two
+    seasons are fitted without a season.
+    """
+    days, n_items = history.shape
+    if n_items == 0 or days == 0:
+        return np.zeros((horizon, n_items))
+    seasonal = days >= 2 * SEASON
+    # One column per (alpha, item) pair
+    y = np.tile(history, (1, len(ALPHAS)))
+    alpha = np.repeat(ALPHAS, n_items)
+
+    if seasonal:
+        first = y[:SEASON]
+        level = first.mean(axis=0)
+        trend = (y[SEASON:2 * SEASON].mean(axis=0) - level) / SEASON
+        season = first - level
+    else:
+        level = y[0].copy()
+        trend = np.zeros_like(level)
+        season = np.zeros((SEASON, y.shape[1]))
+
+    sse = np.zeros(y.shape[1])
+    for t in range(days):
+        s = season[t % SEASON]
+        predicted = level + PHI * trend + s
+        error = y[t] - predicted
+        sse += error * error
+        new_level = level + PHI * trend + alpha * error
+        trend = PHI * trend + BETA * (new_level - level - PHI * trend)
+        if seasonal:
+            season[t % SEASON] = s + GAMMA * (y[t] - new_level - s)
+        level = new_level
+
+    best = sse.reshape(len(ALPHAS), n_items).argmin(axis=0)
+    pick = best * n_items + np.arange(n_items)
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(PHI ** steps)[:, None]
+    season_index = (days + steps - 1) % SEASON
+    forecast = level[pick] + damped * trend[pick] + season[season_index][:, pick]
+    return np.clip(forecast, 0.0, None)
+
+def days_of_stock(forecast: np.ndarray, stock: np.ndarray) -> np.ndarray:
+    """
+    Days until forecast demand (horizon x items) uses up `stock`, with the
+    stockout day interpolated; NaN when stock outlasts the horizon.
+    """
+    cumulative = np.cumsum(forecast, axis=0)
+    runs_out = cumulative >= stock
+    day = runs_out.argmax(axis=0)
+    items = np.arange(forecast.shape[1])
+    before = np.where(day > 0, cumulative[day - 1, items], 0.0)
+    on_day = forecast[day, items]
+    fraction = np.divide(stock - before, on_day, out=np.zeros_like(on_day), where=on_day > 0)
+    days = day + np.clip(fraction, 0.0, 1.0)
+    days[stock <= 0] = 0.0
+    return np.where(runs_out.any(axis=0) | (stock <= 0), days, np.nan)
+
+def forecast_demand(sales: pd.DataFrame, items: pd.DataFrame, horizon: int = 28,
+                    history_days: int = 182, today=None) -> pd.DataFrame:
+    """
+    Projected demand and days of stock left for every item with stock or
+    recent sales. Stock is the current items quantity summed over fridges.
+    """
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+    start = today - pd.Timedelta(days=history_days)
+    dates, names, history = demand_matrix(sales, start, today - pd.Timedelta(days=1))
+
+    stock = pd.Series(dtype=float)
+    if not items.empty:
+        stock = pd.to_numeric(items["quantity"], errors="coerce").fillna(0.0).groupby(items["item_name"]).sum()
+    # Items in stock that have not sold in the window still get a (zero) forecast
+    sold = names
+    names = sold.union(stock.index)
+    aligned = np.zeros((len(dates), len(names)))
+    aligned[:, names.get_indexer(sold)] = history
+    history = aligned
+
+    forecast = fit_forecast(history, horizon)
+    on_hand = stock.reindex(names).fillna(0.0).to_numpy()
+    days_left = days_of_stock(forecast, on_hand)
+    out = pd.DataFrame({
+        "item_name": names,
+        "stock": on_hand,
+        "units_per_day": history[-28:].mean(axis=0) if len(history) else np.zeros(len(names)),
+        "forecast_7d": forecast[:7].sum(axis=0),
+        "forecast_horizon": forecast.sum(axis=0),
+        "days_left": days_left,
+    })
+    out["stockout_date"] = (today + pd.to_timedelta(np.floor(days_left), unit="D")).date
+    out.loc[np.isnan(days_left), "stockout_date"] = None
+    return out.sort_values(["days_left", "forecast_horizon"], ascending=[True, False], na_position="last",
+                           kind="stable")[FORECAST_COLUMNS].reset_index(drop=True)
+
+def demand_series(sales: pd.DataFrame, item_name: str, horizon: int = 28,
+                  history_days: int = 182, today=None) -> pd.DataFrame:
+    """One item's daily units sold and forecast, for charting: date, units, series."""
+    today = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+    sales = sales[sales["item_name"] == item_name] if not sales.empty else sales
+    dates, names, history = demand_matrix(sales, today - pd.Timedelta(days=history_days), today - pd.Timedelta(days=1))
+    units = history[:, 0] if len(names) else np.zeros(len(dates))
+    forecast = fit_forecast(units[:, None], horizon)[:, 0]
+    return pd.concat([
+        pd.DataFrame({"date": dates, "units": units, "series": "sold"}),
+        pd.DataFrame({"date": pd.date_range(today, periods=horizon, freq="D"), "units": forecast, "series": "forecast"}),
+    ], ignore_index=True)
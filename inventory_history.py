@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+# A stock row is identified by what add_or_update_item() matches on. item_id is
+# not used as the key: in local-first mode new rows only get their server id
+# after replay, while the audit entry was written with the local one.
+STOCK_KEY = ["item_name", "category", "fridge_no"]
+STOCK_COLUMNS = ["item_id", *STOCK_KEY, "quantity"]
+
+# Audit action that empties every fridge (delete_all_inventory)
+RESET_ACTION = "Delete All Inventory"
+
+
+def stock_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Items (or checkpoint rows) reduced to STOCK_COLUMNS with a normalized key."""
+    if df.empty:
+        return pd.DataFrame(columns=STOCK_COLUMNS)
+    return pd.DataFrame({
+        "item_id": pd.to_numeric(df["item_id"], errors="coerce").astype("Int64") if "item_id" in df else pd.NA,
+        "item_name": df["item_name"].astype(str),
+        "category": df["category"].astype(str),
+        "fridge_no": fridge_label(df["fridge_no"]),
+        "quantity": pd.to_numeric(df["quantity"], errors="coerce").fillna(0.0).astype(float),
+    }).reset_index(drop=True)
+
+def fridge_label(values: pd.Series) -> pd.Series:
+    """Fridge numbers as text, so 3, 3.0 and "3" are the same fridge."""
+    numbers = pd.to_numeric(values, errors="coerce")
+    whole = numbers.notna() & (numbers % 1 == 0)
+    labels = values.astype(object).where(values.notna(), "").astype(str).str.strip()
+    labels[whole] = numbers[whole].astype("int64").astype(str)
+    return labels
+
+def stock_deltas(audit: pd.DataFrame) -> pd.DataFrame:
+    """
+    The stock movements in audit rows: one row per entry with a qty_delta,
+    keyed like stock_rows(). Entries written before qty_delta was recorded
+    carry no movement and are skipped.
+    """
+    if audit.empty or "qty_delta" not in audit:
+        return pd.DataFrame(columns=["timestamp", *STOCK_KEY, "qty_delta"])
+    moves = audit[pd.to_numeric(audit["qty_delta"], errors="coerce").notna()]
+    return pd.DataFrame({
+        "timestamp": moves["timestamp"].astype(str),
+        "item_name": moves["item_name"].astype(str),
+        "category": moves["category"].astype(str),
+        "fridge_no": fridge_label(moves["fridge_no"]),
+        "qty_delta": pd.to_numeric(moves["qty_delta"]).astype(float),
+    }).reset_index(drop=True)
+
+def last_reset(audit: pd.DataFrame):
+    """Timestamp of the newest "Delete All Inventory" entry, or None."""
+    if audit.empty:
+        return None
+    resets = audit.loc[audit["action"] == RESET_ACTION, "timestamp"].astype(str)
+    return resets.max() if not resets.empty else None
+
+def replay(base: pd.DataFrame, audit: pd.DataFrame, backward: bool = False) -> pd.DataFrame:
+    """
+    Stock after applying the audit entries in `audit` to the checkpoint rows
+    `base`, all at once with one group-by. With backward=True, base is a
+    checkpoint taken after the entries and they are undone instead.
+
+    A "Delete All Inventory" entry empties every fridge, so a forward replay
+    only applies what came after the newest one. It cannot be undone, so
+    backward replays over one raise ValueError.
+    """
+    reset = last_reset(audit)
+    if reset is not None:
+        if backward:
+            raise ValueError("Cannot replay backwards over a Delete All Inventory entry")
+        base = base.iloc[0:0]
+        audit = audit[audit["timestamp"].astype(str) > reset]
+
+    base = stock_rows(base)
+    moves = stock_deltas(audit)
+    sign = -1.0 if backward else 1.0
+    combined = pd.concat([
+        base[STOCK_KEY].assign(quantity=base["quantity"]),
+        moves[STOCK_KEY].assign(quantity=sign * moves["qty_delta"]),
+    ], ignore_index=True)
+    if combined.empty:
+        return pd.DataFrame(columns=STOCK_COLUMNS)
+
+    stock = combined.groupby(STOCK_KEY, sort=False, as_index=False)["quantity"].sum()
+    # Rows that ended at zero were deleted or sold out; a tiny residue is float noise
+    stock = stock[~np.isclose(stock["quantity"], 0.0)]
+    ids = base.dropna(subset=["item_id"]).drop_duplicates(STOCK_KEY, keep="last")[[*STOCK_KEY, "item_id"]]
+    stock = stock.merge(ids, on=STOCK_KEY, how="left")
+    return stock[STOCK_COLUMNS].sort_values(STOCK_KEY, kind="stable").reset_index(drop=True)
+
+def fill_item_ids(stock: pd.DataFrame, items: pd.DataFrame) -> pd.DataFrame:
+    """Fill item_id for stock rows created after their checkpoint from the current items."""
+    missing = stock["item_id"].isna()
+    if not missing.any() or items.empty:
+        return stock
+    ids = stock_rows(items).drop_duplicates(STOCK_KEY, keep="last")[[*STOCK_KEY, "item_id"]]
+    found = stock[STOCK_KEY].merge(ids, on=STOCK_KEY, how="left")["item_id"].set_axis(stock.index)
+    return stock.assign(item_id=stock["item_id"].fillna(found))
@@ -0,0 +1,213 @@
+import os
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+import pandas as pd
+
+from file_locks import try_lock
+from sqlite_client import SQLiteClient
+
+_JOBS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        title TEXT,
+        owner TEXT,
+        status TEXT NOT NULL,          -- queued | running | done | failed | cancelled
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        error TEXT,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        result_path TEXT,
+        result_name TEXT,
+        result_mime TEXT,
+        pid INTEGER,
+        runner TEXT,                   -- id of the JobRunner that queued it
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT
+    )"""
+
+ACTIVE_STATUSES = ("queued", "running")
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation was requested."""
+
+
+class JobContext:
+    """Handed to a running job to report progress, notice cancellation and store its result."""
+
+    def __init__(self, runner, job_id):
+        self._runner = runner
+        self.job_id = job_id
+
+    def progress(self, fraction: float, message: str = None):
+        """Record progress (0..1) and raise JobCancelled if the job was cancelled."""
+        self._runner._update(self.job_id, progress=min(max(float(fraction), 0.0), 1.0), message=message)
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._runner._cancel_requested(self.job_id):
+            raise JobCancelled()
+
+    def save_result(self, data, name: str, mime: str = "application/octet-stream"):
+        """Keep the job's output (bytes or str) for download."""
+        path = os.path.join(self._runner.result_dir, f"{self.job_id}_{os.path.basename(name)}")
+        with open(path, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+        self._runner._update(self.job_id, result_path=path, result_name=name, result_mime=mime)
+
+
+class JobRunner:
+    """
+    Runs long operations (imports, report generation, exports) on a thread
+    pool so a page submits them and returns at once.
+
+    Every job is a row in a SQLite jobs table shared by all processes on the
+    host, holding its status, progress, message and the path of its result,
+    so any session can follow it, cancel it and download what it produced.
+    Cancellation is cooperative: the job sees it at its next progress() call.
+
+    Each runner has its own id and holds an exclusive lock on
+    runners/<id>.lock next to the jobs database while it lives. When a runner
+    starts, every queued or running job of a runner whose lock can be taken
+    is marked failed: the OS drops the lock when its process dies, whatever
+    pid the next process gets.
+    """
+
+    def __init__(self, path, result_dir, max_workers=2):
+        self.result_dir = result_dir
+        os.makedirs(result_dir, exist_ok=True)
+        self._client = SQLiteClient(path)
+        self._client.conn.execute(_JOBS_SCHEMA)
+        self._client.ensure_columns("jobs", ["runner"])
+        self._client.conn.execute("CREATE INDEX IF NOT EXISTS jobs_owner_created ON jobs(owner, created_at)")
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.runner_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._runner_dir = os.path.join(os.path.dirname(os.path.abspath(path)), "runners")
+        os.makedirs(self._runner_dir, exist_ok=True)
+        self._owner_lock = open(os.path.join(self._runner_dir, f"{self.runner_id}.lock"), "w")
+        try_lock(self._owner_lock)
+        self._fail_orphaned_jobs()
+
+    # ---------------- PUBLIC ----------------
+    def submit(self, kind: str, title: str, fn, *args, owner: str = None, **kwargs) -> str:
+        """
+        Queue fn(ctx, *args, **kwargs), where ctx is a JobContext. Whatever fn
+        returns (a short string) becomes the job's final message. Returns the
+        job id.
+        """
+        job_id = uuid.uuid4().hex
+        self._client.table("jobs").insert({
+            "id": job_id,
+            "kind": kind,
+            "title": title,
+            "owner": owner,
+            "status": "queued",
+            "pid": os.getpid(),
+            "runner": self.runner_id,
+            "created_at": datetime.now().isoformat(),
+        }).execute()
+        self._pool.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def status(self, job_id: str) -> dict:
+        rows = self._client.table("jobs").select("*").eq("id", job_id).execute().data
+        return rows[0] if rows else {}
+
+    def jobs(self, owner: str = None, limit: int = 20) -> pd.DataFrame:
+        query = self._client.table("jobs").select("*")
+        if owner is not None:
+            query = query.eq("owner", owner)
+        return pd.DataFrame(query.order("created_at", desc=True).limit(limit).execute().data)
+
+    def cancel(self, job_id: str):
+        """Ask a job to stop. A job still queued is cancelled straight away."""
+        self._update(job_id, cancel_requested=1)
+        self._client.table("jobs").update({
+            "status": "cancelled", "finished_at": datetime.now().isoformat(),
+        }).eq("id", job_id).eq("status", "queued").execute()
+
+    def result(self, job_id: str):
+        """
+        (load, file name, mime type) of a finished job's result, or None.
+        load() returns the result's bytes, so a page listing results reads
+        none of them until one is downloaded.
+        """
+        job = self.status(job_id)
+        path = job.get("result_path")
+        if not path or not os.path.exists(path):
+            return None
+        return partial(_read_result, path), job["result_name"], job["result_mime"]
+
+    def prune(self, older_than_days: int = 7):
+        """Forget finished jobs (and their result files) older than `older_than_days`."""
+        cutoff = (pd.Timestamp.now() - pd.Timedelta(days=older_than_days)).isoformat()
+        old = (
+            self._client.table("jobs").select("id,result_path")
+            .lt("created_at", cutoff).in_("status", ["done", "failed", "cancelled"]).execute().data
+        )
+        for job in old:
+            if job["result_path"] and os.path.exists(job["result_path"]):
+                os.remove(job["result_path"])
+        if old:
+            self._client.table("jobs").delete().in_("id", [j["id"] for j in old]).execute()
+
+    # ---------------- INTERNAL ----------------
+    def _run(self, job_id, fn, args, kwargs):
+        started = self._client.table("jobs").update({
+            "status": "running", "started_at": datetime.now().isoformat(),
+        }).eq("id", job_id).eq("status", "queued").execute().data
+        if not started:
+            return  # cancelled while queued
+        try:
+            message = fn(JobContext(self, job_id), *args, **kwargs)
+            self._update(job_id, status="done", progress=1.0, message=message, finished_at=datetime.now().isoformat())
+        except JobCancelled:
+            self._update(job_id, status="cancelled", message="Cancelled", finished_at=datetime.now().isoformat())
+        except Exception as e:
+            self._update(job_id, status="failed", error=f"{e}\n{traceback.format_exc(limit=5)}",
+                         finished_at=datetime.now().isoformat())
+
+    def _update(self, job_id, **values):
+        values = {k: v for k, v in values.items() if v is not None}
+        self._client.table("jobs").update(values).eq("id", job_id).execute()
+
+    def _cancel_requested(self, job_id) -> bool:
+        rows = self._client.table("jobs").select("cancel_requested").eq("id", job_id).execute().data
+        return bool(rows and rows[0]["cancel_requested"])
+
+    def _fail_orphaned_jobs(self):
+        active = self._client.table("jobs").select("id,runner").in_("status", list(ACTIVE_STATUSES)).execute().data
+        runners = {j["runner"] for j in active if j["runner"] != self.runner_id}
+        # Jobs from before runner ids have no runner; their process is long gone
+        dead = {r for r in runners if r is None or _runner_gone(os.path.join(self._runner_dir, f"{r}.lock"))}
+        orphaned = [j["id"] for j in active if j["runner"] in dead]
+        if orphaned:
+            self._client.table("jobs").update({
+                "status": "failed", "error": "Interrupted: the server process running it stopped",
+                "finished_at": datetime.now().isoformat(),
+            }).in_("id", orphaned).execute()
+        for runner in dead - {None}:
+            try:
+                os.remove(os.path.join(self._runner_dir, f"{runner}.lock"))
+            except FileNotFoundError:
+                pass
+
+
+def _read_result(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def _runner_gone(lock_path) -> bool:
+    """True unless a live runner holds the lock at lock_path."""
+    try:
+        f = open(lock_path, "r+")
+    except FileNotFoundError:
+        return True
+    with f:
+        return try_lock(f)
@@ -0,0 +1,228 @@
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Audit rows land in a table the local mirror schema does not have
+_AUDIT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY,
+        client_id TEXT UNIQUE,
+        item_name TEXT,
+        category TEXT,
+        action TEXT,
+        quantity REAL,
+        fridge_no INTEGER,
+        qty_delta REAL,
+        unit_cost REAL,
+        selling_price REAL,
+        username TEXT,
+        timestamp TEXT
+    )"""
+
+
+def local_backend(directory):
+    """
+    Import db_supabase against a fresh SQLite backend in `directory`. Every
+    optional mode (local-first, change feeds, shared cache, profiling) is off,
+    so each call goes straight to the backend the way a plain deployment
+    goes straight to Supabase. Needs .streamlit/secrets.toml to import, but
+    never contacts Supabase.
+    """
+    os.environ.update({
+        "DIANES_LOCAL_FIRST": "0", "DIANES_DELTA_SYNC": "0", "DIANES_CHANGE_FEED": "",
+        "DIANES_SHARED_CACHE_DIR": "", "DIANES_PROFILE": "",
+        "DIANES_AUDIT_SPOOL_DIR": os.path.join(directory, "audit_spool"),
+        "DIANES_JOBS_DIR": os.path.join(directory, "jobs"),
+        "DIANES_AUDIT_ARCHIVE_DIR": os.path.join(directory, "audit_archive"),
+        "DIANES_PURGE_ARCHIVE_DIR": os.path.join(directory, "purge_archive"),
+    })
+    import db_supabase
+    from local_store import LocalStore
+
+    server = LocalStore(os.path.join(directory, "server.db"))
+    server.client.temp_ids = False
+    server.client.conn.execute(_AUDIT_SCHEMA)
+    db_supabase.supabase = server.client
+    return db_supabase, server.client
+
+def seed_backend(client, items, fridges, customers, stock):
+    rows = [
+        {"item_name": f"ITEM{i:04d}", "category": f"CAT{i % 10}", "quantity": stock, "fridge_no": fridge}
+        for i in range(items) for fridge in range(1, fridges + 1)
+    ]
+    client.table("items").insert(rows).execute()
+    client.table("customers").insert([{"name": f"CUSTOMER{c:04d}"} for c in range(customers)]).execute()
+    items_df = pd.DataFrame(client.table("items").select("*").execute().data)
+    tiers = [
+        {"item_id": int(r.item_id), "min_qty": 1, "max_qty": None, "price_per_unit": 20.0, "label": "RETAIL"}
+        for r in items_df.itertuples()
+    ]
+    client.table("pricing_tiers").insert(tiers).execute()
+    customer_ids = [r["id"] for r in client.table("customers").select("id").execute().data]
+    return items_df, customer_ids
+
+def _stock_by_item(client) -> pd.Series:
+    items = pd.DataFrame(client.table("items").select("item_name,quantity").execute().data)
+    return items.groupby("item_name")["quantity"].sum()
+
+def run(users: int = 8, duration: float = 10.0, items: int = 20, fridges: int = 2, customers: int = 50,
+        stock: int = 200, max_quantity: int = 5, stock_in_share: float = 0.2, think: float = 0.0,
+        seed: int = 0) -> dict:
+    """
+    `users` concurrent cashiers, each a thread like a Streamlit session, run
+    the Record Sale flow (get_total_qty, get_customer_adjusted_price,
+    record_sale) and, `stock_in_share` of the time, a stock-in
+    (add_or_update_item) for `duration` seconds over a few hot items.
+
+    Returns throughput, latency percentiles per operation and the invariant
+    violations found afterwards: negative stock, sales that do not match the
+    stock deducted, sale rows that do not match the sales cashiers were
+    told were recorded, and audit entries that do not match the sale rows.
+    """
+    directory = tempfile.mkdtemp(prefix="dianes_load_")
+    db, client = local_backend(directory)
+    items_df, customer_ids = seed_backend(client, items, fridges, customers, stock)
+    initial = _stock_by_item(client)
+    item_ids = items_df["item_id"].tolist()
+    names = dict(zip(items_df["item_id"], items_df["item_name"]))
+    rows = items_df.set_index("item_id")[["category", "fridge_no"]].to_dict(orient="index")
+
+    lock = threading.Lock()
+    latencies = defaultdict(list)   # operation -> seconds
+    outcomes = Counter()
+    errors = Counter()
+    sold = Counter()                # item_name -> units cashiers were told were sold
+    stocked = Counter()             # item_name -> units stocked in
+    deadline = time.perf_counter() + duration
+
+    def timed(operation, fn, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies[operation].append(elapsed)
+
+    def cashier(number):
+        rng = random.Random(seed * 1000 + number)
+        user = f"cashier{number}"
+        while time.perf_counter() < deadline:
+            item_id = rng.choice(item_ids)
+            quantity = rng.randint(1, max_quantity)
+            try:
+                if rng.random() < stock_in_share:
+                    row = rows[item_id]
+                    timed("add_or_update_item", db.add_or_update_item,
+                          item_id, names[item_id], row["category"], quantity, row["fridge_no"], user)
+                    with lock:
+                        stocked[names[item_id]] += quantity
+                        outcomes["stock_in"] += 1
+                else:
+                    started = time.perf_counter()
+                    timed("get_total_qty", db.get_total_qty, names[item_id])
+                    customer_id = rng.choice(customer_ids)
+                    price = timed("get_customer_adjusted_price", db.get_customer_adjusted_price,
+                                  customer_id, item_id, quantity)
+                    message = timed("record_sale", db.record_sale, item_id, quantity, user, customer_id, price,
+                                    idempotency_key=str(uuid.uuid4()))
+                    with lock:
+                        latencies["sale_flow"].append(time.perf_counter() - started)
+                        if message.startswith("Sale recorded"):
+                            sold[names[item_id]] += quantity
+                            outcomes["sale"] += 1
+                        else:
+                            outcomes[message] += 1
+            except Exception as e:
+                with lock:
+                    errors[f"{type(e).__name__}: {e}"] += 1
+            if think:
+                time.sleep(rng.uniform(0, 2 * think))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=cashier, args=(n,)) for n in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    db.audit_writer.flush()
+
+    latency = pd.DataFrame([
+        {"operation": op, "calls": len(s), **dict(zip(["p50_ms", "p95_ms", "p99_ms", "max_ms"],
+                                                      np.percentile(np.array(s) * 1000, [50, 95, 99, 100])))}
+        for op, s in sorted(latencies.items())
+    ])
+    return {
+        "users": users,
+        "seconds": round(elapsed, 2),
+        "operations_per_sec": round(sum(outcomes.values()) / elapsed, 1),
+        "sales_per_sec": round(outcomes["sale"] / elapsed, 1),
+        "outcomes": dict(outcomes),
+        "errors": dict(errors),
+        "latency": latency,
+        "violations": check_invariants(client, initial, sold, stocked),
+        "directory": directory,
+    }
+
+def check_invariants(client, initial: pd.Series, sold: Counter, stocked: Counter) -> list:
+    violations = []
+    items = pd.DataFrame(client.table("items").select("item_id,item_name,fridge_no,quantity").execute().data)
+    for r in items[items["quantity"] < 0].itertuples():
+        violations.append(f"negative stock: {r.item_name} fridge {r.fridge_no} has {r.quantity:g}")
+
+    final = items.groupby("item_name")["quantity"].sum()
+    sales = pd.DataFrame(client.table("sales").select("item_name,quantity").execute().data,
+                         columns=["item_name", "quantity"])
+    sales_rows = sales.groupby("item_name")["quantity"].sum()
+    audit = pd.DataFrame(client.table("audit_log").select("item_name,qty_delta").eq("action", "Sale").execute().data,
+                         columns=["item_name", "qty_delta"])
+    audited = -audit.groupby("item_name")["qty_delta"].sum()
+    for name in initial.index:
+        deducted = initial[name] + stocked[name] - final.get(name, 0.0)
+        recorded = sales_rows.get(name, 0.0)
+        if not np.isclose(deducted, recorded):
+            violations.append(f"{name}: sales rows total {recorded:g} but stock went down by {deducted:g}")
+        if not np.isclose(recorded, sold[name]):
+            violations.append(f"{name}: sales rows total {recorded:g} but cashiers were told {sold[name]:g} sold")
+        if not np.isclose(audited.get(name, 0.0), recorded):
+            violations.append(f"{name}: audit log shows {audited.get(name, 0.0):g} sold, sales rows {recorded:g}")
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulate concurrent cashiers against a local SQLite backend and check stock invariants."
+    )
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--fridges", type=int, default=2)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--stock-in-share", type=float, default=0.2)
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds between a cashier's operations")
+    args = parser.parse_args()
+    failed = False
+    for users in args.users:
+        result = run(users, args.duration, args.items, args.fridges, stock=args.stock,
+                     stock_in_share=args.stock_in_share, think=args.think)
+        print(f"\n{users} cashier(s): {result['operations_per_sec']} ops/sec, {result['sales_per_sec']} sales/sec "
+              f"over {result['seconds']}s; outcomes {result['outcomes']}")
+        print(result["latency"].round(2).to_string(index=False))
+        for error, count in result["errors"].items():
+            print(f"error x{count}: {error}")
+        print(f"{len(result['violations'])} invariant violation(s)")
+        for violation in result["violations"][:20]:
+            print(f"VIOLATION {violation}")
+        if len(result["violations"]) > 20:
+            print(f"... {len(result['violations']) - 20} more violations")
+        failed = failed or bool(result["violations"] or result["errors"])
+    raise SystemExit(1 if failed else 0)
@@ -0,0 +1,494 @@
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from sqlite_client import SQLiteClient
+
+# Tables mirrored locally in local-first mode. Columns the server adds later are
+# picked up automatically on refresh (see SQLiteClient.ensure_columns).
+MIRROR_SCHEMA = {
+    "items": """
+        CREATE TABLE IF NOT EXISTS items (
+            item_id INTEGER PRIMARY KEY,
+            item_name TEXT,
+            category TEXT,
+            quantity REAL,
+            fridge_no INTEGER
+        )""",
+    "customers": """
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT,
+            group_id INTEGER
+        )""",
+    "pricing_tiers": """
+        CREATE TABLE IF NOT EXISTS pricing_tiers (
+            id INTEGER PRIMARY KEY,
+            item_id INTEGER NOT NULL,
+            min_qty INTEGER NOT NULL,
+            max_qty INTEGER,
+            price_per_unit REAL NOT NULL,
+            label TEXT
+        )""",
+    "customer_price_list": """
+        CREATE TABLE IF NOT EXISTS customer_price_list (
+            id INTEGER PRIMARY KEY,
+            customer_id INTEGER,
+            item_id INTEGER,
+            custom_price REAL
+        )""",
+    "sales": """
+        CREATE TABLE IF NOT EXISTS sales (
+            id INTEGER PRIMARY KEY,
+            item_id INTEGER NOT NULL,
+            item_name TEXT,
+            quantity REAL,
+            selling_price REAL,
+            total_sale REAL,
+            cost REAL,
+            profit REAL,
+            date TEXT,
+            customer_id INTEGER,
+            overridden INTEGER DEFAULT 0,
+            client_id TEXT
+        )""",
+    "item_barcodes": """
+        CREATE TABLE IF NOT EXISTS item_barcodes (
+            barcode TEXT PRIMARY KEY,
+            item_id INTEGER NOT NULL,
+            units_per_scan INTEGER NOT NULL DEFAULT 1
+        )""",
+    "price_history": """
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY,
+            item_id INTEGER,
+            old_quantity REAL,
+            new_price_quantity REAL,
+            old_unit_cost REAL,
+            old_selling_price REAL,
+            new_unit_cost REAL,
+            new_selling_price REAL,
+            changed_by TEXT,
+            timestamp TEXT
+        )""",
+    "price_versions": """
+        CREATE TABLE IF NOT EXISTS price_versions (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            item_id INTEGER NOT NULL,
+            customer_id INTEGER,
+            min_qty INTEGER,
+            max_qty INTEGER,
+            label TEXT,
+            price_per_unit REAL NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT
+        )""",
+    "stock_thresholds": """
+        CREATE TABLE IF NOT EXISTS stock_thresholds (
+            item_name TEXT PRIMARY KEY,
+            threshold REAL NOT NULL
+        )""",
+}
+
+# Indexes the mirror needs for the lookups db_supabase.py makes against it
+MIRROR_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS sales_client_id ON sales(client_id)",
+    "CREATE INDEX IF NOT EXISTS items_fridge_no ON items(fridge_no)",
+    "CREATE INDEX IF NOT EXISTS price_versions_item_kind_from ON price_versions(item_id, kind, customer_id, valid_from)",
+    "CREATE INDEX IF NOT EXISTS price_versions_open ON price_versions(kind, source_id) WHERE valid_to IS NULL",
+    # The hot filters of migrations/supabase/008 and 012 (see query_plans.py)
+    "CREATE INDEX IF NOT EXISTS customers_name ON customers(name)",
+    "CREATE INDEX IF NOT EXISTS sales_customer_id_date ON sales(customer_id, date)",
+    "CREATE INDEX IF NOT EXISTS sales_item_name_date ON sales(item_name, date)",
+    # The upsert keys of migrations/supabase/013, which also serve the item_name
+    # and item_id/min_qty lookups the indexes dropped here used to
+    "DROP INDEX IF EXISTS items_item_name",
+    "DROP INDEX IF EXISTS pricing_tiers_item_id_min_qty",
+    "DROP INDEX IF EXISTS customer_price_list_customer_id_item_id",
+    # Rows without a fridge_no clash too, as under the server's NULLS NOT
+    # DISTINCT key; the first version of this key let them through
+    "DROP INDEX IF EXISTS items_item_name_category_fridge_no_key",
+    "CREATE UNIQUE INDEX IF NOT EXISTS items_item_name_category_fridge_key"
+    " ON items(item_name, category, COALESCE(fridge_no, ''))",
+    "CREATE UNIQUE INDEX IF NOT EXISTS pricing_tiers_item_id_min_qty_max_qty_key"
+    " ON pricing_tiers(item_id, min_qty, COALESCE(max_qty, 0))",
+    "CREATE UNIQUE INDEX IF NOT EXISTS customer_price_list_customer_id_item_id_key ON customer_price_list(customer_id, item_id)",
+]
+
+# Mirrors made before the upsert keys above may hold rows the keys reject.
+# Merged the way migrations/supabase/013 merges them on the server, whose
+# copies then replace these on the next sync.
+_MIRROR_DEDUPE = [
+    """UPDATE items SET quantity = (
+           SELECT SUM(d.quantity) FROM items d
+           WHERE d.item_name = items.item_name AND d.category = items.category AND d.fridge_no IS items.fridge_no)
+       WHERE item_id IN (
+           SELECT MIN(item_id) FROM items
+           WHERE item_name IS NOT NULL AND category IS NOT NULL
+           GROUP BY item_name, category, fridge_no HAVING COUNT(*) > 1)""",
+    """DELETE FROM items WHERE item_id NOT IN (
+           SELECT MIN(item_id) FROM items GROUP BY item_name, category, fridge_no)
+       AND item_name IS NOT NULL AND category IS NOT NULL""",
+    """DELETE FROM pricing_tiers WHERE id NOT IN (
+           SELECT MAX(id) FROM pricing_tiers GROUP BY item_id, min_qty, COALESCE(max_qty, 0))""",
+    """DELETE FROM customer_price_list WHERE id NOT IN (
+           SELECT MAX(id) FROM customer_price_list GROUP BY customer_id, item_id)
+       AND customer_id IS NOT NULL AND item_id IS NOT NULL""",
+]
+
+# stock_in() of migrations/supabase/013
+_STOCK_IN_SQL = """
+    INSERT INTO items (item_id, item_name, category, quantity, fridge_no)
+    VALUES (:new_id,
+            COALESCE((SELECT item_name FROM items WHERE item_id = :p_item_id), :p_item_name),
+            COALESCE((SELECT category FROM items WHERE item_id = :p_item_id), :p_category),
+            :p_quantity, :p_fridge_no)
+    ON CONFLICT (item_name, category, COALESCE(fridge_no, '')) DO UPDATE SET quantity = quantity + excluded.quantity
+    RETURNING *, item_id = :new_id AS inserted"""
+
+def _stamp() -> str:
+    """The "stamped_at" of a stock write (migrations/supabase/019); the write lock orders it."""
+    return datetime.now(timezone.utc).isoformat()
+
+def _claim_write(conn, client_key, op) -> bool:
+    """claim_write() of migrations/supabase/017: False if `client_key` was applied before."""
+    if client_key is None:
+        return True
+    return conn.execute(
+        "INSERT INTO applied_writes (client_key, op) VALUES (?, ?) ON CONFLICT (client_key) DO NOTHING RETURNING 1",
+        (client_key, op),
+    ).fetchone() is not None
+
+def _stock_in(client, conn, params):
+    if not _claim_write(conn, params.get("p_client_key"), "stock_in"):
+        return []
+    row = conn.execute(_STOCK_IN_SQL, dict(params, new_id=client.new_id(conn, "items"))).fetchone()
+    return [dict(row, stamped_at=_stamp())]
+
+def _sell_stock(client, conn, params):
+    """sell_stock() of migrations/supabase/015; the rpc() transaction holds the write lock throughout."""
+    if conn.execute("SELECT 1 FROM sales WHERE client_id = :p_client_id", params).fetchone():
+        return {"status": "duplicate"}
+    item = conn.execute("SELECT * FROM items WHERE item_id = :p_item_id", params).fetchone()
+    if item is None:
+        return {"status": "not_found"}
+    rows = conn.execute("SELECT * FROM items WHERE item_name = ? ORDER BY item_id", (item["item_name"],)).fetchall()
+    quantity, price = params["p_quantity"], params["p_selling_price"] or 0
+    if sum(max(r["quantity"] or 0, 0) for r in rows) < quantity:
+        return {"status": "short"}
+
+    conn.execute(
+        """INSERT INTO sales (id, client_id, item_id, item_name, quantity, selling_price, total_sale,
+                              cost, profit, date, customer_id, overridden)
+           VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0, ?, ?, ?)""",
+        (client.new_id(conn, "sales"), params["p_client_id"], params["p_item_id"], item["item_name"], quantity,
+         params["p_selling_price"], quantity * price, params["p_date"], params["p_customer_id"], 1 if price else 0),
+    )
+    deductions, remaining = [], quantity
+    for r in rows:
+        deduct = min(max(r["quantity"] or 0, 0), remaining)
+        if deduct <= 0:
+            continue
+        row = conn.execute(
+            "UPDATE items SET quantity = quantity - ? WHERE item_id = ? RETURNING *", (deduct, r["item_id"])
+        ).fetchone()
+        deductions.append({"row": dict(row), "deduct": deduct})
+        remaining -= deduct
+    return {"status": "recorded", "item_name": item["item_name"], "category": item["category"],
+            "deductions": deductions, "stamped_at": _stamp()}
+
+def _stock_in_batch(client, conn, params):
+    """stock_in_batch() of migrations/supabase/016, one stock_in per target row."""
+    if not _claim_write(conn, params.get("p_client_key"), "stock_in_batch"):
+        return []
+    targets = {}
+    for entry in params["p_entries"]:
+        item = conn.execute("SELECT * FROM items WHERE item_id = ?", (entry["item_id"],)).fetchone()
+        if item is None:
+            continue
+        fridge_no = item["fridge_no"] if entry.get("fridge_no") is None else entry["fridge_no"]
+        target = targets.setdefault((item["item_name"], item["category"], fridge_no), {"quantity": 0, "item_ids": set()})
+        target["quantity"] += entry["quantity"]
+        target["item_ids"].add(entry["item_id"])
+    rows = []
+    for (item_name, category, fridge_no), target in sorted(targets.items(), key=lambda t: str(t[0])):
+        row = conn.execute(_STOCK_IN_SQL, {
+            "p_item_id": None, "p_item_name": item_name, "p_category": category, "p_fridge_no": fridge_no,
+            "p_quantity": target["quantity"], "new_id": client.new_id(conn, "items"),
+        }).fetchone()
+        rows.append(dict(row, item_ids=sorted(target["item_ids"]), stamped_at=_stamp()))
+    return rows
+
+def _insert_once(client, conn, params):
+    """insert_once() of migrations/supabase/017."""
+    table = params["p_table"]
+    if table not in ("customers", "price_history"):
+        raise ValueError(f"insert_once does not write to {table}")
+    if not _claim_write(conn, params.get("p_client_key"), f"insert_once:{table}"):
+        return []
+    return client.table(table).insert(params["p_row"]).execute().data
+
+_PRICE_VERSION_COLUMNS = ["item_id", "customer_id", "min_qty", "max_qty", "label", "price_per_unit"]
+
+def _record_price_versions(client, conn, params):
+    """record_price_versions() of migrations/supabase/018."""
+    kind, deleted = params["p_kind"], params.get("p_deleted")
+    now = datetime.now(timezone.utc)
+    valid_from = datetime.fromisoformat(params["p_valid_from"]) if params.get("p_valid_from") else now
+    for row in params["p_rows"]:
+        current = conn.execute(
+            "SELECT * FROM price_versions WHERE kind = ? AND source_id = ? AND valid_to IS NULL", (kind, row["source_id"])
+        ).fetchone()
+        if current is not None and not deleted and all(current[c] == row.get(c) for c in _PRICE_VERSION_COLUMNS):
+            continue
+        at = valid_from if current is None or datetime.fromisoformat(current["valid_from"]) < valid_from else now
+        if current is not None:
+            conn.execute("UPDATE price_versions SET valid_to = ? WHERE id = ?", (at.isoformat(), current["id"]))
+        if not deleted:
+            conn.execute(
+                "INSERT INTO price_versions (id, kind, source_id, item_id, customer_id, min_qty, max_qty, label,"
+                " price_per_unit, valid_from) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (client.new_id(conn, "price_versions"), kind, row["source_id"],
+                 *(row.get(c) for c in _PRICE_VERSION_COLUMNS), at.isoformat()),
+            )
+
+# The server's write functions (migrations/supabase/013 and 015-019) for rpc()
+# calls against the mirror: (table, SQL), or a function for those that take
+# several statements. SQLite has no xmax, so a row counts as inserted when it
+# took the :new_id the client offered.
+MIRROR_FUNCTIONS = {
+    "stock_in": _stock_in,
+    "upsert_pricing_tier": ("pricing_tiers", """
+        INSERT INTO pricing_tiers (id, item_id, min_qty, max_qty, price_per_unit, label)
+        VALUES (:new_id, :p_item_id, :p_min_qty, NULLIF(:p_max_qty, 0), :p_price_per_unit, :p_label)
+        ON CONFLICT (item_id, min_qty, COALESCE(max_qty, 0)) DO UPDATE SET
+            price_per_unit = excluded.price_per_unit, label = excluded.label
+        RETURNING *, id = :new_id AS inserted"""),
+    "sell_stock": _sell_stock,
+    "stock_in_batch": _stock_in_batch,
+    "insert_once": _insert_once,
+    "record_price_versions": _record_price_versions,
+}
+
+_OUTBOX_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        op TEXT NOT NULL,
+        args TEXT NOT NULL,
+        base TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',   -- pending | synced | conflict | dismissed
+        error TEXT,
+        created_at TEXT NOT NULL,
+        synced_at TEXT,
+        client_key TEXT,   -- the server applies each key once (migrations/supabase/017)
+        local_rows TEXT    -- mirror rows behind ids created offline, by "key:id"
+    )"""
+
+# Client keys applied by the server functions above; only filled when this
+# store stands in for the server (load_test.py, tests), since the mirror's own
+# writes are never replayed against it
+_APPLIED_WRITES_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS applied_writes (
+        client_key TEXT PRIMARY KEY,
+        op TEXT,
+        applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )"""
+
+
+# Per-table delta sync watermarks (see sync_table() in db_supabase.py)
+_SYNC_STATE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        table_name TEXT PRIMARY KEY,
+        watermark TEXT,            -- newest updated_at merged
+        deleted_watermark TEXT,    -- newest deleted_rows.deleted_at merged
+        full_synced_at TEXT
+    )"""
+
+
+class SyncConflict(Exception):
+    """A queued write that cannot be applied on the server as it was made locally."""
+
+
+class LocalStore:
+    """
+    Local SQLite mirror of the shop tables plus an ordered outbox of writes
+    waiting to be replayed on Supabase.
+    """
+
+    def __init__(self, path):
+        self.client = SQLiteClient(path, temp_ids=True)
+        conn = self.client.conn
+        for ddl in MIRROR_SCHEMA.values():
+            conn.execute(ddl)
+        # Mirrors made before sales had client_id (the index below needs it)
+        self.client.ensure_columns("sales", ["client_id"])
+        for sql in _MIRROR_DEDUPE:
+            conn.execute(sql)
+        for ddl in MIRROR_INDEXES:
+            conn.execute(ddl)
+        self.client.functions.update(MIRROR_FUNCTIONS)
+        conn.execute(_OUTBOX_SCHEMA)
+        # Outboxes made before client keys: give queued writes theirs
+        self.client.ensure_columns("outbox", ["client_key", "local_rows"])
+        for (seq,) in conn.execute("SELECT seq FROM outbox WHERE client_key IS NULL").fetchall():
+            conn.execute("UPDATE outbox SET client_key = ? WHERE seq = ?", (str(uuid.uuid4()), seq))
+        conn.execute(_APPLIED_WRITES_SCHEMA)
+        conn.execute(_SYNC_STATE_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_status_seq ON outbox(status, seq)")
+        self.last_sync = None
+        self.last_error = None
+
+    # ---------------- OUTBOX ----------------
+    def enqueue(self, op: str, args: dict, base=None, client_key: str = None, local_rows: dict = None):
+        self.client.conn.execute(
+            "INSERT INTO outbox (op, args, base, created_at, client_key, local_rows) VALUES (?, ?, ?, ?, ?, ?)",
+            (op, json.dumps(args, default=_to_json), json.dumps(base, default=_to_json), datetime.now().isoformat(),
+             client_key or str(uuid.uuid4()), json.dumps(local_rows or {}, default=_to_json)),
+        )
+
+    def pending(self, limit: int) -> list:
+        rows = self.client.conn.execute(
+            "SELECT seq, op, args, base, client_key, local_rows FROM outbox"
+            " WHERE status = 'pending' ORDER BY seq LIMIT ?", (limit,)
+        ).fetchall()
+        return [
+            {"seq": r["seq"], "op": r["op"], "args": json.loads(r["args"], object_hook=_from_json),
+             "base": json.loads(r["base"], object_hook=_from_json) if r["base"] else None,
+             "client_key": r["client_key"], "local_rows": json.loads(r["local_rows"]) if r["local_rows"] else {}}
+            for r in rows
+        ]
+
+    def mark_synced(self, seq: int):
+        self.client.conn.execute(
+            "UPDATE outbox SET status = 'synced', synced_at = ? WHERE seq = ?", (datetime.now().isoformat(), seq)
+        )
+
+    def mark_conflict(self, seq: int, reason: str):
+        self.client.conn.execute(
+            "UPDATE outbox SET status = 'conflict', error = ?, synced_at = ? WHERE seq = ?",
+            (reason, datetime.now().isoformat(), seq),
+        )
+
+    def dismiss_conflict(self, seq: int):
+        self.client.conn.execute("UPDATE outbox SET status = 'dismissed' WHERE seq = ? AND status = 'conflict'", (seq,))
+
+    def prune_synced(self):
+        self.client.conn.execute("DELETE FROM outbox WHERE status = 'synced'")
+
+    def pending_count(self) -> int:
+        return self.client.conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+    def conflicts(self) -> pd.DataFrame:
+        return pd.read_sql_query(
+            "SELECT seq, op, args, error, created_at FROM outbox WHERE status = 'conflict' ORDER BY seq",
+            self.client.conn,
+        )
+
+    # ---------------- MIRROR ----------------
+    def row(self, table: str, **where) -> dict:
+        query = self.client.table(table).select("*")
+        for column, value in where.items():
+            query = query.eq(column, value)
+        rows = query.execute().data
+        return rows[0] if rows else None
+
+    def sync_state(self, table: str) -> dict:
+        row = self.client.conn.execute("SELECT * FROM sync_state WHERE table_name = ?", (table,)).fetchone()
+        return dict(row) if row else None
+
+    def merge_if_idle(self, table: str, rows: list, deleted_ids: list,
+                      watermark: str, deleted_watermark: str, full: bool = False) -> bool:
+        """
+        Merge server changes into the mirror and advance the table's watermarks,
+        all in one transaction. With full=True the table is replaced outright.
+        Skipped while writes are still queued, since the server rows would not
+        include them yet. Returns True if the mirror was updated.
+        """
+        pk = self.client.primary_key(table)
+        with self.client.transaction() as conn:
+            if self.pending_count():
+                return False
+            if full:
+                conn.execute(f'DELETE FROM "{table}"')
+            elif self.client.temp_ids:
+                # Rows created offline (negative ids) have all been replayed by now,
+                # and their server copies arrive in this delta under real ids
+                conn.execute(f'DELETE FROM "{table}" WHERE typeof("{pk}") = \'integer\' AND "{pk}" < 0')
+            if rows:
+                self.client.ensure_columns(table, rows[0].keys())
+                columns = list(rows[0].keys())
+                column_sql = ", ".join(f'"{c}"' for c in columns)
+                conn.executemany(
+                    f'INSERT OR REPLACE INTO "{table}" ({column_sql}) VALUES ({", ".join("?" for _ in columns)})',
+                    [[_sqlite_value(r.get(c)) for c in columns] for r in rows],
+                )
+            if deleted_ids:
+                conn.executemany(
+                    f'DELETE FROM "{table}" WHERE "{pk}" = ?',
+                    [[int(i) if str(i).lstrip("-").isdigit() else i] for i in deleted_ids],
+                )
+            conn.execute(
+                """INSERT INTO sync_state (table_name, watermark, deleted_watermark, full_synced_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT(table_name) DO UPDATE SET
+                       watermark = excluded.watermark,
+                       deleted_watermark = excluded.deleted_watermark,
+                       full_synced_at = COALESCE(excluded.full_synced_at, sync_state.full_synced_at)""",
+                (table, watermark, deleted_watermark, datetime.now().isoformat() if full else None),
+            )
+        return True
+
+
+class SyncWorker:
+    """Calls `sync_once` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, sync_once, interval=5.0):
+        self._sync_once = sync_once
+        self._interval = interval
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="local-sync", daemon=True)
+        self._thread.start()
+
+    def poke(self):
+        """Sync soon instead of waiting for the next tick (e.g. right after a local write)."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self._interval)
+            self._wake.clear()
+            try:
+                self._sync_once()
+            except Exception:
+                # Offline or server error; the outbox is untouched and retried next tick
+                time.sleep(self._interval)
+
+
+def _sqlite_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+def _to_json(value):
+    """json.dumps default= hook for queued call arguments."""
+    if isinstance(value, pd.DataFrame):
+        return {"__dataframe__": value.to_dict(orient="records")}
+    if hasattr(value, "item"):  # numpy scalars
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Cannot queue argument of type {type(value).__name__}")
+
+def _from_json(obj):
+    if "__dataframe__" in obj:
+        return pd.DataFrame(obj["__dataframe__"])
+    return obj
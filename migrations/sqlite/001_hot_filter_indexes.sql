@@ -0,0 +1,11 @@
+-- Same indexes as migrations/supabase/003, 008, 009 and 012, for SQLite
+-- databases with the inventory.db schema. Applied by sqlite_migrations.py.
+
+CREATE INDEX IF NOT EXISTS items_item_name_idx ON items(item_name);
+CREATE INDEX IF NOT EXISTS items_fridge_no_idx ON items(fridge_no);
+CREATE INDEX IF NOT EXISTS customers_name_idx ON customers(name);
+CREATE INDEX IF NOT EXISTS sales_customer_id_date_idx ON sales(customer_id, date);
+CREATE INDEX IF NOT EXISTS sales_item_name_date_idx ON sales(item_name, date);
+CREATE INDEX IF NOT EXISTS audit_log_timestamp_idx ON audit_log(timestamp);
+CREATE INDEX IF NOT EXISTS pricing_tiers_item_id_min_qty_idx ON pricing_tiers(item_id, min_qty);
+CREATE INDEX IF NOT EXISTS customer_price_list_customer_id_item_id_idx ON customer_price_list(customer_id, item_id);
@@ -0,0 +1,50 @@
+-- Same unique keys as migrations/supabase/013, for SQLite databases with the
+-- inventory.db schema. Applied by sqlite_migrations.py.
+
+-- Merge item rows that share item_name/category/fridge_no into the oldest one,
+-- rows without a fridge_no included (see the key below)
+CREATE TEMP TABLE item_merge AS
+    SELECT i.item_id AS old_id, k.keep_id
+    FROM items i
+    JOIN (
+        SELECT item_name, category, fridge_no, MIN(item_id) AS keep_id
+        FROM items
+        GROUP BY item_name, category, fridge_no
+        HAVING COUNT(*) > 1
+    ) k ON i.item_name = k.item_name AND i.category = k.category AND i.fridge_no IS k.fridge_no
+    WHERE i.item_id <> k.keep_id;
+
+UPDATE items SET quantity = quantity + (
+        SELECT SUM(d.quantity) FROM item_merge m JOIN items d ON d.item_id = m.old_id
+        WHERE m.keep_id = items.item_id)
+    WHERE item_id IN (SELECT keep_id FROM item_merge);
+
+UPDATE sales SET item_id = (SELECT keep_id FROM item_merge WHERE old_id = sales.item_id)
+    WHERE item_id IN (SELECT old_id FROM item_merge);
+UPDATE pricing_tiers SET item_id = (SELECT keep_id FROM item_merge WHERE old_id = pricing_tiers.item_id)
+    WHERE item_id IN (SELECT old_id FROM item_merge);
+UPDATE customer_price_list SET item_id = (SELECT keep_id FROM item_merge WHERE old_id = customer_price_list.item_id)
+    WHERE item_id IN (SELECT old_id FROM item_merge);
+DELETE FROM items WHERE item_id IN (SELECT old_id FROM item_merge);
+DROP TABLE item_merge;
+
+-- SQLite indexes treat NULLs as distinct; the COALESCE makes rows without a
+-- fridge_no clash like Postgres' NULLS NOT DISTINCT key does
+CREATE UNIQUE INDEX IF NOT EXISTS items_item_name_category_fridge_no_key
+    ON items(item_name, category, COALESCE(fridge_no, ''));
+DROP INDEX IF EXISTS items_item_name_idx;
+
+-- One tier per item and range, max_qty null and 0 both meaning unlimited
+DELETE FROM pricing_tiers
+    WHERE id NOT IN (SELECT MAX(id) FROM pricing_tiers GROUP BY item_id, min_qty, COALESCE(max_qty, 0));
+CREATE UNIQUE INDEX IF NOT EXISTS pricing_tiers_item_id_min_qty_max_qty_key
+    ON pricing_tiers(item_id, min_qty, COALESCE(max_qty, 0));
+DROP INDEX IF EXISTS pricing_tiers_item_id_min_qty_idx;
+
+-- One special price per customer and item. Keep the newest of any duplicates,
+-- whether the app wrote them (it read an arbitrary one) or the merge above did.
+DELETE FROM customer_price_list
+    WHERE id NOT IN (SELECT MAX(id) FROM customer_price_list GROUP BY customer_id, item_id);
+CREATE UNIQUE INDEX IF NOT EXISTS customer_price_list_customer_id_item_id_key
+    ON customer_price_list(customer_id, item_id);
+DROP INDEX IF EXISTS customer_price_list_customer_id_item_id_idx;
@@ -0,0 +1,10 @@
+-- Barcode → item mapping used by the "Barcode Scan-In" page.
+-- One barcode points at one items row (item + fridge); units_per_scan lets a
+-- case barcode count as several units.
+create table if not exists item_barcodes (
+    barcode text primary key,
+    item_id bigint not null references items(item_id) on delete cascade,
+    units_per_scan integer not null default 1 check (units_per_scan > 0)
+);
+
+create index if not exists item_barcodes_item_id_idx on item_barcodes(item_id);
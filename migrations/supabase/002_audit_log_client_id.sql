@@ -0,0 +1,5 @@
+-- Write-behind audit logging: each spooled entry carries a client-generated id
+-- so a batch re-sent after a crash is ignored instead of inserted twice.
+alter table audit_log add column if not exists client_id uuid;
+
+create unique index if not exists audit_log_client_id_key on audit_log(client_id);
@@ -0,0 +1,4 @@
+-- Hot audit queries only read the recent window; older months live in the
+-- Parquet archive (see audit_archive.py), so range scans on timestamp must
+-- use an index.
+create index if not exists audit_log_timestamp_idx on audit_log(timestamp desc);
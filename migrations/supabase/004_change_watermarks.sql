@@ -0,0 +1,57 @@
+-- Delta sync: every mirrored table carries an updated_at watermark, and deletes
+-- leave a tombstone in deleted_rows, so clients can fetch only what changed
+-- since their last sync (see sync_table() in db_supabase.py).
+
+create or replace function set_updated_at() returns trigger as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$ language plpgsql;
+
+-- TG_ARGV[0] is the primary key column of the table the trigger is on
+create or replace function record_tombstone() returns trigger as $$
+begin
+    insert into deleted_rows (table_name, row_id) values (tg_table_name, to_jsonb(old) ->> tg_argv[0]);
+    return old;
+end;
+$$ language plpgsql;
+
+create table if not exists deleted_rows (
+    id bigserial primary key,
+    table_name text not null,
+    row_id text not null,
+    deleted_at timestamptz not null default now()
+);
+create index if not exists deleted_rows_table_deleted_at_idx on deleted_rows(table_name, deleted_at);
+
+do $$
+declare
+    t record;
+begin
+    for t in
+        select * from (values
+            ('items', 'item_id'),
+            ('customers', 'id'),
+            ('pricing_tiers', 'id'),
+            ('customer_price_list', 'id'),
+            ('sales', 'id'),
+            ('item_barcodes', 'barcode'),
+            ('price_history', 'id')
+        ) as v(table_name, pk)
+    loop
+        execute format('alter table %I add column if not exists updated_at timestamptz not null default now()', t.table_name);
+        execute format('create index if not exists %I on %I(updated_at)', t.table_name || '_updated_at_idx', t.table_name);
+        execute format('drop trigger if exists set_updated_at on %I', t.table_name);
+        execute format('create trigger set_updated_at before update on %I for each row execute function set_updated_at()', t.table_name);
+        execute format('drop trigger if exists record_tombstone on %I', t.table_name);
+        execute format('create trigger record_tombstone after delete on %I for each row execute function record_tombstone(%L)', t.table_name, t.pk);
+    end loop;
+end;
+$$;
+
+-- Tombstones only need to outlive the longest gap between client syncs.
+-- Clients whose watermark is older than this fall back to a full resync.
+create or replace function purge_tombstones(retention interval default interval '30 days') returns void as $$
+    delete from deleted_rows where deleted_at < now() - retention;
+$$ language sql;
@@ -0,0 +1,23 @@
+-- Change feed (DIANES_CHANGE_FEED=realtime): publish row changes on the shop
+-- tables to Supabase realtime. Replica identity full puts the whole old row
+-- in DELETE events, so clients can tell which cached row went away.
+
+do $$
+declare
+    t text;
+begin
+    foreach t in array array[
+        'items', 'customers', 'pricing_tiers', 'customer_price_list',
+        'sales', 'item_barcodes', 'price_history'
+    ]
+    loop
+        execute format('alter table %I replica identity full', t);
+        if not exists (
+            select 1 from pg_publication_tables
+            where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = t
+        ) then
+            execute format('alter publication supabase_realtime add table %I', t);
+        end if;
+    end loop;
+end;
+$$;
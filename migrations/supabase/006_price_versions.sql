@@ -0,0 +1,66 @@
+-- Temporal price history: every pricing tier and special customer price is
+-- kept as a series of versions, each valid over [valid_from, valid_to).
+-- The open (current) version has valid_to null. See price_as_of() in
+-- db_supabase.py.
+
+create table if not exists price_versions (
+    id bigserial primary key,
+    kind text not null check (kind in ('tier', 'special')),
+    source_id bigint not null,              -- pricing_tiers.id or customer_price_list.id
+    item_id bigint not null,
+    customer_id bigint,                     -- special prices only
+    min_qty integer,                        -- tiers only
+    max_qty integer,
+    label text,
+    price_per_unit numeric not null,
+    valid_from timestamptz not null default now(),
+    valid_to timestamptz,
+    updated_at timestamptz not null default now(),
+    check (valid_to is null or valid_to > valid_from)
+);
+
+-- price_as_of(): versions of one item's tiers / one customer's special price
+-- that started before a given time
+create index if not exists price_versions_item_kind_from_idx
+    on price_versions(item_id, kind, customer_id, valid_from);
+-- At most one open version per tier or special price
+create unique index if not exists price_versions_open_key
+    on price_versions(kind, source_id) where valid_to is null;
+create index if not exists price_versions_updated_at_idx on price_versions(updated_at);
+
+-- Mirrored like the other shop tables (see 004_change_watermarks.sql)
+drop trigger if exists set_updated_at on price_versions;
+create trigger set_updated_at before update on price_versions
+    for each row execute function set_updated_at();
+drop trigger if exists record_tombstone on price_versions;
+create trigger record_tombstone after delete on price_versions
+    for each row execute function record_tombstone('id');
+
+-- Current prices become the first versions. Their real start is unknown, so
+-- they are treated as valid from the epoch.
+insert into price_versions (kind, source_id, item_id, min_qty, max_qty, label, price_per_unit, valid_from)
+select 'tier', t.id, t.item_id, t.min_qty, t.max_qty, t.label, t.price_per_unit, 'epoch'
+from pricing_tiers t
+where not exists (
+    select 1 from price_versions v where v.kind = 'tier' and v.source_id = t.id and v.valid_to is null
+);
+
+insert into price_versions (kind, source_id, item_id, customer_id, price_per_unit, valid_from)
+select 'special', c.id, c.item_id, c.customer_id, c.custom_price, 'epoch'
+from customer_price_list c
+where c.custom_price is not null and not exists (
+    select 1 from price_versions v where v.kind = 'special' and v.source_id = c.id and v.valid_to is null
+);
+
+-- Change feed (see 005_realtime_publication.sql)
+alter table price_versions replica identity full;
+do $$
+begin
+    if not exists (
+        select 1 from pg_publication_tables
+        where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = 'price_versions'
+    ) then
+        alter publication supabase_realtime add table price_versions;
+    end if;
+end;
+$$;
@@ -0,0 +1,27 @@
+-- Point-in-time inventory: audit entries that move stock record which fridge
+-- row moved and by how much, and the stock is copied into a checkpoint
+-- periodically. inventory_as_of() in db_supabase.py starts from the nearest
+-- checkpoint and replays only the audit entries since.
+
+-- Null on entries that do not move stock, and on entries from before this migration
+alter table audit_log add column if not exists fridge_no text;
+alter table audit_log add column if not exists qty_delta numeric;
+
+-- taken_at uses the same local-time convention as audit_log.timestamp
+create table if not exists inventory_checkpoints (
+    id bigserial primary key,
+    taken_at timestamp not null,
+    item_rows integer not null,
+    total_quantity numeric not null
+);
+create index if not exists inventory_checkpoints_taken_at_idx on inventory_checkpoints(taken_at);
+
+create table if not exists inventory_checkpoint_rows (
+    checkpoint_id bigint not null references inventory_checkpoints(id) on delete cascade,
+    item_id bigint not null,
+    item_name text,
+    category text,
+    fridge_no text,
+    quantity numeric not null,
+    primary key (checkpoint_id, item_id)
+);
@@ -0,0 +1,33 @@
+-- Per-item stock alert thresholds. Items without a row here alert at the
+-- global threshold set in the sidebar (see StockAlerts in stock_alerts.py).
+
+create table if not exists stock_thresholds (
+    item_name text primary key,
+    threshold numeric not null check (threshold >= 0),
+    updated_at timestamptz not null default now()
+);
+create index if not exists stock_thresholds_updated_at_idx on stock_thresholds(updated_at);
+
+-- Mirrored like the other shop tables (see 004_change_watermarks.sql)
+drop trigger if exists set_updated_at on stock_thresholds;
+create trigger set_updated_at before update on stock_thresholds
+    for each row execute function set_updated_at();
+drop trigger if exists record_tombstone on stock_thresholds;
+create trigger record_tombstone after delete on stock_thresholds
+    for each row execute function record_tombstone('item_name');
+
+-- Change feed (see 005_realtime_publication.sql)
+alter table stock_thresholds replica identity full;
+do $$
+begin
+    if not exists (
+        select 1 from pg_publication_tables
+        where pubname = 'supabase_realtime' and schemaname = 'public' and tablename = 'stock_thresholds'
+    ) then
+        alter publication supabase_realtime add table stock_thresholds;
+    end if;
+end;
+$$;
+
+-- Reorder suggestions read recent sales of the low-stock items
+create index if not exists sales_item_name_date_idx on sales(item_name, date);
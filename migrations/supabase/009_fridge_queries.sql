@@ -0,0 +1,26 @@
+-- Fridge-scoped reads: the per-fridge view reads one fridge's rows through an
+-- index, and the fridge list comes from a server-side aggregate instead of
+-- every item row (see fridge_summary() in db_supabase.py).
+
+create index if not exists items_fridge_no_idx on items(fridge_no);
+
+create or replace function fridge_summary()
+returns table (
+    fridge_no text,
+    item_rows bigint,
+    stocked_rows bigint,
+    empty_rows bigint,
+    categories bigint,
+    total_units numeric
+) as $$
+    select
+        i.fridge_no::text,
+        count(*),
+        count(*) filter (where i.quantity > 0),
+        count(*) filter (where coalesce(i.quantity, 0) <= 0),
+        count(distinct i.category),
+        coalesce(sum(i.quantity), 0)
+    from items i
+    group by i.fridge_no
+    order by i.fridge_no;
+$$ language sql stable;
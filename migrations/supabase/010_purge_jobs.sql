@@ -0,0 +1,19 @@
+-- Bulk purges (delete all inventory / customers) run as background jobs that
+-- delete in id ranges. Each job records how far it got, so a failed or
+-- abandoned job resumes after last_id (see start_purge() in db_supabase.py).
+
+create table if not exists purge_jobs (
+    id bigserial primary key,
+    table_name text not null,
+    status text not null check (status in ('running', 'done', 'failed')),
+    username text,
+    archive boolean not null default false,
+    total_rows bigint not null default 0,
+    deleted_rows bigint not null default 0,
+    last_id bigint,                       -- highest primary key deleted so far
+    error text,
+    heartbeat timestamptz,                -- bumped after every chunk while running
+    started_at timestamptz not null default now(),
+    finished_at timestamptz
+);
+create index if not exists purge_jobs_table_status_idx on purge_jobs(table_name, status);
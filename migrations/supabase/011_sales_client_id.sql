@@ -0,0 +1,6 @@
+-- Idempotent sales: record_sale() writes each sale with a client-generated id
+-- and upserts on it, so a retried request or a replayed outbox entry cannot
+-- insert the same sale twice (see record_sale() in db_supabase.py).
+alter table sales add column if not exists client_id uuid;
+
+create unique index if not exists sales_client_id_key on sales(client_id);
@@ -0,0 +1,10 @@
+-- Indexes for the filters db_supabase.py runs on every page: stock by item
+-- name, customers by name, a customer's sales by date, tier lookup by item
+-- and quantity, and a customer's special price for an item. audit_log(timestamp) is covered by
+-- migration 003. Check the plans with `python query_plans.py`.
+
+create index if not exists items_item_name_idx on items(item_name);
+create index if not exists customers_name_idx on customers(name);
+create index if not exists sales_customer_id_date_idx on sales(customer_id, date);
+create index if not exists pricing_tiers_item_id_min_qty_idx on pricing_tiers(item_id, min_qty);
+create index if not exists customer_price_list_customer_id_item_id_idx on customer_price_list(customer_id, item_id);
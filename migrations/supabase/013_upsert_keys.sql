@@ -0,0 +1,121 @@
+-- Single-statement writes: stock-ins, pricing tiers and special prices are
+-- upserts on unique keys instead of a read followed by an insert or update,
+-- so concurrent writes can neither create duplicates nor lose a stock-in.
+-- See add_or_update_item(), save_pricing_tier() and set_special_price() in
+-- db_supabase.py.
+
+-- Merge item rows that share item_name/category/fridge_no into the oldest one
+-- and point everything that referred to the others at it. Rows without a
+-- fridge_no share the key too (the unique index below treats nulls as equal).
+create temp table item_merge as
+    select i.item_id as old_id, k.keep_id
+    from items i
+    join (
+        select item_name, category, fridge_no, min(item_id) as keep_id
+        from items
+        group by item_name, category, fridge_no
+        having count(*) > 1
+    ) k on i.item_name = k.item_name and i.category = k.category
+          and i.fridge_no is not distinct from k.fridge_no
+    where i.item_id <> k.keep_id;
+
+update items i set quantity = i.quantity + m.extra
+    from (
+        select m.keep_id, sum(d.quantity) as extra
+        from item_merge m join items d on d.item_id = m.old_id
+        group by m.keep_id
+    ) m
+    where i.item_id = m.keep_id;
+
+update sales s set item_id = m.keep_id from item_merge m where s.item_id = m.old_id;
+update pricing_tiers t set item_id = m.keep_id from item_merge m where t.item_id = m.old_id;
+update customer_price_list c set item_id = m.keep_id from item_merge m where c.item_id = m.old_id;
+update item_barcodes b set item_id = m.keep_id from item_merge m where b.item_id = m.old_id;
+update price_history h set item_id = m.keep_id from item_merge m where h.item_id = m.old_id;
+update price_versions v set item_id = m.keep_id from item_merge m where v.item_id = m.old_id;
+delete from items i using item_merge m where i.item_id = m.old_id;
+drop table item_merge;
+
+create unique index if not exists items_item_name_category_fridge_no_key
+    on items(item_name, category, fridge_no) nulls not distinct;
+-- Covered by the key above
+drop index if exists items_item_name_idx;
+
+-- One tier per item and quantity range. An open-ended tier may have max_qty
+-- null or 0 (get_base_price() treats both as unlimited), so the key does too.
+-- Keep the newest of any duplicates.
+delete from pricing_tiers a
+    using pricing_tiers b
+    where a.item_id = b.item_id and a.min_qty = b.min_qty
+      and coalesce(a.max_qty, 0) = coalesce(b.max_qty, 0) and a.id < b.id;
+create unique index if not exists pricing_tiers_item_id_min_qty_max_qty_key
+    on pricing_tiers(item_id, min_qty, coalesce(max_qty, 0));
+drop index if exists pricing_tiers_item_id_min_qty_idx;
+
+-- One special price per customer and item. Keep the newest of any duplicates,
+-- whether the app wrote them (it read an arbitrary one) or the merge above did.
+delete from customer_price_list a
+    using customer_price_list b
+    where a.customer_id = b.customer_id and a.item_id = b.item_id and a.id < b.id;
+create unique index if not exists customer_price_list_customer_id_item_id_key
+    on customer_price_list(customer_id, item_id);
+-- Covered by the key above
+drop index if exists customer_price_list_customer_id_item_id_idx;
+
+-- Tiers and special prices removed above stop being current (see 006)
+update price_versions v set valid_to = now()
+    where v.valid_to is null and v.kind = 'tier'
+      and not exists (select 1 from pricing_tiers t where t.id = v.source_id);
+update price_versions v set valid_to = now()
+    where v.valid_to is null and v.kind = 'special'
+      and not exists (select 1 from customer_price_list c where c.id = v.source_id);
+
+-- Add p_quantity to an item's row in p_fridge_no, inserting the row if it is
+-- not there. With p_item_id the row is that item's (by name and category) in
+-- p_fridge_no; otherwise it is p_item_name/p_category's. Returns the row as
+-- written plus "inserted" and "stamped_at", the time its audit entry carries
+-- (see 019). A call whose p_client_key was applied before (claim_write(),
+-- 017) changes nothing and returns no rows.
+create or replace function stock_in(
+    p_item_id bigint,
+    p_item_name text,
+    p_category text,
+    p_fridge_no bigint,
+    p_quantity numeric,
+    p_client_key text default null
+)
+returns setof jsonb as $$
+begin
+    if p_client_key is not null and not claim_write(p_client_key, 'stock_in') then
+        return;
+    end if;
+    return query
+        insert into items as i (item_name, category, quantity, fridge_no)
+        values (
+            coalesce((select s.item_name from items s where s.item_id = p_item_id), p_item_name),
+            coalesce((select s.category from items s where s.item_id = p_item_id), p_category),
+            p_quantity,
+            p_fridge_no
+        )
+        on conflict (item_name, category, fridge_no)
+            do update set quantity = i.quantity + excluded.quantity
+        returning to_jsonb(i) || jsonb_build_object('inserted', i.xmax = 0, 'stamped_at', clock_timestamp());
+end;
+$$ language plpgsql volatile;
+
+-- Insert a pricing tier or reprice the one with the same item and range.
+-- Returns the row as written plus "inserted".
+create or replace function upsert_pricing_tier(
+    p_item_id bigint,
+    p_min_qty integer,
+    p_max_qty integer,
+    p_price_per_unit numeric,
+    p_label text
+)
+returns setof jsonb as $$
+    insert into pricing_tiers as t (item_id, min_qty, max_qty, price_per_unit, label)
+    values (p_item_id, p_min_qty, nullif(p_max_qty, 0), p_price_per_unit, p_label)
+    on conflict (item_id, min_qty, coalesce(max_qty, 0))
+        do update set price_per_unit = excluded.price_per_unit, label = excluded.label
+    returning to_jsonb(t) || jsonb_build_object('inserted', t.xmax = 0);
+$$ language sql volatile;
@@ -0,0 +1,8 @@
+-- Private Storage bucket for the monthly audit_log archive (see audit_archive.py
+-- and archive_old_audit_entries() in db_supabase.py). Every app host reads and
+-- writes the same files, and they outlive the hosts. Only the service role key
+-- the app uses can reach it.
+
+insert into storage.buckets (id, name, public)
+values ('audit-archive', 'audit-archive', false)
+on conflict (id) do nothing;
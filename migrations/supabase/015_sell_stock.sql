@@ -0,0 +1,79 @@
+-- Record a sale in one transaction: check the sale's client_id, deduct the
+-- quantity from the item's rows relative to what they hold, and insert the
+-- sale. Concurrent sales of the same item queue on its row locks instead of
+-- overwriting each other's deductions, and a sale is either fully recorded or
+-- not at all. See record_sale() in db_supabase.py.
+--
+-- Returns {"status": "recorded" | "duplicate" | "not_found" | "short"}; a
+-- recorded sale also has "item_name", "category", "deductions", one
+-- {"row": <item row as written>, "deduct": <units>} per row stock came out of,
+-- and "stamped_at", the time its audit entries carry (see 019).
+create or replace function sell_stock(
+    p_client_id uuid,
+    p_item_id bigint,
+    p_quantity numeric,
+    p_customer_id bigint,
+    p_selling_price numeric,
+    p_date date
+)
+returns jsonb as $$
+declare
+    v_item items;
+    v_available numeric;
+    v_deductions jsonb;
+begin
+    if exists (select 1 from sales where client_id = p_client_id) then
+        return jsonb_build_object('status', 'duplicate');
+    end if;
+
+    select * into v_item from items where item_id = p_item_id;
+    if not found then
+        return jsonb_build_object('status', 'not_found');
+    end if;
+
+    -- Every fridge row of the item, locked in a fixed order
+    perform 1 from items where item_name = v_item.item_name order by item_id for update;
+    select coalesce(sum(greatest(quantity, 0)), 0) into v_available
+        from items where item_name = v_item.item_name;
+    if v_available < p_quantity then
+        return jsonb_build_object('status', 'short');
+    end if;
+
+    insert into sales (client_id, item_id, item_name, quantity, selling_price, total_sale,
+                       cost, profit, date, customer_id, overridden)
+    values (p_client_id, p_item_id, v_item.item_name, p_quantity, p_selling_price,
+            p_quantity * coalesce(p_selling_price, 0), 0, 0, p_date, p_customer_id,
+            case when coalesce(p_selling_price, 0) <> 0 then 1 else 0 end)
+    on conflict (client_id) do nothing;
+    if not found then
+        -- The same sale committed while this call waited for the row locks
+        return jsonb_build_object('status', 'duplicate');
+    end if;
+
+    -- Take from the rows in item_id order until the quantity is covered
+    with stocked as (
+        select item_id, greatest(quantity, 0) as available,
+               sum(greatest(quantity, 0)) over (order by item_id) - greatest(quantity, 0) as before
+        from items
+        where item_name = v_item.item_name
+    ), taken as (
+        select item_id, least(available, p_quantity - before) as deduct
+        from stocked
+        where available > 0 and before < p_quantity
+    ), written as (
+        update items i set quantity = i.quantity - t.deduct
+        from taken t
+        where i.item_id = t.item_id
+        returning i.item_id, jsonb_build_object('row', to_jsonb(i), 'deduct', t.deduct) as deduction
+    )
+    select coalesce(jsonb_agg(deduction order by item_id), '[]'::jsonb) into v_deductions from written;
+
+    return jsonb_build_object(
+        'status', 'recorded',
+        'item_name', v_item.item_name,
+        'category', v_item.category,
+        'deductions', v_deductions,
+        'stamped_at', clock_timestamp()
+    );
+end;
+$$ language plpgsql volatile;
@@ -0,0 +1,44 @@
+-- Many stock-ins in one statement (see add_or_update_items_batch() in
+-- db_supabase.py), each adding to its row as it is at that moment, so a batch
+-- cannot lose units stocked in or sold concurrently.
+--
+-- p_entries is a JSON array of {"item_id", "quantity", "fridge_no"}. An entry
+-- without a fridge_no goes onto the item's own row; one with a fridge_no onto
+-- the row with the item's name and category in that fridge, which is inserted
+-- if it is not there. Entries for unknown items are skipped. Returns each row
+-- as written plus "inserted", "stamped_at" (see 019) and "item_ids", the
+-- entries' items that landed on it. Like stock_in() (013), a batch whose
+-- p_client_key was applied before changes nothing and returns no rows.
+create or replace function stock_in_batch(p_entries jsonb, p_client_key text default null)
+returns setof jsonb as $$
+begin
+    if p_client_key is not null and not claim_write(p_client_key, 'stock_in_batch') then
+        return;
+    end if;
+    return query
+        with entries as (
+            select (e->>'item_id')::bigint as item_id,
+                   (e->>'fridge_no')::bigint as fridge_no,
+                   (e->>'quantity')::numeric as quantity
+            from jsonb_array_elements(p_entries) e
+        ), targets as (
+            select i.item_name, i.category, coalesce(e.fridge_no, i.fridge_no) as fridge_no,
+                   sum(e.quantity) as quantity, array_agg(distinct e.item_id) as item_ids
+            from entries e
+            join items i on i.item_id = e.item_id
+            group by 1, 2, 3
+        ), written as (
+            insert into items as i (item_name, category, quantity, fridge_no)
+            select t.item_name, t.category, t.quantity, t.fridge_no from targets t
+            -- One lock order for every batch, so two batches cannot deadlock
+            order by t.item_name, t.category, t.fridge_no
+            on conflict (item_name, category, fridge_no)
+                do update set quantity = i.quantity + excluded.quantity
+            returning i.*, i.xmax = 0 as inserted, clock_timestamp() as stamped_at
+        )
+        select to_jsonb(w) || jsonb_build_object('item_ids', to_jsonb(t.item_ids))
+        from written w
+        join targets t on t.item_name = w.item_name and t.category = w.category
+            and t.fridge_no is not distinct from w.fridge_no;
+end;
+$$ language plpgsql volatile;
@@ -0,0 +1,50 @@
+-- Idempotent outbox replay (see sync_local_changes() in db_supabase.py).
+-- Every write queued in local-first mode carries a client key, recorded here
+-- once the write has been applied, so a write replayed again after a crash or
+-- a lost response is skipped instead of applied twice. Writes that are not
+-- repeatable record their key in the same transaction as the write itself:
+-- stock_in() (013) and stock_in_batch() (016) through claim_write(),
+-- insert_once() below, and sell_stock() through sales.client_id (015).
+create table if not exists applied_writes (
+    client_key text primary key,
+    op text,
+    applied_at timestamptz not null default now()
+);
+create index if not exists applied_writes_applied_at_idx on applied_writes(applied_at);
+
+-- Keys only need to outlive the longest a host can stay offline with writes queued
+create or replace function purge_applied_writes(retention interval default interval '90 days') returns void as $$
+    delete from applied_writes where applied_at < now() - retention;
+$$ language sql;
+
+-- Record p_client_key. False if it was recorded before (the write was applied).
+create or replace function claim_write(p_client_key text, p_op text) returns boolean as $$
+    with claimed as (
+        insert into applied_writes (client_key, op) values (p_client_key, p_op)
+        on conflict (client_key) do nothing
+        returning 1
+    )
+    select exists (select 1 from claimed);
+$$ language sql volatile;
+
+-- Insert p_row into p_table once per client key (plain inserts of customers
+-- and price_history). Returns the inserted row, or nothing if the key was
+-- applied before.
+create or replace function insert_once(p_table text, p_row jsonb, p_client_key text default null)
+returns setof jsonb as $$
+declare
+    v_columns text;
+begin
+    if p_table not in ('customers', 'price_history') then
+        raise exception 'insert_once does not write to %', p_table;
+    end if;
+    if p_client_key is not null and not claim_write(p_client_key, 'insert_once:' || p_table) then
+        return;
+    end if;
+    select string_agg(quote_ident(k), ', ') into v_columns from jsonb_object_keys(p_row) k;
+    return query execute format(
+        'insert into %I as t (%s) select %s from jsonb_populate_record(null::%I, $1) returning to_jsonb(t)',
+        p_table, v_columns, v_columns, p_table
+    ) using p_row;
+end;
+$$ language plpgsql volatile;
@@ -0,0 +1,55 @@
+-- Version changed tiers and special prices in one transaction (see
+-- _record_price_versions() in db_supabase.py): close each row's open version
+-- and open one from the row as written, so no reader or failure in between
+-- can leave a price with two open versions or none.
+--
+-- p_rows is a JSON array of {"source_id", "item_id", "customer_id",
+-- "min_qty", "max_qty", "label", "price_per_unit"}; rows whose fields match
+-- their open version keep it. With p_deleted the open versions are only
+-- closed. p_valid_from is when the change was made, which for a write queued
+-- offline is earlier than now; a change older than the open version it
+-- replaces takes effect now instead.
+create or replace function record_price_versions(
+    p_kind text,
+    p_rows jsonb,
+    p_deleted boolean default false,
+    p_valid_from timestamptz default null
+)
+returns void as $$
+declare
+    v_changed jsonb;
+begin
+    -- Concurrent versioning of the same price queues here
+    perform 1 from price_versions
+        where kind = p_kind and valid_to is null
+          and source_id in (select (r->>'source_id')::bigint from jsonb_array_elements(p_rows) r)
+        order by id
+        for update;
+
+    select coalesce(jsonb_agg(to_jsonb(r) || jsonb_build_object(
+               'open_id', v.id,
+               'at', case when v.id is null or v.valid_from < coalesce(p_valid_from, now())
+                          then coalesce(p_valid_from, now()) else now() end
+           )), '[]'::jsonb)
+    into v_changed
+    from jsonb_to_recordset(p_rows) as r(source_id bigint, item_id bigint, customer_id bigint, min_qty integer,
+                                         max_qty integer, label text, price_per_unit numeric)
+    left join price_versions v on v.kind = p_kind and v.source_id = r.source_id and v.valid_to is null
+    where p_deleted or v.id is null
+       or (v.item_id, v.customer_id, v.min_qty, v.max_qty, v.label, v.price_per_unit)
+          is distinct from (r.item_id, r.customer_id, r.min_qty, r.max_qty, r.label, r.price_per_unit);
+
+    update price_versions v set valid_to = c.at
+        from jsonb_to_recordset(v_changed) as c(open_id bigint, at timestamptz)
+        where v.id = c.open_id;
+
+    if not p_deleted then
+        insert into price_versions (kind, source_id, item_id, customer_id, min_qty, max_qty, label,
+                                    price_per_unit, valid_from)
+        select p_kind, c.source_id, c.item_id, c.customer_id, c.min_qty, c.max_qty, c.label, c.price_per_unit, c.at
+        from jsonb_to_recordset(v_changed) as c(source_id bigint, item_id bigint, customer_id bigint,
+                                                min_qty integer, max_qty integer, label text,
+                                                price_per_unit numeric, at timestamptz);
+    end if;
+end;
+$$ language plpgsql volatile;
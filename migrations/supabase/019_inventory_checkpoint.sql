@@ -0,0 +1,29 @@
+-- Inventory checkpoints taken in one transaction on the server (see
+-- take_inventory_checkpoint() in db_supabase.py). The stock writes (stock_in()
+-- in 013, sell_stock() in 015, stock_in_batch() in 016) return "stamped_at",
+-- the time their audit entries carry.
+--
+-- The checkpoint holds a share lock on items while it copies them: stock
+-- writes in progress finish first and are in the copy, later ones wait until
+-- it commits. A write reads its stamp after changing its rows and the
+-- checkpoint reads taken_at once it has the lock, both from the server's
+-- clock, so every write is either in the copy or stamped after taken_at,
+-- never both and never neither.
+
+-- taken_at is local time like audit_log.timestamp: the caller passes its UTC offset
+create or replace function take_inventory_checkpoint(p_utc_offset_seconds integer)
+returns bigint as $$
+declare
+    v_id bigint;
+begin
+    lock table items in share mode;
+    insert into inventory_checkpoints (taken_at, item_rows, total_quantity)
+    select (clock_timestamp() at time zone 'UTC') + make_interval(secs => p_utc_offset_seconds),
+           count(*), coalesce(sum(quantity), 0)
+    from items
+    returning id into v_id;
+    insert into inventory_checkpoint_rows (checkpoint_id, item_id, item_name, category, fridge_no, quantity)
+    select v_id, item_id, item_name, category, fridge_no::text, coalesce(quantity, 0) from items;
+    return v_id;
+end;
+$$ language plpgsql volatile;
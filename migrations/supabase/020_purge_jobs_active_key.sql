@@ -0,0 +1,21 @@
+-- At most one unfinished (running or failed) purge job per table, so two
+-- hosts starting a purge at the same moment cannot both insert a job; the
+-- loser's insert fails and start_purge() in db_supabase.py resumes the
+-- winner's job instead.
+
+-- Older duplicates are superseded by the newest job, which deletes every row
+-- they would have
+update purge_jobs p
+set status = 'done', error = 'superseded by job ' || newest.id, finished_at = now()
+from (
+    select distinct on (table_name) table_name, id
+    from purge_jobs
+    where status in ('running', 'failed')
+    order by table_name, id desc
+) newest
+where p.table_name = newest.table_name
+  and p.status in ('running', 'failed')
+  and p.id <> newest.id;
+
+create unique index if not exists purge_jobs_active_key
+    on purge_jobs(table_name) where status in ('running', 'failed');
@@ -0,0 +1,8 @@
+-- Private Storage bucket for the rows archiving bulk purges save before
+-- deleting them (see bulk_purge.py and start_purge() in db_supabase.py), so the
+-- archive does not depend on which host ran the job. Only the service role key
+-- the app uses can reach it.
+
+insert into storage.buckets (id, name, public)
+values ('purge-archive', 'purge-archive', false)
+on conflict (id) do nothing;
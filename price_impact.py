@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+# Same columns as the tiered pricing upload (upload_tiered_pricing_to_db)
+TIER_COLUMNS = ["item_id", "min_qty", "max_qty", "price_per_unit", "label"]
+TIER_KEY = ["item_id", "min_qty", "max_qty", "label"]
+
+
+def normalize_tiers(df: pd.DataFrame) -> pd.DataFrame:
+    """Coerce a tier frame the way upload_tiered_pricing_to_db reads each row."""
+    missing = [c for c in TIER_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing pricing columns: {', '.join(missing)}")
+    df = df[TIER_COLUMNS].dropna(subset=["item_id", "min_qty", "price_per_unit"])
+    return pd.DataFrame({
+        "item_id": df["item_id"].astype("int64"),
+        "min_qty": df["min_qty"].astype("int64"),
+        # Nullable so an open-ended tier (no max) still matches its key
+        "max_qty": pd.to_numeric(df["max_qty"], errors="coerce").astype("Int64"),
+        "price_per_unit": df["price_per_unit"].astype(float),
+        "label": df["label"].astype(str).str.strip().str.upper(),
+    }).reset_index(drop=True)
+
+def apply_tier_changes(current: pd.DataFrame, proposed: pd.DataFrame) -> pd.DataFrame:
+    """
+    The tier set after an upload of `proposed`: rows matching an existing tier
+    on (item_id, min_qty, max_qty, label) replace its price, others are added.
+    """
+    current, proposed = normalize_tiers(current), normalize_tiers(proposed)
+    merged = pd.concat([current, proposed], ignore_index=True)
+    return merged.drop_duplicates(subset=TIER_KEY, keep="last").reset_index(drop=True)
+
+def changed_tiers(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Tiers whose price differs between two tier sets (old_price is NaN for added tiers)."""
+    both = normalize_tiers(new).merge(
+        normalize_tiers(old), on=TIER_KEY, how="left", suffixes=("", "_old")
+    ).rename(columns={"price_per_unit": "new_price", "price_per_unit_old": "old_price"})
+    return both[both["new_price"] != both["old_price"]].reset_index(drop=True)
+
+def tier_prices(item_id, quantity, tiers: pd.DataFrame, missing=0.0) -> np.ndarray:
+    """
+    Per-unit tier price for each (item_id, quantity) pair, chosen like
+    get_base_price(): the tier with the highest min_qty <= quantity whose
+    max_qty is empty, 0 or >= quantity; `missing` when no tier applies.
+    """
+    lines = pd.DataFrame({"item_id": np.asarray(item_id, dtype="int64"), "quantity": np.asarray(quantity, dtype=float)})
+    lines["_pos"] = np.arange(len(lines))
+    prices = np.full(len(lines), missing, dtype=float)
+    tiers = normalize_tiers(tiers)
+    if lines.empty or tiers.empty:
+        return prices
+
+    # Interval match: for every line, the tier of its item with the largest min_qty <= quantity
+    left = lines.sort_values("quantity", kind="stable")
+    right = tiers.assign(min_qty=tiers["min_qty"].astype(float)).sort_values("min_qty", kind="stable")
+    matched = pd.merge_asof(left, right, left_on="quantity", right_on="min_qty", by="item_id", direction="backward")
+    max_qty = matched["max_qty"].astype(float)
+    ok = matched["price_per_unit"].notna() & (max_qty.isna() | (max_qty == 0) | (max_qty >= matched["quantity"]))
+    prices[matched.loc[ok, "_pos"].to_numpy()] = matched.loc[ok, "price_per_unit"].to_numpy()
+
+    # Overlapping tiers: the nearest tier below may end before the quantity while
+    # a lower one still covers it. Only those few lines are matched pairwise.
+    rest = matched.loc[~ok & matched["price_per_unit"].notna(), ["item_id", "quantity", "_pos"]]
+    if not rest.empty:
+        pairs = rest.merge(tiers, on="item_id")
+        pair_max = pairs["max_qty"].astype(float)
+        pairs = pairs[(pairs["min_qty"] <= pairs["quantity"])
+                      & (pair_max.isna() | (pair_max == 0) | (pair_max >= pairs["quantity"]))]
+        best = pairs.sort_values("min_qty").groupby("_pos").tail(1)
+        prices[best["_pos"].to_numpy()] = best["price_per_unit"].to_numpy()
+    return prices
+
+def simulate(sales: pd.DataFrame, old_tiers: pd.DataFrame, new_tiers: pd.DataFrame,
+             special_prices: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Re-price every sales line against the old and the new tier sets. A
+    customer's special price for the item (customer_price_list) takes
+    precedence over tiers, as in get_customer_adjusted_price(). Returns the
+    lines with old/new unit price, revenue and margin columns added.
+    """
+    lines = sales.reset_index(drop=True)
+    lines = lines.assign(
+        item_id=lines["item_id"].astype("int64"),
+        quantity=lines["quantity"].astype(float),
+        cost=pd.to_numeric(lines.get("cost", 0.0), errors="coerce").fillna(0.0),
+    )
+    old_price = tier_prices(lines["item_id"], lines["quantity"], old_tiers)
+    new_price = tier_prices(lines["item_id"], lines["quantity"], new_tiers)
+
+    if special_prices is not None and not special_prices.empty and "customer_id" in lines:
+        special = special_prices.drop_duplicates(["customer_id", "item_id"], keep="last")
+        custom = lines[["customer_id", "item_id"]].merge(
+            special[["customer_id", "item_id", "custom_price"]], on=["customer_id", "item_id"], how="left"
+        )["custom_price"].to_numpy(dtype=float)
+        has_custom = ~np.isnan(custom)
+        old_price = np.where(has_custom, custom, old_price)
+        new_price = np.where(has_custom, custom, new_price)
+
+    lines["old_price"] = old_price
+    lines["new_price"] = new_price
+    lines["old_revenue"] = old_price * lines["quantity"]
+    lines["new_revenue"] = new_price * lines["quantity"]
+    lines["revenue_delta"] = lines["new_revenue"] - lines["old_revenue"]
+    lines["old_margin"] = lines["old_revenue"] - lines["cost"]
+    lines["new_margin"] = lines["new_revenue"] - lines["cost"]
+    lines["margin_delta"] = lines["new_margin"] - lines["old_margin"]
+    return lines
+
+def summarize(lines: pd.DataFrame, by) -> pd.DataFrame:
+    """Revenue and margin totals and deltas per group, biggest change first."""
+    summary = lines.groupby(by, dropna=False).agg(
+        lines=("quantity", "size"),
+        quantity=("quantity", "sum"),
+        old_revenue=("old_revenue", "sum"),
+        new_revenue=("new_revenue", "sum"),
+        revenue_delta=("revenue_delta", "sum"),
+        old_margin=("old_margin", "sum"),
+        new_margin=("new_margin", "sum"),
+        margin_delta=("margin_delta", "sum"),
+    ).reset_index()
+    summary["revenue_delta_pct"] = np.where(
+        summary["old_revenue"] != 0, summary["revenue_delta"] / summary["old_revenue"] * 100, np.nan
+    )
+    return summary.sort_values("revenue_delta", key=np.abs, ascending=False, kind="stable").reset_index(drop=True)
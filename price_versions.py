@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from price_impact import TIER_COLUMNS, tier_prices
+
+
+def annotate(sales: pd.DataFrame, when: pd.Series, versions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add price_as_of and price_source to sales lines, given each line's
+    timestamp (`when`) and the price_versions rows covering those times.
+
+    Special prices are matched with merge_asof on (item_id, customer_id) by
+    valid_from. For tiers, each item's timeline is cut into epochs at every
+    version boundary, so one tier set applies per epoch; lines are assigned
+    to epochs with merge_asof and priced with price_impact.tier_prices()
+    using the epoch as the key.
+    """
+    n = len(sales)
+    price = np.full(n, np.nan)
+    source = np.full(n, None, dtype=object)
+    column = lambda name: pd.to_numeric(sales[name], errors="coerce").to_numpy() if name in sales else np.nan
+    lines = pd.DataFrame({
+        "_pos": np.arange(n),
+        "item_id": column("item_id"),
+        "customer_id": column("customer_id"),
+        "quantity": column("quantity"),
+        "when": _utc(when).reset_index(drop=True),
+    }).dropna(subset=["item_id", "quantity", "when"])
+    lines["item_id"] = lines["item_id"].astype("int64")
+
+    versions = versions.assign(
+        item_id=pd.to_numeric(versions["item_id"]).astype("int64"),
+        valid_from=_utc(versions["valid_from"]),
+        valid_to=_utc(versions["valid_to"]),
+    )
+
+    # ---- special prices ----
+    specials = versions[versions["kind"] == "special"].dropna(subset=["customer_id"])
+    with_customer = lines.dropna(subset=["customer_id"])
+    if not specials.empty and not with_customer.empty:
+        matched = pd.merge_asof(
+            with_customer.astype({"customer_id": "int64"}).sort_values("when"),
+            specials.astype({"customer_id": "int64"})
+            [["item_id", "customer_id", "valid_from", "valid_to", "price_per_unit"]].sort_values("valid_from"),
+            left_on="when", right_on="valid_from", by=["item_id", "customer_id"], direction="backward",
+        )
+        ok = matched["price_per_unit"].notna() & (matched["valid_to"].isna() | (matched["valid_to"] > matched["when"]))
+        positions = matched.loc[ok, "_pos"].to_numpy()
+        price[positions] = matched.loc[ok, "price_per_unit"].to_numpy(dtype=float)
+        source[positions] = "special"
+
+    # ---- tiers ----
+    tiers = versions[versions["kind"] == "tier"]
+    rest = lines[np.isnan(price[lines["_pos"].to_numpy()])]
+    if not tiers.empty and not rest.empty:
+        starts = pd.concat([
+            tiers[["item_id", "valid_from"]].rename(columns={"valid_from": "start"}),
+            tiers.loc[tiers["valid_to"].notna(), ["item_id", "valid_to"]].rename(columns={"valid_to": "start"}),
+        ]).drop_duplicates().sort_values(["item_id", "start"]).reset_index(drop=True)
+        starts["epoch"] = np.arange(len(starts))
+
+        epoch_tiers = starts.merge(tiers, on="item_id")
+        epoch_tiers = epoch_tiers[
+            (epoch_tiers["valid_from"] <= epoch_tiers["start"])
+            & (epoch_tiers["valid_to"].isna() | (epoch_tiers["valid_to"] > epoch_tiers["start"]))
+        ].assign(item_id=lambda df: df["epoch"])
+
+        matched = pd.merge_asof(
+            rest.sort_values("when"), starts.sort_values("start"),
+            left_on="when", right_on="start", by="item_id", direction="backward",
+        ).dropna(subset=["epoch"])
+        tier_price = tier_prices(matched["epoch"], matched["quantity"], epoch_tiers[TIER_COLUMNS], missing=np.nan)
+        found = ~np.isnan(tier_price)
+        positions = matched["_pos"].to_numpy()[found]
+        price[positions] = tier_price[found]
+        source[positions] = "tier"
+
+    return sales.assign(price_as_of=price, price_source=source)
+
+def _utc(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, utc=True, format="ISO8601").dt.as_unit("us")
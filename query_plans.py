@@ -0,0 +1,148 @@
+import argparse
+import re
+import sqlite3
+import tempfile
+from datetime import date, datetime
+
+import pandas as pd
+
+import sqlite_migrations
+from load_test import local_backend, seed_backend
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"IN \((?:\?, )*\?\)")
+_SKIP = re.compile(r"^\s*(PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|EXPLAIN|CREATE|ALTER)\b", re.I)
+
+
+def shape(sql: str) -> str:
+    """The statement with its literal values replaced by ?, so calls with different arguments compare equal."""
+    sql = _LITERAL.sub("?", " ".join(sql.split()))
+    return _IN_LIST.sub("IN (...)", sql)
+
+def exercise(db, item: dict, customer: dict) -> list:
+    """
+    Call every db_supabase function with a hot filter once, against a seeded
+    backend. Returns (function, call) pairs; calls run in order, so writes
+    leave the rows later reads look for.
+    """
+    today = date.today().isoformat()
+    user = "query_plans"
+    return [
+        ("view_items", lambda: db.view_items()),
+        ("get_total_qty", lambda: db.get_total_qty(item["item_name"])),
+        ("view_items_in_fridge", lambda: db.view_items_in_fridge(item["fridge_no"])),
+        ("add_or_update_item (new entry)", lambda: db.add_or_update_item(
+            None, item["item_name"], item["category"], 1, item["fridge_no"], user)),
+        ("add_or_update_item (selected item)", lambda: db.add_or_update_item(
+            item["item_id"], item["item_name"], item["category"], 1, item["fridge_no"], user)),
+        ("add_or_update_items_batch", lambda: db.add_or_update_items_batch(
+            [{"item_id": item["item_id"], "quantity": 1}], user)),
+        ("get_customer", lambda: db.get_customer(customer["id"])),
+        ("validate_if_customer_exist", lambda: db.validate_if_customer_exist(customer["name"])),
+        ("update_customer", lambda: db.update_customer(customer["name"], "0917", "a@b.c", "QC")),
+        ("add_price", lambda: db.add_price(customer["id"], item["item_id"], 18.0)),
+        ("validate_special_price_exist", lambda: db.validate_special_price_exist(customer["id"], item["item_id"])),
+        ("get_special_price", lambda: db.get_special_price(customer["id"], item["item_id"])),
+        ("update_price", lambda: db.update_price(customer["id"], item["item_id"], 17.0)),
+        ("set_special_price", lambda: db.set_special_price(customer["id"], item["item_id"], 16.0)),
+        ("get_base_price", lambda: db.get_base_price(item["item_id"], 3)),
+        ("get_customer_adjusted_price", lambda: db.get_customer_adjusted_price(customer["id"], item["item_id"], 3)),
+        ("get_pricing_tiers", lambda: db.get_pricing_tiers(item["item_id"])),
+        ("save_pricing_tier", lambda: db.save_pricing_tier(item["item_id"], 10, None, 19.0, "CASE")),
+        ("record_sale", lambda: db.record_sale(item["item_id"], 2, user, customer["id"], 20.0)),
+        ("view_sales_by_customer", lambda: db.view_sales_by_customer(customer["id"])),
+        ("get_sales_by_customer", lambda: db.get_sales_by_customer(customer["id"], today, today)),
+        ("low_stock_items", lambda: db.low_stock_items(5)),
+        ("reorder_suggestions", lambda: db.reorder_suggestions(10_000)),
+        ("view_audit_log", lambda: (db.flush_audit_log(), db.audit_writer.flush(),
+                                    db.view_audit_log(today, f"{today}T23:59:59.999999"))),
+        ("set_stock_threshold", lambda: db.set_stock_threshold(item["item_name"], 3)),
+        ("delete_stock_threshold", lambda: db.delete_stock_threshold(item["item_name"])),
+        ("view_price_versions", lambda: db.view_price_versions([item["item_id"]])),
+        ("price_as_of", lambda: db.price_as_of(item["item_id"], 3, datetime.now(), customer["id"])),
+        ("delete_item", lambda: db.delete_item(item["item_id"], user)),
+    ]
+
+def collect(directory: str = None):
+    """
+    Run exercise() on a fresh local backend with the SQLite migrations
+    applied, tracing the SQL it sends. Returns (backend connection,
+    DataFrame of function, shape and one example statement, errors).
+    """
+    db, client = local_backend(directory or tempfile.mkdtemp(prefix="dianes_plans_"))
+    sqlite_migrations.migrate(client.conn)
+    items_df, customer_ids = seed_backend(client, items=20, fridges=2, customers=10, stock=100)
+    item = items_df.iloc[0].to_dict()
+    customer = client.table("customers").select("*").eq("id", customer_ids[0]).execute().data[0]
+
+    statements = []
+    current = {"function": None}
+    client.conn.set_trace_callback(lambda sql: statements.append((current["function"], sql)))
+    errors = {}
+    for function, call in exercise(db, item, customer):
+        current["function"] = function
+        try:
+            call()
+        except Exception as e:
+            errors[function] = f"{type(e).__name__}: {e}"
+    client.conn.set_trace_callback(None)
+
+    rows, seen = [], set()
+    for function, sql in statements:
+        if _SKIP.match(sql):
+            continue
+        key = (function, shape(sql))
+        if key not in seen:
+            seen.add(key)
+            rows.append({"function": function, "shape": key[1], "example": sql})
+    return client.conn, pd.DataFrame(rows, columns=["function", "shape", "example"]), errors
+
+def explain(conn: sqlite3.Connection, sql: str) -> list:
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+
+def verdict(sql: str, plan: list) -> str:
+    """
+    "full scan" when a filtered statement reads a whole table, "full read"
+    for deliberate whole-table reads (no WHERE), "index" otherwise.
+    """
+    scans = [d for d in plan if d.startswith("SCAN ") and "USING" not in d and "CONSTANT ROW" not in d]
+    if not scans:
+        return "index" if plan else "no plan"
+    return "full scan" if re.search(r"\bWHERE\b", sql, re.I) else "full read"
+
+def check(conn: sqlite3.Connection, shapes: pd.DataFrame) -> pd.DataFrame:
+    """EXPLAIN every statement shape on `conn`; adds plan and verdict columns."""
+    plans, verdicts = [], []
+    for sql in shapes["example"]:
+        try:
+            plan = explain(conn, sql)
+            plans.append(" | ".join(plan))
+            verdicts.append(verdict(sql, plan))
+        except sqlite3.Error as e:
+            plans.append(str(e))
+            verdicts.append("n/a")  # table or column missing from this schema
+    return shapes.assign(plan=plans, verdict=verdicts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="EXPLAIN every query shape db_supabase.py issues and flag full table scans."
+    )
+    parser.add_argument("--db", help="also check the shapes against this SQLite database, e.g. inventory.db")
+    parser.add_argument("--all", action="store_true", help="list every shape, not only the full scans")
+    args = parser.parse_args()
+    conn, shapes, errors = collect()
+    for function, error in errors.items():
+        print(f"could not exercise {function}: {error}")
+    targets = [("local backend", conn)] + ([(args.db, sqlite3.connect(args.db))] if args.db else [])
+    flagged = 0
+    for name, target in targets:
+        report = check(target, shapes)
+        scans = report[report["verdict"] == "full scan"]
+        flagged += len(scans)
+        print(f"\n{name}: {len(report)} statement shapes, {len(scans)} full scan(s), "
+              f"{(report['verdict'] == 'full read').sum()} whole-table read(s)")
+        shown = report if args.all else scans
+        for r in shown.itertuples():
+            print(f"[{r.verdict}] {r.function}\n    {r.shape}\n    plan: {r.plan}")
+    raise SystemExit(1 if flagged else 0)
@@ -0,0 +1,110 @@
+VENDOR = {
+    "name": "Diane's Wholesale Beverages",
+    "address": "45 Data St. Brgy Don Manuel QC",
+    "phone": "+63 917 808 1409",
+    "email": "ong_diane@yahoo.com"
+}
+LOGO = "Icon.jpeg"
+
+
+def soa_pdf(customer_id, customer_name, start_date, end_date, sales_customer) -> bytes:
+    """Statement of Account for one customer's sales rows over a period."""
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+
+    pdf = FPDF()
+    pdf.add_page()
+
+    # --- Logo ---
+    pdf.image(LOGO, x=10, y=8, w=30)
+
+    # --- Company Name & Address ---
+    pdf.set_font("Helvetica", 'B', 14)
+    pdf.cell(0, 10, VENDOR["name"], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+
+    pdf.set_font("Helvetica", size=10)
+    pdf.multi_cell(0, 5, f"{VENDOR['address']}\nPhone: +63 917 8081409\nEmail: {VENDOR['email']}", align="C")
+    pdf.ln(10)
+
+    pdf.set_font("Helvetica", size=12)
+    pdf.cell(200, 10, text=f"Statement of Account", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.cell(200, 10, text=f"Customer: {customer_name} (ID: {customer_id})", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.cell(200, 10, text=f"Period: {start_date} to {end_date}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.ln(10)
+
+    # Table header
+    pdf.set_font("Helvetica", 'B', 10)
+    pdf.cell(20, 10, "Date", 1, align="C")
+    pdf.cell(60, 10, "Item", 1, align="L")
+    pdf.cell(20, 10, "Qty", 1, align="C")
+    pdf.cell(40, 10, "Total Sale", 1, align="R")
+    pdf.cell(40, 10, "Profit", 1, align="R")
+    pdf.ln()
+
+    # Table rows
+    pdf.set_font("Helvetica", size=10)
+    for _, row in sales_customer.iterrows():
+        pdf.cell(20, 10, str(row.get("date", "")), 1, align="C")
+        pdf.cell(60, 10, str(row.get("item_name", "")), 1, align="L")
+        pdf.cell(20, 10, str(row.get("quantity", "")), 1, align="C")
+        pdf.cell(40, 10, f"{row.get('total_sale', 0):,.2f}", 1, align="R")
+        pdf.cell(40, 10, f"{row.get('profit', 0):,.2f}", 1, align="R")
+        pdf.ln()
+
+    return bytes(pdf.output())
+
+def po_pdf(po_number, order_date_sql, pickup_date_sql, order_lines) -> bytes:
+    """Purchase Order for one customer's sales lines on an order date."""
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.image(LOGO, x=10, y=8, w=30)
+
+    pdf.set_font("Helvetica", 'B', 14)
+    pdf.cell(0, 10, VENDOR["name"], new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.set_font("Helvetica", size=10)
+    pdf.multi_cell(0, 5, f"{VENDOR['address']}\nPhone: {VENDOR['phone']}\nEmail: {VENDOR['email']}", align="C")
+    pdf.ln(10)
+
+    pdf.set_font("Helvetica", 'B', 12)
+    pdf.cell(0, 10, "Purchase Order", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="C")
+    pdf.set_font("Helvetica", size=10)
+    pdf.cell(0, 10, f"PO Number: {po_number}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.cell(0, 10, f"Order Date: {order_date_sql}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(10)
+
+    # Table header
+    pdf.set_font("Helvetica", 'B', 10)
+    pdf.cell(20, 10, "No.", 1, align="C")
+    pdf.cell(80, 10, "Description", 1, align="L")
+    pdf.cell(30, 10, "Qty", 1, align="C")
+    pdf.cell(30, 10, "Unit Price", 1, align="R")
+    pdf.cell(30, 10, "Total", 1, align="R")
+    pdf.ln()
+
+    # Table rows
+    pdf.set_font("Helvetica", size=10)
+    subtotal = 0
+    for idx, row in order_lines.iterrows():
+        total = row["quantity"] * row["selling_price"]
+        subtotal += total
+        pdf.cell(20, 10, str(idx+1), 1, align="C")
+        pdf.cell(80, 10, str(row.get("item_name", "")), 1, align="L")
+        pdf.cell(30, 10, str(row.get("quantity", "")), 1, align="C")
+        pdf.cell(30, 10, f"{row.get('selling_price', 0):,.2f}", 1, align="R")
+        pdf.cell(30, 10, f"{total:,.2f}", 1, align="R")
+        pdf.ln()
+
+    pdf.ln(5)
+    pdf.cell(0, 10, f"Subtotal: PHP {subtotal:,.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+    pdf.cell(0, 10, "GST: PHP 0.00 (No GST)", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+    pdf.cell(0, 10, f"Total Amount: PHP {subtotal:,.2f}", new_x=XPos.LMARGIN, new_y=YPos.NEXT, align="R")
+    pdf.ln(10)
+
+    pdf.cell(0, 10, f"Pickup Date: {pickup_date_sql}", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.ln(20)
+    pdf.cell(0, 10, "Authorized By: ____________________", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    return bytes(pdf.output())
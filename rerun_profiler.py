@@ -0,0 +1,201 @@
+import cProfile
+import functools
+import heapq
+import inspect
+import io
+import itertools
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Opt-in profiling of Drinks.py reruns:
+#   DIANES_PROFILE=1            time page sections and db_supabase calls
+#   DIANES_PROFILE=cprofile     ... and keep cProfile stats of the slowest reruns
+#   DIANES_PROFILE=pyinstrument ... or a pyinstrument report (needs pyinstrument)
+MODE = os.environ.get("DIANES_PROFILE", "").lower()
+ENABLED = MODE in ("1", "cprofile", "pyinstrument")
+# Slowest reruns kept per menu entry
+KEEP = int(os.environ.get("DIANES_PROFILE_KEEP", "20"))
+
+_local = threading.local()
+_lock = threading.Lock()
+_slowest = {}  # menu -> min-heap of (total seconds, id, record)
+_ids = itertools.count(1)
+# Only one deterministic profiler can run in a process at a time, so
+# concurrent reruns are timed but only one of them is profiled
+_capturing = None  # the _Rerun whose profiler is running
+
+
+class _Rerun:
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.start = self.lap_start = time.perf_counter()
+        self.sections = []   # (name, seconds)
+        self.db_calls = []   # (function, seconds)
+        self.depth = 0
+        self.thread = threading.current_thread()
+        self.capture = None
+        if MODE in ("cprofile", "pyinstrument") and self._claim_capture():
+            self.capture = _start_capture()
+            if self.capture is None:
+                self._release_capture()
+
+    def _claim_capture(self) -> bool:
+        global _capturing
+        with _lock:
+            # A rerun stopped by st.rerun()/st.stop() never ends; its script thread is gone
+            if _capturing is not None and not _capturing.thread.is_alive():
+                _capturing = None
+            if _capturing is None:
+                _capturing = self
+            return _capturing is self
+
+    def _release_capture(self):
+        global _capturing
+        with _lock:
+            if _capturing is self:
+                _capturing = None
+
+    def stop_capture(self):
+        if self.capture is None:
+            return None
+        try:
+            return _stop_capture(self.capture)
+        finally:
+            self.capture = None
+            self._release_capture()
+
+
+def _start_capture():
+    if MODE == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None  # another profiler (a debugger, say) is active
+    return profiler
+
+def _stop_capture(profiler) -> str:
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(40)
+        return out.getvalue()
+    profiler.stop()
+    return profiler.output_text(unicode=True, color=False)
+
+# ---------------- RERUN ----------------
+def begin():
+    """Start timing a rerun on this thread. A rerun cut short by st.rerun()/st.stop() is dropped."""
+    if not ENABLED:
+        return
+    previous = getattr(_local, "rerun", None)
+    if previous is not None:
+        previous.stop_capture()
+    _local.rerun = _Rerun()
+
+def lap(section: str):
+    """Close the section running since begin() or the previous lap() and call it `section`."""
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+    now = time.perf_counter()
+    rerun.sections.append((section, now - rerun.lap_start))
+    rerun.lap_start = now
+
+def end(menu: str):
+    """Finish the rerun and keep it if it is among the KEEP slowest for `menu`."""
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+    _local.rerun = None
+    total = time.perf_counter() - rerun.start
+    profile = rerun.stop_capture()
+    record = {
+        "menu": menu,
+        "started_at": rerun.started_at,
+        "total_ms": total * 1000,
+        "db_ms": sum(s for _, s in rerun.db_calls) * 1000,
+        "sections": rerun.sections,
+        "db_calls": rerun.db_calls,
+        "profile": profile,
+    }
+    with _lock:
+        record["id"] = next(_ids)
+        heap = _slowest.setdefault(menu, [])
+        entry = (total, record["id"], record)
+        if len(heap) < KEEP:
+            heapq.heappush(heap, entry)
+        elif total > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+# ---------------- DB CALLS ----------------
+def timed(fn):
+    """Wrap fn so calls made during a profiled rerun are timed. Nested calls count once, in the outermost."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        rerun = getattr(_local, "rerun", None)
+        if rerun is None:
+            return fn(*args, **kwargs)
+        rerun.depth += 1
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            rerun.depth -= 1
+            if rerun.depth == 0:
+                rerun.db_calls.append((fn.__name__, time.perf_counter() - started))
+    return wrapper
+
+def instrument(namespace: dict, module: str):
+    """Time every public function defined in `module` (its globals() as `namespace`)."""
+    for name, value in list(namespace.items()):
+        if not name.startswith("_") and inspect.isfunction(value) and value.__module__ == module:
+            namespace[name] = timed(value)
+
+# ---------------- REPORTS ----------------
+def slowest_reruns(menu: str = None) -> pd.DataFrame:
+    """The slowest kept reruns, slowest first: where the time went by section and DB call."""
+    with _lock:
+        records = [r for m, heap in _slowest.items() if menu in (None, m) for _, _, r in heap]
+    rows = []
+    for r in sorted(records, key=lambda r: r["total_ms"], reverse=True):
+        section = max(r["sections"], key=lambda s: s[1], default=("", 0.0))
+        call = max(r["db_calls"], key=lambda c: c[1], default=("", 0.0))
+        rows.append({
+            "id": r["id"], "menu": r["menu"], "started_at": r["started_at"], "total_ms": r["total_ms"],
+            "db_ms": r["db_ms"], "db_calls": len(r["db_calls"]),
+            "slowest_section": section[0], "section_ms": section[1] * 1000,
+            "slowest_call": call[0], "call_ms": call[1] * 1000,
+        })
+    return pd.DataFrame(rows, columns=[
+        "id", "menu", "started_at", "total_ms", "db_ms", "db_calls",
+        "slowest_section", "section_ms", "slowest_call", "call_ms",
+    ])
+
+def rerun_detail(rerun_id: int):
+    """(sections, db calls, profile text or None) of one kept rerun, or None once it has been dropped."""
+    with _lock:
+        found = [r for heap in _slowest.values() for _, _, r in heap if r["id"] == rerun_id]
+    if not found:
+        return None
+    r = found[0]
+    sections = pd.DataFrame([(name, s * 1000) for name, s in r["sections"]], columns=["section", "ms"])
+    calls = pd.DataFrame([(name, s * 1000) for name, s in r["db_calls"]], columns=["function", "ms"])
+    return sections, calls, r["profile"]
+
+def reset():
+    with _lock:
+        _slowest.clear()
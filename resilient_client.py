@@ -0,0 +1,291 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+try:
+    import httpx
+    _TRANSPORT_ERRORS = (httpx.TransportError,)
+except ImportError:  # pragma: no cover - httpx ships with supabase
+    _TRANSPORT_ERRORS = ()
+
+# Query builder methods that decide what kind of request a chain makes
+_READS = {"select"}
+_WRITES = {"insert", "upsert", "update", "delete"}
+# Writes that leave the same state when applied twice. A plain insert is not
+# one of them: make it an upsert on a client-generated key to retry it.
+_IDEMPOTENT_WRITES = {"upsert", "update", "delete"}
+# PostgREST/Postgres error codes worth another try: gateway errors,
+# serialization failures, deadlocks, connection and shutdown errors
+_TRANSIENT_CODES = {"502", "503", "504", "40001", "40P01", "08000", "08003", "08006", "57P01", "57P03"}
+
+# Latency samples kept per table and kind for percentiles and the hedge delay
+_SAMPLES = 500
+
+# Threads shared by every RequestPolicy. An attempt holds one of MAX_WORKERS
+# slots from submit until its call returns, including an attempt abandoned
+# after a timeout, so a stalled backend cannot pile up threads or queued work.
+MAX_WORKERS = 16
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(MAX_WORKERS)
+
+
+class DBTimeout(TimeoutError):
+    """A database request did not answer within its operation timeout."""
+
+
+class RequestPolicy:
+    """
+    How every request made through a ResilientClient runs:
+
+    * each request has a timeout (read_timeout or write_timeout seconds);
+    * reads, and writes that are safe to repeat (update, delete, upsert), are
+      retried on timeouts and transient errors with capped exponential
+      backoff and full jitter; plain inserts are tried once;
+    * with hedge=True, a read still unanswered after the table's p95 read
+      latency is sent a second time (if a worker is free) and whichever
+      answer arrives first wins.
+
+    Attempts run on the shared worker pool. One given up on (timed out, or
+    the slower of a hedged pair) is cancelled if it has not started, and is
+    otherwise counted as abandoned and keeps its worker until it returns.
+
+    Latency, retries, timeouts, errors, hedges and abandoned attempts are
+    counted per table and request kind; see metrics().
+    """
+
+    def __init__(self, read_timeout=10.0, write_timeout=15.0, retries=3, backoff=0.2, max_backoff=2.0,
+                 hedge=False, hedge_min_samples=20):
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self._lock = threading.Lock()
+        self._stats = {}  # (table, kind) -> counters and latency samples
+
+    # ---------------- EXECUTION ----------------
+    def execute(self, table: str, kind: str, idempotent: bool, call):
+        """Run call() (a builder's execute) under the policy for `kind` ("read", "write", "rpc")."""
+        stats = self._entry(table, kind)
+        timeout = self.read_timeout if kind == "read" else self.write_timeout
+        attempts = 1 + (self.retries if idempotent else 0)
+        started = time.perf_counter()
+        for attempt in range(attempts):
+            try:
+                if kind == "read" and self.hedge:
+                    result = self._hedged(call, timeout, stats)
+                else:
+                    result = self._attempt(call, timeout, stats)
+                self._record(stats, "calls", time.perf_counter() - started)
+                return result
+            except Exception as e:
+                if isinstance(e, DBTimeout):
+                    self._count(stats, "timeouts")
+                if attempt + 1 >= attempts or not is_transient(e):
+                    self._count(stats, "errors")
+                    self._record(stats, "calls", time.perf_counter() - started)
+                    raise
+                self._count(stats, "retries")
+                time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def _attempt(self, call, timeout, stats):
+        deadline = time.monotonic() + timeout
+        future = self._submit(call, stats, timeout)
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except TimeoutError as e:
+            if future.done():
+                raise
+            raise DBTimeout(f"no response within {timeout:g}s") from e
+        finally:
+            self._abandon([future], stats)
+
+    def _hedged(self, call, timeout, stats):
+        deadline = time.monotonic() + timeout
+        primary = self._submit(call, stats, timeout)
+        futures = [primary]
+        try:
+            delay = self._p95(stats)
+            if delay is not None and delay < deadline - time.monotonic():
+                done, _ = wait([primary], timeout=delay)
+                # Never wait for a worker to hedge; a saturated pool only gets slower
+                hedge = None if done else self._submit(call, stats, 0, required=False)
+                if hedge is not None:
+                    self._count(stats, "hedged")
+                    futures.append(hedge)
+            result, winner = self._first(futures, deadline, timeout)
+        finally:
+            self._abandon(futures, stats)
+        if winner is not primary:
+            self._count(stats, "hedge_wins")
+        return result
+
+    @staticmethod
+    def _first(futures, deadline, timeout):
+        """(result, future) of the first of `futures` to succeed; the last error if all fail."""
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    return future.result(), future
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise DBTimeout(f"no response within {timeout:g}s")
+
+    def _submit(self, call, stats, timeout, required=True):
+        """
+        Start call() on the shared pool once a worker slot frees up, waiting
+        at most `timeout` seconds. None (or DBTimeout if `required`) when no
+        slot frees up in time.
+        """
+        if not _slots.acquire(timeout=timeout):
+            if not required:
+                return None
+            raise DBTimeout(f"no free database worker within {timeout:g}s")
+        try:
+            future = _executor().submit(self._timed, call, stats)
+        except BaseException:
+            _slots.release()
+            raise
+        future.add_done_callback(lambda _: _slots.release())
+        return future
+
+    def _abandon(self, futures, stats):
+        """Give up on unfinished attempts: cancel those not started, count the rest."""
+        for future in futures:
+            if not future.done() and not future.cancel():
+                # Runs until the HTTP client's own timeout; its answer is dropped
+                self._count(stats, "abandoned")
+
+    def _timed(self, call, stats):
+        started = time.perf_counter()
+        result = call()
+        self._record(stats, "attempts", time.perf_counter() - started)
+        return result
+
+    # ---------------- METRICS ----------------
+    def _entry(self, table, kind):
+        key = (table, kind)
+        with self._lock:
+            if key not in self._stats:
+                self._stats[key] = {
+                    "calls": deque(maxlen=_SAMPLES), "attempts": deque(maxlen=_SAMPLES), "count": 0,
+                    "retries": 0, "timeouts": 0, "errors": 0, "hedged": 0, "hedge_wins": 0, "abandoned": 0,
+                }
+            return self._stats[key]
+
+    def _record(self, stats, samples, seconds):
+        with self._lock:
+            stats[samples].append(seconds)
+            if samples == "calls":
+                stats["count"] += 1
+
+    def _count(self, stats, counter):
+        with self._lock:
+            stats[counter] += 1
+
+    def _p95(self, stats):
+        with self._lock:
+            samples = list(stats["attempts"])
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return float(np.percentile(samples, 95))
+
+    def metrics(self) -> pd.DataFrame:
+        """Per table and kind: calls, retries, timeouts, errors, hedges, abandoned attempts and latency percentiles (ms)."""
+        rows = []
+        with self._lock:
+            snapshot = {key: dict(stats, calls=list(stats["calls"])) for key, stats in self._stats.items()}
+        for (table, kind), stats in sorted(snapshot.items()):
+            latency = np.array(stats["calls"]) * 1000
+            p50, p95, p99 = np.percentile(latency, [50, 95, 99]) if len(latency) else (np.nan,) * 3
+            rows.append({
+                "table": table, "kind": kind, "calls": stats["count"], "retries": stats["retries"],
+                "timeouts": stats["timeouts"], "errors": stats["errors"], "hedged": stats["hedged"],
+                "hedge_wins": stats["hedge_wins"], "abandoned": stats["abandoned"], "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+                "max_ms": latency.max() if len(latency) else np.nan,
+            })
+        return pd.DataFrame(rows, columns=[
+            "table", "kind", "calls", "retries", "timeouts", "errors", "hedged", "hedge_wins", "abandoned",
+            "p50_ms", "p95_ms", "p99_ms", "max_ms",
+        ])
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="db")
+        return _pool
+
+def is_transient(e) -> bool:
+    """Whether a failed request may succeed if sent again (timeouts, connection and transient server errors)."""
+    if isinstance(e, (TimeoutError, ConnectionError) + _TRANSPORT_ERRORS):
+        return True
+    return str(getattr(e, "code", "")) in _TRANSIENT_CODES
+
+
+class ResilientClient:
+    """
+    A Supabase client whose table() and rpc() requests execute under a
+    RequestPolicy. Everything else (auth, storage, ...) is the wrapped client's.
+    """
+
+    def __init__(self, client, policy: RequestPolicy):
+        self._client = client
+        self.policy = policy
+
+    def table(self, name):
+        return _Request(self.policy, name, self._client.table(name))
+
+    def rpc(self, fn, *args, **kwargs):
+        return _Request(self.policy, f"rpc:{fn}", self._client.rpc(fn, *args, **kwargs), kind="rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _Request:
+    """A query builder chain; remembers what kind of request it is for execute()."""
+
+    def __init__(self, policy, table, builder, kind=None, idempotent=False):
+        self._policy = policy
+        self._table = table
+        self._builder = builder
+        self._kind = kind
+        self._idempotent = idempotent
+
+    def __getattr__(self, name):
+        attribute = getattr(self._builder, name)
+        if not callable(attribute):
+            # Properties such as not_ return the next builder in the chain
+            return self._wrap(name, attribute) if hasattr(attribute, "execute") else attribute
+
+        def chained(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            return self._wrap(name, result) if hasattr(result, "execute") else result
+        return chained
+
+    def _wrap(self, name, builder):
+        kind, idempotent = self._kind, self._idempotent
+        if kind is None and name in _READS:
+            kind, idempotent = "read", True
+        elif kind is None and name in _WRITES:
+            kind, idempotent = "write", name in _IDEMPOTENT_WRITES
+        return _Request(self._policy, self._table, builder, kind, idempotent)
+
+    def execute(self):
+        return self._policy.execute(self._table, self._kind or "read", self._idempotent, self._builder.execute)
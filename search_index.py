@@ -0,0 +1,107 @@
+import difflib
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Columns searched for each kind of picker
+SEARCH_FIELDS = {
+    "items": ["item_name", "category", "item_id"],
+    "customers": ["name", "phone", "email", "id"],
+    "pricing_items": ["label", "item_id"],
+}
+
+_TOKEN = re.compile(r"[^\w@.+-]+")
+
+
+class SearchIndex:
+    """
+    Prefix and fuzzy search over a few text columns of a frame.
+
+    Every word of every searched column goes into one sorted token array, so a
+    query word is matched by binary search for the range of tokens that start
+    with it. Rows must match every query word; a word with no prefix match
+    falls back to close spellings (difflib) of the known tokens. search()
+    returns row positions, best first.
+    """
+
+    def __init__(self, df: pd.DataFrame, fields):
+        self.size = len(df)
+        tokens, rows = [], []
+        for field in fields:
+            if field not in df.columns:
+                continue
+            for pos, text in enumerate(df[field].map(_normalize)):
+                for token in text.split():
+                    tokens.append(token)
+                    rows.append(pos)
+        order = np.argsort(np.array(tokens, dtype=str), kind="stable")
+        self._tokens = np.array(tokens, dtype=str)[order]
+        self._rows = np.array(rows, dtype=np.int64)[order]
+        self._vocabulary = None  # unique tokens, built on the first fuzzy lookup
+
+    def search(self, query: str, limit: int = 20) -> np.ndarray:
+        terms = _normalize(query).split()
+        if not terms:
+            return np.arange(min(limit, self.size))
+        scores = np.zeros(self.size)
+        matched = np.ones(self.size, dtype=bool)
+        for term in terms:
+            term_scores = self._score_term(term)
+            matched &= term_scores > 0
+            scores += term_scores
+        if not matched.any():
+            # No row has every word; rank rows by the words they do have
+            matched = scores > 0
+        positions = np.flatnonzero(matched)
+        best = np.argsort(-scores[positions], kind="stable")[:limit]
+        return positions[best]
+
+    def _score_term(self, term):
+        scores = np.zeros(self.size)
+        lo, hi = np.searchsorted(self._tokens, [term, term + "\uffff"])
+        if hi > lo:
+            rows, tokens = self._rows[lo:hi], self._tokens[lo:hi]
+            # An exact word beats a prefix; the best match per row counts
+            np.maximum.at(scores, rows, np.where(tokens == term, 3.0, 2.0))
+            return scores
+        if self._vocabulary is None:
+            self._vocabulary = sorted(set(self._tokens.tolist()))
+        for close in difflib.get_close_matches(term, self._vocabulary, n=5, cutoff=0.75):
+            lo, hi = np.searchsorted(self._tokens, close, "left"), np.searchsorted(self._tokens, close, "right")
+            np.maximum.at(scores, self._rows[lo:hi], 1.0)
+        return scores
+
+
+_lock = threading.Lock()
+_indexes = {}  # kind -> (data key, SearchIndex)
+
+
+def index_for(df: pd.DataFrame, kind: str) -> SearchIndex:
+    """
+    The search index for `df`, rebuilt only when the searched columns change
+    (keyed by a vectorized hash of them, which is far cheaper than a rebuild).
+    """
+    fields = [f for f in SEARCH_FIELDS[kind] if f in df.columns]
+    hashes = pd.util.hash_pandas_object(df[fields], index=True).to_numpy()
+    data_key = (len(df), int((hashes * np.arange(1, len(df) + 1, dtype=np.uint64)).sum()))
+    with _lock:
+        cached = _indexes.get(kind)
+    if cached is not None and cached[0] == data_key:
+        return cached[1]
+    index = SearchIndex(df, fields)
+    with _lock:
+        _indexes[kind] = (data_key, index)
+    return index
+
+def search(df: pd.DataFrame, kind: str, query: str, limit: int = 20) -> pd.DataFrame:
+    """Top `limit` rows of df matching `query`, best first."""
+    return df.iloc[index_for(df, kind).search(query, limit)]
+
+def _normalize(value) -> str:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return _TOKEN.sub(" ", str(value).lower())
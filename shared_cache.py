@@ -0,0 +1,183 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+import snapshots
+
+# Fetches of a table that keeps being invalidated mid-fetch before it is served uncached
+_FILL_ATTEMPTS = 3
+
+
+class SharedTableStore:
+    """
+    Host-wide table snapshots shared by every Streamlit worker process.
+
+    Each snapshot is an Arrow IPC file in `directory`, named after its table,
+    generation and the process that wrote it (items-12-4242.arrow); a small
+    SQLite index records which file is current. invalidate() bumps a table's
+    generation, and the next reader on the host refetches it. The fetch runs
+    outside the index's write lock, and its file is published only if the
+    generation has not moved since the fetch began, so a fetch that raced a
+    write is never recorded as current. Threads of one process share a fetch.
+
+    A new file is written in full under a temporary name and moved into place
+    before the index points at it, so readers only ever see whole snapshots.
+    Snapshots older than `max_age` seconds are refetched even without an
+    invalidation, which bounds staleness from writes made on other hosts.
+    Tables Arrow cannot hold (an object column mixing ints and text) are
+    served from the fetch uncached.
+    """
+
+    def __init__(self, directory, max_age=300.0):
+        self.directory = directory
+        self.max_age = max_age
+        self._local = threading.local()
+        self._memo = {}  # table -> ((generation, filled_at), DataFrame)
+        self._fill_locks = {}  # table -> Lock, one fetch per table per process
+        os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            """CREATE TABLE IF NOT EXISTS snapshots (
+                   table_name TEXT PRIMARY KEY,
+                   generation INTEGER NOT NULL DEFAULT 0,
+                   filled_generation INTEGER,
+                   path TEXT,
+                   row_count INTEGER,
+                   filled_at REAL
+               )"""
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.directory, "index.db"), timeout=60, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # ---------------- PUBLIC ----------------
+    def get(self, table, load) -> pd.DataFrame:
+        """Current snapshot of `table`; `load(table)` -> list of rows is called at most once per host per generation."""
+        entry = self._current(table)
+        if entry is None:
+            entry = self._fill(table, load)
+            if "frame" in entry:
+                return entry["frame"]
+        key = (entry["generation"], entry["filled_at"])
+        memo = self._memo.get(table)
+        if memo is None or memo[0] != key:
+            memo = (key, snapshots.publish("shared_store", table, key, _read_arrow(entry["path"])))
+            self._memo[table] = memo
+        return memo[1]
+
+    def version(self, table) -> int:
+        row = self._conn().execute("SELECT generation FROM snapshots WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def invalidate(self, tables):
+        """Mark tables stale for every process on the host."""
+        conn = self._conn()
+        for table in tables:
+            conn.execute(
+                """INSERT INTO snapshots (table_name, generation) VALUES (?, 1)
+                   ON CONFLICT(table_name) DO UPDATE SET generation = generation + 1""",
+                (table,),
+            )
+
+    def stats(self) -> pd.DataFrame:
+        return pd.read_sql_query(
+            "SELECT table_name, generation, filled_generation, row_count, filled_at FROM snapshots ORDER BY table_name",
+            self._conn(),
+        )
+
+    # ---------------- INTERNAL ----------------
+    def _current(self, table):
+        row = self._conn().execute(
+            "SELECT generation, filled_generation, path, filled_at FROM snapshots WHERE table_name = ?", (table,)
+        ).fetchone()
+        if row is None:
+            return None
+        generation, filled_generation, path, filled_at = row
+        if filled_generation != generation or not path or not os.path.exists(path):
+            return None
+        if time.time() - filled_at > self.max_age:
+            return None
+        return {"generation": generation, "path": path, "filled_at": filled_at}
+
+    def _fill(self, table, load):
+        with self._fill_locks.setdefault(table, threading.Lock()):
+            # Another thread may have filled it while we waited for the lock
+            entry = self._current(table)
+            if entry is not None:
+                return entry
+            for _ in range(_FILL_ATTEMPTS):
+                generation = self.version(table)
+                rows = load(table)
+                df = pd.DataFrame(rows)
+                path = os.path.join(self.directory, f"{table}-{generation}-{os.getpid()}.arrow")
+                try:
+                    _write_arrow(df, path)
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    return {"frame": df}
+                entry = self._publish(table, generation, path, len(rows))
+                if entry is not None:
+                    self._remove_old_files(table, path)
+                    return entry
+                # Invalidated during the fetch, which may have missed that write
+                os.remove(path)
+            # Writes keep landing mid-fetch; serve the last fetch without caching it
+            return {"frame": df}
+
+    def _publish(self, table, generation, path, row_count):
+        """Point the index at `path` if `table` is still at `generation`. None if it moved on."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.version(table) != generation:
+                conn.execute("ROLLBACK")
+                return None
+            filled_at = time.time()
+            conn.execute(
+                """INSERT INTO snapshots (table_name, generation, filled_generation, path, row_count, filled_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(table_name) DO UPDATE SET
+                       filled_generation = excluded.filled_generation, path = excluded.path,
+                       row_count = excluded.row_count, filled_at = excluded.filled_at""",
+                (table, generation, generation, path, row_count, filled_at),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {"generation": generation, "path": path, "filled_at": filled_at}
+
+    def _remove_old_files(self, table, current_path):
+        # Keep the file just replaced: another process may still be reading it
+        paths = sorted(
+            (p for p in glob.glob(os.path.join(self.directory, f"{table}-*.arrow")) if p != current_path),
+            key=os.path.getmtime,
+        )
+        for path in paths[:-1]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _write_arrow(df: pd.DataFrame, path: str):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def _read_arrow(path: str) -> pd.DataFrame:
+    # Not closed explicitly: columns converted without a copy still point into the map
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all().to_pandas()
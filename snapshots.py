@@ -0,0 +1,110 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+# Shared table frames are handed to sessions as shallow copies where pandas
+# copy-on-write is on (always from pandas 3, or if the app opted in), so a
+# session can add or change columns on its copy without touching the shared
+# frame and without copying the data up front. Otherwise sessions get deep
+# copies; this module does not switch the option on for the whole process.
+_PANDAS_3 = int(pd.__version__.split(".")[0]) >= 3
+
+# Display labels pages build for selectboxes, by name: (columns, template)
+LABELS = {
+    "item": (["item_id", "item_name"], "{} - {}"),
+    "item_category": (["item_id", "category", "item_name"], "{} - {} - {}"),
+    "item_fridge": (["item_id", "item_name", "fridge_no"], "{} - {} (Fridge {})"),
+    "customer": (["id", "name"], "{} - {}"),
+    "pricing_item": (["item_id", "label"], "{} - {}"),
+}
+
+_lock = threading.Lock()
+_snapshots = {}  # (owner, table) -> DataFrame
+_labels = {}     # (table, version, name) -> Series
+
+
+def publish(owner: str, table: str, version, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Register `df` as the current shared snapshot of `table` held by `owner`
+    (a cache name, for the memory report), tagged with its version so labels
+    can be derived once per version. Returns the frame.
+    """
+    df.attrs["snapshot"] = (table, version)
+    with _lock:
+        _snapshots[(owner, table)] = df
+        for key in [k for k in _labels if k[0] == table and k[1] != version]:
+            del _labels[key]
+    return df
+
+def share(df):
+    """The per-caller view of a shared snapshot (a frame or a label Series)."""
+    return df.copy(deep=not _copy_on_write())
+
+def _copy_on_write() -> bool:
+    return _PANDAS_3 or pd.get_option("mode.copy_on_write") is True
+
+def label_column(df: pd.DataFrame, name: str) -> pd.Series:
+    """
+    The `name` label for every row of df (see LABELS), built with vectorized
+    string joins. For an unfiltered shared snapshot the result is computed once
+    per snapshot version and reused by every session.
+    """
+    snapshot = df.attrs.get("snapshot")
+    if snapshot is None:
+        return _build_label(df, name)
+    key = (*snapshot, name)
+    with _lock:
+        cached = _labels.get(key)
+        shared = [s for (_, table), s in _snapshots.items() if table == snapshot[0] and s.attrs["snapshot"] == snapshot]
+    if cached is not None and cached.index.equals(df.index):
+        return share(cached)
+    labels = _build_label(df, name)
+    # Only labels for the whole snapshot are kept, not for a filtered copy of it
+    if shared and shared[0].index.equals(df.index):
+        with _lock:
+            _labels[key] = labels
+        return share(labels)
+    return labels
+
+def _build_label(df, name):
+    columns, template = LABELS[name]
+    parts = template.split("{}")
+    out = pd.Series(parts[0], index=df.index, dtype=object)
+    for column, sep in zip(columns, parts[1:]):
+        out = out + df[column].map(str).astype(object) + sep
+    return out
+
+def memory_report() -> pd.DataFrame:
+    """Memory held in this process by shared snapshots and their derived labels, plus process RSS."""
+    rows = []
+    with _lock:
+        for (owner, table), df in sorted(_snapshots.items()):
+            rows.append({
+                "cache": owner,
+                "table": table,
+                "version": str(df.attrs.get("snapshot", (None, None))[1]),
+                "rows": len(df),
+                "mb": df.memory_usage(deep=True).sum() / 1e6,
+            })
+        for (table, version, name), series in sorted(_labels.items(), key=str):
+            rows.append({
+                "cache": "labels",
+                "table": f"{table}.{name}",
+                "version": str(version),
+                "rows": len(series),
+                "mb": series.memory_usage(deep=True) / 1e6,
+            })
+    rows.append({"cache": "process", "table": "(resident set)", "version": "", "rows": None, "mb": _rss_bytes() / 1e6})
+    return pd.DataFrame(rows, columns=["cache", "table", "version", "rows", "mb"])
+
+def _rss_bytes() -> int:
+    try:
+        with open(f"/proc/{os.getpid()}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
@@ -0,0 +1,381 @@
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteClient:
+    """
+    A small stand-in for the Supabase client backed by a SQLite file.
+
+    It implements the part of the PostgREST query builder that db_supabase.py
+    uses (select with one level of embedded relations, insert, update, upsert,
+    delete, eq/neq/gt/gte/lt/lte/in_/is_/or_ filters, order, limit, range), so
+    the same functions can run against the local mirror unchanged. rpc() runs
+    what is registered under the function's name in `functions`, standing in
+    for the server's SQL functions.
+
+    With temp_ids=True, inserts that do not supply a primary key get negative
+    ids, keeping locally created rows apart from ids assigned by Supabase.
+    """
+
+    def __init__(self, path, temp_ids=False):
+        self.path = path
+        self.temp_ids = temp_ids
+        self._local = threading.local()
+        self._pk_cache = {}
+        # rpc name -> (table it inserts into, SQL with :named parameters), or
+        # fn(client, conn, params) returning the call's data for functions
+        # that take more than one statement
+        self.functions = {}
+
+    # ---------------- CONNECTION ----------------
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Group several calls into one atomic write (nestable, per thread)."""
+        conn = self.conn
+        if self._local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.execute("COMMIT")
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, fn, params=None):
+        return _Call(self, fn, params or {})
+
+    def new_id(self, conn, table):
+        """Primary key for a row about to be inserted (negative with temp_ids)."""
+        pk = _quote(self.primary_key(table))
+        if self.temp_ids:
+            return min(conn.execute(f'SELECT MIN({pk}) FROM "{table}"').fetchone()[0] or 0, 0) - 1
+        return (conn.execute(f'SELECT MAX({pk}) FROM "{table}"').fetchone()[0] or 0) + 1
+
+    def primary_key(self, table):
+        if table not in self._pk_cache:
+            cols = self.conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+            pks = [c["name"] for c in cols if c["pk"]]
+            self._pk_cache[table] = pks[0] if pks else "rowid"
+        return self._pk_cache[table]
+
+    def columns(self, table):
+        return [c["name"] for c in self.conn.execute(f'PRAGMA table_info("{table}")').fetchall()]
+
+    def ensure_columns(self, table, names):
+        """Add any columns the server has that the local table does not know yet."""
+        existing = set(self.columns(table))
+        for name in names:
+            if name not in existing:
+                self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}"')
+
+
+class _Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+_FILTER_OPS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class _Query:
+    def __init__(self, client, table):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._embeds = []
+        self._payload = None
+        self._on_conflict = None
+        self._ignore_duplicates = False
+        self._where = []
+        self._params = []
+        self._order = []
+        self._limit = None
+        self._offset = None
+        self._count = None
+
+    # ---------------- ACTIONS ----------------
+    def select(self, columns="*", count=None):
+        self._action = "select"
+        self._count = count
+        plain = []
+        for part in _split_top_level(columns):
+            match = re.fullmatch(r"(\w+)\((.*)\)", part)
+            if match:
+                self._embeds.append((match.group(1), match.group(2)))
+            else:
+                plain.append(part)
+        self._columns = ", ".join(_quote(c) for c in plain) if plain else "*"
+        return self
+
+    def insert(self, rows):
+        self._action, self._payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        self._action, self._payload = "upsert", rows
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values):
+        self._action, self._payload = "update", values
+        return self
+
+    def delete(self):
+        self._action = "delete"
+        return self
+
+    # ---------------- FILTERS ----------------
+    def _filter(self, column, op, value):
+        self._where.append(f"{_quote(column)} {op} ?")
+        self._params.append(value)
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "=", value)
+
+    def neq(self, column, value):
+        return self._filter(column, "!=", value)
+
+    def gt(self, column, value):
+        return self._filter(column, ">", value)
+
+    def gte(self, column, value):
+        return self._filter(column, ">=", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "<", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "<=", value)
+
+    def in_(self, column, values):
+        values = list(values)
+        if not values:
+            self._where.append("0")
+            return self
+        self._where.append(f"{_quote(column)} IN ({', '.join('?' for _ in values)})")
+        self._params.extend(values)
+        return self
+
+    def is_(self, column, value):
+        if value is None or str(value).lower() == "null":
+            self._where.append(f"{_quote(column)} IS NULL")
+        else:
+            self._where.append(f"{_quote(column)} IS ?")
+            self._params.append(1 if str(value).lower() == "true" else 0)
+        return self
+
+    def or_(self, filters):
+        """PostgREST or-syntax, e.g. "max_qty.is.null,max_qty.gte.5"."""
+        clauses = []
+        for cond in _split_top_level(filters):
+            column, op, value = cond.split(".", 2)
+            if op == "is":
+                clauses.append(f"{_quote(column)} IS NULL" if value == "null" else f"{_quote(column)} IS {1 if value == 'true' else 0}")
+            elif op == "in":
+                values = [v.strip() for v in value.strip("()").split(",")]
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' for _ in values)})")
+                self._params.extend(values)
+            else:
+                clauses.append(f"{_quote(column)} {_FILTER_OPS[op]} ?")
+                self._params.append(_parse_literal(value))
+        self._where.append("(" + " OR ".join(clauses) + ")")
+        return self
+
+    def order(self, column, desc=False):
+        self._order.append(f"{_quote(column)} {'DESC' if desc else 'ASC'}")
+        return self
+
+    def limit(self, n):
+        self._limit = int(n)
+        return self
+
+    def range(self, start, end):
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    # ---------------- EXECUTE ----------------
+    def _where_sql(self):
+        return (" WHERE " + " AND ".join(self._where)) if self._where else ""
+
+    def execute(self):
+        return getattr(self, f"_execute_{self._action}")()
+
+    def _execute_select(self):
+        conn = self._client.conn
+        columns = self._columns
+        # Embedded relations need their foreign key even if it was not selected
+        hidden = [_foreign_key(rel) for rel, _ in self._embeds if columns != "*" and _quote(_foreign_key(rel)) not in columns]
+        if hidden:
+            columns += ", " + ", ".join(_quote(c) for c in hidden)
+        sql = f'SELECT {columns} FROM "{self._table}"{self._where_sql()}'
+        count = None
+        if self._count:
+            count = conn.execute(f'SELECT COUNT(*) FROM "{self._table}"{self._where_sql()}', self._params).fetchone()[0]
+        if self._order:
+            sql += " ORDER BY " + ", ".join(self._order)
+        if self._limit is not None:
+            sql += f" LIMIT {self._limit}"
+            if self._offset:
+                sql += f" OFFSET {self._offset}"
+        rows = [dict(r) for r in conn.execute(sql, self._params).fetchall()]
+        for relation, embed_columns in self._embeds:
+            self._attach_embed(rows, relation, embed_columns)
+        for r in rows:
+            for column in hidden:
+                r.pop(column, None)
+        return _Result(rows, count)
+
+    def _attach_embed(self, rows, relation, columns):
+        fk = _foreign_key(relation)
+        pk = self._client.primary_key(relation)
+        keys = sorted({r[fk] for r in rows if r.get(fk) is not None})
+        related = {}
+        if keys:
+            cols = ", ".join(_quote(c) for c in _split_top_level(columns))
+            sql = f'SELECT {_quote(pk)} AS __pk, {cols} FROM "{relation}" WHERE {_quote(pk)} IN ({", ".join("?" for _ in keys)})'
+            for r in self._client.conn.execute(sql, keys).fetchall():
+                record = dict(r)
+                related[record.pop("__pk")] = record
+        for r in rows:
+            r[relation] = related.get(r.get(fk))
+
+    def _rows(self):
+        return self._payload if isinstance(self._payload, list) else [self._payload]
+
+    def _execute_insert(self):
+        return self._write_rows(conflict_sql="")
+
+    def _execute_upsert(self):
+        rows = self._rows()
+        target = self._on_conflict or self._client.primary_key(self._table)
+        if self._ignore_duplicates:
+            conflict_sql = f" ON CONFLICT({target}) DO NOTHING"
+        else:
+            keys = {c.strip() for c in target.split(",")}
+            columns = [c for c in rows[0] if c not in keys] if rows else []
+            updates = ", ".join(f"{_quote(c)} = excluded.{_quote(c)}" for c in columns)
+            conflict_sql = f" ON CONFLICT({target}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+        return self._write_rows(conflict_sql)
+
+    def _write_rows(self, conflict_sql):
+        rows = [dict(r) for r in self._rows()]
+        if not rows:
+            return _Result([])
+        pk = self._client.primary_key(self._table)
+        out = []
+        with self._client.transaction() as conn:
+            if self._client.temp_ids and pk != "rowid":
+                next_id = min(conn.execute(f'SELECT MIN({_quote(pk)}) FROM "{self._table}"').fetchone()[0] or 0, 0) - 1
+                for row in rows:
+                    if row.get(pk) is None:
+                        row[pk] = next_id
+                        next_id -= 1
+            for row in rows:
+                columns = list(row)
+                sql = (
+                    f'INSERT INTO "{self._table}" ({", ".join(_quote(c) for c in columns)}) '
+                    f'VALUES ({", ".join("?" for _ in columns)}){conflict_sql} RETURNING *'
+                )
+                out.extend(dict(r) for r in conn.execute(sql, [row[c] for c in columns]).fetchall())
+        return _Result(out)
+
+    def _execute_update(self):
+        columns = list(self._payload)
+        sets = ", ".join(f"{_quote(c)} = ?" for c in columns)
+        sql = f'UPDATE "{self._table}" SET {sets}{self._where_sql()} RETURNING *'
+        with self._client.transaction() as conn:
+            rows = conn.execute(sql, [self._payload[c] for c in columns] + self._params).fetchall()
+        return _Result([dict(r) for r in rows])
+
+    def _execute_delete(self):
+        sql = f'DELETE FROM "{self._table}"{self._where_sql()} RETURNING *'
+        with self._client.transaction() as conn:
+            rows = conn.execute(sql, self._params).fetchall()
+        return _Result([dict(r) for r in rows])
+
+
+class _Call:
+    """
+    An rpc() call, run in one transaction. Besides its own parameters the
+    SQL gets :new_id, the primary key a row it inserts should take (a
+    negative id with temp_ids), so callers can tell an inserted row from an
+    updated one.
+    """
+
+    def __init__(self, client, fn, params):
+        self._client = client
+        self._fn = fn
+        self._params = dict(params)
+
+    def execute(self):
+        function = self._client.functions[self._fn]
+        with self._client.transaction() as conn:
+            if callable(function):
+                return _Result(function(self._client, conn, self._params))
+            table, sql = function
+            new_id = self._client.new_id(conn, table)
+            rows = conn.execute(sql, dict(self._params, new_id=new_id)).fetchall()
+        return _Result([dict(r) for r in rows])
+
+
+def _foreign_key(relation):
+    """customers(name) on customer_price_list joins through customer_id."""
+    return (relation[:-1] if relation.endswith("s") else relation) + "_id"
+
+def _quote(column):
+    column = column.strip()
+    if column == "*" or column.startswith('"'):
+        return column
+    return f'"{column}"'
+
+def _split_top_level(text):
+    """Split on commas that are not inside parentheses."""
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+def _parse_literal(value):
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
@@ -0,0 +1,53 @@
+import argparse
+import os
+import re
+import sqlite3
+
+# NNN_description.sql, applied in NNN order. A database's PRAGMA user_version
+# is the number of the last migration applied to it.
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations", "sqlite")
+
+_NAME = re.compile(r"^(\d+)_.+\.sql$")
+
+
+def migrations(directory: str = MIGRATIONS_DIR) -> list:
+    """(version, path) of every migration in `directory`, oldest first."""
+    found = []
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = _NAME.match(name)
+        if match:
+            found.append((int(match.group(1)), os.path.join(directory, name)))
+    return sorted(found)
+
+def migrate(conn: sqlite3.Connection, directory: str = MIGRATIONS_DIR) -> list:
+    """
+    Apply the migrations newer than the database's user_version, each in its
+    own transaction together with the version bump. Returns the paths applied.
+    """
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+    for version, path in migrations(directory):
+        if version <= current:
+            continue
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        try:
+            conn.executescript(f"BEGIN;\n{sql}\n;PRAGMA user_version = {version};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        applied.append(path)
+    return applied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply migrations/sqlite to a SQLite database.")
+    parser.add_argument("database", nargs="?", default="inventory.db")
+    args = parser.parse_args()
+    with sqlite3.connect(args.database) as conn:
+        done = migrate(conn)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    print(f"{args.database}: applied {len(done)} migration(s), now at version {version}")
+    for path in done:
+        print(f"  {os.path.basename(path)}")
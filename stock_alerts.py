@@ -0,0 +1,176 @@
+import math
+import threading
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+
+ALERT_COLUMNS = ["item_name", "quantity", "threshold"]
+REORDER_COLUMNS = ["item_name", "quantity", "threshold", "units_per_day", "days_left", "suggested_qty"]
+
+
+class StockAlerts:
+    """
+    The items at or below their stock alert threshold, kept up to date as
+    stock is written instead of by scanning every item.
+
+    Stock is summed per item_name across fridges, the way record_sale() sells
+    it. Each stock write hands over the item rows it touched (update_rows /
+    remove_rows); only those names are re-checked. A per-item threshold
+    overrides the global one from the sidebar; changing the global threshold
+    re-checks every name once.
+
+    Writes made by other processes arrive as change events when a change feed
+    is running (apply), and otherwise through a full reload every `max_age`
+    seconds.
+    """
+
+    def __init__(self, load_items, load_thresholds, max_age=None):
+        self._load_items = load_items            # () -> DataFrame of items
+        self._load_thresholds = load_thresholds  # () -> DataFrame of stock_thresholds
+        self._max_age = max_age
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._rows = {}        # item_id -> (item_name, quantity)
+        self._totals = {}      # item_name -> quantity over all fridges
+        self._counts = {}      # item_name -> number of fridge rows
+        self._thresholds = {}  # item_name -> per-item threshold
+        self._global = None
+        self._low = {}         # item_name -> threshold it is at or below
+
+    # ---------------- PUBLIC ----------------
+    def low_stock(self, threshold) -> pd.DataFrame:
+        """Items at or below their threshold (`threshold` unless set per item), lowest first."""
+        with self._lock:
+            self._ensure_loaded()
+            if threshold != self._global:
+                self._global = threshold
+                self._low = {}
+                for name in self._totals:
+                    self._check(name)
+            rows = [(name, self._totals[name], limit) for name, limit in self._low.items()]
+        df = pd.DataFrame(rows, columns=ALERT_COLUMNS)
+        return df.sort_values(["quantity", "item_name"], kind="stable").reset_index(drop=True)
+
+    def update_rows(self, rows):
+        """Item rows (item_id, item_name, quantity) as a write left them."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for row in rows:
+                self._put(row["item_id"], row["item_name"], row["quantity"] or 0)
+
+    def remove_rows(self, item_ids):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for item_id in item_ids:
+                self._put(item_id, None, 0)
+
+    def set_thresholds(self, thresholds: dict):
+        """Per-item thresholds by item_name; None removes one (back to the global threshold)."""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for name, value in thresholds.items():
+                if value is None:
+                    self._thresholds.pop(name, None)
+                else:
+                    self._thresholds[name] = float(value)
+                self._check(name)
+
+    def apply(self, events, load_rows):
+        """
+        Change events for items and stock_thresholds. Events that carry only a
+        key are resolved with load_rows(table, keys).
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for table, pk_col in (("items", "item_id"), ("stock_thresholds", "item_name")):
+                table_events = [e for e in events if e.table == table]
+                if not table_events:
+                    continue
+                keyed_only = [e.pk for e in table_events if e.op != "DELETE" and e.row is None]
+                found = {r[pk_col]: r for r in load_rows(table, keyed_only)} if keyed_only else {}
+                for event in table_events:
+                    row = None if event.op == "DELETE" else (event.row or found.get(event.pk))
+                    if table == "items":
+                        if row is None:
+                            self.remove_rows([event.pk])
+                        else:
+                            self.update_rows([row])
+                    else:
+                        self.set_thresholds({event.pk: row["threshold"] if row else None})
+
+    def invalidate(self):
+        """Reload everything on the next read."""
+        with self._lock:
+            self._loaded_at = None
+
+    # ---------------- INTERNAL ----------------
+    def _ensure_loaded(self):
+        stale = self._max_age is not None and self._loaded_at is not None and time.monotonic() - self._loaded_at > self._max_age
+        if self._loaded_at is not None and not stale:
+            return
+        items, thresholds = self._load_items(), self._load_thresholds()
+        self._rows, self._totals, self._counts, self._low = {}, {}, {}, {}
+        if not items.empty:
+            quantity = pd.to_numeric(items["quantity"], errors="coerce").fillna(0.0)
+            self._rows = dict(zip(items["item_id"], zip(items["item_name"], quantity)))
+            self._totals = quantity.groupby(items["item_name"]).sum().to_dict()
+            self._counts = items["item_name"].value_counts().to_dict()
+        self._thresholds = {} if thresholds.empty else dict(
+            zip(thresholds["item_name"], pd.to_numeric(thresholds["threshold"]).astype(float))
+        )
+        self._loaded_at = time.monotonic()
+        if self._global is not None:
+            for name in self._totals:
+                self._check(name)
+
+    def _put(self, item_id, item_name, quantity):
+        old_name, old_quantity = self._rows.pop(item_id, (None, 0))
+        if old_name is not None:
+            self._totals[old_name] -= old_quantity
+            self._counts[old_name] -= 1
+            if not self._counts[old_name]:
+                # Last fridge row of that item is gone
+                del self._totals[old_name], self._counts[old_name]
+        if item_name is not None:
+            self._rows[item_id] = (item_name, quantity)
+            self._totals[item_name] = self._totals.get(item_name, 0) + quantity
+            self._counts[item_name] = self._counts.get(item_name, 0) + 1
+        for name in {old_name, item_name} - {None}:
+            self._check(name)
+
+    def _check(self, name):
+        limit = self._thresholds.get(name, self._global)
+        total = self._totals.get(name)
+        if limit is not None and total is not None and total <= limit:
+            self._low[name] = limit
+        else:
+            self._low.pop(name, None)
+
+
+def reorder_list(low: pd.DataFrame, sales: pd.DataFrame, lookback_days: int = 28,
+                 cover_days: int = 14, today: date = None) -> pd.DataFrame:
+    """
+    Suggested order quantities for low-stock items: enough to lift stock above
+    the alert threshold and cover `cover_days` of sales at the rate of the
+    last `lookback_days`. Fast sellers (fewest days of stock left) come first.
+    """
+    if low.empty:
+        return pd.DataFrame(columns=REORDER_COLUMNS)
+    today = today or date.today()
+    since = (today - timedelta(days=lookback_days)).isoformat()
+    velocity = pd.Series(dtype=float)
+    if not sales.empty:
+        recent = sales[sales["date"].astype(str).str[:10] > since]
+        velocity = pd.to_numeric(recent["quantity"], errors="coerce").groupby(recent["item_name"]).sum() / lookback_days
+
+    out = low.copy()
+    out["units_per_day"] = out["item_name"].map(velocity).fillna(0.0)
+    out["days_left"] = (out["quantity"].clip(lower=0) / out["units_per_day"]).where(out["units_per_day"] > 0)
+    target = out["threshold"] + 1 + out["units_per_day"] * cover_days
+    out["suggested_qty"] = (target - out["quantity"]).clip(lower=0).map(math.ceil).astype(int)
+    return out.sort_values(["days_left", "quantity"], na_position="last", kind="stable")[REORDER_COLUMNS].reset_index(drop=True)
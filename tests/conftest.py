@@ -0,0 +1,101 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The server-side audit_log (Supabase keeps it outside the mirrored tables)
+_AUDIT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS audit_log (
+        id INTEGER PRIMARY KEY,
+        client_id TEXT UNIQUE,
+        item_name TEXT,
+        category TEXT,
+        action TEXT,
+        quantity REAL,
+        fridge_no INTEGER,
+        qty_delta REAL,
+        unit_cost REAL,
+        selling_price REAL,
+        username TEXT,
+        timestamp TEXT
+    )"""
+# Tombstones the server keeps for delta sync (migrations/supabase/004)
+_TOMBSTONE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS deleted_rows (
+        id INTEGER PRIMARY KEY,
+        table_name TEXT,
+        row_id TEXT,
+        deleted_at TEXT
+    )"""
+
+
+def _server(path):
+    """A SQLite database standing in for Supabase, with server-assigned ids."""
+    from local_store import LocalStore
+
+    store = LocalStore(path)
+    store.client.temp_ids = False
+    store.client.conn.execute(_AUDIT_SCHEMA)
+    store.client.conn.execute(_TOMBSTONE_SCHEMA)
+    return store.client
+
+
+@pytest.fixture(scope="session")
+def db(tmp_path_factory):
+    """
+    db_supabase with every optional mode (local-first, change feeds, shared
+    cache, profiling) off and its local files under a temporary directory.
+    Supabase is never contacted: st.secrets only needs a URL and key, and
+    db.supabase is a local SQLite server (see the server fixture).
+    """
+    home = tmp_path_factory.mktemp("app")
+    os.makedirs(home / ".streamlit")
+    (home / ".streamlit" / "secrets.toml").write_text(
+        '[supabase]\nurl = "http://127.0.0.1:9"\nservice_role_key = "test"\n'
+    )
+    os.environ.update({
+        "DIANES_LOCAL_FIRST": "0", "DIANES_DELTA_SYNC": "0", "DIANES_CHANGE_FEED": "",
+        "DIANES_SHARED_CACHE_DIR": "", "DIANES_PROFILE": "",
+        "DIANES_AUDIT_SPOOL_DIR": str(home / "audit_spool"),
+        "DIANES_JOBS_DIR": str(home / "jobs"),
+        "DIANES_AUDIT_ARCHIVE_DIR": str(home / "audit_archive"),
+        "DIANES_PURGE_ARCHIVE_DIR": str(home / "purge_archive"),
+    })
+    cwd = os.getcwd()
+    os.chdir(home)
+    try:
+        import db_supabase
+    finally:
+        os.chdir(cwd)
+    db_supabase.supabase = _server(str(home / "server.db"))
+    return db_supabase
+
+
+@pytest.fixture
+def server(db, tmp_path):
+    """A fresh SQLite database standing in for Supabase, behind db.supabase."""
+    client = _server(str(tmp_path / "server.db"))
+    previous = db.supabase
+    db.supabase = client
+    yield client
+    db.audit_writer.flush()
+    db.supabase = previous
+
+
+@pytest.fixture
+def seed(server):
+    """seed(items, fridges, customers, stock): items in every fridge, customers and a retail tier per item row."""
+    def seed(items, fridges, customers, stock):
+        server.table("items").insert([
+            {"item_name": f"ITEM{i:04d}", "category": f"CAT{i % 10}", "quantity": stock, "fridge_no": fridge}
+            for i in range(items) for fridge in range(1, fridges + 1)
+        ]).execute()
+        server.table("customers").insert([{"name": f"CUSTOMER{c:04d}"} for c in range(customers)]).execute()
+        server.table("pricing_tiers").insert([
+            {"item_id": r["item_id"], "min_qty": 1, "max_qty": None, "price_per_unit": 20.0, "label": "RETAIL"}
+            for r in server.table("items").select("item_id").execute().data
+        ]).execute()
+    return seed
@@ -0,0 +1,92 @@
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import audit_archive
+from audit_archive import LocalArchive
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalArchive(str(tmp_path / "audit_archive"))
+
+class CountingArchive(LocalArchive):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.reads = []
+
+    def read(self, name):
+        self.reads.append(name)
+        return super().read(name)
+
+def _rows(*stamps):
+    return pd.DataFrame([{"id": i, "action": "Sale", "timestamp": stamp} for i, stamp in enumerate(stamps, start=1)])
+
+
+def test_only_whole_months_are_archived():
+    assert audit_archive.archive_cutoff(90, today=date(2024, 6, 15)) == "2024-03-01"
+    assert audit_archive.archive_cutoff(30, today=date(2024, 3, 31)) == "2024-03-01"
+
+def test_month_files_merge_rewrites_and_read_only_the_range(store):
+    assert audit_archive.write_month_partitions(store, _rows("2024-01-05T10:00:00", "2024-02-01T09:00:00")) \
+        == ["2024-01", "2024-02"]
+    # Writing a month again (an interrupted run repeated) keeps one copy of each row
+    audit_archive.write_month_partitions(store, _rows("2024-01-05T10:00:00"))
+    assert sorted(store.names()) == ["audit_log_2024-01.parquet", "audit_log_2024-02.parquet"]
+    assert audit_archive.read_archive(store)["timestamp"].tolist() == ["2024-01-05T10:00:00", "2024-02-01T09:00:00"]
+    assert audit_archive.read_archive(store, "2024-01-06", "2024-12-31")["id"].tolist() == [2]
+
+def test_boundary_only_moves_forward(store):
+    assert audit_archive.archived_before(store) == ""
+    audit_archive.mark_archived_before(store, "2024-03-01")
+    audit_archive.mark_archived_before(store, "2024-02-01")
+    assert audit_archive.archived_before(store) == "2024-03-01"
+
+def test_boundary_is_read_once_per_ttl_and_moved_at_once_by_its_own_process(store, monkeypatch):
+    monkeypatch.setattr(audit_archive, "BOUNDARY_TTL", 3600)
+    other_host = CountingArchive(store._directory)
+    assert audit_archive.archived_before(other_host) == ""
+    assert audit_archive.archived_before(other_host) == ""
+    assert other_host.reads == ["archive_state.json"]
+
+    audit_archive.mark_archived_before(store, "2024-03-01")
+    assert audit_archive.archived_before(store) == "2024-03-01"
+    # Another process keeps the boundary it read until the TTL runs out
+    assert audit_archive.archived_before(other_host) == ""
+    monkeypatch.setattr(audit_archive, "BOUNDARY_TTL", 0)
+    assert audit_archive.archived_before(other_host) == "2024-03-01"
+
+def test_a_boundary_settles_after_the_ttl(store, monkeypatch):
+    clock = [1_000_000.0]
+    monkeypatch.setattr(audit_archive, "time", SimpleNamespace(time=lambda: clock[0], monotonic=time.monotonic))
+    monkeypatch.setattr(audit_archive, "BOUNDARY_TTL", 300)
+    audit_archive.mark_archived_before(store, "2024-02-01")
+    assert audit_archive.settled_before(store) == ""
+    clock[0] += 301
+    assert audit_archive.settled_before(store) == "2024-02-01"
+
+    audit_archive.mark_archived_before(store, "2024-03-01")
+    # The earlier boundary has settled; the new one has not yet
+    assert audit_archive.settled_before(store) == "2024-02-01"
+    clock[0] += 301
+    assert audit_archive.settled_before(store) == "2024-03-01"
+
+
+def test_archived_rows_are_read_back_across_the_boundary(db, server, store, monkeypatch):
+    monkeypatch.setattr(db, "audit_archive_store", store)
+    monkeypatch.setattr(audit_archive, "BOUNDARY_TTL", 0)
+    now = datetime.now()
+    old, recent = (now - timedelta(days=200)).isoformat(), (now - timedelta(days=5)).isoformat()
+    server.table("audit_log").insert([
+        {"action": "Sale", "item_name": "OLD", "timestamp": old},
+        {"action": "Sale", "item_name": "RECENT", "timestamp": recent},
+    ]).execute()
+
+    assert db.archive_old_audit_entries(90) == 1
+    assert [r["item_name"] for r in server.table("audit_log").select("item_name").execute().data] == ["RECENT"]
+    everything = db.view_audit_log((now - timedelta(days=365)).isoformat(), now.isoformat())
+    assert everything["item_name"].tolist() == ["RECENT", "OLD"]
+    assert db.view_audit_log()["item_name"].tolist() == ["RECENT"]
@@ -0,0 +1,55 @@
+import os
+
+from audit_writer import AuditWriter
+
+
+def _unreachable(rows):
+    raise ConnectionError("Supabase unreachable")
+
+def _writer(spool_dir, sink):
+    # Long intervals so only explicit flush() calls send anything
+    return AuditWriter(sink, str(spool_dir), flush_interval=3600, sync_interval=3600)
+
+def _crash(writer):
+    """What the OS does when the writer's process dies: its lock goes."""
+    writer._owner_lock.close()
+
+
+def test_nothing_is_opened_or_started_until_first_use(tmp_path):
+    writer = _writer(tmp_path / "spool", _unreachable)
+    assert not (tmp_path / "spool").exists()
+    assert writer.pending() == 0
+
+def test_entries_spooled_before_a_crash_are_sent_by_the_next_writer(tmp_path):
+    crashed = _writer(tmp_path, _unreachable)
+    crashed.log_many([{"action": "Stock In", "quantity": 5}, {"action": "Sale", "quantity": 2}])
+    _crash(crashed)
+
+    sent = []
+    writer = _writer(tmp_path, sent.extend)
+    writer.flush()
+    assert [(r["action"], r["quantity"]) for r in sent] == [("Stock In", 5), ("Sale", 2)]
+    assert all(r["client_id"] for r in sent)
+    # The orphaned spool and its lock file are gone once re-spooled and sent
+    spool = os.path.basename(writer._spool_path)
+    assert sorted(os.listdir(tmp_path)) == [spool, spool.replace(".jsonl", ".lock")]
+
+def test_a_live_writers_spool_is_left_alone(tmp_path):
+    live = _writer(tmp_path, _unreachable)
+    live.log({"action": "Stock In", "quantity": 5})
+
+    sent = []
+    _writer(tmp_path, sent.extend).flush()
+    assert sent == []
+    assert live.pending() == 1
+
+def test_a_torn_last_line_is_dropped_on_replay(tmp_path):
+    crashed = _writer(tmp_path, _unreachable)
+    crashed.log({"action": "Stock In", "quantity": 5})
+    with open(crashed._spool_path, "a", encoding="utf-8") as f:
+        f.write('{"action": "Sa')
+    _crash(crashed)
+
+    sent = []
+    _writer(tmp_path, sent.extend).flush()
+    assert [r["action"] for r in sent] == ["Stock In"]
@@ -0,0 +1,67 @@
+import time
+
+import pandas as pd
+import pytest
+
+import barcode_scan
+from barcode_scan import ScanQueue, build_barcode_index, tally_scans
+
+
+@pytest.fixture
+def fake_decoder(monkeypatch):
+    """Images are b"code,code,..."; b"bad" fails to decode."""
+    def decode(data):
+        if data == b"bad":
+            raise ValueError("not an image")
+        return [code for code in data.decode().split(",") if code]
+    monkeypatch.setattr(barcode_scan, "decode_image_bytes", decode)
+
+def _wait_for_images(scan_queue):
+    deadline = time.monotonic() + 5
+    while scan_queue.pending_images() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert scan_queue.pending_images() == 0
+
+
+def test_scans_come_out_in_the_order_they_were_decoded(fake_decoder):
+    scan_queue = ScanQueue()
+    scan_queue.submit_code(" 111 ")
+    scan_queue.submit_image(b"222,333", source="photo1.jpg")
+    scan_queue.submit_image(b"444", source="photo2.jpg")
+    _wait_for_images(scan_queue)
+    scan_queue.submit_code("555")
+
+    scans = scan_queue.drain()
+    assert [s["barcode"] for s in scans] == ["111", "222", "333", "444", "555"]
+    assert [s["source"] for s in scans] == ["scanner", "photo1.jpg", "photo1.jpg", "photo2.jpg", "scanner"]
+    assert scan_queue.drain() == []
+
+def test_blank_codes_and_undecodable_images_queue_nothing(fake_decoder):
+    scan_queue = ScanQueue()
+    scan_queue.submit_code("   ")
+    scan_queue.submit_image(b"bad")
+    scan_queue.submit_image(b"")
+    _wait_for_images(scan_queue)
+    assert scan_queue.drain() == []
+
+def test_sessions_share_the_decoder_but_not_their_scans(fake_decoder):
+    first, second = ScanQueue(), ScanQueue()
+    first.submit_image(b"111")
+    second.submit_image(b"222")
+    _wait_for_images(first)
+    _wait_for_images(second)
+    assert [s["barcode"] for s in first.drain()] == ["111"]
+    assert [s["barcode"] for s in second.drain()] == ["222"]
+
+
+def test_scans_are_tallied_per_item_and_unknown_codes_listed():
+    barcodes = pd.DataFrame({"barcode": ["111", "222", "999"], "item_id": [1, 1, 3], "units_per_scan": [1, 6, 1]})
+    items = pd.DataFrame({"item_id": [1, 2], "item_name": ["COLA", "SODA"], "category": ["DRINK", "DRINK"],
+                          "fridge_no": [1, 2]})
+    index = build_barcode_index(barcodes, items)
+    # 999 points at a deleted item
+    assert sorted(index) == ["111", "222"]
+
+    batch, unknown = tally_scans([{"barcode": b} for b in ["111", "222", "111", "999", "000", "000"]], index)
+    assert batch[["item_id", "scans", "quantity"]].values.tolist() == [[1, 3, 8]]
+    assert unknown == ["000", "999"]
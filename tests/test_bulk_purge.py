@@ -0,0 +1,72 @@
+import pytest
+
+import bulk_purge
+from audit_archive import LocalArchive
+
+# purge_jobs as migrations/supabase/010 and 020 leave it
+_PURGE_JOBS_SCHEMA = [
+    """CREATE TABLE purge_jobs (
+        id INTEGER PRIMARY KEY, table_name TEXT NOT NULL, status TEXT NOT NULL, username TEXT,
+        archive INTEGER NOT NULL DEFAULT 0, total_rows INTEGER NOT NULL DEFAULT 0,
+        deleted_rows INTEGER NOT NULL DEFAULT 0, last_id INTEGER, error TEXT, heartbeat TEXT,
+        started_at TEXT, finished_at TEXT
+    )""",
+    "CREATE UNIQUE INDEX purge_jobs_active_key ON purge_jobs(table_name) WHERE status IN ('running', 'failed')",
+]
+
+
+@pytest.fixture
+def purge_server(db, server, seed):
+    for sql in _PURGE_JOBS_SCHEMA:
+        server.conn.execute(sql)
+    seed(items=3, fridges=1, customers=5, stock=10)
+    return server
+
+
+def test_archived_chunks_read_back_per_job(tmp_path):
+    store = LocalArchive(str(tmp_path / "purge_archive"))
+    rows = [{"id": i, "name": f"C{i}"} for i in range(1, 6)]
+    bulk_purge.archive_chunk(store, "customers", 7, 1, rows[:3])
+    bulk_purge.archive_chunk(store, "customers", 7, 4, rows[3:])
+    bulk_purge.archive_chunk(store, "customers", 8, 1, rows[:1])
+    # Re-running a chunk after a resume replaces it instead of adding to it
+    bulk_purge.archive_chunk(store, "customers", 7, 4, rows[3:])
+
+    assert bulk_purge.read_archive(store, "customers", 7).to_dict("records") == rows
+    assert len(bulk_purge.read_archive(store, "customers", 8)) == 1
+    assert bulk_purge.read_archive(store, "items", 7).empty
+
+
+def test_start_purge_that_loses_the_insert_race_resumes_the_winner(db, purge_server, monkeypatch):
+    winner = purge_server.table("purge_jobs").insert({
+        "table_name": "customers", "status": "running", "username": "other host",
+        "heartbeat": db._utc_now(),
+    }).execute().data[0]
+    # This host looked before the other host's job existed
+    active = db._active_purge
+    looked = []
+
+    def active_purge(table):
+        looked.append(table)
+        return None if len(looked) == 1 else active(table)
+    monkeypatch.setattr(db, "_active_purge", active_purge)
+
+    assert db.start_purge("customers", "test") == winner["id"]
+    assert len(purge_server.table("purge_jobs").select("id").execute().data) == 1
+    # The other host is still working on it, so nothing was deleted here
+    assert len(purge_server.table("customers").select("id").execute().data) == 5
+
+
+def test_archiving_purge_saves_every_row_to_the_store(db, purge_server, tmp_path, monkeypatch):
+    store = LocalArchive(str(tmp_path / "purge_archive"))
+    monkeypatch.setattr(db, "purge_archive_store", store)
+    customers = purge_server.table("customers").select("*").order("id").execute().data
+
+    job_id = db.start_purge("customers", "test", archive=True)
+    thread = db._purge_threads.get(job_id)
+    if thread is not None:
+        thread.join(10)
+
+    assert db.purge_status(job_id)["status"] == "done"
+    assert not purge_server.table("customers").select("id").execute().data
+    assert bulk_purge.read_archive(store, "customers", job_id)["id"].tolist() == [c["id"] for c in customers]
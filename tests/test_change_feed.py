@@ -0,0 +1,37 @@
+import threading
+
+from change_feed import PollingChangeFeed, TableCache
+
+
+def _feed(changes, delivered, interval=3600):
+    """A polling feed over `changes`: table -> (rows, deleted_ids) returned by the next poll."""
+    def fetch_changes(table, watermark, deleted_watermark):
+        rows, deleted = changes.pop(table, ([], []))
+        return rows, deleted, watermark, deleted_watermark
+    feed = PollingChangeFeed(fetch_changes, lambda table: None, lambda table: "barcode", delivered, interval)
+    for table in ("item_barcodes", "stock_thresholds"):
+        feed.track(table, [])
+    return feed
+
+
+def test_a_key_deleted_and_reused_keeps_the_new_row():
+    cache = TableCache(lambda table: [{"barcode": "480", "item_id": 1}], None, lambda table: "barcode")
+    cache.get("item_barcodes")
+    feed = _feed({"item_barcodes": ([{"barcode": "480", "item_id": 2}], ["480"])}, cache.apply)
+    feed.poll_once()
+    assert cache.get("item_barcodes").to_dict(orient="records") == [{"barcode": "480", "item_id": 2}]
+
+def test_poke_polls_the_poked_tables_on_the_feed_thread():
+    polled, done = [], threading.Event()
+    feed = _feed({}, lambda events: None)
+    poll_once = feed.poll_once
+
+    def record(tables=None):
+        polled.append(tables)
+        done.set()
+        return poll_once(tables)
+    feed.poll_once = record
+    feed.start()
+    feed.poke(["item_barcodes"])
+    assert done.wait(5)
+    assert polled == [["item_barcodes"]]
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from chart_data import downsample, lttb
+
+
+def test_short_series_are_kept_whole():
+    np.testing.assert_array_equal(lttb(np.arange(10.0), np.arange(10.0), 10), np.arange(10))
+    np.testing.assert_array_equal(lttb(np.arange(10.0), np.arange(10.0), 2), np.arange(10))
+
+def test_keeps_the_ends_and_one_point_per_bucket():
+    x = np.arange(1000.0)
+    y = np.sin(x / 25)
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+
+def test_keeps_a_spike_in_a_flat_series():
+    y = np.zeros(1000)
+    y[437] = 50.0
+    y[700] = -30.0
+    keep = lttb(np.arange(1000.0), y, 40)
+    assert 437 in keep and 700 in keep
+
+def test_downsample_returns_rows_of_the_frame():
+    dates = pd.date_range("2024-01-01", periods=2000, freq="D")
+    df = pd.DataFrame({"date": dates, "profit": np.arange(2000.0) % 97})
+    out = downsample(df, "date", "profit", 100)
+    assert len(out) == 100
+    assert out["date"].is_monotonic_increasing
+    assert out["date"].iloc[0] == dates[0] and out["date"].iloc[-1] == dates[-1]
+    assert out.merge(df, on=["date", "profit"]).shape[0] == 100
+    assert downsample(df.head(50), "date", "profit", 100).equals(df.head(50))
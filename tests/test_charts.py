@@ -0,0 +1,57 @@
+import pandas as pd
+
+import chart_data
+
+
+def _counting_fetches(db, monkeypatch):
+    fetches = []
+    fetch_pages = db._fetch_pages
+
+    def counted(query):
+        fetches.append(query)
+        return fetch_pages(query)
+    monkeypatch.setattr(db, "_fetch_pages", counted)
+    return fetches
+
+
+def test_forecast_and_item_series_share_one_sales_fetch(db, seed, monkeypatch):
+    seed(items=2, fridges=1, customers=1, stock=50)
+    item = db.view_items().iloc[0]
+    db.record_sale(int(item["item_id"]), 3, "test", None, 20.0)
+    fetches = _counting_fetches(db, monkeypatch)
+
+    forecast = db.demand_forecast(14)
+    series = db.item_demand_series(item["item_name"], 14)
+    assert len(fetches) == 1
+    assert item["item_name"] in forecast["item_name"].tolist()
+    assert len(series) == db.FORECAST_HISTORY_DAYS + 14
+
+    # A new sale is a new version of the sales, fetched again
+    db.record_sale(int(item["item_id"]), 2, "test", None, 20.0)
+    db.demand_forecast(14)
+    assert len(fetches) == 2
+
+
+def test_chart_version_is_read_before_the_data(db, monkeypatch):
+    version = {"items": 1}
+    frames = [pd.DataFrame({"category": ["SODA"], "quantity": [n]}) for n in (5, 7)]
+
+    def view_items():
+        if len(frames) > 1:
+            # The first run reads the old rows, then the table changes
+            version["items"] += 1
+            return frames.pop(0)
+        return frames[0]
+    monkeypatch.setattr(db, "table_versions", lambda tables: dict(version))
+    monkeypatch.setattr(db, "view_items", view_items)
+
+    assert db.stock_by_category_chart()["quantity"].tolist() == [5]
+    # Charted under the version read first, so the next run rebuilds it
+    assert db.stock_by_category_chart()["quantity"].tolist() == [7]
+
+def test_data_version_ignores_row_order_but_not_values():
+    df = pd.DataFrame({"date": ["2024-01-01", "2024-01-02"], "profit": [5.0, 7.0], "note": ["a", "b"]})
+    version = chart_data.data_version(df, ["date", "profit"])
+    assert chart_data.data_version(df.iloc[::-1], ["date", "profit"]) == version
+    assert chart_data.data_version(df.assign(note="c"), ["date", "profit"]) == version
+    assert chart_data.data_version(df.assign(profit=[5.0, 8.0]), ["date", "profit"]) != version
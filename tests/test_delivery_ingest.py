@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+from delivery_ingest import build_tasks, ingest_delivery  # noqa: E402
+
+
+def _pdf(images=(), pages=None) -> bytes:
+    """A PDF with one page per PNG in `images`, or `pages` blank pages."""
+    doc = fitz.open()
+    for png in images:
+        page = doc.new_page(width=300, height=300)
+        page.insert_image(fitz.Rect(50, 50, 250, 250), stream=png)
+    for _ in range(pages or 0):
+        doc.new_page()
+    return doc.tobytes()
+
+def _qr_png(text: str) -> bytes:
+    cv2 = pytest.importorskip("cv2")
+    image = cv2.QRCodeEncoder.create().encode(text)
+    image = cv2.resize(image, None, fx=8, fy=8, interpolation=cv2.INTER_NEAREST)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+
+def test_uploads_expand_into_one_task_per_image_or_pdf_page(tmp_path):
+    tasks = build_tasks(
+        [("manifest.pdf", _pdf(pages=2)), ("photo.JPG", b"jpeg bytes"), ("notes.txt", b"skipped")],
+        str(tmp_path),
+    )
+    assert [label for label, _, _ in tasks] == ["manifest.pdf p1", "manifest.pdf p2", "photo.JPG"]
+    # Page tasks carry the spooled file's path, never the PDF's bytes
+    spooled = {source for _, source, page_no in tasks if page_no is not None}
+    assert spooled == {str(tmp_path / "0.pdf")}
+    assert (tmp_path / "0.pdf").read_bytes().startswith(b"%PDF")
+    assert tasks[2] == ("photo.JPG", b"jpeg bytes", None)
+
+def test_delivery_is_decoded_into_a_stock_in_batch():
+    pytest.importorskip("pyzbar.pyzbar", exc_type=ImportError)
+    png = _qr_png("4800000000001")
+    index = {"4800000000001": {"item_id": 1, "item_name": "COLA", "category": "SODA",
+                               "fridge_no": 1, "units_per_scan": 6}}
+    files = [("photo.png", png), ("manifest.pdf", _pdf(images=[png, _qr_png("4899999999999")]))]
+
+    result = ingest_delivery(files, index, max_workers=2)
+
+    assert result["batch"][["item_id", "scans", "quantity"]].values.tolist() == [[1, 2, 12]]
+    assert result["unknown"] == ["4899999999999"]
+    pd.testing.assert_frame_equal(result["pages"], pd.DataFrame({
+        "source": ["photo.png", "manifest.pdf p1", "manifest.pdf p2"], "barcodes": [1, 1, 1],
+    }))
+    assert result["stats"]["images"] == 3 and result["stats"]["barcodes"] == 3
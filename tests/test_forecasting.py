@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from forecasting import SEASON, days_of_stock, fit_forecast, forecast_demand
+
+
+def test_constant_demand_is_forecast_flat():
+    history = np.full((8 * SEASON, 2), [5.0, 0.0])
+    forecast = fit_forecast(history, 14)
+    assert forecast.shape == (14, 2)
+    np.testing.assert_allclose(forecast, np.tile([5.0, 0.0], (14, 1)), atol=1e-9)
+
+def test_weekly_pattern_carries_into_the_forecast():
+    # Busy every seventh day, quiet otherwise
+    week = np.array([2.0, 2.0, 2.0, 2.0, 2.0, 12.0, 2.0])
+    history = np.tile(week, 8)[:, None]
+    forecast = fit_forecast(history, SEASON)[:, 0]
+    busy = (len(history) + np.arange(SEASON)) % SEASON == 5
+    assert forecast[busy].min() > 2 * forecast[~busy].max()
+
+def test_short_history_is_fitted_without_a_season():
+    forecast = fit_forecast(np.full((SEASON, 1), 3.0), 5)
+    np.testing.assert_allclose(forecast, 3.0)
+
+def test_falling_demand_is_never_forecast_below_zero():
+    history = np.linspace(20.0, 0.0, 6 * SEASON)[:, None]
+    assert (fit_forecast(history, 60) >= 0).all()
+
+def test_no_items_or_no_days_give_an_empty_forecast():
+    assert fit_forecast(np.zeros((30, 0)), 7).shape == (7, 0)
+    np.testing.assert_array_equal(fit_forecast(np.zeros((0, 3)), 7), np.zeros((7, 3)))
+
+def test_days_of_stock_interpolates_the_stockout_day():
+    forecast = np.full((10, 4), 2.0)
+    days = days_of_stock(forecast, np.array([5.0, 4.0, 0.0, 100.0]))
+    assert days[0] == 2.5          # 2 + 2 used by the end of day 2, the last 1 halfway through day 3
+    assert days[1] == 2.0          # used up exactly at the end of day 2
+    assert days[2] == 0.0          # nothing in stock
+    assert np.isnan(days[3])       # outlasts the horizon
+
+def test_days_of_stock_with_no_demand_outlasts_the_horizon():
+    assert np.isnan(days_of_stock(np.zeros((7, 1)), np.array([3.0]))[0])
+
+def test_forecast_demand_covers_items_in_stock_without_sales():
+    today = pd.Timestamp("2024-03-01")
+    sales = pd.DataFrame({
+        "item_name": ["COLA"] * 28,
+        "quantity": [4] * 28,
+        "date": [(today - pd.Timedelta(days=d)).date().isoformat() for d in range(1, 29)],
+    })
+    items = pd.DataFrame({"item_name": ["COLA", "COLA", "WATER"], "quantity": [6, 6, 10]})
+    out = forecast_demand(sales, items, horizon=14, history_days=28, today=today).set_index("item_name")
+    assert out.loc["COLA", "stock"] == 12
+    assert out.loc["COLA", "units_per_day"] == 4
+    assert out.loc["COLA", "days_left"] == 3
+    assert out.loc["COLA", "stockout_date"] == pd.Timestamp("2024-03-04").date()
+    assert out.loc["WATER", "forecast_horizon"] == 0
+    assert np.isnan(out.loc["WATER", "days_left"])
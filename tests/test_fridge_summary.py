@@ -0,0 +1,46 @@
+import pytest
+
+from change_feed import TableCache
+from local_store import LocalStore
+
+EXPECTED = [
+    # fridge_no, item_rows, stocked_rows, empty_rows, categories, total_units
+    ["1", 3, 2, 1, 2, 15],
+    ["2", 1, 1, 0, 1, 4],
+    ["10", 2, 0, 2, 1, 0],
+]
+
+
+@pytest.fixture
+def items(server):
+    server.table("items").insert([
+        {"item_name": "COKE", "category": "SODA", "quantity": 10, "fridge_no": 1},
+        {"item_name": "SPRITE", "category": "SODA", "quantity": 5, "fridge_no": 1},
+        {"item_name": "WATER", "category": "WATER", "quantity": 0, "fridge_no": 1},
+        {"item_name": "COKE", "category": "SODA", "quantity": 4, "fridge_no": 2},
+        {"item_name": "COKE", "category": "SODA", "quantity": 0, "fridge_no": 10},
+        {"item_name": "SPRITE", "category": "SODA", "quantity": None, "fridge_no": 10},
+    ]).execute()
+    return server
+
+def _table_cache(server):
+    return TableCache(lambda table: server.table(table).select("*").execute().data, None, server.primary_key)
+
+def _rows(summary):
+    return [[r[0]] + [int(v) for v in r[1:]] for r in summary.values.tolist()]
+
+
+def test_totals_from_the_table_cache(db, items, monkeypatch):
+    monkeypatch.setattr(db, "table_cache", _table_cache(items))
+    assert _rows(db.fridge_summary()) == EXPECTED
+
+def test_totals_from_the_local_mirror(db, items, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "local_store", LocalStore(str(tmp_path / "mirror.db")))
+    assert _rows(db.fridge_summary()) == EXPECTED
+    # The mirror catches up with later writes before aggregating
+    items.table("items").update({"quantity": 7}).eq("fridge_no", 10).eq("item_name", "COKE").execute()
+    assert _rows(db.fridge_summary())[2] == ["10", 2, 1, 1, 1, 7]
+
+def test_no_items_means_no_fridges(db, server, monkeypatch):
+    monkeypatch.setattr(db, "table_cache", _table_cache(server))
+    assert db.fridge_summary().empty
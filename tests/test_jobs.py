@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from jobs import JobRunner
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+def _runner(tmp_path):
+    return JobRunner(str(tmp_path / "jobs.db"), str(tmp_path / "results"))
+
+def _blocking_job(started, release):
+    def run(ctx):
+        started.set()
+        release.wait(5)
+        return "finished"
+    return run
+
+
+def test_jobs_of_an_earlier_run_in_the_same_pid_are_failed(tmp_path, release):
+    earlier = _runner(tmp_path)
+    started = threading.Event()
+    running = earlier.submit("test", "running", _blocking_job(started, release))
+    queued = earlier.submit("test", "queued", _blocking_job(threading.Event(), release))
+    started.wait(5)
+    # The process "restarts": the old runner's lock goes, and the new runner has the same pid
+    earlier._owner_lock.close()
+
+    current = _runner(tmp_path)
+    for job_id in (running, queued):
+        job = current.status(job_id)
+        assert job["status"] == "failed" and "Interrupted" in job["error"]
+
+
+def test_jobs_of_a_live_runner_are_left_alone(tmp_path, release):
+    other = _runner(tmp_path)
+    started = threading.Event()
+    job_id = other.submit("test", "running", _blocking_job(started, release))
+    started.wait(5)
+
+    _runner(tmp_path)
+    assert other.status(job_id)["status"] == "running"
+
+
+def test_result_is_read_only_when_loaded(tmp_path):
+    runner = _runner(tmp_path)
+    done = threading.Event()
+
+    def export(ctx):
+        ctx.save_result("a,b\n1,2\n", "export.csv", "text/csv")
+        done.set()
+        return "exported"
+    job_id = runner.submit("test", "export", export)
+    done.wait(5)
+
+    load, name, mime = runner.result(job_id)
+    assert (name, mime) == ("export.csv", "text/csv")
+    assert load() == b"a,b\n1,2\n"
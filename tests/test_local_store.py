@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+from local_store import MIRROR_SCHEMA, LocalStore
+
+
+@pytest.fixture
+def old_mirror(tmp_path):
+    """A mirror made before the upsert keys, holding rows they reject."""
+    path = str(tmp_path / "mirror.db")
+    conn = sqlite3.connect(path)
+    for ddl in MIRROR_SCHEMA.values():
+        conn.execute(ddl)
+    conn.executemany(
+        "INSERT INTO items (item_id, item_name, category, quantity, fridge_no) VALUES (?, ?, ?, ?, ?)",
+        [(1, "COLA", "SODA", 3, 1), (5, "COLA", "SODA", 4, 1), (9, "COLA", "SODA", 2, 1),
+         (7, "COLA", "SODA", 1, 2),
+         # Rows without a fridge_no share one key, as on the server
+         (10, "WATER", "MISC", 6, None), (11, "WATER", "MISC", 8, None)],
+    )
+    conn.executemany(
+        "INSERT INTO pricing_tiers (id, item_id, min_qty, max_qty, price_per_unit) VALUES (?, ?, ?, ?, ?)",
+        # An open-ended tier is stored either as NULL or 0
+        [(1, 1, 10, None, 18.0), (2, 1, 10, 0, 17.0), (3, 1, 20, 0, 16.0)],
+    )
+    conn.executemany(
+        "INSERT INTO customer_price_list (id, customer_id, item_id, custom_price) VALUES (?, ?, ?, ?)",
+        [(3, 1, 1, 15.0), (4, 1, 1, 14.0), (6, 2, 1, 13.0), (8, None, 1, 12.0), (12, None, 1, 11.0)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _column(store, sql):
+    return [tuple(r) for r in store.client.conn.execute(sql).fetchall()]
+
+
+def test_duplicate_items_are_merged_into_the_oldest_row(old_mirror):
+    store = LocalStore(old_mirror)
+    assert _column(store, "SELECT item_id, quantity, fridge_no FROM items ORDER BY item_id") == [
+        (1, 9, 1), (7, 1, 2), (10, 14, None),
+    ]
+
+def test_duplicate_prices_keep_the_newest_row(old_mirror):
+    store = LocalStore(old_mirror)
+    assert _column(store, "SELECT id, price_per_unit FROM pricing_tiers ORDER BY id") == [(2, 17.0), (3, 16.0)]
+    assert _column(store, "SELECT id, custom_price FROM customer_price_list ORDER BY id") == [
+        (4, 14.0), (6, 13.0), (8, 12.0), (12, 11.0),
+    ]
+
+def test_merged_mirror_enforces_the_upsert_keys(old_mirror):
+    store = LocalStore(old_mirror)
+    conn = store.client.conn
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO items (item_name, category, quantity, fridge_no) VALUES ('COLA', 'SODA', 1, 2)")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO items (item_name, category, quantity, fridge_no) VALUES ('WATER', 'MISC', 1, NULL)")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO pricing_tiers (item_id, min_qty, max_qty, price_per_unit) VALUES (1, 20, NULL, 1)")
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO customer_price_list (customer_id, item_id, custom_price) VALUES (2, 1, 1)")
+
+def test_reopening_a_merged_mirror_changes_nothing(old_mirror):
+    LocalStore(old_mirror).client.conn.close()
+    store = LocalStore(old_mirror)
+    assert _column(store, "SELECT COUNT(*), SUM(quantity) FROM items") == [(3, 24)]
+
+def test_stock_ins_without_a_fridge_add_to_one_row(db, server):
+    db.add_or_update_item("Add New", "WATER", "MISC", 2, "", "test")
+    db.add_or_update_item("Add New", "WATER", "MISC", 3, None, "test")
+    item_id = server.table("items").select("item_id").execute().data[0]["item_id"]
+    db.add_or_update_items_batch([{"item_id": item_id, "quantity": 4, "fridge_no": None}], "test")
+    assert [(r["quantity"], r["fridge_no"]) for r in server.table("items").select("*").execute().data] == [(9, None)]
+
+def test_stock_ins_reject_a_fridge_that_is_not_a_whole_number(db, server):
+    for fridge_no in ("A1", "1.5", "nan"):
+        with pytest.raises(ValueError, match="Fridge No."):
+            db.add_or_update_item("Add New", "WATER", "MISC", 2, fridge_no, "test")
+    with pytest.raises(ValueError, match="Fridge No."):
+        db.add_or_update_items_batch([{"item_id": 1, "quantity": 1, "fridge_no": 2},
+                                      {"item_id": 1, "quantity": 1, "fridge_no": "back"}], "test")
+    assert server.table("items").select("*").execute().data == []
+    db.add_or_update_item("Add New", "WATER", "MISC", 2, " 2.0 ", "test")
+    assert server.table("items").select("fridge_no").execute().data == [{"fridge_no": 2}]
@@ -0,0 +1,178 @@
+import pandas as pd
+import pytest
+
+from local_store import LocalStore, SyncWorker
+
+
+@pytest.fixture
+def store(db, server, seed, tmp_path, monkeypatch):
+    """Local-first mode over a mirror of a seeded server: 2 items x 2 fridges of 10, 2 customers."""
+    seed(items=2, fridges=2, customers=2, stock=10)
+    mirror = LocalStore(str(tmp_path / "mirror.db"))
+    monkeypatch.setattr(db, "LOCAL_FIRST", True)
+    monkeypatch.setattr(db, "local_store", mirror)
+    monkeypatch.setattr(db, "sync_worker", SyncWorker(lambda: None, interval=3600))
+    db.sync_mirror(full=True)
+    return mirror
+
+
+def _rows(client, table, **where):
+    query = client.table(table).select("*")
+    for column, value in where.items():
+        query = query.eq(column, value)
+    return query.execute().data
+
+def _stock(client, item_name):
+    return sum(r["quantity"] for r in _rows(client, "items", item_name=item_name))
+
+def _first_item(db):
+    item = db.view_items().sort_values("item_id").iloc[0]
+    return int(item["item_id"]), item["item_name"], item["category"], int(item["fridge_no"])
+
+def _queue_stock_in_sale_and_customer(db):
+    item_id, name, category, fridge_no = _first_item(db)
+    db.add_or_update_item(item_id, name, category, 5, fridge_no, "test")
+    assert db.record_sale(item_id, 12, "test", None, 20.0).startswith("Sale recorded")
+    assert db.save_customer(None, "new customer", "0917", "a@b.c", "qc") == "inserted"
+    return name
+
+def _losing_first_responses(server):
+    """server.rpc where the first call of each function is applied but its answer never arrives."""
+    rpc, lost = server.rpc, set()
+
+    def call(fn, params=None):
+        request = rpc(fn, params)
+        if fn in lost:
+            return request
+        lost.add(fn)
+
+        class Lost:
+            def execute(self):
+                request.execute()
+                raise ConnectionError("response lost")
+        return Lost()
+    return call
+
+
+def test_replay_applies_queued_writes_in_order(db, server, store):
+    name = _queue_stock_in_sale_and_customer(db)
+    assert store.pending_count() == 3
+    assert _stock(server, name) == 20
+
+    assert db.sync_local_changes() == 3
+    assert store.pending_count() == 0
+    assert _stock(server, name) == 20 + 5 - 12
+    assert len(_rows(server, "sales")) == 1
+    assert len(_rows(server, "customers", name="NEW CUSTOMER")) == 1
+    # The mirror now holds the server's copies
+    assert _stock(store.client, name) == 20 + 5 - 12
+
+
+def test_write_replayed_after_a_lost_response_is_applied_once(db, server, store, monkeypatch):
+    name = _queue_stock_in_sale_and_customer(db)
+    with monkeypatch.context() as m:
+        m.setattr(server, "rpc", _losing_first_responses(server))
+        # Each run replays the write whose answer was lost, which the server
+        # applies no second time, then applies the next one, loses that
+        # answer too and stops
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                db.sync_local_changes()
+    assert store.pending_count() == 1
+
+    assert db.sync_local_changes() == 1
+    assert _stock(server, name) == 20 + 5 - 12
+    assert len(_rows(server, "sales")) == 1
+    assert len(_rows(server, "customers", name="NEW CUSTOMER")) == 1
+    assert store.conflicts().empty
+
+
+def test_transient_error_stops_the_run_and_keeps_the_queue(db, server, store, monkeypatch):
+    name = _queue_stock_in_sale_and_customer(db)
+
+    def unreachable(fn, params=None):
+        raise ConnectionError("server unreachable")
+    with monkeypatch.context() as m:
+        m.setattr(server, "rpc", unreachable)
+        with pytest.raises(ConnectionError):
+            db.sync_local_changes()
+
+    assert store.pending_count() == 3
+    assert store.conflicts().empty
+    assert _stock(server, name) == 20
+    assert not _rows(server, "sales")
+
+
+def test_write_the_server_refuses_is_set_aside_and_later_writes_continue(db, server, store):
+    server.conn.execute(
+        "CREATE TRIGGER refuse_barcodes BEFORE INSERT ON item_barcodes BEGIN SELECT RAISE(ABORT, 'refused'); END"
+    )
+    item_id, name, category, fridge_no = _first_item(db)
+    db.save_item_barcode("4800000000001", item_id)
+    db.add_or_update_item(item_id, name, category, 5, fridge_no, "test")
+
+    assert db.sync_local_changes() == 2
+    conflicts = store.conflicts()
+    assert conflicts["op"].tolist() == ["save_item_barcode"]
+    assert "refused" in conflicts["error"].iloc[0]
+    assert _stock(server, name) == 25
+    assert store.pending_count() == 0
+
+
+def test_edit_of_a_row_changed_on_the_server_is_a_conflict(db, server, store):
+    customer = db.view_customers().sort_values("id").iloc[0]
+    db.save_customer(int(customer["id"]), customer["name"], "0999", "", "")
+    server.table("customers").update({"phone": "0555"}).eq("id", int(customer["id"])).execute()
+
+    assert db.sync_local_changes() == 1
+    conflicts = store.conflicts()
+    assert conflicts["op"].tolist() == ["save_customer"]
+    assert "phone" in conflicts["error"].iloc[0]
+    assert _rows(server, "customers", id=int(customer["id"]))[0]["phone"] == "0555"
+
+
+def test_rows_created_and_deleted_offline_are_deleted_on_the_server(db, server, store):
+    item_id = _first_item(db)[0]
+    customer_id = int(db.view_customers().sort_values("id").iloc[0]["id"])
+
+    db.set_special_price(customer_id, item_id, 15.0)
+    record = store.row("customer_price_list", customer_id=customer_id, item_id=item_id)
+    assert record["id"] < 0
+    db.delete_price(record["id"])
+
+    db.save_pricing_tier(item_id, 10, 0, 18.0, "case")
+    tier = store.row("pricing_tiers", item_id=item_id, min_qty=10)
+    assert tier["id"] < 0
+    db.delete_pricing_tier(tier["id"])
+
+    assert db.sync_local_changes() == 4
+    assert store.conflicts().empty
+    assert not _rows(server, "customer_price_list", customer_id=customer_id, item_id=item_id)
+    assert not _rows(server, "pricing_tiers", item_id=item_id, min_qty=10)
+    # Both were versioned while they existed, and neither version is still open
+    versions = pd.DataFrame(_rows(server, "price_versions", item_id=item_id))
+    assert versions["kind"].tolist().count("special") == 1
+    assert versions.loc[versions["kind"] == "special", "valid_to"].notna().all()
+
+
+def test_replayed_price_change_is_versioned_from_the_edit(db, server, store):
+    item_id = _first_item(db)[0]
+    db.save_pricing_tier(item_id, 10, 0, 18.0, "case")
+    db.save_pricing_tier(item_id, 10, 0, 17.0, "case")
+    edits = [op["args"]["valid_from"] for op in store.pending(10)]
+
+    assert db.sync_local_changes() == 2
+    versions = sorted(_rows(server, "price_versions", item_id=item_id, kind="tier"), key=lambda v: v["id"])
+    assert [v["price_per_unit"] for v in versions] == [18.0, 17.0]
+    # The first version ends where the second starts: at the second edit, not at the replay
+    assert [v["valid_from"] for v in versions] == edits
+    assert [v["valid_to"] for v in versions] == [edits[1], None]
+
+
+def test_saving_an_unchanged_tier_keeps_its_version(db, server, store):
+    item_id = _first_item(db)[0]
+    db.save_pricing_tier(item_id, 10, 0, 18.0, "case")
+    db.save_pricing_tier(item_id, 10, 0, 18.0, "case")
+    assert db.sync_local_changes() == 2
+    versions = _rows(server, "price_versions", item_id=item_id, kind="tier")
+    assert len(versions) == 1 and versions[0]["valid_to"] is None
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import uuid
+
+import pytest
+
+from sqlite_migrations import MIGRATIONS_DIR, migrate
+
+SUPABASE_MIGRATIONS = os.path.join(os.path.dirname(MIGRATIONS_DIR), "supabase")
+INVENTORY_DB = os.path.join(os.path.dirname(os.path.dirname(MIGRATIONS_DIR)), "inventory.db")
+
+# Duplicates of the kind the upsert keys reject: COLA/SODA/fridge 1 three
+# times, tiers and special prices that clash once those rows are merged
+_ITEMS = [(1, "COLA", "SODA", 3, 1), (5, "COLA", "SODA", 4, 1), (9, "COLA", "SODA", 2, 1), (7, "COLA", "SODA", 1, 2)]
+_SALES = [(1, 5, "COLA", 2), (2, 9, "COLA", 1), (3, 7, "COLA", 1)]
+_TIERS = [(1, 1, 10, None, 18.0), (2, 5, 10, 0, 17.0), (3, 9, 20, None, 16.0)]
+_SPECIAL = [(1, 1, 1, 15.0), (2, 1, 5, 14.0), (3, 2, 9, 13.0)]
+
+
+def _seed(execute):
+    execute("INSERT INTO items (item_id, item_name, category, quantity, fridge_no) VALUES (?, ?, ?, ?, ?)", _ITEMS)
+    execute("INSERT INTO sales (id, item_id, item_name, quantity) VALUES (?, ?, ?, ?)", _SALES)
+    execute("INSERT INTO pricing_tiers (id, item_id, min_qty, max_qty, price_per_unit) VALUES (?, ?, ?, ?, ?)", _TIERS)
+    execute("INSERT INTO customer_price_list (id, customer_id, item_id, custom_price) VALUES (?, ?, ?, ?)", _SPECIAL)
+
+def _assert_merged(rows):
+    assert rows("SELECT item_id, quantity, fridge_no FROM items ORDER BY item_id") == [(1, 9, 1), (7, 1, 2)]
+    assert rows("SELECT id, item_id FROM sales ORDER BY id") == [(1, 1), (2, 1), (3, 7)]
+    assert rows("SELECT id, item_id, min_qty FROM pricing_tiers ORDER BY id") == [(2, 1, 10), (3, 1, 20)]
+    assert rows("SELECT id, customer_id, item_id FROM customer_price_list ORDER BY id") == [(2, 1, 1), (3, 2, 1)]
+
+
+# ---------------- SQLITE ----------------
+@pytest.fixture
+def inventory(tmp_path):
+    """An inventory.db-schema database from before any migration, with duplicates."""
+    with sqlite3.connect(INVENTORY_DB) as source:
+        tables = source.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+    conn = sqlite3.connect(str(tmp_path / "inventory.db"))
+    for (ddl,) in tables:
+        conn.execute(ddl)
+    _seed(conn.executemany)
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_sqlite_hot_filter_indexes_are_added_once(inventory):
+    migrate(inventory)
+    indexes = {name for (name,) in inventory.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"customers_name_idx", "sales_customer_id_date_idx", "audit_log_timestamp_idx"} <= indexes
+    assert migrate(inventory) == []
+
+def test_sqlite_hot_filter_indexes_change_no_rows(inventory, tmp_path):
+    (tmp_path / "migrations").mkdir()
+    with open(os.path.join(MIGRATIONS_DIR, "001_hot_filter_indexes.sql"), encoding="utf-8") as f:
+        (tmp_path / "migrations" / "001_hot_filter_indexes.sql").write_text(f.read())
+    inventory.execute("INSERT INTO customer_price_list (customer_id, item_id, custom_price) VALUES (1, 1, 12)")
+    migrate(inventory, str(tmp_path / "migrations"))
+    # Duplicate special prices are left to the upsert keys (002)
+    assert inventory.execute("SELECT COUNT(*) FROM customer_price_list").fetchone()[0] == len(_SPECIAL) + 1
+    assert inventory.execute("SELECT COUNT(*) FROM items").fetchone()[0] == len(_ITEMS)
+
+def test_sqlite_upsert_keys_merge_duplicates(inventory):
+    applied = migrate(inventory)
+    assert [os.path.basename(p) for p in applied] == ["001_hot_filter_indexes.sql", "002_upsert_keys.sql"]
+    assert inventory.execute("PRAGMA user_version").fetchone()[0] == 2
+    _assert_merged(lambda sql: [tuple(r) for r in inventory.execute(sql).fetchall()])
+
+def test_sqlite_upsert_keys_are_enforced_afterwards(inventory):
+    migrate(inventory)
+    for sql in [
+        "INSERT INTO items (item_name, category, quantity, fridge_no) VALUES ('COLA', 'SODA', 1, 2)",
+        "INSERT INTO pricing_tiers (item_id, min_qty, max_qty, price_per_unit) VALUES (1, 20, 0, 1)",
+        "INSERT INTO customer_price_list (customer_id, item_id, custom_price) VALUES (1, 1, 1)",
+    ]:
+        with pytest.raises(sqlite3.IntegrityError):
+            inventory.execute(sql)
+    assert migrate(inventory) == []
+
+def test_sqlite_upsert_keys_treat_a_missing_fridge_as_one_fridge(inventory):
+    inventory.executemany(
+        "INSERT INTO items (item_id, item_name, category, quantity, fridge_no) VALUES (?, ?, ?, ?, ?)",
+        [(20, "WATER", "MISC", 6, None), (21, "WATER", "MISC", 8, None)],
+    )
+    migrate(inventory)
+    assert inventory.execute("SELECT item_id, quantity FROM items WHERE item_name = 'WATER'").fetchall() == [(20, 14)]
+    with pytest.raises(sqlite3.IntegrityError):
+        inventory.execute("INSERT INTO items (item_name, category, quantity, fridge_no) VALUES ('WATER', 'MISC', 1, NULL)")
+
+def test_sqlite_migration_that_fails_leaves_the_database_as_it_was(inventory, tmp_path):
+    (tmp_path / "migrations").mkdir()
+    (tmp_path / "migrations" / "001_broken.sql").write_text(
+        "DELETE FROM items;\nINSERT INTO no_such_table VALUES (1);\n"
+    )
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(inventory, str(tmp_path / "migrations"))
+    assert inventory.execute("SELECT COUNT(*) FROM items").fetchone()[0] == len(_ITEMS)
+    assert inventory.execute("PRAGMA user_version").fetchone()[0] == 0
+
+
+# ---------------- SUPABASE ----------------
+# The tables 013 touches, as far as it touches them
+_POSTGRES_SCHEMA = """
+    create table items (item_id bigserial primary key, item_name text, category text,
+                        quantity numeric, fridge_no bigint);
+    create index items_item_name_idx on items(item_name);
+    create table sales (id bigserial primary key, item_id bigint not null, item_name text, quantity numeric);
+    create table pricing_tiers (id bigserial primary key, item_id bigint not null, min_qty integer not null,
+                                max_qty integer, price_per_unit numeric not null, label text);
+    create table customer_price_list (id bigserial primary key, customer_id bigint, item_id bigint,
+                                      custom_price numeric);
+    create table item_barcodes (barcode text primary key, item_id bigint not null);
+    create table price_history (id bigserial primary key, item_id bigint);
+    create table price_versions (id bigserial primary key, kind text not null, source_id bigint not null,
+                                 item_id bigint not null, customer_id bigint, price_per_unit numeric not null,
+                                 valid_from timestamptz not null default now(), valid_to timestamptz);
+"""
+
+@pytest.fixture
+def postgres():
+    """A throwaway schema on DIANES_TEST_DATABASE_URL holding the tables 013 touches."""
+    url = os.environ.get("DIANES_TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("DIANES_TEST_DATABASE_URL is not set")
+    psycopg = pytest.importorskip("psycopg")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute(f"create schema {schema}")
+        try:
+            conn.execute(f"set search_path to {schema}")
+            conn.execute(_POSTGRES_SCHEMA)
+            yield conn
+        finally:
+            conn.execute(f"drop schema {schema} cascade")
+
+def _run(conn, name):
+    with open(os.path.join(SUPABASE_MIGRATIONS, name), encoding="utf-8") as f:
+        conn.execute(f.read())
+
+def test_supabase_upsert_keys_merge_duplicates(postgres):
+    def executemany(sql, rows):
+        with postgres.cursor() as cur:
+            cur.executemany(sql.replace("?", "%s"), rows)
+    _seed(executemany)
+    postgres.execute("insert into item_barcodes values ('4800000000001', 9)")
+    postgres.execute(
+        "insert into price_versions (kind, source_id, item_id, customer_id, price_per_unit) values"
+        " ('tier', 1, 1, null, 18), ('tier', 2, 5, null, 17), ('special', 1, 1, 1, 15), ('special', 2, 5, 1, 14)"
+    )
+    _run(postgres, "013_upsert_keys.sql")
+
+    _assert_merged(lambda sql: [tuple(r) for r in postgres.execute(sql).fetchall()])
+    assert postgres.execute("select item_id from item_barcodes").fetchall() == [(1,)]
+    # Versions of the tier and special price that lost to a newer duplicate are closed
+    assert postgres.execute(
+        "select kind, source_id, item_id from price_versions where valid_to is null order by kind, source_id"
+    ).fetchall() == [("special", 2, 1), ("tier", 2, 1)]
+
+def test_supabase_stock_in_adds_to_the_row_or_inserts_it(postgres):
+    _run(postgres, "013_upsert_keys.sql")
+    postgres.execute("insert into items (item_name, category, quantity, fridge_no) values ('COLA', 'SODA', 3, 1)")
+
+    def stock_in(*args):
+        return postgres.execute("select * from stock_in(%s, %s, %s, %s, %s)", args).fetchone()[0]
+    added = stock_in(None, "COLA", "SODA", 1, 4)
+    assert (added["quantity"], added["inserted"]) == (7, False)
+    moved = stock_in(added["item_id"], None, None, 2, 5)
+    assert (moved["item_name"], moved["fridge_no"], moved["inserted"]) == ("COLA", 2, True)
+    # No fridge_no is one row too, not a new row per stock-in
+    loose = stock_in(None, "WATER", "MISC", None, 2)
+    again = stock_in(None, "WATER", "MISC", None, 3)
+    assert (again["item_id"], again["quantity"], again["inserted"]) == (loose["item_id"], 5, False)
+
+    def tier(max_qty, price):
+        return postgres.execute(
+            "select * from upsert_pricing_tier(%s, 10, %s, %s, null)", (added["item_id"], max_qty, price)
+        ).fetchone()[0]
+    assert tier(None, 18)["inserted"]
+    repriced = tier(0, 17)
+    assert (repriced["inserted"], repriced["price_per_unit"]) == (False, 17)
+
+def test_supabase_checkpoint_is_stamped_after_the_writes_it_holds(postgres):
+    postgres.execute("create table audit_log (id bigserial primary key, timestamp timestamp)")
+    for name in ("007_inventory_checkpoints.sql", "013_upsert_keys.sql", "017_applied_writes.sql",
+                 "019_inventory_checkpoint.sql"):
+        _run(postgres, name)
+    written = postgres.execute("select * from stock_in(null, 'COLA', 'SODA', 1, 4)").fetchone()[0]
+
+    checkpoint_id = postgres.execute("select take_inventory_checkpoint(0)").fetchone()[0]
+    taken_at = postgres.execute(
+        "select taken_at from inventory_checkpoints where id = %s", (checkpoint_id,)
+    ).fetchone()[0]
+    assert postgres.execute(
+        "select %s::timestamptz at time zone 'UTC' < %s", (written["stamped_at"], taken_at)
+    ).fetchone()[0]
+    assert postgres.execute(
+        "select item_id, fridge_no, quantity from inventory_checkpoint_rows where checkpoint_id = %s",
+        (checkpoint_id,),
+    ).fetchall() == [(written["item_id"], "1", 4)]
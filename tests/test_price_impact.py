@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_impact import apply_tier_changes, changed_tiers
+
+
+def _tiers(*rows):
+    return pd.DataFrame(rows, columns=["item_id", "min_qty", "max_qty", "price_per_unit", "label"])
+
+CURRENT = _tiers(
+    (1, 1, 11, 20.0, "retail"),
+    (1, 12, None, 18.0, "CASE"),
+    (2, 1, None, 35.0, "RETAIL"),
+)
+
+
+def test_unchanged_tiers_are_not_reported():
+    assert changed_tiers(CURRENT, CURRENT).empty
+    # Labels are compared normalized, and an empty max_qty matches an empty max_qty
+    same = _tiers((1, 1, 11, 20.0, " RETAIL "), (1, 12, np.nan, 18.0, "case"))
+    assert changed_tiers(CURRENT, apply_tier_changes(CURRENT, same)).empty
+
+def test_repriced_and_added_tiers_are_reported():
+    proposed = _tiers(
+        (1, 12, None, 17.5, "CASE"),
+        (2, 24, None, 30.0, "CASE"),
+    )
+    changes = changed_tiers(CURRENT, apply_tier_changes(CURRENT, proposed))
+    assert changes[["item_id", "min_qty", "label", "new_price"]].values.tolist() == [
+        [1, 12, "CASE", 17.5],
+        [2, 24, "CASE", 30.0],
+    ]
+    assert changes["old_price"].iloc[0] == 18.0
+    assert np.isnan(changes["old_price"].iloc[1])
+
+def test_a_different_max_qty_is_a_new_tier():
+    proposed = _tiers((1, 1, 5, 20.0, "RETAIL"))
+    changes = changed_tiers(CURRENT, apply_tier_changes(CURRENT, proposed))
+    assert changes[["min_qty", "max_qty"]].values.tolist() == [[1, 5]]
+    assert np.isnan(changes["old_price"].iloc[0])
+
+def test_missing_columns_are_rejected():
+    with pytest.raises(ValueError, match="label"):
+        changed_tiers(CURRENT, CURRENT.drop(columns="label"))
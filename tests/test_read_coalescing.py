@@ -0,0 +1,44 @@
+import threading
+import time
+
+
+def _blocking_read(db):
+    """A coalesced read of items that waits for `release`; returns (read, calls, started, release)."""
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    @db._single_flight("items")
+    def read():
+        calls.append(len(calls))
+        started.set()
+        release.wait(5)
+        return len(calls)
+    return read, calls, started, release
+
+def _in_thread(fn, results):
+    thread = threading.Thread(target=lambda: results.append(fn()))
+    thread.start()
+    return thread
+
+
+def test_identical_reads_share_one_request(db):
+    read, calls, started, release = _blocking_read(db)
+    results = []
+    leader = _in_thread(read, results)
+    assert started.wait(5)
+    follower = _in_thread(read, results)
+    while not db._flights or next(iter(db._flights.values())).waiters == 0:
+        time.sleep(0.001)
+    release.set()
+    leader.join(), follower.join()
+    assert len(calls) == 1 and results == [1, 1]
+
+def test_read_after_a_write_does_not_join_an_earlier_request(db):
+    read, calls, started, release = _blocking_read(db)
+    results = []
+    leader = _in_thread(read, results)
+    assert started.wait(5)
+    db._tables_changed(["items"])
+    release.set()
+    assert read() == 2
+    leader.join()
+    assert len(calls) == 2
@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+import rerun_profiler
+
+
+@pytest.fixture
+def profiler(monkeypatch):
+    monkeypatch.setattr(rerun_profiler, "ENABLED", True)
+    monkeypatch.setattr(rerun_profiler, "MODE", "1")
+    monkeypatch.setattr(rerun_profiler, "KEEP", 2)
+    rerun_profiler.reset()
+    yield rerun_profiler
+    rerun_profiler._local.rerun = None
+    rerun_profiler.reset()
+
+def _rerun(profiler, menu, seconds, calls=()):
+    profiler.begin()
+    for call in calls:
+        call()
+    time.sleep(seconds)
+    profiler.lap("page")
+    profiler.end(menu)
+
+
+def test_nested_db_calls_count_once_in_the_outermost(profiler):
+    @profiler.timed
+    def view_items():
+        time.sleep(0.01)
+
+    @profiler.timed
+    def fridge_summary():
+        view_items()
+    profiler.begin()
+    fridge_summary()
+    view_items()
+    profiler.lap("summary")
+    profiler.end("Fridges")
+
+    rerun_id = profiler.slowest_reruns()["id"].iloc[0]
+    sections, calls, profile = profiler.rerun_detail(rerun_id)
+    assert calls["function"].tolist() == ["fridge_summary", "view_items"]
+    assert sections["section"].tolist() == ["summary"]
+    assert profile is None
+
+def test_only_the_slowest_reruns_per_menu_are_kept(profiler):
+    for seconds in (0.03, 0.0, 0.02, 0.01):
+        _rerun(profiler, "Sales", seconds)
+    _rerun(profiler, "Inventory", 0.0)
+
+    slow = profiler.slowest_reruns()
+    assert slow["menu"].tolist() == ["Sales", "Sales", "Inventory"]
+    assert slow["total_ms"].iloc[0] >= 30 and slow["total_ms"].iloc[1] >= 20
+    assert profiler.slowest_reruns("Inventory")["slowest_section"].tolist() == ["page"]
+    # Reruns pushed out of the kept set have no detail any more
+    first = slow["id"].min()
+    assert sorted(slow["id"][slow["menu"] == "Sales"]) == [first, first + 2]
+    assert profiler.rerun_detail(first + 1) is None and profiler.rerun_detail(first + 3) is None
+
+def test_a_rerun_cut_short_is_dropped(profiler):
+    profiler.begin()
+    profiler.lap("half a page")
+    profiler.begin()  # st.rerun() started the script again on this thread
+    profiler.end("Sales")
+    assert profiler.rerun_detail(profiler.slowest_reruns()["id"].iloc[0])[0].empty
+
+def test_calls_outside_a_rerun_are_not_timed(profiler):
+    @profiler.timed
+    def view_items():
+        return "rows"
+    assert view_items() == "rows"
+    thread = threading.Thread(target=profiler.begin)
+    thread.start()
+    thread.join()
+    profiler.end("Sales")  # nothing began on this thread
+    assert profiler.slowest_reruns().empty
+
+def test_cprofile_captures_one_rerun_at_a_time(profiler, monkeypatch):
+    monkeypatch.setattr(profiler, "MODE", "cprofile")
+    started, release = threading.Event(), threading.Event()
+
+    def other_session():
+        profiler.begin()
+        started.set()
+        release.wait()
+        profiler.end("Other")
+    thread = threading.Thread(target=other_session)
+    thread.start()
+    started.wait()
+    _rerun(profiler, "Sales", 0.0)
+    release.set()
+    thread.join()
+
+    profiles = {r.menu: profiler.rerun_detail(r.id)[2] for r in profiler.slowest_reruns().itertuples()}
+    assert profiles["Sales"] is None
+    assert "function calls" in profiles["Other"]
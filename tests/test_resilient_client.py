@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+import resilient_client
+from resilient_client import DBTimeout, RequestPolicy
+
+
+class Flaky:
+    """A call that fails with `errors` in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+class Transient(Exception):
+    code = "503"
+
+@pytest.fixture
+def release():
+    """An event that lets blocked calls return; set at the end of the test."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+def _metrics(policy, table="items", kind="read"):
+    row = policy.metrics().set_index(["table", "kind"]).loc[(table, kind)]
+    return {k: row[k] for k in ("calls", "retries", "timeouts", "errors", "hedged", "hedge_wins", "abandoned")}
+
+def _wait_idle():
+    # Attempts given up on keep their worker until the call returns
+    deadline = time.monotonic() + 5
+    while resilient_client._slots._value < resilient_client.MAX_WORKERS and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert resilient_client._slots._value == resilient_client.MAX_WORKERS
+
+
+def test_transient_errors_are_retried_and_others_are_not():
+    policy = RequestPolicy(retries=3, backoff=0)
+    call = Flaky(Transient(), ConnectionError())
+    assert policy.execute("items", "read", True, call) == "ok"
+    assert call.calls == 3
+    with pytest.raises(ValueError):
+        policy.execute("items", "read", True, Flaky(ValueError()))
+    assert _metrics(policy) == {
+        "calls": 2, "retries": 2, "timeouts": 0, "errors": 1, "hedged": 0, "hedge_wins": 0, "abandoned": 0,
+    }
+
+def test_plain_inserts_are_tried_once():
+    policy = RequestPolicy(retries=3, backoff=0)
+    call = Flaky(Transient())
+    with pytest.raises(Transient):
+        policy.execute("sales", "write", False, call)
+    assert call.calls == 1
+
+def test_a_timed_out_attempt_is_abandoned_and_retried(release):
+    policy = RequestPolicy(read_timeout=0.05, retries=1, backoff=0)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait()
+        return "ok"
+    assert policy.execute("items", "read", True, call) == "ok"
+    assert _metrics(policy) == {
+        "calls": 1, "retries": 1, "timeouts": 1, "errors": 0, "hedged": 0, "hedge_wins": 0, "abandoned": 1,
+    }
+    release.set()
+    _wait_idle()
+
+def test_running_out_of_retries_raises_db_timeout(release):
+    policy = RequestPolicy(read_timeout=0.05, retries=1, backoff=0)
+    with pytest.raises(DBTimeout):
+        policy.execute("items", "read", True, release.wait)
+    assert _metrics(policy)["abandoned"] == 2
+    release.set()
+    _wait_idle()
+
+def test_policies_share_one_bounded_pool(release, monkeypatch):
+    monkeypatch.setattr(resilient_client, "_slots", threading.BoundedSemaphore(1))
+    first, second = RequestPolicy(read_timeout=0.05, retries=0), RequestPolicy(read_timeout=0.05, retries=0)
+    with pytest.raises(DBTimeout):
+        first.execute("items", "read", True, release.wait)
+    # The abandoned attempt still holds the only worker, so nothing else starts
+    call = Flaky()
+    with pytest.raises(DBTimeout, match="no free database worker"):
+        second.execute("items", "read", True, call)
+    assert call.calls == 0
+    release.set()
+    deadline = time.monotonic() + 5
+    while resilient_client._slots._value == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert second.execute("items", "read", True, call) == "ok"
+
+def test_a_slow_read_is_hedged_and_the_loser_abandoned(release):
+    policy = RequestPolicy(read_timeout=2, retries=0, hedge=True, hedge_min_samples=5)
+    for _ in range(5):
+        policy.execute("items", "read", True, lambda: "warm")
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait()
+            return "primary"
+        return "hedge"
+    started = time.monotonic()
+    assert policy.execute("items", "read", True, call) == "hedge"
+    assert time.monotonic() - started < 1
+    assert _metrics(policy) == {
+        "calls": 6, "retries": 0, "timeouts": 0, "errors": 0, "hedged": 1, "hedge_wins": 1, "abandoned": 1,
+    }
+    release.set()
+    _wait_idle()
+
+def test_writes_are_never_hedged():
+    policy = RequestPolicy(write_timeout=2, retries=0, hedge=True, hedge_min_samples=1)
+    policy.execute("items", "write", True, lambda: "warm")
+    call = Flaky()
+    assert policy.execute("items", "write", True, call) == "ok"
+    assert call.calls == 1
+    assert _metrics(policy, kind="write")["hedged"] == 0
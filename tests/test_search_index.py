@@ -0,0 +1,51 @@
+import pandas as pd
+
+import search_index
+from search_index import SearchIndex
+
+
+def _items():
+    return pd.DataFrame({
+        "item_id": [1, 2, 3, 4],
+        "item_name": ["Coke Zero", "Coke", "Cokefloat Syrup", "Fanta Orange"],
+        "category": ["Soda", "Soda", "Mixers", "Soda"],
+    })
+
+def _names(df, query, limit=20):
+    return df.iloc[SearchIndex(df, search_index.SEARCH_FIELDS["items"]).search(query, limit)]["item_name"].tolist()
+
+
+def test_exact_words_rank_above_prefixes():
+    df = _items()
+    assert _names(df, "coke") == ["Coke Zero", "Coke", "Cokefloat Syrup"]
+    assert _names(df, "coke soda") == ["Coke Zero", "Coke"]
+    assert _names(df, "coke soda", limit=1) == ["Coke Zero"]
+
+def test_every_word_must_match_when_some_row_has_them_all():
+    df = _items()
+    assert _names(df, "orange soda") == ["Fanta Orange"]
+    assert _names(df, "3") == ["Cokefloat Syrup"]
+
+def test_misspellings_fall_back_to_close_words():
+    df = _items()
+    assert _names(df, "fnata") == ["Fanta Orange"]
+    assert _names(df, "syrop") == ["Cokefloat Syrup"]
+
+def test_without_a_full_match_rows_rank_by_the_words_they_have():
+    df = _items()
+    # No row is both a mixer and an orange; rows with either still come back
+    assert _names(df, "mixers orange") == ["Cokefloat Syrup", "Fanta Orange"]
+    assert _names(df, "lemonade") == []
+
+def test_an_empty_query_returns_the_first_rows():
+    df = _items()
+    assert _names(df, "  ", limit=2) == ["Coke Zero", "Coke"]
+
+def test_index_is_reused_until_the_searched_columns_change():
+    df = _items()
+    search_index._indexes.clear()
+    first = search_index.index_for(df, "items")
+    assert search_index.index_for(df.copy(), "items") is first
+    df.loc[1, "item_name"] = "Pepsi"
+    assert search_index.index_for(df, "items") is not first
+    assert search_index.search(df, "items", "pepsi")["item_id"].tolist() == [2]
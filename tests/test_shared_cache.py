@@ -0,0 +1,48 @@
+from shared_cache import SharedTableStore
+
+
+def _loader(batches):
+    """load(table) returning the next of `batches`, counting calls."""
+    calls = []
+
+    def load(table):
+        calls.append(table)
+        return batches[min(len(calls), len(batches)) - 1]
+    return load, calls
+
+
+def test_snapshot_is_fetched_once_per_generation(tmp_path):
+    store = SharedTableStore(str(tmp_path))
+    load, calls = _loader([[{"item_id": 1, "quantity": 3}], [{"item_id": 1, "quantity": 5}]])
+    assert store.get("items", load)["quantity"].tolist() == [3]
+    assert store.get("items", load)["quantity"].tolist() == [3]
+    assert len(calls) == 1
+
+    store.invalidate(["items"])
+    assert SharedTableStore(str(tmp_path)).get("items", load)["quantity"].tolist() == [5]
+    assert len(calls) == 2
+
+def test_fetch_that_raced_a_write_is_not_published(tmp_path):
+    store = SharedTableStore(str(tmp_path))
+    batches = [[{"item_id": 1, "quantity": 3}], [{"item_id": 1, "quantity": 5}]]
+
+    def load(table):
+        calls.append(table)
+        if len(calls) == 1:
+            # A write lands (and invalidates) while the first fetch is in flight
+            store.invalidate([table])
+        return batches[len(calls) - 1]
+    calls = []
+    assert store.get("items", load)["quantity"].tolist() == [5]
+    assert len(calls) == 2
+    assert store.stats()["filled_generation"].tolist() == [1]
+    assert len(list(tmp_path.glob("items-*.arrow"))) == 1
+
+def test_table_arrow_cannot_hold_is_served_uncached(tmp_path):
+    store = SharedTableStore(str(tmp_path))
+    rows = [{"item_id": 1, "fridge_no": 1}, {"item_id": 2, "fridge_no": "back room"}]
+    load, calls = _loader([rows])
+    assert store.get("items", load)["fridge_no"].tolist() == [1, "back room"]
+    assert store.get("items", load)["fridge_no"].tolist() == [1, "back room"]
+    assert len(calls) == 2
+    assert not list(tmp_path.glob("items-*"))
@@ -0,0 +1,21 @@
+import pandas as pd
+
+import snapshots
+
+
+def test_changes_to_a_shared_view_leave_the_snapshot_alone(monkeypatch):
+    for copy_on_write in (True, False):
+        monkeypatch.setattr(snapshots, "_copy_on_write", lambda: copy_on_write)
+        snapshot = snapshots.publish("test", "items", 1, pd.DataFrame({"item_id": [1, 2], "quantity": [3, 4]}))
+        view = snapshots.share(snapshot)
+        view.loc[0, "quantity"] = 99
+        view["label"] = "x"
+        assert snapshot["quantity"].tolist() == [3, 4]
+        assert "label" not in snapshot
+
+def test_labels_are_built_once_per_snapshot_version():
+    snapshot = snapshots.publish("test", "customers", 1, pd.DataFrame({"id": [1, 2], "name": ["ANA", "BEN"]}))
+    first = snapshots.label_column(snapshots.share(snapshot), "customer")
+    assert first.tolist() == ["1 - ANA", "2 - BEN"]
+    assert snapshots._labels[("customers", 1, "customer")] is not first
+    assert snapshots.label_column(snapshots.share(snapshot), "customer").tolist() == first.tolist()
@@ -0,0 +1,59 @@
+from datetime import date
+
+import pandas as pd
+
+from stock_alerts import StockAlerts, reorder_list
+
+
+def _alerts(items, thresholds=()):
+    loads = []
+
+    def load_items():
+        loads.append("items")
+        return pd.DataFrame(items, columns=["item_id", "item_name", "quantity"])
+    return StockAlerts(load_items, lambda: pd.DataFrame(thresholds, columns=["item_name", "threshold"])), loads
+
+def _low(alerts, threshold=5):
+    return alerts.low_stock(threshold)[["item_name", "quantity"]].values.tolist()
+
+
+def test_stock_is_summed_across_fridges_and_the_threshold_is_inclusive():
+    alerts, _ = _alerts([(1, "COKE", 3), (2, "COKE", 2), (3, "SPRITE", 6), (4, "WATER", 5)])
+    assert _low(alerts) == [["COKE", 5], ["WATER", 5]]
+    assert _low(alerts, threshold=4) == []
+
+def test_writes_cross_the_threshold_both_ways_without_a_reload():
+    alerts, loads = _alerts([(1, "COKE", 3), (2, "COKE", 4), (3, "SPRITE", 10)])
+    assert _low(alerts) == []
+    alerts.update_rows([{"item_id": 1, "item_name": "COKE", "quantity": 1}])
+    alerts.update_rows([{"item_id": 3, "item_name": "SPRITE", "quantity": None}])
+    assert _low(alerts) == [["SPRITE", 0], ["COKE", 5]]
+    alerts.update_rows([{"item_id": 1, "item_name": "COKE", "quantity": 2}])
+    assert _low(alerts) == [["SPRITE", 0]]
+    assert loads == ["items"]
+
+def test_removing_the_last_fridge_row_clears_the_alert():
+    alerts, _ = _alerts([(1, "COKE", 1), (2, "COKE", 1)])
+    assert _low(alerts) == [["COKE", 2]]
+    alerts.remove_rows([1])
+    assert _low(alerts) == [["COKE", 1]]
+    alerts.remove_rows([2])
+    assert _low(alerts) == []
+
+def test_per_item_thresholds_override_the_global_one():
+    alerts, _ = _alerts([(1, "COKE", 8), (2, "SPRITE", 3)], thresholds=[("COKE", 10)])
+    assert alerts.low_stock(5)[["item_name", "threshold"]].values.tolist() == [["SPRITE", 5], ["COKE", 10]]
+    alerts.set_thresholds({"COKE": None, "SPRITE": 2})
+    assert _low(alerts) == []
+
+def test_reorder_list_covers_the_threshold_and_recent_sales():
+    low = pd.DataFrame([("COKE", 2, 5.0), ("SPRITE", 0, 5.0)], columns=["item_name", "quantity", "threshold"])
+    sales = pd.DataFrame({"item_name": ["COKE", "COKE", "SPRITE"], "quantity": [14, 14, 50],
+                          "date": ["2026-10-10", "2026-10-12", "2026-01-01"]})
+    out = reorder_list(low, sales, lookback_days=28, cover_days=14, today=date(2026, 10, 19))
+    # Fast sellers first; no recent sales only lifts stock above the threshold
+    assert out[["item_name", "units_per_day", "suggested_qty"]].values.tolist() == [
+        ["COKE", 1.0, 18],
+        ["SPRITE", 0.0, 6],
+    ]
+    assert out["days_left"].iloc[0] == 2.0 and pd.isna(out["days_left"].iloc[1])